@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from common.utils import setup_logging
 from client.pop3_client_refactored import POP3ClientRefactored
+from client.pop3_sync import POP3MailboxSync
 from common.config import EMAIL_STORAGE_DIR
 
 # 设置日志
@@ -138,7 +139,8 @@ class ReceiveEmailMenu:
             return False
 
     def _receive_all_emails(self):
-        """接收所有邮件"""
+        """接收所有邮件（按UIDL增量同步，已下载的邮件不再重复下载）"""
+        db_saved_count = 0
         try:
             if not self._init_pop3_client():
                 input("\n按回车键继续...")
@@ -150,20 +152,37 @@ class ReceiveEmailMenu:
             with self.pop3_client as client:
                 # 连接时会自动进行认证
 
-                # 获取邮件列表
-                email_list = client.list_emails()
-                if not email_list:
+                # 获取邮件UIDL列表，与本地同步状态比较（一次往返）
+                current_account = self.main_cli.get_current_account()
+                mailbox_sync = POP3MailboxSync(
+                    client, self.main_cli.get_db(), current_account["email"]
+                )
+                uidls = mailbox_sync.fetch_uidls()
+                if uidls is not None:
+                    email_count = len(uidls)
+                else:
+                    email_count = len(client.list_emails())
+                if not email_count:
                     print("📭 邮箱中没有邮件")
                     input("\n按回车键继续...")
                     return
 
-                print(f"📊 邮箱中有 {len(email_list)} 封邮件")
+                if uidls is not None:
+                    new_count = len(mailbox_sync.new_messages(uidls))
+                    print(f"📊 邮箱中有 {email_count} 封邮件，其中 {new_count} 封未下载")
+                    if not new_count:
+                        print("✅ 所有邮件都已下载到本地")
+                        input("\n按回车键继续...")
+                        return
+                else:
+                    new_count = email_count
+                    print(f"📊 邮箱中有 {email_count} 封邮件")
 
                 # 确认是否继续
-                if len(email_list) > 10:
+                if new_count > 10:
                     confirm = (
                         input(
-                            f"⚠️  邮件数量较多({len(email_list)}封)，确认接收所有邮件? (Y/n): "
+                            f"⚠️  邮件数量较多({new_count}封)，确认接收所有邮件? (Y/n): "
                         )
                         .strip()
                         .lower()
@@ -173,116 +192,30 @@ class ReceiveEmailMenu:
                         input("按回车键继续...")
                         return
 
-                # 获取所有邮件
-                print("🚀 正在获取邮件...")
-                emails = client.retrieve_all_emails()
-
-                if emails:
-                    print(f"✅ 成功获取了 {len(emails)} 封邮件")
-
-                    # 保存邮件
-                    saved_count = 0
-                    db_saved_count = 0
-
-                    # 获取数据库服务
-                    db = self.main_cli.get_db()
-
-                    for i, email in enumerate(emails, 1):
-                        try:
-                            print(
-                                f"📧 处理邮件 {i}/{len(emails)}: {email.subject or '(无主题)'}"
-                            )
-
-                            # 确保目录存在
-                            inbox_dir = os.path.join(EMAIL_STORAGE_DIR, "inbox")
-                            os.makedirs(inbox_dir, exist_ok=True)
-
-                            # 保存邮件文件
-                            filepath = client.save_email_as_eml(email, inbox_dir)
-                            if filepath:
-                                saved_count += 1
-
-                                # 保存到数据库
-                                try:
-                                    # 读取EML文件内容
-                                    with open(filepath, "r", encoding="utf-8") as f:
-                                        eml_content = f.read()
-
-                                    # 提取邮件基本信息
-                                    from_addr = (
-                                        str(email.from_addr)
-                                        if email.from_addr
-                                        else "unknown@localhost"
-                                    )
-                                    to_addrs = (
-                                        [str(addr) for addr in email.to_addrs]
-                                        if email.to_addrs
-                                        else ["unknown@localhost"]
-                                    )
-
-                                    # 修复：获取当前账户信息，确保邮件归属正确
-                                    current_account = (
-                                        self.main_cli.get_current_account()
-                                    )
-                                    if current_account:
-                                        current_user_email = current_account["email"]
-                                        # 确保当前用户在收件人列表中（如果不在，添加到抄送）
-                                        if current_user_email not in to_addrs:
-                                            # 检查是否在原始邮件的To, CC, BCC中
-                                            if (
-                                                hasattr(email, "cc_addrs")
-                                                and email.cc_addrs
-                                            ):
-                                                cc_addrs = [
-                                                    str(addr) for addr in email.cc_addrs
-                                                ]
-                                                if current_user_email not in cc_addrs:
-                                                    to_addrs.append(current_user_email)
-                                            else:
-                                                to_addrs.append(current_user_email)
-
-                                    # 提取纯文本内容用于垃圾过滤分析
-                                    plain_text_content = email.text_content or ""
-                                    if not plain_text_content and email.html_content:
-                                        # 如果没有纯文本，从HTML中提取
-                                        try:
-                                            from bs4 import BeautifulSoup
+                # 确保目录存在
+                inbox_dir = os.path.join(EMAIL_STORAGE_DIR, "inbox")
+                os.makedirs(inbox_dir, exist_ok=True)
 
-                                            soup = BeautifulSoup(
-                                                email.html_content, "html.parser"
-                                            )
-                                            plain_text_content = soup.get_text()
-                                        except ImportError:
-                                            # 如果没有BeautifulSoup，使用简单的HTML标签移除
-                                            import re
+                saved_files = []
 
-                                            plain_text_content = re.sub(
-                                                r"<[^>]+>", "", email.html_content or ""
-                                            )
-
-                                    success = db.save_email(
-                                        message_id=email.message_id,
-                                        from_addr=from_addr,
-                                        to_addrs=to_addrs,
-                                        subject=email.subject or "",
-                                        content=plain_text_content,  # 传递纯文本内容用于垃圾过滤
-                                        full_content_for_storage=eml_content,  # 传递完整EML内容用于存储
-                                        date=email.date,
-                                    )
-
-                                    if success:
-                                        db_saved_count += 1
-
-                                except Exception as db_err:
-                                    logger.error(f"保存邮件到数据库失败: {db_err}")
-                                    print(f"⚠️  保存邮件到数据库失败: {db_err}")
+                def save_eml(email):
+                    print(
+                        f"📧 处理邮件 {len(saved_files) + 1}/{new_count}: "
+                        f"{email.subject or '(无主题)'}"
+                    )
+                    # 保存邮件文件
+                    filepath = client.save_email_as_eml(email, inbox_dir)
+                    if filepath:
+                        saved_files.append(filepath)
 
-                        except Exception as e:
-                            logger.error(f"保存邮件失败: {e}")
-                            print(f"❌ 保存邮件失败: {e}")
+                # 只下载新邮件（流水线RETR），边接收边保存到数据库和收件箱目录
+                print("🚀 正在获取邮件...")
+                result = mailbox_sync.sync(uidls=uidls, on_new=save_eml)
+                db_saved_count = result.new_count
 
+                if db_saved_count:
                     print(f"\n🎉 接收完成!")
-                    print(f"✅ 成功保存了 {saved_count} 封邮件到: {inbox_dir}")
+                    print(f"✅ 成功保存了 {len(saved_files)} 封邮件到: {inbox_dir}")
                     print(f"✅ 成功保存了 {db_saved_count} 封邮件到数据库")
                 else:
                     print("❌ 未获取到任何邮件")
@@ -215,6 +215,12 @@ class SearchEmailMenu:
 
     def _execute_content_search(self, content_keyword, user_email, search_limit):
         """执行内容搜索"""
+        db = self.main_cli.get_db()
+        fulltext_index = getattr(db, "fulltext_index", None)
+        if fulltext_index is not None and fulltext_index.available:
+            self._execute_fulltext_search(content_keyword, user_email, search_limit)
+            return
+
         try:
             print(f"🔍 正在搜索内容包含 '{content_keyword}' 的邮件...")
             print("正在扫描邮件内容，请稍候...")
@@ -239,6 +245,33 @@ class SearchEmailMenu:
         except Exception as e:
             self._handle_search_error(e, "搜索邮件内容")
 
+    def _execute_fulltext_search(self, content_keyword, user_email, search_limit):
+        """使用全文索引执行内容搜索（按相关度排序）"""
+        try:
+            print(f"🔍 正在搜索内容包含 '{content_keyword}' 的邮件...")
+
+            db = self.main_cli.get_db()
+            matching_emails = db.search_fulltext(
+                content_keyword, user_email=user_email, limit=search_limit
+            )
+            if not matching_emails:
+                print(f"📭 未找到内容包含 '{content_keyword}' 的邮件")
+                input("\n按回车键继续...")
+                return
+
+            print(f"\n✅ 找到 {len(matching_emails)} 封匹配的邮件（按相关度排序）:")
+            for email in matching_emails[:10]:
+                subject = (email.get("subject") or "(无主题)")[:30]
+                print(f"   📧 {subject}: {email.get('snippet', '')}")
+            input("\n按回车键查看邮件列表...")
+
+            self._display_search_results(
+                matching_emails, f"📝 内容包含 '{content_keyword}' 的邮件"
+            )
+
+        except Exception as e:
+            self._handle_search_error(e, "搜索邮件内容")
+
     def _get_emails_for_content_search(self, user_email, search_limit):
         """获取用于内容搜索的邮件列表"""
         db = self.main_cli.get_db()
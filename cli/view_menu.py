@@ -11,6 +11,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from common.utils import setup_logging
+from common.email_content_processor import LazyAttachment
 
 # 设置日志
 logger = setup_logging("view_menu")
@@ -464,10 +465,15 @@ class ViewEmailMenu:
                         counter += 1
 
                     # 保存附件
-                    if hasattr(attachment, "content") and attachment.content:
+                    if isinstance(attachment, LazyAttachment) or (
+                        hasattr(attachment, "content") and attachment.content
+                    ):
                         # 直接保存二进制内容
                         with open(file_path, "wb") as f:
-                            if isinstance(attachment.content, bytes):
+                            if isinstance(attachment, LazyAttachment):
+                                # 按需解码的附件分块解码写入
+                                attachment.write_to(f)
+                            elif isinstance(attachment.content, bytes):
                                 f.write(attachment.content)
                             else:
                                 # 尝试解码Base64
@@ -106,7 +106,8 @@ class MIMEHandler:
         # 写入文件
         try:
             with open(file_path, "wb") as f:
-                f.write(attachment.content)
+                # 按需解码的附件分块解码写入，不在内存中保留完整内容
+                attachment.write_to(f)
         except IOError as e:
             logger.error(f"写入文件失败: {e}")
             raise
@@ -4,7 +4,7 @@
 使用模块化设计，将原来的1371行代码拆分为多个专门的模块
 """
 
-from typing import List, Tuple, Optional, Literal
+from typing import Iterator, List, Tuple, Optional, Literal
 import datetime
 
 from common.utils import setup_logging
@@ -141,6 +141,25 @@ class POP3ClientRefactored:
             subject_contains=subject_contains,
         )
 
+    def iter_emails(
+        self,
+        msg_nums: Optional[List[int]] = None,
+        connections: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Email]]:
+        """
+        批量获取邮件（流水线RETR，解析与接收并行），逐封返回
+
+        Args:
+            msg_nums: 要获取的邮件索引列表，None表示全部
+            connections: 使用的连接数，None表示使用配置值
+
+        Yields:
+            (邮件索引, Email对象)元组
+        """
+        if connections is None:
+            return self.email_retriever.iter_emails(msg_nums)
+        return self.email_retriever.iter_emails(msg_nums, connections=connections)
+
     def delete_email(self, msg_num: int) -> bool:
         """
         删除指定邮件
@@ -6,16 +6,26 @@ POP3邮件检索器
 
 import poplib
 import ssl
+import queue
 import socket
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from email import policy
 from email.parser import BytesParser
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 import datetime
 
 from common.utils import setup_logging
-from common.models import Email
+from common.models import Email, EmailAddress
+from common.config import (
+    POP3_CLIENT_PIPELINE_DEPTH,
+    POP3_CLIENT_PARSE_WORKERS,
+    POP3_CLIENT_FETCH_CONNECTIONS,
+)
 from common.email_format_handler import EmailFormatHandler
+from client.pop3_connection_manager import POP3ConnectionManager
 
 # 设置日志
 logger = setup_logging("pop3_email_retriever")
@@ -87,66 +97,44 @@ class POP3EmailRetriever:
         Returns:
             Email对象，如果获取失败则返回None
         """
-        connection = self.connection_manager.get_connection()
-        retry_count = 0
-        max_retries = 3
+        lines = self._retr_lines(self.connection_manager, msg_num)
+        if lines is None:
+            return None
 
-        while retry_count < max_retries:
+        email_obj = self._parse_lines(msg_num, lines)
+
+        # 如果需要，标记邮件为删除
+        if delete:
             try:
-                # 获取邮件内容
-                _, lines, _ = connection.retr(msg_num)  # 忽略响应码和字节数
+                self.connection_manager.get_connection().dele(msg_num)
+                logger.info(f"邮件已标记为删除: {msg_num}")
+            except Exception as e:
+                logger.error(f"获取邮件 {msg_num} 失败: {e}")
+                return None
 
-                # 解析邮件
-                msg_content = b"\r\n".join(lines)
+        logger.info(f"已获取邮件: {msg_num}")
+        return email_obj
 
-                # 使用统一的邮件格式处理器解析邮件
-                try:
-                    # 直接使用EmailFormatHandler进行解析
-                    email_obj = EmailFormatHandler.parse_email_content(
-                        msg_content.decode("utf-8", errors="ignore")
-                    )
+    def _retr_lines(self, connection_manager, msg_num: int) -> Optional[List[bytes]]:
+        """
+        用RETR获取一封邮件的原始行，连接超时时重新连接后重试
 
-                    # 简单验证解析结果
-                    if (
-                        not email_obj.message_id
-                        or email_obj.message_id == "unknown@localhost"
-                    ):
-                        # 生成一个基于邮件编号的临时ID
-                        email_obj.message_id = f"msg_{msg_num}@pop3.localhost"
-                        logger.info(
-                            f"为邮件 {msg_num} 生成临时Message-ID: {email_obj.message_id}"
-                        )
-
-                    # 如果没有主题，使用默认主题
-                    if not email_obj.subject or email_obj.subject == "解析失败的邮件":
-                        email_obj.subject = f"邮件 {msg_num}"
-
-                except Exception as parse_e:
-                    logger.error(f"邮件解析失败: {parse_e}")
-                    # 创建一个基本的邮件对象作为回退
-                    from common.models import Email, EmailAddress
-                    import datetime
-
-                    email_obj = Email(
-                        message_id=f"msg_{msg_num}@pop3.localhost",
-                        subject=f"邮件 {msg_num}",
-                        from_addr=EmailAddress("", "unknown@localhost"),
-                        to_addrs=[EmailAddress("", "unknown@localhost")],
-                        cc_addrs=[],
-                        bcc_addrs=[],
-                        date=datetime.datetime.now(),
-                        text_content="邮件解析失败",
-                        html_content="",
-                        attachments=[],
-                    )
+        Args:
+            connection_manager: 使用的连接管理器
+            msg_num: 邮件索引
 
-                # 如果需要，标记邮件为删除
-                if delete:
-                    connection.dele(msg_num)
-                    logger.info(f"邮件已标记为删除: {msg_num}")
+        Returns:
+            邮件内容行列表，如果获取失败则返回None
+        """
+        connection = connection_manager.get_connection()
+        retry_count = 0
+        max_retries = 3
 
-                logger.info(f"已获取邮件: {msg_num}")
-                return email_obj
+        while retry_count < max_retries:
+            try:
+                # 获取邮件内容
+                _, lines, _ = connection.retr(msg_num)  # 忽略响应码和字节数
+                return lines
 
             except (socket.timeout, ssl.SSLError, ConnectionError, OSError) as e:
                 retry_count += 1
@@ -162,15 +150,15 @@ class POP3EmailRetriever:
                     )
                     # 强制断开连接
                     try:
-                        self.connection_manager.connection = None
+                        connection_manager.connection = None
                     except:
                         pass
 
                     # 等待后重新连接
                     time.sleep(2)  # 增加等待时间
                     try:
-                        self.connection_manager.connect()
-                        connection = self.connection_manager.get_connection()
+                        connection_manager.connect()
+                        connection = connection_manager.get_connection()
                         logger.info(f"重新连接成功，继续获取邮件 {msg_num}")
                     except Exception as conn_err:
                         logger.error(f"重新连接失败: {conn_err}")
@@ -204,6 +192,293 @@ class POP3EmailRetriever:
         logger.error(f"获取邮件 {msg_num} 失败，已达到最大重试次数")
         return None
 
+    def _parse_lines(self, msg_num: int, lines: List[bytes]) -> Email:
+        """
+        解析RETR返回的邮件内容行
+
+        Args:
+            msg_num: 邮件索引（用于生成缺失的Message-ID和主题）
+            lines: 邮件内容行列表
+
+        Returns:
+            Email对象，解析失败时返回占位邮件
+        """
+        # 解析邮件
+        msg_content = b"\r\n".join(lines)
+
+        # 使用统一的邮件格式处理器解析邮件
+        try:
+            # 直接使用EmailFormatHandler进行解析
+            email_obj = EmailFormatHandler.parse_email_content(
+                msg_content.decode("utf-8", errors="ignore")
+            )
+
+            # 简单验证解析结果
+            if not email_obj.message_id or email_obj.message_id == "unknown@localhost":
+                # 生成一个基于邮件编号的临时ID
+                email_obj.message_id = f"msg_{msg_num}@pop3.localhost"
+                logger.info(
+                    f"为邮件 {msg_num} 生成临时Message-ID: {email_obj.message_id}"
+                )
+
+            # 如果没有主题，使用默认主题
+            if not email_obj.subject or email_obj.subject == "解析失败的邮件":
+                email_obj.subject = f"邮件 {msg_num}"
+
+        except Exception as parse_e:
+            logger.error(f"邮件解析失败: {parse_e}")
+            # 创建一个基本的邮件对象作为回退
+            email_obj = Email(
+                message_id=f"msg_{msg_num}@pop3.localhost",
+                subject=f"邮件 {msg_num}",
+                from_addr=EmailAddress("", "unknown@localhost"),
+                to_addrs=[EmailAddress("", "unknown@localhost")],
+                cc_addrs=[],
+                bcc_addrs=[],
+                date=datetime.datetime.now(),
+                text_content="邮件解析失败",
+                html_content="",
+                attachments=[],
+            )
+
+        return email_obj
+
+    def iter_emails(
+        self,
+        msg_nums: Optional[List[int]] = None,
+        pipeline_depth: int = POP3_CLIENT_PIPELINE_DEPTH,
+        parse_workers: int = POP3_CLIENT_PARSE_WORKERS,
+        connections: int = POP3_CLIENT_FETCH_CONNECTIONS,
+    ) -> Iterator[Tuple[int, Email]]:
+        """
+        批量获取邮件，边接收边解析，逐封返回
+
+        服务器支持PIPELINING时，一个连接上同时发出pipeline_depth条RETR命令，
+        不必每封邮件等待一次往返；解析在线程池中进行，与网络接收重叠。
+        connections大于1时另外登录多个会话分担获取（服务器锁定邮箱时
+        额外连接会失败，自动退回单连接）。
+
+        Args:
+            msg_nums: 要获取的邮件索引列表，None表示全部
+            pipeline_depth: 每个连接上未完成的RETR命令数上限
+            parse_workers: 解析线程数
+            connections: 使用的连接数
+
+        Yields:
+            (邮件索引, Email对象)元组；单连接时按msg_nums的顺序返回
+        """
+        if msg_nums is None:
+            msg_nums = [msg_num for msg_num, _ in self.list_emails()]
+        if not msg_nums:
+            return
+
+        window = max(1, parse_workers) * 2
+        with ThreadPoolExecutor(
+            max_workers=max(1, parse_workers), thread_name_prefix="pop3_parse"
+        ) as parser:
+            pending = deque()
+            for msg_num, lines in self._fetch_raw_emails(
+                msg_nums, pipeline_depth, connections
+            ):
+                pending.append(
+                    (msg_num, parser.submit(self._parse_lines, msg_num, lines))
+                )
+                # 已解析完的邮件尽早交给调用方，未完成的解析不超过window封
+                while pending and (pending[0][1].done() or len(pending) > window):
+                    msg_num, future = pending.popleft()
+                    yield msg_num, future.result()
+
+            while pending:
+                msg_num, future = pending.popleft()
+                yield msg_num, future.result()
+
+    def _fetch_raw_emails(
+        self, msg_nums: List[int], pipeline_depth: int, connections: int
+    ) -> Iterator[Tuple[int, List[bytes]]]:
+        """
+        获取原始邮件行，必要时分散到多个连接
+
+        Yields:
+            (邮件索引, 邮件内容行列表)元组
+        """
+        extra_managers = []
+        if connections > 1 and len(msg_nums) > 1:
+            extra_managers = self._open_extra_connections(
+                min(connections, len(msg_nums)) - 1
+            )
+
+        if not extra_managers:
+            yield from self._fetch_on_connection(
+                self.connection_manager, msg_nums, pipeline_depth
+            )
+            return
+
+        managers = [self.connection_manager] + extra_managers
+        results = queue.Queue(maxsize=pipeline_depth * len(managers))
+        stop = threading.Event()
+        done = object()
+
+        def fetch(manager, nums):
+            try:
+                for item in self._fetch_on_connection(manager, nums, pipeline_depth):
+                    while not stop.is_set():
+                        try:
+                            results.put(item, timeout=0.5)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                logger.error(f"批量获取邮件时出错: {e}")
+            finally:
+                results.put(done)
+
+        # 按编号交错分配，每个连接处理的邮件大小分布相近
+        threads = [
+            threading.Thread(
+                target=fetch,
+                args=(manager, msg_nums[i :: len(managers)]),
+                name=f"pop3_fetch_{i}",
+                daemon=True,
+            )
+            for i, manager in enumerate(managers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            remaining = len(threads)
+            while remaining:
+                item = results.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            stop.set()
+            # 取出剩余结果，避免获取线程阻塞在满队列上
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            for manager in extra_managers:
+                manager.disconnect()
+
+    def _open_extra_connections(self, count: int) -> list:
+        """
+        使用相同的账户信息登录额外的会话
+
+        Args:
+            count: 需要的额外连接数
+
+        Returns:
+            已连接的连接管理器列表（可能少于count）
+        """
+        cm = self.connection_manager
+        managers = []
+        for _ in range(count):
+            manager = POP3ConnectionManager(
+                host=cm.host,
+                port=cm.port,
+                use_ssl=cm.use_ssl,
+                username=cm.username,
+                password=cm.password,
+                auth_method=cm.auth_method,
+                timeout=cm.timeout,
+                max_retries=1,
+            )
+            try:
+                manager.connect()
+            except Exception as e:
+                logger.warning(
+                    f"无法打开额外的POP3连接（服务器可能不允许同一邮箱多个会话）: {e}"
+                )
+                break
+            managers.append(manager)
+
+        if managers:
+            logger.info(f"批量获取使用 {len(managers) + 1} 个连接")
+        return managers
+
+    def _fetch_on_connection(
+        self, connection_manager, msg_nums: List[int], pipeline_depth: int
+    ) -> Iterator[Tuple[int, List[bytes]]]:
+        """
+        在一个连接上流水线获取邮件，连接出错后剩余邮件逐封获取（带重连）
+
+        Yields:
+            (邮件索引, 邮件内容行列表)元组，获取失败的邮件被跳过
+        """
+        received = 0
+        try:
+            connection = connection_manager.get_connection()
+            for msg_num, lines in self._retr_pipelined(
+                connection, msg_nums, pipeline_depth
+            ):
+                received += 1
+                if lines is not None:
+                    yield msg_num, lines
+            return
+        except (socket.timeout, ssl.SSLError, ConnectionError, OSError) as e:
+            logger.warning(f"流水线获取邮件时连接出错，剩余邮件逐封获取: {e}")
+            # 已发出的命令的响应无法再对应，丢弃这个连接
+            connection_manager.connection = None
+
+        for msg_num in msg_nums[received:]:
+            lines = self._retr_lines(connection_manager, msg_num)
+            if lines is not None:
+                yield msg_num, lines
+
+    def _retr_pipelined(
+        self, connection, msg_nums: List[int], pipeline_depth: int
+    ) -> Iterator[Tuple[int, Optional[List[bytes]]]]:
+        """
+        流水线发送RETR命令并按顺序读取响应（RFC 2449 PIPELINING）
+
+        poplib一次只处理一条命令，这里使用它的_putcmd和_getlongresp
+        分开发送命令和读取响应。服务器未声明PIPELINING时一次只发一条。
+
+        Yields:
+            (邮件索引, 邮件内容行列表)元组，服务器返回-ERR时内容为None
+        """
+        if pipeline_depth > 1 and not self._supports_pipelining(connection):
+            pipeline_depth = 1
+
+        sent = received = 0
+        try:
+            for msg_num in msg_nums:
+                while sent < len(msg_nums) and sent - received < pipeline_depth:
+                    connection._putcmd(f"RETR {msg_nums[sent]}")
+                    sent += 1
+
+                try:
+                    _, lines, _ = connection._getlongresp()
+                except poplib.error_proto as e:
+                    # -ERR响应只有一行，后续响应仍然对齐
+                    lines = None
+                    logger.warning(f"获取邮件 {msg_num} 失败: {e}")
+                received += 1
+                if lines is not None:
+                    logger.debug("已获取邮件: %s", msg_num)
+                yield msg_num, lines
+        except GeneratorExit:
+            # 调用方提前停止时读掉已发出命令的响应，连接仍可继续使用
+            for _ in range(sent - received):
+                try:
+                    connection._getlongresp()
+                except poplib.error_proto:
+                    pass
+            raise
+
+    def _supports_pipelining(self, connection) -> bool:
+        """检查服务器是否声明了PIPELINING能力"""
+        try:
+            return "PIPELINING" in connection.capa()
+        except poplib.error_proto:
+            return False
+
     def retrieve_all_emails(
         self,
         delete: bool = False,
@@ -227,8 +502,6 @@ class POP3EmailRetriever:
         Returns:
             邮件列表
         """
-        connection = self.connection_manager.get_connection()
-
         try:
             # 获取邮件列表
             email_list = self.list_emails()
@@ -242,30 +515,29 @@ class POP3EmailRetriever:
                 logger.info(f"根据限制，只获取最新的 {len(email_list)} 封邮件")
 
             emails = []
-            for i, (msg_num, msg_size) in enumerate(email_list, 1):
-                try:
-                    logger.info(f"正在获取邮件 {i}/{len(email_list)}: 编号 {msg_num}")
-
-                    email_obj = self.retrieve_email(msg_num, delete=False)
-                    if email_obj:
-                        # 应用过滤条件
-                        if self._should_include_email(
-                            email_obj, since_date, from_addr, subject_contains
-                        ):
-                            emails.append(email_obj)
-
-                            # 如果设置了删除，在确认邮件符合条件后删除
-                            if delete:
-                                connection.dele(msg_num)
-                                logger.info(f"邮件 {msg_num} 已标记为删除")
-                        else:
-                            logger.debug(f"邮件 {msg_num} 不符合过滤条件，跳过")
-                    else:
-                        logger.warning(f"无法获取邮件 {msg_num}")
-
-                except Exception as e:
-                    logger.error(f"获取邮件 {msg_num} 时出错: {e}")
-                    continue
+            to_delete = []
+            for msg_num, email_obj in self.iter_emails(
+                [msg_num for msg_num, _ in email_list]
+            ):
+                # 应用过滤条件
+                if self._should_include_email(
+                    email_obj, since_date, from_addr, subject_contains
+                ):
+                    emails.append(email_obj)
+                    # 确认邮件符合条件后删除（流水线结束后再发送DELE）
+                    if delete:
+                        to_delete.append(msg_num)
+                else:
+                    logger.debug("邮件 %s 不符合过滤条件，跳过", msg_num)
+
+            if to_delete:
+                connection = self.connection_manager.get_connection()
+                for msg_num in to_delete:
+                    try:
+                        connection.dele(msg_num)
+                        logger.info(f"邮件 {msg_num} 已标记为删除")
+                    except Exception as e:
+                        logger.error(f"删除邮件 {msg_num} 时出错: {e}")
 
             logger.info(f"成功获取了 {len(emails)} 封符合条件的邮件")
             return emails
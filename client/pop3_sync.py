@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+POP3增量同步
+基于UIDL记录每个账户已下载的邮件，只RETR新邮件，其余从本地存储读取
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from common.utils import setup_logging
+from common.models import Email
+from common.email_format_handler import EmailFormatHandler
+from common.email_validator import EmailValidator
+
+# 设置日志
+logger = setup_logging("pop3_sync")
+
+# 每同步这么多封新邮件写一次同步状态，中途中断时已保存的邮件不会重新下载
+RECORD_BATCH_SIZE = 50
+
+
+@dataclass
+class SyncResult:
+    """一次同步的结果"""
+
+    message_ids: List[str] = field(default_factory=list)  # 同步范围内的邮件，按邮箱顺序
+    new_count: int = 0  # 本次下载的新邮件数
+    total: int = 0  # 服务器邮箱中的邮件总数
+
+
+class POP3MailboxSync:
+    """POP3邮箱增量同步"""
+
+    def __init__(self, client, db, account: str):
+        """
+        初始化增量同步
+
+        Args:
+            client: 已配置账户信息的POP3ClientRefactored
+            db: 本地存储（EmailService）
+            account: 账户标识（邮箱地址），同步状态按它保存，也作为本地邮件的收件人
+        """
+        self.client = client
+        self.db = db
+        self.account = account
+
+    def fetch_uidls(self) -> Optional[List[Tuple[int, str]]]:
+        """
+        获取服务器邮箱中所有邮件的UIDL（一次往返）
+
+        Returns:
+            [(邮件索引, UIDL), ...]列表，服务器不支持UIDL时返回None
+        """
+        lines = self.client.get_unique_id()
+        if lines is None:
+            return None
+
+        uidls = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].isdigit():
+                uidls.append((int(parts[0]), parts[1]))
+        return uidls
+
+    def new_messages(self, uidls: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """
+        找出本地还没有的邮件
+
+        Args:
+            uidls: [(邮件索引, UIDL), ...]列表
+
+        Returns:
+            其中尚未同步的(邮件索引, UIDL)列表
+        """
+        synced = self.db.sync_state.get_synced(self.account)
+        return [(msg_num, uidl) for msg_num, uidl in uidls if uidl not in synced]
+
+    def sync(
+        self,
+        limit: Optional[int] = None,
+        uidls: Optional[List[Tuple[int, str]]] = None,
+        on_new: Optional[Callable[[Email], None]] = None,
+    ) -> SyncResult:
+        """
+        同步邮箱：下载本地没有的邮件并保存到本地存储
+
+        Args:
+            limit: 只同步最新的limit封邮件
+            uidls: 已获取的UIDL列表（避免重复往返），None时自动获取
+            on_new: 每封新邮件保存后的回调
+
+        Returns:
+            SyncResult
+        """
+        if uidls is None:
+            uidls = self.fetch_uidls()
+        if uidls is None:
+            logger.warning("服务器不支持UIDL，下载全部邮件且不记录同步状态")
+            return self._sync_without_uidl(limit, on_new)
+
+        result = SyncResult(total=len(uidls))
+        synced = self.db.sync_state.get_synced(self.account)
+
+        # 服务器上已不存在的邮件不再保留同步状态（本地邮件保留）
+        on_server = {uidl for _, uidl in uidls}
+        self.db.sync_state.forget(
+            self.account, [uidl for uidl in synced if uidl not in on_server]
+        )
+
+        window = uidls[-limit:] if limit and limit < len(uidls) else uidls
+        new = [(msg_num, uidl) for msg_num, uidl in window if uidl not in synced]
+        logger.info(
+            f"邮箱中共有 {len(uidls)} 封邮件，同步范围 {len(window)} 封，"
+            f"其中 {len(new)} 封需要下载"
+        )
+
+        if new:
+            uidl_by_num = dict(new)
+            pending = []
+            try:
+                for msg_num, email in self.client.iter_emails(
+                    [msg_num for msg_num, _ in new]
+                ):
+                    message_id = self._store(email)
+                    if message_id is None:
+                        continue
+                    synced[uidl_by_num[msg_num]] = message_id
+                    pending.append((uidl_by_num[msg_num], message_id))
+                    result.new_count += 1
+                    if on_new:
+                        on_new(email)
+                    if len(pending) >= RECORD_BATCH_SIZE:
+                        self.db.sync_state.record_synced(self.account, pending)
+                        pending = []
+            finally:
+                self.db.sync_state.record_synced(self.account, pending)
+
+        result.message_ids = [synced[uidl] for _, uidl in window if uidl in synced]
+        return result
+
+    def _sync_without_uidl(
+        self, limit: Optional[int], on_new: Optional[Callable[[Email], None]]
+    ) -> SyncResult:
+        """服务器不支持UIDL时下载范围内的全部邮件"""
+        email_list = self.client.list_emails()
+        result = SyncResult(total=len(email_list))
+        if limit and limit < len(email_list):
+            email_list = email_list[-limit:]
+        for _, email in self.client.iter_emails([num for num, _ in email_list]):
+            message_id = self._store(email)
+            if message_id is None:
+                continue
+            result.message_ids.append(message_id)
+            result.new_count += 1
+            if on_new:
+                on_new(email)
+        return result
+
+    def _store(self, email: Email) -> Optional[str]:
+        """
+        保存一封下载的邮件到本地存储
+
+        Returns:
+            保存使用的Message-ID，失败时返回None
+        """
+        from_addr = str(email.from_addr) if email.from_addr else "unknown@localhost"
+        to_addrs = (
+            [str(addr) for addr in email.to_addrs]
+            if email.to_addrs
+            else ["unknown@localhost"]
+        )
+        # 确保当前账户在收件人中，邮件归属到该账户的邮箱
+        cc_addrs = [str(addr) for addr in email.cc_addrs or []]
+        if self.account not in to_addrs and self.account not in cc_addrs:
+            to_addrs.append(self.account)
+
+        # 纯文本内容用于垃圾邮件分析
+        plain_text_content = email.text_content or ""
+        if not plain_text_content and email.html_content:
+            plain_text_content = re.sub(r"<[^>]+>", "", email.html_content)
+
+        try:
+            success = self.db.save_email(
+                message_id=email.message_id,
+                from_addr=from_addr,
+                to_addrs=to_addrs,
+                subject=email.subject or "",
+                content=plain_text_content,
+                full_content_for_storage=EmailFormatHandler.format_email_for_storage(
+                    email
+                ),
+                date=email.date,
+            )
+        except Exception as e:
+            logger.error(f"保存邮件到本地存储失败: {e}")
+            return None
+
+        if not success:
+            logger.warning(f"保存邮件到本地存储失败: {email.message_id}")
+            return None
+        # 与save_email使用相同的规范化规则（补全尖括号），得到本地存储的ID
+        return EmailValidator.sanitize_email_data({"message_id": email.message_id})[
+            "message_id"
+        ]
+
+    def load_emails(
+        self, message_ids: List[str], skip_deleted: bool = True
+    ) -> List[Email]:
+        """
+        从本地存储读取邮件
+
+        Args:
+            message_ids: 邮件ID列表
+            skip_deleted: 是否跳过当前账户已删除的邮件
+
+        Returns:
+            Email对象列表，顺序与message_ids一致
+        """
+        deleted = (
+            self.db.get_deleted_message_ids(self.account) if skip_deleted else set()
+        )
+
+        emails = []
+        for message_id in message_ids:
+            if message_id in deleted:
+                continue
+            content = self.db.get_email_content(message_id)
+            if not content:
+                # 已撤回等没有保存内容的邮件
+                continue
+            try:
+                email = EmailFormatHandler.parse_email_content(content)
+            except Exception as e:
+                logger.warning(f"解析本地邮件失败 {message_id}: {e}")
+                continue
+            # 使用本地存储的ID，删除等操作按它查找邮件
+            email.message_id = message_id
+            emails.append(email)
+
+        skipped = len(message_ids) - len(emails)
+        if skipped:
+            logger.info(f"已跳过 {skipped} 封已删除或无内容的邮件")
+        return emails
@@ -14,6 +14,7 @@ import secrets
 
 from common.utils import setup_logging
 from common.config import SSL_CERT_FILE, SSL_KEY_FILE
+from common.tls_context import get_server_context
 
 # 设置日志
 logger = setup_logging('security')
@@ -81,7 +82,7 @@ class SecurityManager:
         key_file: str = SSL_KEY_FILE
     ) -> ssl.SSLContext:
         """
-        创建服务器SSL上下文
+        获取服务器SSL上下文（同一证书在进程内共享）
         
         Args:
             cert_file: 证书文件路径
@@ -91,16 +92,8 @@ class SecurityManager:
             SSL上下文
         """
         try:
-            # 创建SSL上下文
-            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            
-            # 加载证书和密钥
-            if not os.path.exists(cert_file):
-                raise FileNotFoundError(f"证书文件不存在: {cert_file}")
-            if not os.path.exists(key_file):
-                raise FileNotFoundError(f"密钥文件不存在: {key_file}")
-            
-            context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+            # 使用与SMTP/POP3服务器共享的SSL上下文（会话恢复、ECDHE密码套件）
+            context = get_server_context(cert_file, key_file)
             
             logger.info("已创建服务器SSL上下文")
             return context
@@ -113,7 +106,8 @@ class SecurityManager:
         sock: socket.socket, 
         context: ssl.SSLContext, 
         server_side: bool = False,
-        server_hostname: Optional[str] = None
+        server_hostname: Optional[str] = None,
+        session: Optional[ssl.SSLSession] = None
     ) -> ssl.SSLSocket:
         """
         包装套接字为SSL套接字
@@ -123,6 +117,8 @@ class SecurityManager:
             context: SSL上下文
             server_side: 是否为服务器端
             server_hostname: 服务器主机名（客户端使用）
+            session: 上一次连接的ssl_sock.session（客户端使用），
+                传入后尝试恢复会话，避免完整握手
             
         Returns:
             SSL套接字
@@ -134,7 +130,8 @@ class SecurityManager:
                 ssl_sock = context.wrap_socket(
                     sock, 
                     server_side=False,
-                    server_hostname=server_hostname
+                    server_hostname=server_hostname,
+                    session=session
                 )
             
             logger.info(f"已包装套接字为SSL套接字")
@@ -46,9 +46,27 @@ SSL_CERT_FILE = os.getenv(
     "SSL_CERT_FILE", os.path.join(BASE_DIR, "certs", "server.crt")
 )
 SSL_KEY_FILE = os.getenv("SSL_KEY_FILE", os.path.join(BASE_DIR, "certs", "server.key"))
+TLS_SESSION_TICKETS = int(
+    os.getenv("TLS_SESSION_TICKETS", 2)
+)  # TLS 1.3握手后发放的会话票据数量，0表示禁用会话恢复票据
 
 # 用户认证
 AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "True").lower() == "true"
+PASSWORD_HASH_SCHEME = os.getenv(
+    "PASSWORD_HASH_SCHEME", "scrypt"
+).lower()  # 新密码使用的哈希算法: scrypt、pbkdf2_sha256 或 sha256（旧算法）
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", 2**14))  # scrypt CPU/内存成本
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", 8))  # scrypt块大小
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", 1))  # scrypt并行度
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.getenv("PASSWORD_PBKDF2_ITERATIONS", 600000)
+)  # PBKDF2-SHA256迭代次数
+AUTH_CACHE_TTL = int(
+    os.getenv("AUTH_CACHE_TTL", 60)
+)  # 认证成功结果和用户记录的缓存时间（秒），0表示不缓存
+AUTH_CACHE_SIZE = int(
+    os.getenv("AUTH_CACHE_SIZE", 1024)
+)  # 认证结果缓存的最大条目数
 
 # 并发配置
 MAX_CONNECTIONS = int(
@@ -69,20 +87,111 @@ MONITOR_INTERVAL = int(os.getenv("MONITOR_INTERVAL", 10))  # 性能监控间隔
 SMTP_CONCURRENT_HANDLER_COUNT = int(
     os.getenv("SMTP_CONCURRENT_HANDLER_COUNT", 100)
 )  # SMTP并发处理器数量
+SMTP_PROCESSING_MODE = os.getenv(
+    "SMTP_PROCESSING_MODE", "thread"
+).lower()  # SMTP邮件处理工作池类型: thread 或 process
+SMTP_PROCESSING_QUEUE_SIZE = int(
+    os.getenv("SMTP_PROCESSING_QUEUE_SIZE", 200)
+)  # 等待处理的邮件队列上限，超出时返回451
+SMTP_MAX_MESSAGE_SIZE = int(
+    os.getenv("SMTP_MAX_MESSAGE_SIZE", 10 * 1024 * 1024)
+)  # 单封邮件最大字节数，通过EHLO的SIZE扩展公布，超出时返回552
+SMTP_SPOOL_MEMORY_LIMIT = int(
+    os.getenv("SMTP_SPOOL_MEMORY_LIMIT", 1024 * 1024)
+)  # DATA内容超过该字节数时转存到临时文件
+SMTP_SPOOL_DIR = (
+    os.getenv("SMTP_SPOOL_DIR", "") or None
+)  # DATA临时文件目录，默认使用系统临时目录
 POP3_REQUEST_QUEUE_SIZE = int(
     os.getenv("POP3_REQUEST_QUEUE_SIZE", 150)
 )  # POP3请求队列大小
+POP3_STREAM_CHUNK_SIZE = int(
+    os.getenv("POP3_STREAM_CHUNK_SIZE", 64 * 1024)
+)  # RETR/TOP流式发送时每次读取和写出的字节数
+POP3_ASYNC_MAX_CONNECTIONS = int(
+    os.getenv("POP3_ASYNC_MAX_CONNECTIONS", 10000)
+)  # asyncio POP3服务器最大并发连接数（空闲连接不占用线程）
+POP3_ASYNC_EXECUTOR_WORKERS = int(
+    os.getenv("POP3_ASYNC_EXECUTOR_WORKERS", 32)
+)  # asyncio POP3服务器执行数据库和文件操作的线程数
 CLIENT_CONNECTION_POOL_SIZE = int(
     os.getenv("CLIENT_CONNECTION_POOL_SIZE", 50)
 )  # 客户端连接池大小
+POP3_CLIENT_PIPELINE_DEPTH = int(
+    os.getenv("POP3_CLIENT_PIPELINE_DEPTH", 16)
+)  # 批量获取邮件时一个连接上同时发出的RETR命令数（服务器支持PIPELINING时生效）
+POP3_CLIENT_PARSE_WORKERS = int(
+    os.getenv("POP3_CLIENT_PARSE_WORKERS", 4)
+)  # 批量获取邮件时解析邮件的线程数
+POP3_CLIENT_FETCH_CONNECTIONS = int(
+    os.getenv("POP3_CLIENT_FETCH_CONNECTIONS", 1)
+)  # 批量获取邮件使用的连接数，大于1时需要服务器允许同一邮箱同时登录多个会话
 DB_CONNECTION_POOL_SIZE = int(
     os.getenv("DB_CONNECTION_POOL_SIZE", 30)
 )  # 数据库连接池大小
+DB_STATEMENT_CACHE_SIZE = int(
+    os.getenv("DB_STATEMENT_CACHE_SIZE", 256)
+)  # 每个池化连接缓存的预编译语句数量
+DB_WRITE_BATCH_ENABLED = (
+    os.getenv("DB_WRITE_BATCH_ENABLED", "False").lower() == "true"
+)  # 是否启用邮件写入批量提交（组提交）
+DB_WRITE_BATCH_SIZE = int(
+    os.getenv("DB_WRITE_BATCH_SIZE", 64)
+)  # 每个批次最多合并的邮件数量
+DB_WRITE_BATCH_DELAY_MS = int(
+    os.getenv("DB_WRITE_BATCH_DELAY_MS", 5)
+)  # 批次最长等待时间（毫秒）
+DB_WRITE_BATCH_TIMEOUT = int(
+    os.getenv("DB_WRITE_BATCH_TIMEOUT", 30)
+)  # 等待批次提交完成的最长时间（秒）
+MESSAGE_STORE_BACKEND = os.getenv(
+    "MESSAGE_STORE_BACKEND", "sharded"
+).lower()  # 邮件内容存储后端: sharded（按哈希分目录）或 flat（单一目录，旧布局）
+MESSAGE_STORE_SHARD_DEPTH = int(
+    os.getenv("MESSAGE_STORE_SHARD_DEPTH", 2)
+)  # 分片目录层数，每层使用2个十六进制字符（256个子目录）
+MESSAGE_STORE_FSYNC = (
+    os.getenv("MESSAGE_STORE_FSYNC", "False").lower() == "true"
+)  # 写入邮件文件后是否fsync（更安全，但写入更慢）
+MESSAGE_STORE_COMPRESSION = os.getenv(
+    "MESSAGE_STORE_COMPRESSION", "none"
+).lower()  # 邮件文件压缩算法: none、zlib 或 zstd（需要zstandard库）
+MESSAGE_STORE_DEDUP_ATTACHMENTS = (
+    os.getenv("MESSAGE_STORE_DEDUP_ATTACHMENTS", "False").lower() == "true"
+)  # 是否把较大的MIME部分（附件）按内容哈希只保存一份
+MESSAGE_STORE_DEDUP_MIN_SIZE = int(
+    os.getenv("MESSAGE_STORE_DEDUP_MIN_SIZE", 4096)
+)  # 拆分为共享数据块的最小MIME正文字节数
+PARSED_CACHE_SIZE = int(
+    os.getenv("PARSED_CACHE_SIZE", 256)
+)  # 解析结果缓存的最大邮件数，0表示不缓存
+PARSED_CACHE_MAX_BYTES = int(
+    os.getenv("PARSED_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+)  # 解析结果缓存的最大总大小（字节，按正文和附件描述估算）
+HEADER_CACHE_SIZE = int(
+    os.getenv("HEADER_CACHE_SIZE", 4096)
+)  # 头部解码、地址解析和地址验证结果各自缓存的最大条目数
 
 # 日志配置
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.path.join(BASE_DIR, "logs", "email_app.log")
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+LOG_ASYNC = (
+    os.getenv("LOG_ASYNC", "True").lower() == "true"
+)  # 是否通过队列由单独的线程写日志（不在请求处理线程中做文件I/O）
+LOG_QUEUE_SIZE = int(
+    os.getenv("LOG_QUEUE_SIZE", 10000)
+)  # 日志队列上限，队列满时丢弃新记录而不阻塞调用方
+LOG_MAX_BYTES = int(
+    os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)
+)  # 日志文件轮转大小（字节），0表示不轮转
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))  # 保留的轮转日志文件数量
+LOG_RATE_LIMIT = int(
+    os.getenv("LOG_RATE_LIMIT", 0)
+)  # 每个日志记录器每秒最多输出的INFO/DEBUG记录数，0表示不限制
+LOG_RATE_LIMITS = os.getenv(
+    "LOG_RATE_LIMITS", ""
+)  # 按子系统覆盖的限速，如"stable_pop3_server=50,db_connection_pool=20"
 
 # Web界面配置（如果启用）
 WEB_HOST = os.getenv("WEB_HOST", "localhost")
@@ -104,3 +213,9 @@ os.makedirs(PGP_HOME, exist_ok=True)
 # 邮件撤回功能
 RECALL_ENABLED = os.getenv("RECALL_ENABLED", "False").lower() == "true"
 RECALL_TIMEOUT = int(os.getenv("RECALL_TIMEOUT", 3600))  # 允许撤回的时间窗口（秒）
+RECALL_BLOOM_CAPACITY = int(
+    os.getenv("RECALL_BLOOM_CAPACITY", 100000)
+)  # 撤回记录布隆过滤器的预期键数量，超出时自动扩容
+RECALL_INDEX_REFRESH_INTERVAL = int(
+    os.getenv("RECALL_INDEX_REFRESH_INTERVAL", 5)
+)  # 从数据库加载其他进程写入的撤回记录的间隔（秒）
@@ -5,16 +5,163 @@
 """
 
 import base64
+import binascii
 import quopri
 import re
-from typing import List, Tuple
-from email.message import EmailMessage
+from typing import BinaryIO, List, Optional, Tuple
+from email.message import EmailMessage, Message
+from email.policy import Compat32
 
 from common.utils import setup_logging
 from common.models import Attachment
 
 logger = setup_logging(__name__)
 
+# 流式解码base64附件时每次处理的字符数（4的倍数）
+DECODE_CHUNK_CHARS = 64 * 1024
+_NON_BASE64 = re.compile(r"[^A-Za-z0-9+/]")
+
+
+def _restore_raw_text(value: str, charset: str = "utf-8") -> str:
+    """把字节解析器保留的原始8位字节（surrogateescape）按指定字符集还原为文本"""
+    try:
+        value.encode("utf-8")
+        return value
+    except UnicodeEncodeError:
+        raw = value.encode("ascii", errors="surrogateescape")
+        try:
+            return raw.decode(charset, errors="replace")
+        except LookupError:
+            return raw.decode("utf-8", errors="replace")
+
+
+def base64_decoded_size(payload: str) -> int:
+    """根据base64编码的载荷计算解码后的字节数，不实际解码"""
+    whitespace = sum(payload.count(c) for c in " \t\r\n")
+    padding = min(payload.rstrip()[-2:].count("="), 2)
+    return max(0, (len(payload) - whitespace) * 3 // 4 - padding)
+
+
+class RawUtf8Policy(Compat32):
+    """
+    流式解析使用的头部策略：与compat32一致，但头部中的原始8位字节（SMTPUTF8）
+    按UTF-8还原为字符串，而不是返回unknown-8bit的Header对象
+    """
+
+    def header_fetch_parse(self, name, value):
+        if isinstance(value, str):
+            restored = _restore_raw_text(value)
+            if restored is not value:
+                return restored
+        return super().header_fetch_parse(name, value)
+
+
+class MetadataOnlyMessage(Message):
+    """
+    流式解析（BytesFeedParser）使用的消息类
+
+    解析器在读完一个叶子部分时调用set_payload：文本部分照常保存；附件只记录
+    解码后的大小（decoded_size）而丢弃内容，大附件不会在解析结果和
+    Attachment.content中各占一份内存。
+    """
+
+    decoded_size = None
+
+    def set_payload(self, payload, charset=None):
+        if isinstance(payload, str) and not self.is_multipart():
+            if self._is_attachment_part():
+                self.decoded_size = self._estimate_decoded_size(payload)
+                payload = ""
+            else:
+                payload = _restore_raw_text(
+                    payload, self.get_content_charset() or "utf-8"
+                )
+        super().set_payload(payload, charset)
+
+    def _is_attachment_part(self) -> bool:
+        """与EmailContentProcessor的判断一致：声明为附件或非文本的叶子部分"""
+        if self.get_content_disposition() == "attachment":
+            return True
+        return self.get_content_maintype() not in ("text", "multipart", "message")
+
+    def _estimate_decoded_size(self, payload: str) -> int:
+        """根据传输编码估算附件解码后的字节数，不实际解码"""
+        encoding = str(self.get("Content-Transfer-Encoding", "")).strip().lower()
+        if encoding != "base64":
+            return len(payload)
+        return base64_decoded_size(payload)
+
+
+class LazyAttachment(Attachment):
+    """
+    按需解码的附件
+
+    解析时只记录附件所在的MIME部分（保留原始的base64文本）和解码后的大小，
+    访问content时才解码（解码结果保留，不再引用MIME部分）。只需要文件名、
+    类型和大小的调用方（查看邮件、列表、垃圾邮件分析、搜索索引）不会为大附件
+    分配解码后的内存；保存到文件时用write_to分块解码。
+    """
+
+    def __init__(self, filename: str, content_type: str, part: Message, size: int):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self._part: Optional[Message] = part
+        self._content: Optional[bytes] = None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            payload = self._part.get_payload(decode=True) if self._part else None
+            self._content = payload or b""
+            self._part = None
+        return self._content
+
+    @content.setter
+    def content(self, value: bytes) -> None:
+        self._content = value
+        self._part = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """附件内容是否已经解码"""
+        return self._content is not None
+
+    def write_to(self, fileobj: BinaryIO) -> int:
+        """
+        把附件内容分块解码后写入二进制文件对象，不在内存中保留完整的解码结果
+
+        Args:
+            fileobj: 二进制文件对象
+
+        Returns:
+            写入的字节数
+        """
+        if self._content is not None or self._part is None:
+            return super().write_to(fileobj)
+
+        payload = self._part.get_payload()
+        written = 0
+        pending = ""
+        for start in range(0, len(payload), DECODE_CHUNK_CHARS):
+            piece = payload[start : start + DECODE_CHUNK_CHARS]
+            chunk = pending + _NON_BASE64.sub("", piece)
+            usable = len(chunk) - len(chunk) % 4
+            written += fileobj.write(binascii.a2b_base64(chunk[:usable]))
+            pending = chunk[usable:]
+        if len(pending) > 1:
+            # 末尾缺少填充的残缺分组（与标准库的宽松解码一致）
+            padded = pending + "=" * (-len(pending) % 4)
+            written += fileobj.write(binascii.a2b_base64(padded))
+        return written
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(filename={self.filename!r}, "
+            f"content_type={self.content_type!r}, size={self.size}, "
+            f"loaded={self.is_loaded})"
+        )
+
 
 class EmailContentProcessor:
     """邮件内容处理器"""
@@ -165,22 +312,36 @@ class EmailContentProcessor:
             # 获取内容类型
             content_type = part.get_content_type() or "application/octet-stream"
 
+            # base64附件（大附件的常见编码）延迟到访问content时再解码
+            encoding = str(part.get("Content-Transfer-Encoding", "")).strip().lower()
+            raw_payload = part.get_payload()
+            if encoding == "base64" and isinstance(raw_payload, str) and raw_payload:
+                size = base64_decoded_size(raw_payload)
+                attachments.append(LazyAttachment(filename, content_type, part, size))
+                logger.debug(f"已记录附件: {filename} ({content_type}, {size}字节)")
+                return
+
             # 获取内容
             payload = part.get_payload(decode=True)
             if payload is None:
                 logger.warning(f"附件 {filename} 内容为空")
                 return
 
+            # 流式解析时附件内容未保留，只记录大小
+            size = len(payload)
+            if not payload and getattr(part, "decoded_size", None):
+                size = part.decoded_size
+
             # 创建附件对象
             attachment = Attachment(
                 filename=filename,
                 content_type=content_type,
                 content=payload,
-                size=len(payload),
+                size=size,
             )
 
             attachments.append(attachment)
-            logger.debug(f"已提取附件: {filename} ({content_type}, {len(payload)}字节)")
+            logger.debug(f"已提取附件: {filename} ({content_type}, {size}字节)")
 
         except Exception as e:
             logger.error(f"提取附件失败: {e}")
@@ -178,12 +178,8 @@ class EmailFormatValidator:
             是否格式正确
         """
         try:
-            from email.parser import Parser
-            from email import policy
-
-            # 尝试解析邮件
-            parser = Parser(policy=policy.default)
-            msg = parser.parsestr(raw_content)
+            # 只需要检查头部字段，只解析头部块
+            msg = EmailHeaderProcessor.parse_header_block(raw_content)
 
             # 根据RFC 5322，只有From和Date是必需的头部字段
             required_headers = ["From", "Date"]
@@ -197,11 +193,13 @@ class EmailFormatValidator:
             if missing_headers:
                 logger.debug(f"标准解析缺少字段: {missing_headers}，尝试手动检查")
 
-                # 手动检查原始内容中是否存在这些字段
-                content_upper = raw_content.upper()
+                # 手动检查头部块中是否存在这些字段（不扫描正文）
+                header_upper = EmailHeaderProcessor.read_header_block(
+                    raw_content
+                ).upper()
                 for header in missing_headers[:]:  # 创建副本进行迭代
                     # 检查是否存在该字段（不区分大小写）
-                    if f"{header.upper()}:" in content_upper:
+                    if f"{header.upper()}:" in header_upper:
                         missing_headers.remove(header)
                         logger.debug(f"在原始内容中找到字段: {header}")
 
@@ -212,7 +210,7 @@ class EmailFormatValidator:
                 return False
 
             # Message-ID是可选的，但建议包含
-            if not msg.get("Message-ID") and "MESSAGE-ID:" not in raw_content.upper():
+            if "Message-ID" not in msg:
                 logger.info("邮件缺少Message-ID头部（可选字段），建议添加以提高兼容性")
 
             return True
@@ -4,21 +4,29 @@
 通过模块化设计提供邮件格式处理功能
 """
 
-from typing import Union
+from typing import BinaryIO, Union
 from email.message import EmailMessage
+from email.parser import BytesFeedParser
 
 from common.utils import setup_logging
 from common.models import Email
 
 # 导入各个专门的处理模块
 from common.email_parsing_strategies import EmailParsingStrategies, EmailPreprocessor
-from common.email_content_processor import EmailContentProcessor
-from common.email_header_processor import EmailHeaderProcessor
+from common.email_content_processor import (
+    EmailContentProcessor,
+    MetadataOnlyMessage,
+    RawUtf8Policy,
+)
+from common.email_header_processor import EmailHeaderProcessor, HeaderSummary
 from common.email_mime_builder import EmailMimeBuilder, EmailFormatter
 from common.email_fallback_parser import EmailFallbackParser, EmailFormatValidator
 
 logger = setup_logging(__name__)
 
+# 流式解析使用的头部策略
+RAW_UTF8_POLICY = RawUtf8Policy()
+
 
 class EmailFormatHandler:
     """
@@ -82,56 +90,7 @@ class EmailFormatHandler:
                 raw_content = raw_content.decode("utf-8", errors="ignore")
 
             msg = email.message_from_string(raw_content)
-
-            # 验证基本头部是否存在
-            if not msg.get("From"):
-                logger.warning("邮件缺少From头部，尝试备用解析")
-                raise ValueError("Missing From header")
-
-            # 解析基本信息
-            message_id = EmailHeaderProcessor.extract_message_id(msg)
-
-            # 解析主题
-            subject = EmailHeaderProcessor.decode_header_value(msg.get("Subject", ""))
-
-            # 解析发件人
-            from_addr = EmailHeaderProcessor.parse_address(msg.get("From", ""))
-            if not from_addr:
-                from common.models import EmailAddress
-
-                from_addr = EmailAddress("", "unknown@localhost")
-
-            # 解析收件人
-            to_addrs = EmailHeaderProcessor.parse_address_list(msg.get("To", ""))
-            cc_addrs = EmailHeaderProcessor.parse_address_list(msg.get("Cc", ""))
-            bcc_addrs = EmailHeaderProcessor.parse_address_list(msg.get("Bcc", ""))
-
-            # 解析日期
-            date = EmailHeaderProcessor.parse_date(msg.get("Date", ""))
-
-            # 解析内容
-            text_content, html_content, attachments = (
-                EmailContentProcessor.extract_content_and_attachments(msg)
-            )
-
-            # 创建Email对象
-            email_obj = Email(
-                message_id=message_id,
-                subject=subject,
-                from_addr=from_addr,
-                to_addrs=to_addrs,
-                cc_addrs=cc_addrs,
-                bcc_addrs=bcc_addrs,
-                date=date,
-                text_content=text_content,
-                html_content=html_content,
-                attachments=attachments,
-            )
-
-            logger.debug(
-                f"已解析邮件: {message_id}, From: {from_addr}, Subject: {subject}"
-            )
-            return email_obj
+            return cls._build_email(msg)
 
         except Exception as e:
             logger.error(f"标准解析失败: {e}")
@@ -154,6 +113,117 @@ class EmailFormatHandler:
                 # 最后的回退：创建基本邮件对象
                 return cls._create_basic_email_from_raw(raw_content)
 
+    @classmethod
+    def parse_mime_stream(
+        cls, fileobj: BinaryIO, prefix: bytes = b"", chunk_size: int = 64 * 1024
+    ) -> Email:
+        """
+        从二进制文件对象增量解析MIME消息（BytesFeedParser），用于已转存到临时文件的大邮件
+
+        附件内容在解析过程中即被丢弃，返回的Email中附件只有文件名、类型和大小；
+        解析失败时读取全部内容交给parse_mime_message的备用解析流程。
+
+        Args:
+            fileobj: 二进制文件对象（从当前位置读到末尾）
+            prefix: 在文件内容之前补充的字节（如接收流水线补齐的头部）
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            Email对象
+        """
+        start = fileobj.tell()
+        try:
+            parser = BytesFeedParser(
+                _factory=MetadataOnlyMessage, policy=RAW_UTF8_POLICY
+            )
+            parser.feed(prefix)
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                parser.feed(chunk)
+            return cls._build_email(parser.close())
+        except Exception as e:
+            logger.error(f"流式解析失败: {e}")
+            fileobj.seek(start)
+            return cls.parse_mime_message(prefix + fileobj.read())
+
+    @classmethod
+    def parse_headers_fast(cls, source) -> HeaderSummary:
+        """
+        只解析头部块（到第一个空行为止），用于只需要头部的场景（格式验证、
+        重复检查、列表显示），正文再大也只读取头部部分
+
+        Args:
+            source: 邮件内容（str、bytes、mmap等缓冲区）或可readline的文件对象
+
+        Returns:
+            HeaderSummary：get()返回原始头部值，message_id、subject、from_addr、
+            to_addrs、cc_addrs、date在首次访问时解码
+        """
+        return EmailHeaderProcessor.parse_header_block(source)
+
+    @classmethod
+    def _build_email(cls, msg) -> Email:
+        """
+        根据标准库解析出的消息对象构建Email对象
+
+        Args:
+            msg: email.message.Message对象
+
+        Returns:
+            Email对象
+
+        Raises:
+            ValueError: 缺少From头部时抛出，由调用方转入备用解析
+        """
+        # 验证基本头部是否存在
+        if not msg.get("From"):
+            logger.warning("邮件缺少From头部，尝试备用解析")
+            raise ValueError("Missing From header")
+
+        # 解析基本信息
+        message_id = EmailHeaderProcessor.extract_message_id(msg)
+
+        # 解析主题
+        subject = EmailHeaderProcessor.decode_header_value(msg.get("Subject", ""))
+
+        # 解析发件人
+        from_addr = EmailHeaderProcessor.parse_address(msg.get("From", ""))
+        if not from_addr:
+            from common.models import EmailAddress
+
+            from_addr = EmailAddress("", "unknown@localhost")
+
+        # 解析收件人
+        to_addrs = EmailHeaderProcessor.parse_address_list(msg.get("To", ""))
+        cc_addrs = EmailHeaderProcessor.parse_address_list(msg.get("Cc", ""))
+        bcc_addrs = EmailHeaderProcessor.parse_address_list(msg.get("Bcc", ""))
+
+        # 解析日期
+        date = EmailHeaderProcessor.parse_date(msg.get("Date", ""))
+
+        # 解析内容
+        text_content, html_content, attachments = (
+            EmailContentProcessor.extract_content_and_attachments(msg)
+        )
+
+        # 创建Email对象
+        email_obj = Email(
+            message_id=message_id,
+            subject=subject,
+            from_addr=from_addr,
+            to_addrs=to_addrs,
+            cc_addrs=cc_addrs,
+            bcc_addrs=bcc_addrs,
+            date=date,
+            text_content=text_content,
+            html_content=html_content,
+            attachments=attachments,
+        )
+
+        logger.debug(
+            f"已解析邮件: {message_id}, From: {from_addr}, Subject: {subject}"
+        )
+        return email_obj
+
     @classmethod
     def format_email_for_storage(cls, email_obj: Email) -> str:
         """
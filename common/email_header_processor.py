@@ -4,16 +4,74 @@
 负责邮件头部的解析、编码、解码和格式化
 """
 
+import re
 import datetime
-from typing import List, Optional
+from functools import cached_property, lru_cache
+from typing import Dict, List, Optional, Tuple
 from email.header import decode_header, Header
+from email.message import Message
+from email.parser import HeaderParser
 from email.utils import formataddr, parseaddr, parsedate_to_datetime, formatdate
 
 from common.utils import setup_logging
+from common.config import HEADER_CACHE_SIZE
 from common.models import EmailAddress
 
 logger = setup_logging(__name__)
 
+# 头部块与正文之间的空行
+_HEADER_END = re.compile(r"\r?\n\r?\n")
+_HEADER_END_BYTES = re.compile(rb"\r?\n\r?\n")
+_WHITESPACE = re.compile(r"\s+")
+_ADJACENT_ENCODED_WORDS = re.compile(r"\?=\s+=\?")
+
+
+class HeaderSummary:
+    """
+    只包含头部块的邮件摘要
+
+    原始头部值通过get()读取；message_id、subject、地址和日期在首次访问时
+    才用EmailHeaderProcessor解码（RFC 2047），只检查字段是否存在的调用方
+    不需要任何解码。
+    """
+
+    def __init__(self, headers: Message):
+        self.headers = headers
+
+    def get(self, name: str, default=None):
+        """获取原始（未解码的）头部值"""
+        return self.headers.get(name, default)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.headers
+
+    @cached_property
+    def message_id(self) -> str:
+        return EmailHeaderProcessor.extract_message_id(self.headers)
+
+    @cached_property
+    def subject(self) -> str:
+        return EmailHeaderProcessor.decode_header_value(self.get("Subject", ""))
+
+    @cached_property
+    def from_addr(self) -> EmailAddress:
+        # 与完整解析一致，缺少发件人时使用unknown@localhost
+        return EmailHeaderProcessor.parse_address(
+            self.get("From", "")
+        ) or EmailAddress("", "unknown@localhost")
+
+    @cached_property
+    def to_addrs(self) -> List[EmailAddress]:
+        return EmailHeaderProcessor.parse_address_list(self.get("To", ""))
+
+    @cached_property
+    def cc_addrs(self) -> List[EmailAddress]:
+        return EmailHeaderProcessor.parse_address_list(self.get("Cc", ""))
+
+    @cached_property
+    def date(self) -> Optional[datetime.datetime]:
+        return EmailHeaderProcessor.parse_date(self.get("Date", ""))
+
 
 class EmailHeaderProcessor:
     """邮件头部处理器"""
@@ -29,11 +87,60 @@ class EmailHeaderProcessor:
             message_id = message_id.strip("<>")
         return message_id
 
+    @classmethod
+    def read_header_block(cls, source) -> str:
+        """
+        读取邮件的头部块（到第一个空行为止），不读取或扫描正文
+
+        Args:
+            source: 邮件内容（str、bytes、mmap等缓冲区）或可readline的文件对象
+
+        Returns:
+            头部块文本（字节按UTF-8解码，无法解码的字节替换）
+        """
+        if hasattr(source, "readline"):
+            lines = []
+            for line in iter(source.readline, source.read(0)):
+                if not line.strip():
+                    break
+                lines.append(line)
+            block = source.read(0).join(lines)
+        elif isinstance(source, str):
+            if source.startswith(("\n", "\r\n")):
+                return ""
+            match = _HEADER_END.search(source)
+            return source[: match.start()] if match else source
+        else:
+            if source[:1] == b"\n" or source[:2] == b"\r\n":
+                return ""
+            match = _HEADER_END_BYTES.search(source)
+            block = source[: match.start()] if match else source[:]
+
+        if isinstance(block, str):
+            return block
+        return bytes(block).decode("utf-8", errors="replace")
+
+    @classmethod
+    def parse_header_block(cls, source) -> HeaderSummary:
+        """
+        只解析邮件头部，正文不读取也不解析
+
+        Args:
+            source: 邮件内容（str、bytes、mmap等缓冲区）或可readline的文件对象
+
+        Returns:
+            HeaderSummary
+        """
+        return HeaderSummary(HeaderParser().parsestr(cls.read_header_block(source)))
+
     @classmethod
     def decode_header_value(cls, header_value: str) -> str:
         """
         RFC 2047标准合规的邮件头部值解码
 
+        同一邮箱中发件人名称、列表地址等头部值大量重复，字符串值的解码结果
+        按值缓存（最多HEADER_CACHE_SIZE条）。
+
         Args:
             header_value: 头部值
 
@@ -42,73 +149,35 @@ class EmailHeaderProcessor:
         """
         if not header_value:
             return ""
+        if isinstance(header_value, str):
+            return _decode_header_cached(header_value)
+        return cls._decode_header_uncached(header_value)
 
+    @classmethod
+    def _decode_header_uncached(cls, header_value) -> str:
+        """解码头部值（不使用缓存），每个编码段只解码一次"""
         try:
             # 使用Python标准库的decode_header，它完全符合RFC 2047标准
-            parts = decode_header(header_value)
+            # 相邻编码词之间的线性空白已被decode_header忽略，各部分直接连接
             decoded_parts = []
-
-            for part, encoding in parts:
-                if isinstance(part, bytes):
-                    if encoding:
-                        try:
-                            # 使用指定的编码解码
-                            decoded_parts.append(part.decode(encoding))
-                        except (UnicodeDecodeError, LookupError) as e:
-                            logger.warning(f"使用编码 {encoding} 解码失败: {e}")
-                            # 按照RFC标准，如果指定编码失败，尝试UTF-8
-                            try:
-                                decoded_parts.append(part.decode("utf-8"))
-                            except UnicodeDecodeError:
-                                # 最后的回退：使用替换错误处理
-                                decoded_parts.append(
-                                    part.decode("utf-8", errors="replace")
-                                )
-                    else:
-                        # 没有指定编码，按照RFC标准默认为ASCII，但我们宽松处理为UTF-8
-                        try:
-                            decoded_parts.append(part.decode("ascii"))
-                        except UnicodeDecodeError:
-                            decoded_parts.append(part.decode("utf-8", errors="replace"))
-                else:
+            for part, encoding in decode_header(header_value):
+                if not isinstance(part, bytes):
                     # 已经是字符串，直接添加
                     decoded_parts.append(str(part))
-
-            # 按照RFC 2047标准，正确处理编码词之间的空白
-            # 根据RFC 2047: 相邻编码词之间的线性空白应该被忽略
-            result = ""
-            for i, (part, encoding) in enumerate(parts):
-                if isinstance(part, bytes):
-                    if encoding:
-                        try:
-                            decoded_part = part.decode(encoding)
-                        except (UnicodeDecodeError, LookupError):
-                            decoded_part = part.decode("utf-8", errors="replace")
-                    else:
-                        decoded_part = part.decode("ascii", errors="replace")
+                elif encoding:
+                    try:
+                        # 使用指定的编码解码
+                        decoded_parts.append(part.decode(encoding))
+                    except (UnicodeDecodeError, LookupError) as e:
+                        logger.warning(f"使用编码 {encoding} 解码失败: {e}")
+                        # 按照RFC标准，如果指定编码失败，使用UTF-8（替换无法解码的字节）
+                        decoded_parts.append(part.decode("utf-8", errors="replace"))
                 else:
-                    decoded_part = str(part)
-
-                # 添加到结果中
-                if i > 0:
-                    # 检查是否需要在部分之间添加空格
-                    prev_part, prev_encoding = parts[i - 1]
-
-                    # 如果前一个部分和当前部分都是编码词，则不添加空格
-                    # 如果其中一个不是编码词，则保留原始的空格
-                    if prev_encoding is None or encoding is None:
-                        # 至少有一个不是编码词，检查原始字符串中是否有空格
-                        # 这里简化处理，直接连接
-                        pass
-
-                result += decoded_part
+                    # 没有指定编码，按照RFC标准为ASCII
+                    decoded_parts.append(part.decode("ascii", errors="replace"))
 
             # 标准化空白字符
-            import re
-
-            result = re.sub(r"\s+", " ", result).strip()
-
-            return result
+            return _WHITESPACE.sub(" ", "".join(decoded_parts)).strip()
 
         except Exception as e:
             logger.error(f"RFC 2047解码失败: {e}, 原始值: {header_value}")
@@ -132,11 +201,8 @@ class EmailHeaderProcessor:
         # 移除多余的空白
         header_value = header_value.strip()
 
-        # 修复编码段之间的空白问题
-        import re
-
-        # 合并相邻的编码段
-        header_value = re.sub(r"\?=\s+=\?", "?==?", header_value)
+        # 修复编码段之间的空白问题：合并相邻的编码段
+        header_value = _ADJACENT_ENCODED_WORDS.sub("?==?", header_value)
 
         return header_value
 
@@ -145,6 +211,9 @@ class EmailHeaderProcessor:
         """
         改进的邮件地址解析
 
+        解析结果按原始字符串缓存（最多HEADER_CACHE_SIZE条），每次调用返回
+        新的EmailAddress对象。
+
         Args:
             addr_str: 地址字符串
 
@@ -154,6 +223,16 @@ class EmailHeaderProcessor:
         if not addr_str or not addr_str.strip():
             return None
 
+        parsed = (
+            _parse_address_cached(addr_str)
+            if isinstance(addr_str, str)
+            else cls._parse_address_uncached(addr_str)
+        )
+        return EmailAddress(name=parsed[0], address=parsed[1]) if parsed else None
+
+    @classmethod
+    def _parse_address_uncached(cls, addr_str: str) -> Optional[Tuple[str, str]]:
+        """解析地址（不使用缓存），返回(名称, 地址)或None"""
         try:
             # 预处理地址字符串
             addr_str = addr_str.strip()
@@ -169,10 +248,10 @@ class EmailHeaderProcessor:
 
             # 验证地址格式
             if address and "@" in address:
-                return EmailAddress(name=name or "", address=address)
+                return name or "", address
             elif addr_str and "@" in addr_str:
                 # 如果parseaddr失败，尝试直接使用原始字符串
-                return EmailAddress(name="", address=addr_str)
+                return "", addr_str
             else:
                 return None
 
@@ -180,9 +259,28 @@ class EmailHeaderProcessor:
             logger.warning(f"解析邮件地址失败: {e}, 原始值: {addr_str}")
             # 尝试创建一个基本的地址对象
             if addr_str and "@" in addr_str:
-                return EmailAddress(name="", address=addr_str)
+                return "", addr_str
             return None
 
+    @classmethod
+    def cache_info(cls) -> Dict[str, Dict[str, int]]:
+        """
+        获取头部解码和地址解析缓存的统计
+
+        Returns:
+            {"decode": {...}, "address": {...}}，每项包含hits、misses、maxsize、currsize
+        """
+        return {
+            "decode": _decode_header_cached.cache_info()._asdict(),
+            "address": _parse_address_cached.cache_info()._asdict(),
+        }
+
+    @classmethod
+    def clear_caches(cls) -> None:
+        """清空头部解码和地址解析缓存"""
+        _decode_header_cached.cache_clear()
+        _parse_address_cached.cache_clear()
+
     @classmethod
     def parse_address_list(cls, addr_str: str) -> List[EmailAddress]:
         """
@@ -355,3 +453,15 @@ class EmailHeaderBuilder:
 
         # Date
         msg["Date"] = processor.format_date(email_obj.date)
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _decode_header_cached(header_value: str) -> str:
+    """EmailHeaderProcessor.decode_header_value对字符串头部值的带缓存实现"""
+    return EmailHeaderProcessor._decode_header_uncached(header_value)
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _parse_address_cached(addr_str: str) -> Optional[Tuple[str, str]]:
+    """EmailHeaderProcessor.parse_address的带缓存实现，返回(显示名, 地址)"""
+    return EmailHeaderProcessor._parse_address_uncached(addr_str)
@@ -4,9 +4,15 @@
 
 import re
 import datetime
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from email.utils import parseaddr
 
+from common.config import HEADER_CACHE_SIZE
+
+# 纯邮箱地址格式
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+
 
 class EmailValidator:
     """邮件验证器"""
@@ -63,26 +69,8 @@ class EmailValidator:
         """验证邮箱地址格式，支持RFC 5322标准格式（包含显示名称）"""
         if not email_addr or not isinstance(email_addr, str):
             return False
-
-        # 使用 email.utils.parseaddr 解析邮箱地址
-        # 该函数可以正确处理 "Display Name <email@domain.com>" 格式
-        try:
-            display_name, actual_email = parseaddr(email_addr.strip())
-
-            # 如果没有解析出有效的邮箱地址，返回False
-            if not actual_email:
-                return False
-
-            # 验证解析出的纯邮箱地址格式
-            email_pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-            if not re.match(email_pattern, actual_email):
-                return False
-
-            return True
-
-        except Exception:
-            # 如果解析过程中出现任何异常，认为邮箱地址无效
-            return False
+        # 同一邮箱中的地址大量重复，验证结果按地址缓存
+        return _is_valid_email_cached(email_addr)
 
     @staticmethod
     def _is_valid_message_id(message_id: str) -> bool:
@@ -148,3 +136,23 @@ class EmailValidator:
             sanitized["subject"] = "(无主题)"
 
         return sanitized
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _is_valid_email_cached(email_addr: str) -> bool:
+    """EmailValidator._is_valid_email的带缓存实现（按原始地址字符串缓存）"""
+    # 使用 email.utils.parseaddr 解析邮箱地址
+    # 该函数可以正确处理 "Display Name <email@domain.com>" 格式
+    try:
+        display_name, actual_email = parseaddr(email_addr.strip())
+
+        # 如果没有解析出有效的邮箱地址，返回False
+        if not actual_email:
+            return False
+
+        # 验证解析出的纯邮箱地址格式
+        return EMAIL_PATTERN.match(actual_email) is not None
+
+    except Exception:
+        # 如果解析过程中出现任何异常，认为邮箱地址无效
+        return False
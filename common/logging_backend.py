@@ -0,0 +1,245 @@
+"""
+日志后端模块 - 所有日志记录器共享的处理器、异步写入和限速
+
+setup_logging创建的每个日志记录器都挂同一个处理器：
+- 异步模式（LOG_ASYNC）下是QueueHandler，调用方只把记录放入队列，
+  由单独的QueueListener线程写文件和控制台，请求处理线程中不做日志I/O；
+  队列满时丢弃新记录，不阻塞调用方
+- 文件按LOG_MAX_BYTES轮转，保留LOG_BACKUP_COUNT个旧文件
+- 可以按子系统（日志记录器名称）限制每秒输出的INFO/DEBUG记录数，
+  WARNING及以上级别不受限制
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from typing import Dict, List, Optional
+
+from common.config import (
+    LOG_FILE,
+    LOG_ASYNC,
+    LOG_QUEUE_SIZE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_RATE_LIMIT,
+    LOG_RATE_LIMITS,
+)
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class SafeFormatter(logging.Formatter):
+    """处理编码错误的格式化器"""
+
+    def format(self, record):
+        # 确保所有字符串都能安全地编码
+        try:
+            return super().format(record)
+        except UnicodeEncodeError:
+            # 将无法编码的字符替换为问号或其他可显示字符
+            result = super().format(record)
+            return result.encode("gbk", errors="replace").decode("gbk")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃记录并计数的QueueHandler（不阻塞、不打印错误）"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        # 写入线程停止后（进程退出阶段）直接交给这些处理器同步写出
+        self.direct_handlers: Optional[List[logging.Handler]] = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.direct_handlers is not None:
+            for handler in self.direct_handlers:
+                handler.handle(record)
+            return
+        super().emit(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按秒限制日志记录器输出的INFO/DEBUG记录数
+
+    超出的记录被丢弃；下一秒第一条记录前加上丢弃数量的提示。
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self.window = 0
+        self.count = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        window = int(time.monotonic())
+        with self.lock:
+            if window != self.window:
+                self.window = window
+                self.count = 0
+                if self.dropped:
+                    record.msg = f"(已限速丢弃{self.dropped}条日志) {record.msg}"
+                    self.dropped = 0
+            self.count += 1
+            if self.count > self.rate:
+                self.dropped += 1
+                return False
+        return True
+
+
+def parse_rate_limits(spec: str) -> Dict[str, int]:
+    """
+    解析按子系统的限速配置
+
+    Args:
+        spec: 形如"name=rate,name2=rate2"的字符串
+
+    Returns:
+        日志记录器名称 -> 每秒记录数
+    """
+    limits = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip().isdigit():
+            limits[name.strip()] = int(rate)
+    return limits
+
+
+_RATE_LIMITS = parse_rate_limits(LOG_RATE_LIMITS)
+
+_lock = threading.Lock()
+_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_output_handlers: List[logging.Handler] = []
+
+
+def _create_output_handlers() -> List[logging.Handler]:
+    """创建实际写文件和控制台的处理器"""
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    if LOG_MAX_BYTES > 0:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+    else:
+        file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+    console_handler = logging.StreamHandler()
+
+    formatter = SafeFormatter(LOG_FORMAT)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    return [file_handler, console_handler]
+
+
+def _start_listener() -> logging.Handler:
+    """创建日志队列和写入线程，返回放入队列的处理器"""
+    global _listener
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, *_output_handlers)
+    _listener.start()
+    return DroppingQueueHandler(log_queue)
+
+
+def get_shared_handler() -> logging.Handler:
+    """
+    获取所有日志记录器共享的处理器（首次调用时创建）
+
+    Returns:
+        异步模式下为队列处理器，否则为文件和控制台处理器的组合
+    """
+    global _handler
+    with _lock:
+        if _handler is None:
+            _output_handlers.extend(_create_output_handlers())
+            if LOG_ASYNC:
+                _handler = _start_listener()
+            else:
+                _handler = _FanOutHandler(_output_handlers)
+        return _handler
+
+
+def get_rate_limit_filter(name: str) -> Optional[RateLimitFilter]:
+    """
+    获取日志记录器的限速过滤器
+
+    Args:
+        name: 日志记录器名称
+
+    Returns:
+        RateLimitFilter，未配置限速时返回None
+    """
+    rate = _RATE_LIMITS.get(name, LOG_RATE_LIMIT)
+    return RateLimitFilter(rate) if rate > 0 else None
+
+
+def flush() -> None:
+    """等待队列中的日志全部写出（停止并重新启动写入线程）"""
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _output_handlers:
+            handler.flush()
+        _listener.start()
+
+
+def shutdown() -> None:
+    """停止写入线程并写出剩余日志（进程退出时自动调用）"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        # 之后的日志（如对象析构时记录的）不再经过队列
+        if isinstance(_handler, DroppingQueueHandler):
+            _handler.direct_handlers = _output_handlers
+        for handler in _output_handlers:
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                pass
+
+
+class _FanOutHandler(logging.Handler):
+    """同步模式：依次交给文件和控制台处理器"""
+
+    def __init__(self, handlers: List[logging.Handler]):
+        super().__init__()
+        self.handlers = handlers
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            handler.handle(record)
+
+
+def _after_fork_in_child() -> None:
+    """子进程（如进程模式的SMTP工作池）中重新创建锁和写入线程"""
+    global _lock, _listener
+    _lock = threading.Lock()
+    if isinstance(_handler, DroppingQueueHandler) and _handler.direct_handlers is None:
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _handler.queue = log_queue
+        _listener = logging.handlers.QueueListener(log_queue, *_output_handlers)
+        _listener.start()
+
+
+atexit.register(shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -41,6 +41,18 @@ class Attachment:
         if self.size == 0 and self.content:
             self.size = len(self.content)
 
+    def write_to(self, fileobj) -> int:
+        """
+        把附件内容写入二进制文件对象
+
+        Args:
+            fileobj: 二进制文件对象
+
+        Returns:
+            写入的字节数
+        """
+        return fileobj.write(self.content)
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（用于序列化）"""
         return {
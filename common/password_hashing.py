@@ -0,0 +1,170 @@
+"""
+密码哈希模块 - 可插拔的密钥派生算法（KDF）
+
+存储格式（users.password_hash列）：
+    $scrypt$n=16384,r=8,p=1$<十六进制摘要>
+    $pbkdf2_sha256$i=600000$<十六进制摘要>
+盐值仍保存在users.salt列中。不带前缀的64位十六进制字符串是旧算法
+sha256(password + salt)，验证时自动识别，登录成功后由UserAuth升级为当前算法。
+"""
+
+import hmac
+import uuid
+import hashlib
+from typing import Callable, Dict, Optional, Tuple
+
+from common.config import (
+    PASSWORD_HASH_SCHEME,
+    PASSWORD_SCRYPT_N,
+    PASSWORD_SCRYPT_R,
+    PASSWORD_SCRYPT_P,
+    PASSWORD_PBKDF2_ITERATIONS,
+)
+
+LEGACY_SCHEME = "sha256"
+
+
+def _legacy_sha256(password: str, salt: str, params: Dict[str, int]) -> str:
+    """旧算法：单次sha256(password + salt)"""
+    return hashlib.sha256((password + salt).encode()).hexdigest()
+
+
+def _scrypt(password: str, salt: str, params: Dict[str, int]) -> str:
+    """scrypt，参数n/r/p"""
+    n, r, p = params["n"], params["r"], params["p"]
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt.encode(),
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r * p,
+        dklen=32,
+    ).hex()
+
+
+def _pbkdf2_sha256(password: str, salt: str, params: Dict[str, int]) -> str:
+    """PBKDF2-HMAC-SHA256，参数i为迭代次数"""
+    return hashlib.pbkdf2_hmac(
+        "sha256", password.encode(), salt.encode(), params["i"]
+    ).hex()
+
+
+# 算法名称 -> 摘要函数
+SCHEMES: Dict[str, Callable[[str, str, Dict[str, int]], str]] = {
+    LEGACY_SCHEME: _legacy_sha256,
+    "scrypt": _scrypt,
+    "pbkdf2_sha256": _pbkdf2_sha256,
+}
+
+
+def default_params(scheme: str) -> Dict[str, int]:
+    """
+    获取算法的当前配置参数
+
+    Args:
+        scheme: 算法名称
+
+    Returns:
+        参数字典
+    """
+    if scheme == "scrypt":
+        return {"n": PASSWORD_SCRYPT_N, "r": PASSWORD_SCRYPT_R, "p": PASSWORD_SCRYPT_P}
+    if scheme == "pbkdf2_sha256":
+        return {"i": PASSWORD_PBKDF2_ITERATIONS}
+    return {}
+
+
+def encode_hash(scheme: str, params: Dict[str, int], digest: str) -> str:
+    """把算法、参数和摘要编码为存储格式"""
+    if scheme == LEGACY_SCHEME:
+        return digest
+    param_str = ",".join(f"{k}={v}" for k, v in params.items())
+    return f"${scheme}${param_str}${digest}"
+
+
+def decode_hash(encoded: str) -> Tuple[str, Dict[str, int], str]:
+    """
+    解析存储格式
+
+    Args:
+        encoded: 存储的密码哈希
+
+    Returns:
+        (算法名称, 参数字典, 摘要)
+
+    Raises:
+        ValueError: 格式无法识别时抛出
+    """
+    if not encoded.startswith("$"):
+        return LEGACY_SCHEME, {}, encoded
+    try:
+        _, scheme, param_str, digest = encoded.split("$")
+        params = {
+            k: int(v) for k, v in (item.split("=") for item in param_str.split(","))
+        }
+    except ValueError:
+        raise ValueError(f"无法识别的密码哈希格式: {encoded[:20]}")
+    if scheme not in SCHEMES:
+        raise ValueError(f"不支持的密码哈希算法: {scheme}")
+    return scheme, params, digest
+
+
+def hash_password(
+    password: str, salt: Optional[str] = None, scheme: str = PASSWORD_HASH_SCHEME
+) -> Tuple[str, str]:
+    """
+    使用指定算法（默认取配置）对密码进行哈希处理
+
+    Args:
+        password: 原始密码
+        salt: 盐值，如果为None则生成新的盐值
+        scheme: 算法名称
+
+    Returns:
+        (存储格式的密码哈希, salt)元组
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"不支持的密码哈希算法: {scheme}")
+    if salt is None:
+        salt = uuid.uuid4().hex
+    params = default_params(scheme)
+    return encode_hash(scheme, params, SCHEMES[scheme](password, salt, params)), salt
+
+
+def verify_password(password: str, hashed_password: str, salt: str) -> bool:
+    """
+    验证密码是否匹配（根据存储格式自动选择算法，常量时间比较）
+
+    Args:
+        password: 待验证的密码
+        hashed_password: 存储的密码哈希
+        salt: 盐值
+
+    Returns:
+        密码是否匹配
+    """
+    try:
+        scheme, params, digest = decode_hash(hashed_password)
+    except ValueError:
+        return False
+    calculated = SCHEMES[scheme](password, salt, params)
+    return hmac.compare_digest(calculated, digest)
+
+
+def needs_rehash(hashed_password: str, scheme: str = PASSWORD_HASH_SCHEME) -> bool:
+    """
+    判断密码哈希是否需要升级（算法或成本参数与当前配置不同）
+
+    Args:
+        hashed_password: 存储的密码哈希
+        scheme: 当前配置的算法名称
+
+    Returns:
+        是否需要在下次登录成功后重新哈希
+    """
+    try:
+        stored_scheme, params, _ = decode_hash(hashed_password)
+    except ValueError:
+        return False
+    return stored_scheme != scheme or params != default_params(scheme)
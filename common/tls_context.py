@@ -0,0 +1,127 @@
+"""
+TLS上下文模块 - SMTP和POP3服务器共享的服务器端SSL上下文
+
+同一组证书在进程内只创建一个SSLContext：会话票据（session ticket）的密钥和
+会话缓存都属于上下文，共享后客户端重连时可以恢复会话（简短握手），
+不必每次轮询都做一次完整握手。只使用ECDHE密钥交换的AEAD密码套件。
+"""
+
+import os
+import ssl
+import threading
+from typing import Dict, Optional, Tuple
+
+from common.utils import setup_logging
+from common.config import SSL_CERT_FILE, SSL_KEY_FILE, TLS_SESSION_TICKETS
+
+# 设置日志
+logger = setup_logging("tls_context")
+
+# TLS 1.2使用的密码套件（TLS 1.3的套件本身都是ECDHE/AEAD）
+SERVER_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20:!aNULL:!MD5:!DSS"
+
+_lock = threading.Lock()
+# (证书路径, 密钥路径) -> (证书文件修改时间, SSLContext)
+_contexts: Dict[Tuple[str, str], Tuple[float, ssl.SSLContext]] = {}
+
+
+def create_server_context(
+    cert_file: str = SSL_CERT_FILE,
+    key_file: str = SSL_KEY_FILE,
+    session_tickets: int = TLS_SESSION_TICKETS,
+) -> ssl.SSLContext:
+    """
+    创建新的服务器端SSL上下文（不共享）
+
+    Args:
+        cert_file: 证书文件路径
+        key_file: 密钥文件路径
+        session_tickets: TLS 1.3握手后发放的会话票据数量，0表示禁用会话票据
+
+    Returns:
+        SSL上下文
+
+    Raises:
+        FileNotFoundError: 证书或密钥文件不存在
+        ssl.SSLError: 证书加载失败
+    """
+    if not os.path.exists(cert_file):
+        raise FileNotFoundError(f"证书文件不存在: {cert_file}")
+    if not os.path.exists(key_file):
+        raise FileNotFoundError(f"密钥文件不存在: {key_file}")
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(SERVER_CIPHERS)
+    context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE | ssl.OP_NO_COMPRESSION
+
+    # 会话恢复：TLS 1.2使用会话缓存和票据，TLS 1.3使用握手后发放的票据
+    if session_tickets > 0:
+        context.options &= ~ssl.OP_NO_TICKET
+        context.num_tickets = session_tickets
+    else:
+        context.options |= ssl.OP_NO_TICKET
+        context.num_tickets = 0
+
+    return context
+
+
+def get_server_context(
+    cert_file: str = SSL_CERT_FILE, key_file: str = SSL_KEY_FILE
+) -> ssl.SSLContext:
+    """
+    获取共享的服务器端SSL上下文，证书文件被替换后自动重新加载
+
+    Args:
+        cert_file: 证书文件路径
+        key_file: 密钥文件路径
+
+    Returns:
+        SSL上下文
+
+    Raises:
+        FileNotFoundError: 证书或密钥文件不存在
+        ssl.SSLError: 证书加载失败
+    """
+    key = (os.path.abspath(cert_file), os.path.abspath(key_file))
+    mtime = os.path.getmtime(cert_file) if os.path.exists(cert_file) else 0.0
+    with _lock:
+        cached = _contexts.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        context = create_server_context(cert_file, key_file)
+        _contexts[key] = (mtime, context)
+        logger.info(f"已创建共享SSL上下文: {cert_file}")
+        return context
+
+
+def tls_stats(context: Optional[ssl.SSLContext] = None) -> Dict[str, float]:
+    """
+    获取服务器端握手统计
+
+    Args:
+        context: 指定的SSL上下文，None时汇总所有共享上下文
+
+    Returns:
+        握手总数、完整握手数、恢复的会话数和会话恢复率
+    """
+    if context is not None:
+        contexts = [context]
+    else:
+        with _lock:
+            contexts = [ctx for _, ctx in _contexts.values()]
+
+    handshakes = resumed = 0
+    for ctx in contexts:
+        stats = ctx.session_stats()
+        handshakes += stats["accept_good"]
+        resumed += stats["hits"]
+
+    return {
+        "handshakes": handshakes,
+        "full_handshakes": handshakes - resumed,
+        "resumed": resumed,
+        "resumption_ratio": resumed / handshakes if handshakes else 0.0,
+    }
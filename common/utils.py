@@ -5,13 +5,13 @@
 import os
 import logging
 import uuid
-import hashlib
 import datetime
 import sys
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
 
-from common.config import LOG_LEVEL, LOG_FILE
+from common.config import LOG_LEVEL
+from common import logging_backend, password_hashing
 
 
 # 设置日志
@@ -36,9 +36,6 @@ def setup_logging(
     if verbose:
         level = "DEBUG"
 
-    # 确保日志目录存在
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-
     # 创建日志记录器
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level))
@@ -47,33 +44,13 @@ def setup_logging(
     if logger.handlers:
         return logger
 
-    # 文件处理器 - 使用UTF-8编码
-    file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
-    file_handler.setLevel(getattr(logging, level))
-
-    # 控制台处理器 - 处理编码错误
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(getattr(logging, level))
-
-    # 自定义格式化器，处理编码错误
-    class SafeFormatter(logging.Formatter):
-        def format(self, record):
-            # 确保所有字符串都能安全地编码
-            try:
-                return super().format(record)
-            except UnicodeEncodeError:
-                # 将无法编码的字符替换为问号或其他可显示字符
-                result = super().format(record)
-                return result.encode("gbk", errors="replace").decode("gbk")
-
-    # 格式化器
-    formatter = SafeFormatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-
-    # 添加处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # 所有日志记录器共享同一个处理器：异步模式下只放入队列，由写入线程负责文件和控制台I/O
+    logger.addHandler(logging_backend.get_shared_handler())
+
+    # 按子系统限速（只限制INFO/DEBUG）
+    rate_limit_filter = logging_backend.get_rate_limit_filter(name)
+    if rate_limit_filter:
+        logger.addFilter(rate_limit_filter)
 
     return logger
 
@@ -125,7 +102,7 @@ def generate_timestamp() -> str:
 
 def hash_password(password: str, salt: Optional[str] = None) -> Tuple[str, str]:
     """
-    对密码进行哈希处理
+    对密码进行哈希处理（使用PASSWORD_HASH_SCHEME配置的算法）
 
     Args:
         password: 原始密码
@@ -134,16 +111,12 @@ def hash_password(password: str, salt: Optional[str] = None) -> Tuple[str, str]:
     Returns:
         (hashed_password, salt)元组
     """
-    if salt is None:
-        salt = uuid.uuid4().hex
-
-    hashed = hashlib.sha256((password + salt).encode()).hexdigest()
-    return hashed, salt
+    return password_hashing.hash_password(password, salt)
 
 
 def verify_password(password: str, hashed_password: str, salt: str) -> bool:
     """
-    验证密码是否匹配
+    验证密码是否匹配（兼容旧的sha256哈希）
 
     Args:
         password: 待验证的密码
@@ -153,8 +126,7 @@ def verify_password(password: str, hashed_password: str, salt: str) -> bool:
     Returns:
         密码是否匹配
     """
-    calculated_hash, _ = hash_password(password, salt)
-    return calculated_hash == hashed_password
+    return password_hashing.verify_password(password, hashed_password, salt)
 
 
 def safe_filename(filename: str) -> str:
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio POP3服务器 - 单个事件循环承载大量空闲连接
+
+与StablePOP3Server（每个连接一个线程）相比，空闲连接只占用一个协程和少量缓冲区；
+命令语义复用POP3CommandHandler，数据库和文件操作在线程池中执行，不阻塞事件循环。
+支持隐式TLS（POP3S）和STLS（RFC 2595）。
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Set
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.utils import setup_logging
+from common.config import (
+    SSL_CERT_FILE,
+    SSL_KEY_FILE,
+    CONNECTION_IDLE_TIMEOUT,
+    POP3_REQUEST_QUEUE_SIZE,
+    POP3_ASYNC_MAX_CONNECTIONS,
+    POP3_ASYNC_EXECUTOR_WORKERS,
+)
+from server.pop3_auth import POP3Authenticator
+from server.pop3_commands import POP3CommandHandler
+from server.pop3_server import StablePOP3Server
+
+# 设置日志
+logger = setup_logging("async_pop3_server")
+
+
+class AsyncPOP3Session:
+    """单个asyncio POP3连接"""
+
+    def __init__(
+        self,
+        server: "AsyncPOP3Server",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        """
+        初始化会话
+
+        Args:
+            server: 所属的AsyncPOP3Server
+            reader: 流读取器
+            writer: 流写入器
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.address = writer.get_extra_info("peername")
+        self.tls_active = writer.get_extra_info("sslcontext") is not None
+        self.start_time = time.time()
+        self.command_count = 0
+
+        self.command_handler = POP3CommandHandler(
+            email_service=server.email_service,
+            authenticator=server.authenticator,
+            send_response_callback=self._send_response_threadsafe,
+            send_bytes_callback=self._send_bytes_threadsafe,
+        )
+        self._update_capabilities()
+
+    def _update_capabilities(self) -> None:
+        """未加密且服务器有TLS上下文时声明STLS能力"""
+        stls_available = self.server.stls_context is not None and not self.tls_active
+        self.command_handler.extra_capabilities = ["STLS"] if stls_available else []
+
+    def _send_response_threadsafe(self, response: str) -> None:
+        """
+        从工作线程发送单行响应（由事件循环写入，顺序与调用顺序一致）
+
+        Args:
+            response: 响应消息
+        """
+        data = f"{response}\r\n".encode("utf-8")
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def _send_bytes_threadsafe(self, data: bytes) -> None:
+        """
+        从工作线程发送大块数据，等待缓冲区排空后返回，实现背压
+
+        Args:
+            data: 要发送的字节
+        """
+        future = asyncio.run_coroutine_threadsafe(self._write_and_drain(data), self.loop)
+        # 连接长时间无法写出时放弃，避免工作线程被永久占用
+        future.result(timeout=CONNECTION_IDLE_TIMEOUT)
+
+    async def _write_and_drain(self, data: bytes) -> None:
+        """写入数据并等待发送缓冲区排空"""
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def _send(self, response: str) -> None:
+        """在事件循环中发送单行响应"""
+        self.writer.write(f"{response}\r\n".encode("utf-8"))
+        await self.writer.drain()
+
+    async def _start_tls(self) -> bool:
+        """
+        处理STLS命令，将当前连接升级为TLS
+
+        Returns:
+            bool: 是否继续会话
+        """
+        if self.tls_active or self.server.stls_context is None:
+            await self._send("-ERR STLS not available")
+            return True
+        if self.command_handler.state != "AUTHORIZATION":
+            await self._send("-ERR Command not valid in this state")
+            return True
+
+        await self._send("+OK Begin TLS negotiation")
+        try:
+            await self.writer.start_tls(self.server.stls_context)
+        except Exception as e:
+            logger.warning(f"STLS握手失败: {self.address} - {e}")
+            return False
+
+        # TLS协商后丢弃之前的会话状态（RFC 2595）
+        self.tls_active = True
+        self.command_handler.authenticated_user = None
+        self._update_capabilities()
+        logger.debug("STLS已建立: %s", self.address)
+        return True
+
+    async def handle(self) -> None:
+        """处理POP3会话"""
+        try:
+            await self._send("+OK POP3 server ready")
+
+            while True:
+                try:
+                    line = await asyncio.wait_for(
+                        self.reader.readline(), timeout=CONNECTION_IDLE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    await self._send("-ERR Session idle timeout")
+                    break
+                if not line:
+                    break
+
+                command = line.decode("utf-8", errors="replace").strip()
+                if not command:
+                    continue
+                self.command_count += 1
+
+                if command.split(" ", 1)[0].upper() == "STLS":
+                    if not await self._start_tls():
+                        break
+                    continue
+
+                # 命令在线程池中执行，响应通过回调按顺序写回事件循环
+                keep_going = await self.loop.run_in_executor(
+                    self.server.executor, self.command_handler.handle_command, command
+                )
+                await self.writer.drain()
+                if not keep_going:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug("客户端断开连接: %s - %s", self.address, e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"处理POP3会话时出错: {e} from {self.address}")
+            try:
+                await self._send("-ERR Internal server error")
+            except Exception:
+                pass
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """关闭连接、释放邮箱锁并记录会话统计"""
+        self.command_handler.release_maildrop()
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception as e:
+            logger.debug("关闭连接时出错: %s", e)
+
+        duration = time.time() - self.start_time
+        logger.info(
+            f"POP3连接关闭: {self.address}, 持续时间: {duration:.2f}秒, "
+            f"命令数: {self.command_count}"
+        )
+
+
+class AsyncPOP3Server(StablePOP3Server):
+    """
+    基于asyncio的POP3服务器
+
+    构造参数、SSL上下文和start()/stop()接口与StablePOP3Server一致，
+    事件循环运行在后台线程中。
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 995,
+        use_ssl: bool = True,
+        ssl_cert_file: str = SSL_CERT_FILE,
+        ssl_key_file: str = SSL_KEY_FILE,
+        max_connections: int = POP3_ASYNC_MAX_CONNECTIONS,
+        enable_stls: bool = False,
+        executor_workers: int = POP3_ASYNC_EXECUTOR_WORKERS,
+    ):
+        """
+        初始化asyncio POP3服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+            use_ssl: 是否使用隐式TLS
+            ssl_cert_file: SSL证书文件路径
+            ssl_key_file: SSL密钥文件路径
+            max_connections: 最大并发连接数
+            enable_stls: 未使用隐式TLS时是否提供STLS升级
+            executor_workers: 执行数据库和文件操作的线程数
+        """
+        super().__init__(
+            host=host,
+            port=port,
+            use_ssl=use_ssl,
+            ssl_cert_file=ssl_cert_file,
+            ssl_key_file=ssl_key_file,
+            max_connections=max_connections,
+        )
+        self.authenticator = POP3Authenticator(self.user_auth)
+        self.executor_workers = executor_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+        self.stls_context = None
+        if enable_stls and not self.use_ssl:
+            self.stls_context = self._create_ssl_context()
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self.sessions: Set[asyncio.Task] = set()
+        self.current_connections = 0
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """接受新连接"""
+        if self.current_connections >= self.max_connections:
+            logger.warning(
+                f"POP3服务器达到最大连接数限制 {self.max_connections}，拒绝新连接"
+            )
+            try:
+                writer.write(b"-ERR [SYS/TEMP] Too many connections\r\n")
+                await writer.drain()
+                writer.close()
+            except Exception:
+                pass
+            return
+
+        self.current_connections += 1
+        task = asyncio.current_task()
+        self.sessions.add(task)
+        try:
+            await AsyncPOP3Session(self, reader, writer).handle()
+        finally:
+            self.sessions.discard(task)
+            self.current_connections -= 1
+
+    def _run_loop(self, started: threading.Event, errors: list) -> None:
+        """后台线程：创建事件循环并启动监听"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(
+                    self._handle_client,
+                    self.host,
+                    self.port,
+                    ssl=self.ssl_context if self.use_ssl else None,
+                    backlog=POP3_REQUEST_QUEUE_SIZE,
+                    reuse_address=True,
+                )
+            )
+        except Exception as e:
+            errors.append(e)
+            started.set()
+            self.loop.close()
+            return
+
+        started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def start(self):
+        """启动POP3服务器"""
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.executor_workers, thread_name_prefix="pop3-async"
+        )
+        started = threading.Event()
+        errors = []
+        self.loop_thread = threading.Thread(
+            target=self._run_loop, args=(started, errors), daemon=True
+        )
+        self.loop_thread.start()
+        started.wait()
+
+        if errors:
+            logger.error(f"启动asyncio POP3服务器时出错: {errors[0]}")
+            self.executor.shutdown(wait=False)
+            raise errors[0]
+
+        logger.info("asyncio POP3服务器已启动: %s:%s", self.host, self.port)
+        logger.info(
+            f"最大连接数: {self.max_connections}, 工作线程数: {self.executor_workers}, "
+            f"STLS: {'启用' if self.stls_context else '禁用'}"
+        )
+
+    async def _shutdown(self) -> None:
+        """在事件循环中关闭监听并取消所有会话"""
+        self.server.close()
+        await self.server.wait_closed()
+        for task in list(self.sessions):
+            task.cancel()
+        if self.sessions:
+            await asyncio.gather(*self.sessions, return_exceptions=True)
+
+    def stop(self):
+        """停止POP3服务器"""
+        if self.loop and self.server:
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(
+                    timeout=5
+                )
+            except Exception as e:
+                logger.debug("关闭asyncio POP3服务器时出错: %s", e)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.server = None
+
+        if self.loop_thread:
+            self.loop_thread.join(timeout=5)
+            self.loop_thread = None
+
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+        logger.info("asyncio POP3服务器已停止")
@@ -5,11 +5,13 @@
 import os
 import sqlite3
 import time
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, List, Optional, Tuple
 from pathlib import Path
 
 from common.utils import setup_logging
 from common.config import DB_PATH
+from .db_migrations import MigrationRunner
 
 # 设置日志
 logger = setup_logging("db_connection")
@@ -18,14 +20,16 @@ logger = setup_logging("db_connection")
 class DatabaseConnection:
     """数据库连接管理器"""
 
-    def __init__(self, db_path: str = DB_PATH) -> None:
+    def __init__(self, db_path: str = DB_PATH, pool=None) -> None:
         """
         初始化数据库连接管理器
 
         Args:
             db_path: 数据库文件路径
+            pool: 可选的DatabaseConnectionPool，提供时各execute_*方法从池中借用连接
         """
         self.db_path = db_path
+        self.pool = pool
 
         # 确保目录存在
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -92,6 +96,27 @@ class DatabaseConnection:
         else:
             raise sqlite3.OperationalError("数据库连接超时")
 
+    @contextmanager
+    def borrow_connection(self):
+        """
+        获取用于单次操作的连接
+
+        配置了连接池时借用池中已设置好PRAGMA的连接并在结束后归还，
+        否则新建连接并在结束后关闭。
+
+        Yields:
+            sqlite3.Connection: 数据库连接
+        """
+        if self.pool is not None:
+            with self.pool.get_connection() as conn:
+                yield conn
+        else:
+            conn = self.get_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()
+
     def init_database(self) -> None:
         """
         初始化数据库表
@@ -169,6 +194,9 @@ class DatabaseConnection:
             conn.commit()
             conn.close()
 
+            # 执行版本化迁移（收件人索引表、二级索引等）
+            MigrationRunner(self).migrate()
+
             logger.info("数据库表已初始化")
         except Exception as e:
             logger.error(f"初始化数据库表时出错: {e}")
@@ -194,24 +222,21 @@ class DatabaseConnection:
             查询结果或None
         """
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row  # 返回字典形式的结果
-            cursor = conn.cursor()
+            with self.borrow_connection() as conn:
+                conn.row_factory = sqlite3.Row  # 返回字典形式的结果
+                cursor = conn.cursor()
 
-            cursor.execute(query, params)
+                cursor.execute(query, params)
 
-            if fetch_one:
-                result = cursor.fetchone()
-                conn.close()
-                return dict(result) if result else None
-            elif fetch_all:
-                results = cursor.fetchall()
-                conn.close()
-                return [dict(row) for row in results]
-            else:
-                conn.commit()
-                conn.close()
-                return True
+                if fetch_one:
+                    result = cursor.fetchone()
+                    return dict(result) if result else None
+                elif fetch_all:
+                    results = cursor.fetchall()
+                    return [dict(row) for row in results]
+                else:
+                    conn.commit()
+                    return True
 
         except Exception as e:
             logger.error(f"执行数据库查询时出错: {e}")
@@ -243,15 +268,14 @@ class DatabaseConnection:
                 else:
                     query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
 
-                conn = self.get_connection()
-                cursor = conn.cursor()
-                cursor.execute(query, tuple(data.values()))
+                with self.borrow_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(query, tuple(data.values()))
 
-                # 检查是否实际插入了数据
-                rows_affected = cursor.rowcount
+                    # 检查是否实际插入了数据
+                    rows_affected = cursor.rowcount
 
-                conn.commit()
-                conn.close()
+                    conn.commit()
 
                 if attempt > 0:
                     logger.info(f"插入操作在第 {attempt + 1} 次尝试后成功: {table}")
@@ -301,6 +325,54 @@ class DatabaseConnection:
         logger.error(f"插入操作在 {max_retries} 次尝试后仍然失败: {table}")
         return False
 
+    def execute_transaction(self, statements: List[Tuple[str, Any]]) -> bool:
+        """
+        在单个事务中执行多条语句，带有重试机制
+
+        Args:
+            statements: (SQL语句, 参数)列表；参数为列表时使用executemany批量执行
+
+        Returns:
+            bool: 操作是否成功
+        """
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                with self.borrow_connection() as conn:
+                    try:
+                        # 池化连接为自动提交模式，需显式开启事务
+                        if not conn.in_transaction:
+                            conn.execute("BEGIN")
+                        cursor = conn.cursor()
+
+                        for query, params in statements:
+                            if isinstance(params, list):
+                                cursor.executemany(query, params)
+                            else:
+                                cursor.execute(query, params)
+
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                return True
+            except sqlite3.OperationalError as e:
+                if (
+                    "database is locked" in str(e) or "database is busy" in str(e)
+                ) and attempt < max_retries - 1:
+                    wait_time = min(0.1 * (2**attempt), 1.0)
+                    logger.debug(f"事务执行数据库忙碌，等待 {wait_time:.2f} 秒后重试")
+                    time.sleep(wait_time)
+                    continue
+                else:
+                    logger.error(f"执行事务时出错: {e}")
+                    raise
+            except Exception as e:
+                logger.error(f"执行事务时出错: {e}")
+                raise
+
+        return False
+
     def execute_update(
         self, table: str, data: dict, where_clause: str, where_params: tuple = ()
     ) -> bool:
@@ -324,11 +396,10 @@ class DatabaseConnection:
 
                 params = tuple(data.values()) + where_params
 
-                conn = self.get_connection()
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                conn.commit()
-                conn.close()
+                with self.borrow_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(query, params)
+                    conn.commit()
 
                 return True
             except sqlite3.OperationalError as e:
@@ -365,13 +436,32 @@ class DatabaseConnection:
         try:
             query = f"DELETE FROM {table} WHERE {where_clause}"
 
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, where_params)
-            conn.commit()
-            conn.close()
+            with self.borrow_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, where_params)
+                conn.commit()
 
             return True
         except Exception as e:
             logger.error(f"删除数据时出错: {e}")
             raise
+
+    def execute_script(self, script: str) -> bool:
+        """
+        执行SQL脚本
+
+        Args:
+            script: SQL脚本
+
+        Returns:
+            bool: 操作是否成功
+        """
+        try:
+            with self.borrow_connection() as conn:
+                conn.executescript(script)
+                conn.commit()
+
+            return True
+        except Exception as e:
+            logger.error(f"执行SQL脚本时出错: {e}")
+            raise
@@ -17,7 +17,7 @@ from typing import Optional
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from common.config import DB_CONNECTION_POOL_SIZE
+from common.config import DB_CONNECTION_POOL_SIZE, DB_STATEMENT_CACHE_SIZE
 from common.utils import setup_logging
 
 logger = setup_logging("db_connection_pool")
@@ -26,16 +26,23 @@ logger = setup_logging("db_connection_pool")
 class DatabaseConnectionPool:
     """数据库连接池"""
 
-    def __init__(self, db_path: str, pool_size: int = DB_CONNECTION_POOL_SIZE):
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = DB_CONNECTION_POOL_SIZE,
+        cached_statements: int = DB_STATEMENT_CACHE_SIZE,
+    ):
         """
         初始化数据库连接池
 
         Args:
             db_path: 数据库文件路径
             pool_size: 连接池大小
+            cached_statements: 每个连接的预编译语句缓存大小
         """
         self.db_path = db_path
         self.pool_size = pool_size
+        self.cached_statements = cached_statements
         self.pool = queue.Queue(maxsize=pool_size)
         self.lock = threading.RLock()
         self.created_connections = 0
@@ -44,7 +51,7 @@ class DatabaseConnectionPool:
         # 预创建连接
         self._initialize_pool()
 
-        logger.info(f"数据库连接池已初始化: {db_path}, 池大小: {pool_size}")
+        logger.info("数据库连接池已初始化: %s, 池大小: %s", db_path, pool_size)
 
     def _initialize_pool(self):
         """初始化连接池"""
@@ -61,6 +68,7 @@ class DatabaseConnectionPool:
                 check_same_thread=False,  # 允许多线程使用
                 timeout=30.0,  # 设置超时时间
                 isolation_level=None,  # 使用自动提交模式
+                cached_statements=self.cached_statements,  # 复用预编译语句
             )
 
             # 设置连接属性
@@ -74,7 +82,7 @@ class DatabaseConnectionPool:
             with self.lock:
                 self.created_connections += 1
 
-            logger.debug(f"创建新数据库连接 #{self.created_connections}")
+            logger.debug("创建新数据库连接 #%s", self.created_connections)
             return conn
 
         except Exception as e:
@@ -99,7 +107,7 @@ class DatabaseConnectionPool:
                 conn = self.pool.get(timeout=timeout)
                 with self.lock:
                     self.active_connections += 1
-                logger.debug(f"从连接池获取连接，活跃连接数: {self.active_connections}")
+                logger.debug("从连接池获取连接，活跃连接数: %s", self.active_connections)
             except queue.Empty:
                 logger.warning("连接池为空，创建新连接")
                 conn = self._create_connection()
@@ -0,0 +1,363 @@
+"""
+数据库结构迁移 - 基于schema_version表的版本化、幂等迁移步骤
+"""
+
+import datetime
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Any
+
+from common.utils import setup_logging
+
+# 设置日志
+logger = setup_logging("db_migrations")
+
+
+@dataclass
+class Migration:
+    """单个迁移步骤"""
+
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Cursor], None]
+    # 检查步骤的结果是否存在；返回False时即使版本已记录也在启动时重新执行
+    # （用于依赖可选SQLite功能、可能被跳过的步骤）
+    check: Optional[Callable[[sqlite3.Cursor], bool]] = None
+
+
+def _create_email_recipients(cursor: sqlite3.Cursor) -> None:
+    """创建收件人索引表，并从已有邮件的to_addrs/from_addr回填"""
+    from .email_repository import EmailRepository
+
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_recipients (
+            message_id TEXT NOT NULL,
+            address TEXT NOT NULL,
+            role TEXT NOT NULL,
+            PRIMARY KEY (message_id, address, role)
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_email_recipients_address
+        ON email_recipients (address, message_id)
+    """
+    )
+
+    rows = cursor.execute(
+        "SELECT message_id, from_addr, to_addrs FROM emails"
+    ).fetchall()
+
+    recipient_rows = []
+    for message_id, from_addr, to_addrs in rows:
+        recipient_rows.extend(
+            EmailRepository.build_recipient_rows(message_id, from_addr, to_addrs)
+        )
+
+    if recipient_rows:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO email_recipients (message_id, address, role) "
+            "VALUES (?, ?, ?)",
+            recipient_rows,
+        )
+
+    logger.info(
+        f"已回填收件人索引: {len(rows)} 封邮件, {len(recipient_rows)} 条地址记录"
+    )
+
+
+def _normalize_flag_columns(cursor: sqlite3.Cursor) -> None:
+    """将历史数据中的NULL状态标志统一为0，使查询可以直接使用 flag = 0 走索引"""
+    for table, columns in (
+        ("emails", ("is_read", "is_deleted", "is_spam", "is_recalled")),
+        ("sent_emails", ("is_read", "is_spam", "is_recalled")),
+    ):
+        for column in columns:
+            cursor.execute(
+                f"UPDATE {table} SET {column} = 0 WHERE {column} IS NULL"
+            )
+
+
+def _create_listing_indexes(cursor: sqlite3.Cursor) -> None:
+    """创建邮件列表、发件箱列表和用户查找使用的二级索引"""
+    statements = [
+        # 收件箱列表: is_deleted = 0 AND is_recalled = 0 ORDER BY date DESC
+        # is_spam放在末尾，既可用于过滤，也不破坏按date的有序扫描
+        """
+        CREATE INDEX IF NOT EXISTS idx_emails_listing
+        ON emails (is_deleted, is_recalled, date DESC, is_spam)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_emails_date ON emails (date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_emails_from_addr ON emails (from_addr)",
+        # 发件箱列表: from_addr = ? ORDER BY date DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_sent_emails_from_date
+        ON sent_emails (from_addr, date DESC)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sent_emails_date ON sent_emails (date DESC)",
+        # UserAuth.get_user_by_email
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)",
+    ]
+    for statement in statements:
+        cursor.execute(statement)
+
+
+def _create_fulltext_index(cursor: sqlite3.Cursor) -> None:
+    """创建邮件全文索引表（FTS5 trigram），已有邮件由rebuild_fulltext_index工具回填"""
+    from .fulltext_index import create_fulltext_schema
+
+    try:
+        create_fulltext_schema(cursor)
+    except sqlite3.OperationalError as e:
+        # SQLite未编译FTS5时跳过，内容搜索降级为逐封扫描；支持FTS5后启动时重新创建
+        logger.warning(f"无法创建全文索引表，跳过: {e}")
+
+
+def _fulltext_index_exists(cursor: sqlite3.Cursor) -> bool:
+    """检查全文索引表email_fts是否存在"""
+    row = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'email_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def _add_mailbox_flags(cursor: sqlite3.Cursor) -> None:
+    """为email_recipients增加每个收件人独立的已读/删除/垃圾邮件标志，并从emails回填"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(email_recipients)")}
+    for column in ("is_read", "is_deleted", "is_spam"):
+        if column not in columns:
+            cursor.execute(
+                f"ALTER TABLE email_recipients "
+                f"ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+
+    cursor.execute(
+        """
+        UPDATE email_recipients SET
+            is_read = (SELECT COALESCE(e.is_read, 0) FROM emails e
+                       WHERE e.message_id = email_recipients.message_id),
+            is_deleted = (SELECT COALESCE(e.is_deleted, 0) FROM emails e
+                          WHERE e.message_id = email_recipients.message_id),
+            is_spam = (SELECT COALESCE(e.is_spam, 0) FROM emails e
+                       WHERE e.message_id = email_recipients.message_id)
+        WHERE EXISTS (SELECT 1 FROM emails e
+                      WHERE e.message_id = email_recipients.message_id)
+    """
+    )
+    # POP3邮箱快照和用户收件箱: address = ? AND is_deleted = 0
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_email_recipients_mailbox
+        ON email_recipients (address, is_deleted, message_id)
+    """
+    )
+
+
+def _create_sync_state(cursor: sqlite3.Cursor) -> None:
+    """创建POP3客户端按账户保存的UIDL同步状态表"""
+    from .sync_state import create_sync_state_schema
+
+    create_sync_state_schema(cursor)
+
+
+def _create_recall_tombstones(cursor: sqlite3.Cursor) -> None:
+    """创建撤回记录表，并从已撤回的已发送邮件和收件箱邮件回填"""
+    from .recall_index import create_recall_schema, subject_hash
+
+    create_recall_schema(cursor)
+
+    rows = cursor.execute(
+        """
+        SELECT message_id, from_addr, subject, date, recalled_at FROM sent_emails
+        WHERE is_recalled = 1
+        UNION ALL
+        SELECT message_id, from_addr, subject, date, recalled_at FROM emails
+        WHERE is_recalled = 1
+    """
+    ).fetchall()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO recall_tombstones "
+        "(message_id, from_addr, subject_hash, sent_at, recalled_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                message_id,
+                from_addr or "",
+                subject_hash(subject),
+                date,
+                recalled_at or datetime.datetime.now().isoformat(),
+            )
+            for message_id, from_addr, subject, date, recalled_at in rows
+        ],
+    )
+
+
+# 迁移步骤，按版本号顺序执行；已发布步骤的版本号和apply逻辑不可修改，只能追加新步骤。
+# 唯一的例外是为已发布步骤补充check：它不改变迁移结果，只在结果缺失时重新执行该步骤
+MIGRATIONS: List[Migration] = [
+    Migration(1, "创建收件人索引表email_recipients并回填", _create_email_recipients),
+    Migration(2, "规范化状态标志列中的NULL值", _normalize_flag_columns),
+    Migration(3, "创建列表查询与用户查找索引", _create_listing_indexes),
+    Migration(
+        4,
+        "创建邮件全文索引表email_fts",
+        _create_fulltext_index,
+        _fulltext_index_exists,
+    ),
+    Migration(5, "为每个收件人增加独立的邮件状态标志", _add_mailbox_flags),
+    Migration(6, "创建POP3客户端UIDL同步状态表pop3_sync_state", _create_sync_state),
+    Migration(7, "创建撤回记录表recall_tombstones并回填", _create_recall_tombstones),
+]
+
+
+class MigrationRunner:
+    """数据库迁移执行器"""
+
+    def __init__(self, db_connection, migrations: Optional[List[Migration]] = None):
+        """
+        初始化迁移执行器
+
+        Args:
+            db_connection: 数据库连接管理器（DatabaseConnection）
+            migrations: 迁移步骤列表，默认使用MIGRATIONS
+        """
+        self.db = db_connection
+        self.migrations = sorted(
+            migrations if migrations is not None else MIGRATIONS,
+            key=lambda m: m.version,
+        )
+
+    @staticmethod
+    def _ensure_version_table(cursor: sqlite3.Cursor) -> None:
+        """创建schema_version表"""
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT NOT NULL
+            )
+        """
+        )
+
+    @staticmethod
+    def _read_version(cursor: sqlite3.Cursor) -> int:
+        """读取当前已应用的最高版本号"""
+        row = cursor.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] or 0
+
+    def get_current_version(self) -> int:
+        """
+        获取当前数据库结构版本
+
+        Returns:
+            int: 已应用的最高迁移版本号，未迁移时为0
+        """
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            self._ensure_version_table(cursor)
+            conn.commit()
+            return self._read_version(cursor)
+        finally:
+            conn.close()
+
+    def get_pending_migrations(self) -> List[Migration]:
+        """
+        获取尚未应用的迁移步骤
+
+        Returns:
+            待执行的迁移列表
+        """
+        current = self.get_current_version()
+        return [m for m in self.migrations if m.version > current]
+
+    def migrate(self, target_version: Optional[int] = None) -> List[int]:
+        """
+        按顺序执行待应用的迁移，每个步骤在独立事务中执行；
+        已应用但检查未通过的步骤（见Migration.check）重新执行
+
+        Args:
+            target_version: 目标版本号，默认迁移到最新版本
+
+        Returns:
+            本次应用的版本号列表
+
+        Raises:
+            Exception: 迁移步骤失败时回滚该步骤并抛出
+        """
+        applied: List[int] = []
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            self._ensure_version_table(cursor)
+            conn.commit()
+
+            for migration in self.migrations:
+                if target_version is not None and migration.version > target_version:
+                    break
+
+                # 获取写锁后重新检查版本，避免多个进程重复执行同一步骤
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    if self._read_version(cursor) >= migration.version:
+                        if migration.check is None or migration.check(cursor):
+                            conn.rollback()
+                            continue
+                        # 版本已记录但结果缺失（如当时SQLite不支持FTS5），重新执行
+                        migration.apply(cursor)
+                        conn.commit()
+                        if migration.check(cursor):
+                            logger.info(
+                                f"已重新执行数据库迁移: "
+                                f"v{migration.version} {migration.description}"
+                            )
+                        continue
+
+                    migration.apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) "
+                        "VALUES (?, ?, ?)",
+                        (
+                            migration.version,
+                            migration.description,
+                            datetime.datetime.now().isoformat(),
+                        ),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    logger.error(
+                        f"数据库迁移失败: v{migration.version} {migration.description}"
+                    )
+                    raise
+
+                applied.append(migration.version)
+                logger.info(
+                    f"已应用数据库迁移: v{migration.version} {migration.description}"
+                )
+        finally:
+            conn.close()
+
+        return applied
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取迁移状态
+
+        Returns:
+            包含当前版本、最新版本和待执行迁移的字典
+        """
+        current = self.get_current_version()
+        latest = self.migrations[-1].version if self.migrations else 0
+        return {
+            "current_version": current,
+            "latest_version": latest,
+            "pending": [
+                {"version": m.version, "description": m.description}
+                for m in self.migrations
+                if m.version > current
+            ],
+        }
@@ -2,16 +2,21 @@
 邮件内容管理 - 专门负责邮件内容的存储和读取
 """
 
+import io
 import os
-import re
 import datetime
 import json
 import base64
-from typing import Optional, Dict, Any
+from typing import BinaryIO, Optional, Dict, Any, Union
 
 from common.utils import setup_logging
-from common.config import EMAIL_STORAGE_DIR
 from common.email_format_handler import EmailFormatHandler
+from .message_store import (
+    FlatMessageStore,
+    MessageStore,
+    create_message_store,
+    safe_filename,
+)
 
 # 设置日志
 logger = setup_logging("email_content_manager")
@@ -20,74 +25,88 @@ logger = setup_logging("email_content_manager")
 class EmailContentManager:
     """邮件内容管理器"""
 
-    def __init__(self):
-        """初始化邮件内容管理器"""
-        # 确保邮件存储目录存在
-        os.makedirs(EMAIL_STORAGE_DIR, exist_ok=True)
+    def __init__(self, store: Optional[MessageStore] = None):
+        """
+        初始化邮件内容管理器
+
+        Args:
+            store: 邮件内容存储后端，默认按配置创建
+        """
+        self.store = store or create_message_store()
+        # 迁移前写入的旧布局文件（根目录及inbox/sent子目录）仍然可以按文件名直接定位
+        self.legacy_stores = [
+            FlatMessageStore(os.path.join(self.store.root, sub_dir))
+            for sub_dir in ("", "inbox", "sent")
+        ]
         logger.info("邮件内容管理器已初始化")
 
     def save_content(
-        self, message_id: str, content: str, metadata: Optional[Dict[str, Any]] = None
+        self,
+        message_id: str,
+        content: Union[str, bytes, BinaryIO],
+        metadata: Optional[Dict[str, Any]] = None,
+        normalize: bool = True,
     ) -> Optional[str]:
         """
         保存邮件内容，使用统一的EmailFormatHandler
 
         Args:
             message_id: 邮件ID
-            content: 邮件内容
+            content: 邮件内容（字符串、原始字节或二进制文件对象；文件对象在
+                normalize为False时按块写入，不整体读入内存）
             metadata: 邮件元数据（用于补充头部信息）
+            normalize: 是否解析并重新格式化内容；调用方已保证格式完整时传False，原样写入
 
         Returns:
             保存的文件路径，失败返回None
         """
         try:
-            # 确保存储目录存在
-            os.makedirs(EMAIL_STORAGE_DIR, exist_ok=True)
+            if hasattr(content, "read"):
+                if not normalize:
+                    filepath = self.store.write_stream(message_id, content)
+                    logger.info("已保存邮件内容: %s", filepath)
+                    return filepath
+                content = content.read()
 
             # 1. 使用EmailFormatHandler统一处理邮件格式
-            from common.email_format_handler import EmailFormatHandler
-
-            # 如果有元数据，用它来完善邮件内容
-            if metadata:
-                # 先尝试解析现有内容
-                try:
-                    email_obj = EmailFormatHandler.parse_email_content(content)
-                    # 用元数据补充缺失的字段
-                    if metadata.get("from_addr") and (
-                        not email_obj.from_addr
-                        or email_obj.from_addr.address in ["unknown@localhost", ""]
-                    ):
-                        from common.models import EmailAddress
-
-                        email_obj.from_addr = EmailAddress("", metadata["from_addr"])
-                    if metadata.get("subject") and not email_obj.subject:
-                        email_obj.subject = metadata["subject"]
-                    if metadata.get("message_id") and not email_obj.message_id:
-                        email_obj.message_id = metadata["message_id"]
-
-                    # 重新格式化内容
-                    content = EmailFormatHandler.format_email_for_storage(email_obj)
-                except Exception as e:
-                    logger.warning(f"解析邮件失败，使用原始内容: {e}")
-                    # 如果解析失败，确保格式正确
-                    content = EmailFormatHandler.ensure_proper_format(content, metadata)
-            else:
-                # 没有元数据，直接确保格式正确
-                content = EmailFormatHandler.ensure_proper_format(content)
-
-            # 2. 生成安全的文件名
-            safe_filename = self._generate_safe_filename(message_id)
-            filepath = os.path.join(EMAIL_STORAGE_DIR, f"{safe_filename}.eml")
-
-            # 3. 如果文件已存在，可能需要覆盖或跳过
-            if os.path.exists(filepath):
-                logger.debug(f"邮件文件已存在，将覆盖: {filepath}")
+            # 调用方已保证内容完整时（如接收流水线中的原始DATA）原样写入，不再重复解析
+            if normalize:
+                # 如果有元数据，用它来完善邮件内容
+                if metadata:
+                    # 先尝试解析现有内容
+                    try:
+                        email_obj = EmailFormatHandler.parse_email_content(content)
+                        # 用元数据补充缺失的字段
+                        if metadata.get("from_addr") and (
+                            not email_obj.from_addr
+                            or email_obj.from_addr.address in ["unknown@localhost", ""]
+                        ):
+                            from common.models import EmailAddress
+
+                            email_obj.from_addr = EmailAddress(
+                                "", metadata["from_addr"]
+                            )
+                        if metadata.get("subject") and not email_obj.subject:
+                            email_obj.subject = metadata["subject"]
+                        if metadata.get("message_id") and not email_obj.message_id:
+                            email_obj.message_id = metadata["message_id"]
+
+                        # 重新格式化内容
+                        content = EmailFormatHandler.format_email_for_storage(email_obj)
+                    except Exception as e:
+                        logger.warning(f"解析邮件失败，使用原始内容: {e}")
+                        # 如果解析失败，确保格式正确
+                        content = EmailFormatHandler.ensure_proper_format(
+                            content, metadata
+                        )
+                else:
+                    # 没有元数据，直接确保格式正确
+                    content = EmailFormatHandler.ensure_proper_format(content)
 
-            # 4. 保存内容
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(content)
+            # 2. 原子写入存储后端（已存在时整体替换）
+            filepath = self.store.write(message_id, content)
 
-            logger.info(f"已保存邮件内容: {filepath}")
+            logger.info("已保存邮件内容: %s", filepath)
             return filepath
 
         except Exception as e:
@@ -119,7 +138,7 @@ class EmailContentManager:
                 return content
 
             # 3. 如果格式有问题，尝试修复
-            logger.debug(f"邮件格式需要修复: {message_id}")
+            logger.debug("邮件格式需要修复: %s", message_id)
             if metadata:
                 fixed_content = self._build_complete_email_content(metadata, content)
                 return EmailFormatHandler.ensure_proper_format(fixed_content)
@@ -133,20 +152,41 @@ class EmailContentManager:
     def _extract_message_id(self, content: str) -> Optional[str]:
         """从邮件内容中提取Message-ID，使用统一的EmailFormatHandler"""
         try:
-            # 使用统一的邮件格式处理器解析
-            email_obj = EmailFormatHandler.parse_email_content(content)
-            return email_obj.message_id
+            # 只需要Message-ID，只解析头部块
+            return EmailFormatHandler.parse_headers_fast(content).message_id
         except Exception:
             return None
 
     def _generate_safe_filename(self, message_id: str) -> str:
         """生成安全的文件名"""
-        # 标准化处理：移除两端空格，去掉<>，@替换为_at_
-        safe_id = message_id.strip().strip("<>").replace("@", "_at_")
-        # 移除Windows文件系统不允许的字符
-        safe_id = re.sub(r'[\\/*?:"<>|]', "_", safe_id)
-        # 确保没有前导或尾随空格
-        return safe_id.strip()
+        return safe_filename(message_id)
+
+    def resolve_path(
+        self, message_id: str, content_path: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        定位邮件内容文件，只检查计算出的候选路径，不列目录
+
+        Args:
+            message_id: 邮件ID
+            content_path: 数据库中记录的内容路径，优先使用
+
+        Returns:
+            文件路径，找不到时返回None
+        """
+        if content_path and os.path.exists(content_path):
+            return content_path
+
+        path = self.store.locate(message_id)
+        if path:
+            return path
+
+        for store in self.legacy_stores:
+            path = store.locate(message_id)
+            if path:
+                logger.debug("使用旧布局中的邮件文件: %s", path)
+                return path
+        return None
 
     def _ensure_proper_email_format_with_metadata(
         self, content: str, message_id: str, metadata: Dict[str, Any]
@@ -238,7 +278,7 @@ class EmailContentManager:
                 needs_update = True
 
             if needs_update:
-                logger.debug(f"补充邮件头部: {message_id}")
+                logger.debug("补充邮件头部: %s", message_id)
                 return str(msg)
             else:
                 return content
@@ -251,48 +291,71 @@ class EmailContentManager:
         self, message_id: str, metadata: Optional[Dict[str, Any]] = None
     ) -> Optional[str]:
         """尝试加载邮件内容"""
-        # 1. 尝试使用metadata中的content_path
-        if metadata and metadata.get("content_path"):
-            content = self._load_from_path(metadata["content_path"])
-            if content:
-                return content
-
-        # 2. 尝试使用标准化的ID查找文件
-        safe_filename = self._generate_safe_filename(message_id)
-        filepath = os.path.join(EMAIL_STORAGE_DIR, f"{safe_filename}.eml")
-        content = self._load_from_path(filepath)
-        if content:
-            return content
-
-        # 3. 尝试搜索包含类似ID的文件
-        return self._search_similar_files(message_id)
+        content_path = metadata.get("content_path") if metadata else None
+        filepath = self.resolve_path(message_id, content_path)
+        if not filepath:
+            return None
+        return self._load_from_path(filepath)
 
     def _load_from_path(self, filepath: str) -> Optional[str]:
         """从指定路径加载内容"""
         try:
             if os.path.exists(filepath):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    return f.read()
+                return self.read_text(filepath)
         except Exception as e:
             logger.error(f"读取文件时出错: {filepath}, {e}")
         return None
 
-    def _search_similar_files(self, message_id: str) -> Optional[str]:
-        """搜索包含类似ID的文件"""
-        try:
-            # 提取ID的关键部分进行模糊匹配
-            clean_id = message_id.strip("<>").split("@")[0]
-
-            for filename in os.listdir(EMAIL_STORAGE_DIR):
-                if filename.endswith(".eml") and clean_id in filename:
-                    filepath = os.path.join(EMAIL_STORAGE_DIR, filename)
-                    content = self._load_from_path(filepath)
-                    if content:
-                        logger.debug(f"通过模糊匹配找到邮件文件: {filepath}")
-                        return content
-        except Exception as e:
-            logger.error(f"搜索类似文件时出错: {e}")
-        return None
+    def open_raw(self, filepath: str) -> BinaryIO:
+        """
+        以二进制方式打开邮件文件，压缩或去重存储的内容会被透明还原
+
+        Args:
+            filepath: 邮件文件路径
+
+        Returns:
+            二进制文件对象（由调用方关闭）
+        """
+        return self.store.open_file(filepath)
+
+    def content_size(self, filepath: str) -> int:
+        """
+        计算已保存邮件的原始字节数（即POP3 RETR实际发送的内容大小）
+
+        Args:
+            filepath: 邮件文件路径
+
+        Returns:
+            原始邮件字节数
+        """
+        return self.store.content_size(filepath)
+
+    def read_raw(self, filepath: str) -> bytes:
+        """
+        读取邮件文件的原始字节，压缩或去重存储的内容会被透明还原
+
+        Args:
+            filepath: 邮件文件路径
+
+        Returns:
+            原始邮件字节
+        """
+        return self.store.read_file(filepath)
+
+    def read_text(self, filepath: str) -> str:
+        """
+        以文本方式读取邮件文件（UTF-8，统一换行符）
+
+        Args:
+            filepath: 邮件文件路径
+
+        Returns:
+            邮件内容
+        """
+        with io.TextIOWrapper(
+            self.open_raw(filepath), encoding="utf-8", errors="replace"
+        ) as f:
+            return f.read()
 
     def _has_proper_email_headers(self, content: str) -> bool:
         """
@@ -311,7 +374,8 @@ class EmailContentManager:
         if not content:
             return False
 
-        lines = content.split("\n")
+        # 只检查前20行（向后最多再看4行），不拆分整个正文
+        lines = content.split("\n", 25)[:25]
         has_headers = False
         header_format_correct = True
         header_count = 0
@@ -6,10 +6,12 @@ import os
 import json
 import datetime
 import re
-from typing import List, Dict, Optional, Any
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from email.utils import parseaddr
+from typing import List, Dict, Optional, Any, Set, Tuple
 
 from common.utils import setup_logging
-from common.config import EMAIL_STORAGE_DIR
+from common.config import EMAIL_STORAGE_DIR, DB_WRITE_BATCH_TIMEOUT
 from .db_connection import DatabaseConnection
 from .db_models import EmailRecord, SentEmailRecord
 
@@ -20,16 +22,163 @@ logger = setup_logging("email_repository")
 class EmailRepository:
     """邮件数据仓储类"""
 
-    def __init__(self, db_connection: DatabaseConnection):
+    # 每个收件人在email_recipients中独立保存的状态标志
+    MAILBOX_FLAGS = ("is_read", "is_deleted", "is_spam")
+    # 按用户查询时从emails表读取的其余列
+    EMAIL_COLUMNS = (
+        "message_id",
+        "from_addr",
+        "to_addrs",
+        "subject",
+        "date",
+        "size",
+        "spam_score",
+        "content_path",
+        "is_recalled",
+        "recalled_at",
+        "recalled_by",
+    )
+
+    def __init__(self, db_connection: DatabaseConnection, write_batcher=None):
         """
         初始化邮件仓储
 
         Args:
             db_connection: 数据库连接管理器
+            write_batcher: 可选的WriteBatcher，提供时新邮件通过组提交写入
         """
         self.db = db_connection
+        self.write_batcher = write_batcher
         logger.info("邮件仓储已初始化")
 
+    @property
+    def recall_index(self):
+        """撤回索引（首次使用时创建，进程内按数据库共享）"""
+        from .recall_index import get_recall_index
+
+        return get_recall_index(self.db)
+
+    @staticmethod
+    def normalize_address(address: Any) -> Optional[str]:
+        """
+        规范化邮件地址：提取纯地址部分并转为小写
+
+        Args:
+            address: 地址字符串（可带显示名）或包含address/email键的字典
+
+        Returns:
+            规范化后的地址，无法提取时返回None
+        """
+        if isinstance(address, dict):
+            address = address.get("address") or address.get("email") or ""
+        if not address:
+            return None
+
+        _, addr = parseaddr(str(address))
+        addr = (addr or str(address)).strip().strip("<>").lower()
+        return addr or None
+
+    @classmethod
+    def build_recipient_rows(
+        cls, message_id: str, from_addr: Any, to_addrs: Any
+    ) -> List[Tuple[str, str, str]]:
+        """
+        生成email_recipients表的行数据
+
+        Args:
+            message_id: 邮件ID
+            from_addr: 发件人地址
+            to_addrs: 收件人列表（列表或JSON字符串）
+
+        Returns:
+            (message_id, address, role)元组列表
+        """
+        if isinstance(to_addrs, str):
+            try:
+                to_addrs = json.loads(to_addrs)
+            except (json.JSONDecodeError, ValueError):
+                to_addrs = to_addrs.split(",")
+        if not isinstance(to_addrs, list):
+            to_addrs = [to_addrs] if to_addrs else []
+
+        rows = []
+        seen = set()
+        for role, values in (("to", to_addrs), ("from", [from_addr])):
+            for value in values:
+                addr = cls.normalize_address(value)
+                if addr and (addr, role) not in seen:
+                    seen.add((addr, role))
+                    rows.append((message_id, addr, role))
+        return rows
+
+    def _build_email_filters(
+        self,
+        user_email: Optional[str] = None,
+        include_deleted: bool = False,
+        include_spam: bool = False,
+        include_recalled: bool = False,
+        is_spam: Optional[bool] = None,
+        unread_only: bool = False,
+    ) -> Tuple[str, str, List[Any]]:
+        """
+        构建邮件列表/计数/邮箱快照共用的FROM和WHERE子句
+
+        指定用户时从收件人索引表连接emails（收件人或发件人），已读、删除和垃圾邮件
+        状态使用该用户自己的标志；不指定用户时使用emails表上的状态。
+
+        Returns:
+            (FROM子句, WHERE子句, 参数列表)，emails表的别名为e
+        """
+        params: List[Any] = []
+
+        if user_email:
+            source = "email_recipients r JOIN emails e ON e.message_id = r.message_id"
+            where = "r.address = ?"
+            params.append(self.normalize_address(user_email) or user_email)
+            flags = "r"
+        else:
+            source = "emails e"
+            where = "1=1"
+            flags = "e"
+
+        # 删除状态过滤
+        if not include_deleted:
+            where += f" AND {flags}.is_deleted = 0"
+
+        # 撤回状态过滤 - 默认隐藏已撤回邮件（撤回对所有收件人生效）
+        if not include_recalled:
+            where += " AND e.is_recalled = 0"
+
+        # 垃圾邮件过滤
+        if not include_spam:
+            where += f" AND {flags}.is_spam = 0"
+
+        # is_spam 过滤条件
+        if is_spam is not None:
+            where += f" AND {flags}.is_spam = ?"
+            params.append(1 if is_spam else 0)  # SQLite用1/0表示布尔
+
+        if unread_only:
+            where += f" AND {flags}.is_read = 0"
+
+        return source, where, params
+
+    def _email_columns(self, user_email: Optional[str]) -> Tuple[str, str]:
+        """
+        按用户查询时的列和分组子句
+
+        同一用户可能同时以收件人和发件人身份出现（两行索引记录，标志保持一致），
+        按message_id分组后每封邮件只返回一行。
+
+        Returns:
+            (SELECT列, GROUP BY子句)
+        """
+        if not user_email:
+            return "e.*", ""
+        columns = [f"e.{column}" for column in self.EMAIL_COLUMNS]
+        columns += [f"MAX(r.{flag}) AS {flag}" for flag in self.MAILBOX_FLAGS]
+        return ", ".join(columns), " GROUP BY e.message_id"
+
     def create_email(self, email_record: EmailRecord) -> bool:
         """
         创建新邮件记录
@@ -50,13 +199,47 @@ class EmailRepository:
             data["is_deleted"] = 1 if data["is_deleted"] else 0
             data["is_spam"] = 1 if data["is_spam"] else 0
 
-            # 插入数据
-            success = self.db.execute_insert("emails", data)
+            # 邮件记录与收件人索引在同一事务中写入
+            columns = ", ".join(data.keys())
+            placeholders = ", ".join(["?" for _ in data])
+            recipient_rows = self.build_recipient_rows(
+                email_record.message_id,
+                email_record.from_addr,
+                email_record.to_addrs,
+            )
+            # 每个收件人一行邮箱记录，内容和emails行只写一份
+            flags = tuple(data[flag] for flag in self.MAILBOX_FLAGS)
+            statements = [
+                (
+                    f"INSERT OR IGNORE INTO emails ({columns}) VALUES ({placeholders})",
+                    tuple(data.values()),
+                ),
+                (
+                    "INSERT OR IGNORE INTO email_recipients "
+                    "(message_id, address, role, is_read, is_deleted, is_spam) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [row + flags for row in recipient_rows],
+                ),
+            ]
+
+            if self.write_batcher is not None:
+                # 等待包含本邮件的批次提交后再返回，持久化语义与直接写入一致
+                success = self.write_batcher.submit(statements).result(
+                    timeout=DB_WRITE_BATCH_TIMEOUT
+                )
+            else:
+                success = self.db.execute_transaction(statements)
 
             if success:
-                logger.info(f"已创建邮件记录: {email_record.message_id}")
+                logger.info("已创建邮件记录: %s", email_record.message_id)
 
             return success
+        except FutureTimeoutError:
+            logger.error(
+                f"等待批量提交超时（{DB_WRITE_BATCH_TIMEOUT}秒）: "
+                f"{email_record.message_id}"
+            )
+            return False
         except Exception as e:
             logger.error(f"创建邮件记录时出错: {e}")
             return False
@@ -111,51 +294,14 @@ class EmailRepository:
         """
         try:
             # 构建查询
-            query = "SELECT * FROM emails WHERE 1=1"
-            params = []
-
-            # 用户过滤
-            if user_email:
-                query += """ AND (
-                    to_addrs LIKE ? OR
-                    to_addrs LIKE ? OR
-                    to_addrs LIKE ? OR
-                    to_addrs LIKE ? OR
-                    to_addrs LIKE ? OR
-                    from_addr = ? OR
-                    from_addr LIKE ?
-                )"""
-                params.extend(
-                    [
-                        f'%"address":"{user_email}"%',
-                        f'%"{user_email}"%',
-                        f"%<{user_email}>%",
-                        f"%{user_email}%",
-                        f'%"email":"{user_email}"%',
-                        user_email,
-                        f"%{user_email}%",
-                    ]
-                )
-
-            # 删除状态过滤
-            if not include_deleted:
-                query += " AND (is_deleted = 0 OR is_deleted IS NULL)"
-
-            # 撤回状态过滤 - 默认隐藏已撤回邮件
-            if not include_recalled:
-                query += " AND (is_recalled = 0 OR is_recalled IS NULL)"
-
-            # 垃圾邮件过滤
-            if not include_spam:
-                query += " AND (is_spam = 0 OR is_spam IS NULL)"
-
-            # is_spam 过滤条件
-            if is_spam is not None:
-                query += " AND is_spam = ?"
-                params.append(1 if is_spam else 0)  # SQLite用1/0表示布尔
+            source, where, params = self._build_email_filters(
+                user_email, include_deleted, include_spam, include_recalled, is_spam
+            )
+            columns, group_by = self._email_columns(user_email)
+            query = f"SELECT {columns} FROM {source} WHERE {where}{group_by}"
 
             # 排序和分页
-            query += " ORDER BY date DESC LIMIT ? OFFSET ?"
+            query += " ORDER BY e.date DESC LIMIT ? OFFSET ?"
             params.extend([limit, offset])
 
             # 执行查询
@@ -176,12 +322,209 @@ class EmailRepository:
             logger.error(f"获取邮件列表时出错: {e}")
             return []
 
-    def update_email_status(self, message_id: str, **status_updates) -> bool:
+    def count_emails(
+        self,
+        user_email: Optional[str] = None,
+        include_deleted: bool = False,
+        include_spam: bool = False,
+        include_recalled: bool = False,
+        is_spam: Optional[bool] = None,
+        unread_only: bool = False,
+    ) -> int:
+        """
+        统计邮件数量（与list_emails使用相同的过滤条件）
+
+        Args:
+            user_email: 用户邮箱
+            include_deleted: 是否包含已删除的邮件
+            include_spam: 是否包含垃圾邮件
+            include_recalled: 是否包含已撤回的邮件
+            is_spam: 垃圾邮件过滤
+            unread_only: 是否只统计未读邮件
+
+        Returns:
+            int: 邮件数量
+        """
+        try:
+            source, where, params = self._build_email_filters(
+                user_email,
+                include_deleted,
+                include_spam,
+                include_recalled,
+                is_spam,
+                unread_only,
+            )
+            count = "COUNT(DISTINCT e.message_id)" if user_email else "COUNT(*)"
+
+            result = self.db.execute_query(
+                f"SELECT {count} AS total FROM {source} WHERE {where}",
+                tuple(params),
+                fetch_one=True,
+            )
+            return result["total"] if result else 0
+        except Exception as e:
+            logger.error(f"统计邮件数量时出错: {e}")
+            return 0
+
+    def list_maildrop(self, user_email: str) -> List[Tuple[str, int, Optional[str]]]:
+        """
+        获取POP3会话快照所需的最少字段（排序与list_emails一致，不分页）
+
+        Args:
+            user_email: 用户邮箱
+
+        Returns:
+            (message_id, size, content_path)列表
+        """
+        try:
+            source, where, params = self._build_email_filters(
+                user_email, False, False, False, None
+            )
+            _, group_by = self._email_columns(user_email)
+            results = self.db.execute_query(
+                f"SELECT e.message_id, e.size, e.content_path FROM {source} "
+                f"WHERE {where}{group_by} ORDER BY e.date DESC",
+                tuple(params),
+                fetch_all=True,
+            )
+            return [
+                (row["message_id"], row["size"] or 0, row["content_path"])
+                for row in results
+            ]
+        except Exception as e:
+            logger.error(f"获取邮箱快照时出错: {e}")
+            return []
+
+    def get_deleted_message_ids(self, user_email: str) -> Set[str]:
+        """
+        获取用户已删除的邮件ID集合（只读取收件人索引，不加载邮件记录）
+
+        Args:
+            user_email: 用户邮箱
+
+        Returns:
+            已删除邮件的message_id集合
+        """
+        try:
+            results = self.db.execute_query(
+                "SELECT message_id FROM email_recipients "
+                "WHERE address = ? AND is_deleted = 1",
+                (self.normalize_address(user_email) or user_email,),
+                fetch_all=True,
+            )
+            return {row["message_id"] for row in results}
+        except Exception as e:
+            logger.error(f"获取已删除邮件列表时出错: {e}")
+            return set()
+
+    def mark_emails_deleted(
+        self, message_ids: List[str], user_email: Optional[str] = None
+    ) -> bool:
+        """
+        在单个事务中批量标记邮件为已删除
+
+        Args:
+            message_ids: 邮件ID列表
+            user_email: 指定时只删除该用户邮箱中的邮件，其他收件人不受影响
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not message_ids:
+            return True
+        try:
+            if user_email:
+                address = self.normalize_address(user_email) or user_email
+                statements = [
+                    (
+                        "UPDATE email_recipients SET is_deleted = 1 "
+                        "WHERE message_id = ? AND address = ?",
+                        [(message_id, address) for message_id in message_ids],
+                    )
+                ]
+            else:
+                statements = [
+                    (
+                        f"UPDATE {table} SET is_deleted = 1 WHERE message_id = ?",
+                        [(message_id,) for message_id in message_ids],
+                    )
+                    for table in ("emails", "email_recipients")
+                ]
+            success = self.db.execute_transaction(statements)
+            if success:
+                logger.info("已批量标记删除 %s 封邮件", len(message_ids))
+            return success
+        except Exception as e:
+            logger.error(f"批量标记删除邮件时出错: {e}")
+            return False
+
+    def update_content_paths(
+        self, updates: List[Tuple[str, str]], sent: bool = False
+    ) -> bool:
+        """
+        在单个事务中批量更新邮件内容路径（存储迁移后使用）
+
+        Args:
+            updates: (message_id, content_path)列表
+            sent: 是否为已发送邮件
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not updates:
+            return True
+        table = "sent_emails" if sent else "emails"
+        try:
+            return self.db.execute_transaction(
+                [
+                    (
+                        f"UPDATE {table} SET content_path = ? WHERE message_id = ?",
+                        [(path, message_id) for message_id, path in updates],
+                    )
+                ]
+            )
+        except Exception as e:
+            logger.error(f"批量更新邮件内容路径时出错: {e}")
+            return False
+
+    def get_mailbox_flags(
+        self, message_id: str, user_email: str
+    ) -> Optional[Dict[str, bool]]:
+        """
+        获取邮件在指定用户邮箱中的状态标志
+
+        Args:
+            message_id: 邮件ID
+            user_email: 用户邮箱
+
+        Returns:
+            {is_read, is_deleted, is_spam}字典，用户不是收件人或发件人时返回None
+        """
+        try:
+            columns = ", ".join(f"MAX({flag}) AS {flag}" for flag in self.MAILBOX_FLAGS)
+            result = self.db.execute_query(
+                f"SELECT COUNT(*) AS total, {columns} FROM email_recipients "
+                "WHERE message_id = ? AND address = ?",
+                (message_id, self.normalize_address(user_email) or user_email),
+                fetch_one=True,
+            )
+            if not result or not result["total"]:
+                return None
+            return {flag: bool(result[flag]) for flag in self.MAILBOX_FLAGS}
+        except Exception as e:
+            logger.error(f"获取邮箱状态标志时出错: {e}")
+            return None
+
+    def update_email_status(
+        self, message_id: str, user_email: Optional[str] = None, **status_updates
+    ) -> bool:
         """
         更新邮件状态
 
         Args:
             message_id: 邮件ID
+            user_email: 指定时已读/删除/垃圾邮件标志只对该用户生效，
+                不指定时同时更新所有收件人
             **status_updates: 状态更新字典（is_read, is_deleted, is_spam等）
 
         Returns:
@@ -211,12 +554,35 @@ class EmailRepository:
                 logger.warning("没有有效的状态更新字段")
                 return False
 
-            success = self.db.execute_update(
-                "emails", data, "message_id = ?", (message_id,)
-            )
+            mailbox = {k: v for k, v in data.items() if k in self.MAILBOX_FLAGS}
+            if user_email:
+                # 用户自己的标志写入收件人索引表，其余字段（如撤回）仍写入emails
+                data = {k: v for k, v in data.items() if k not in mailbox}
+
+            statements = []
+            if data:
+                set_clause = ", ".join(f"{key} = ?" for key in data)
+                statements.append(
+                    (
+                        f"UPDATE emails SET {set_clause} WHERE message_id = ?",
+                        tuple(data.values()) + (message_id,),
+                    )
+                )
+            if mailbox:
+                set_clause = ", ".join(f"{key} = ?" for key in mailbox)
+                where = "message_id = ?"
+                params = tuple(mailbox.values()) + (message_id,)
+                if user_email:
+                    where += " AND address = ?"
+                    params += (self.normalize_address(user_email) or user_email,)
+                statements.append(
+                    (f"UPDATE email_recipients SET {set_clause} WHERE {where}", params)
+                )
+
+            success = self.db.execute_transaction(statements)
 
             if success:
-                logger.info(f"已更新邮件状态: {message_id}")
+                logger.info("已更新邮件状态: %s", message_id)
 
             return success
         except Exception as e:
@@ -234,10 +600,15 @@ class EmailRepository:
             bool: 操作是否成功
         """
         try:
-            success = self.db.execute_delete("emails", "message_id = ?", (message_id,))
+            success = self.db.execute_transaction(
+                [
+                    ("DELETE FROM email_recipients WHERE message_id = ?", (message_id,)),
+                    ("DELETE FROM emails WHERE message_id = ?", (message_id,)),
+                ]
+            )
 
             if success:
-                logger.info(f"已删除邮件记录: {message_id}")
+                logger.info("已删除邮件记录: %s", message_id)
 
             return success
         except Exception as e:
@@ -279,7 +650,7 @@ class EmailRepository:
             success = self.db.execute_insert("sent_emails", data)
 
             if success:
-                logger.info(f"已创建已发送邮件记录: {sent_email_record.message_id}")
+                logger.info("已创建已发送邮件记录: %s", sent_email_record.message_id)
 
             return success
         except Exception as e:
@@ -340,23 +711,25 @@ class EmailRepository:
 
             # 发件人过滤 - 支持模糊匹配，以处理"显示名 <邮箱>"格式
             if from_addr:
-                logger.debug(f"LIST_SENT_EMAILS: Filtering by from_addr: '{from_addr}'")
+                logger.debug(
+                    "LIST_SENT_EMAILS: Filtering by from_addr: '%s'", from_addr
+                )
                 # 同时支持精确匹配和包含匹配
                 query += " AND (from_addr = ? OR from_addr LIKE ?)"
                 params.extend([from_addr, f"%{from_addr}%"])
 
             # 垃圾邮件过滤
             if not include_spam:
-                query += " AND (is_spam = 0 OR is_spam IS NULL)"
+                query += " AND is_spam = 0"
             elif is_spam is not None:
                 if is_spam:
                     query += " AND is_spam = 1"
                 else:
-                    query += " AND (is_spam = 0 OR is_spam IS NULL)"
+                    query += " AND is_spam = 0"
 
             # 撤回状态过滤 - 默认隐藏已撤回邮件
             if not include_recalled:
-                query += " AND (is_recalled = 0 OR is_recalled IS NULL)"
+                query += " AND is_recalled = 0"
 
             # 排序和分页
             query += " ORDER BY date DESC LIMIT ? OFFSET ?"
@@ -403,7 +776,7 @@ class EmailRepository:
             )
 
             if success:
-                logger.info(f"已删除已发送邮件记录: {message_id}")
+                logger.info("已删除已发送邮件记录: %s", message_id)
 
             return success
         except Exception as e:
@@ -464,9 +837,9 @@ class EmailRepository:
 
                     # 添加删除和垃圾邮件过滤
                     if not include_deleted:
-                        sql_query += " AND (is_deleted = 0 OR is_deleted IS NULL)"
+                        sql_query += " AND is_deleted = 0"
                     if not include_spam:
-                        sql_query += " AND (is_spam = 0 OR is_spam IS NULL)"
+                        sql_query += " AND is_spam = 0"
 
                     # 添加排序和限制
                     sql_query += " ORDER BY date DESC LIMIT ?"
@@ -498,7 +871,7 @@ class EmailRepository:
 
                     # 垃圾邮件过滤
                     if not include_spam:
-                        sql_query += " AND (is_spam = 0 OR is_spam IS NULL)"
+                        sql_query += " AND is_spam = 0"
 
                     # 添加排序和限制
                     sql_query += " ORDER BY date DESC LIMIT ?"
@@ -559,7 +932,7 @@ class EmailRepository:
             )
 
             if success:
-                logger.info(f"已更新已发送邮件状态: {message_id}")
+                logger.info("已更新已发送邮件状态: %s", message_id)
 
             return success
         except Exception as e:
@@ -603,7 +976,8 @@ class EmailRepository:
             success = emails_success or sent_emails_success
 
             if success:
-                logger.info(f"邮件已撤回: {message_id} by {recalled_by}")
+                self._record_recall(message_id)
+                logger.info("邮件已撤回: %s by %s", message_id, recalled_by)
             else:
                 logger.warning(f"邮件撤回失败，可能邮件不存在: {message_id}")
 
@@ -613,6 +987,26 @@ class EmailRepository:
             logger.error(f"撤回邮件时出错: {e}")
             return False
 
+    def _record_recall(self, message_id: str) -> None:
+        """把撤回的邮件写入撤回索引，收件时据此跳过已撤回的邮件"""
+        row = None
+        for table in ("sent_emails", "emails"):
+            row = self.db.execute_query(
+                f"SELECT from_addr, subject, date FROM {table} WHERE message_id = ?",
+                (message_id,),
+                fetch_one=True,
+            )
+            if row:
+                break
+        if not row:
+            return
+
+        try:
+            sent_at = datetime.datetime.fromisoformat(row["date"])
+        except (TypeError, ValueError):
+            sent_at = None
+        self.recall_index.record(message_id, row["from_addr"], row["subject"], sent_at)
+
     def can_recall_email(self, message_id: str, user_email: str) -> Dict[str, Any]:
         """
         检查邮件是否可以撤回
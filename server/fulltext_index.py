@@ -0,0 +1,481 @@
+"""
+全文索引模块 - 基于SQLite FTS5的邮件主题、正文、地址和附件名全文检索
+
+email_fts使用trigram分词器，可以对中文等不分词的文本做任意子串检索；
+email_fts_docs把(message_id, 类型)映射为稳定的文档编号，作为email_fts的rowid，
+更新或删除单封邮件的索引时不需要扫描全文表。
+"""
+
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.utils import setup_logging
+from common.models import Email
+from .email_repository import EmailRepository
+
+# 设置日志
+logger = setup_logging("fulltext_index")
+
+# 邮件类型（与搜索结果中的type字段一致）
+FOLDER_RECEIVED = "received"
+FOLDER_SENT = "sent"
+
+# 索引列（顺序与bm25权重、snippet列号对应）
+FTS_COLUMNS = ("subject", "body", "html", "names", "attachments")
+# bm25列权重：主题命中最重要，其次是地址和附件名
+BM25_WEIGHTS = (10.0, 1.0, 1.0, 5.0, 3.0)
+
+# trigram分词器只能用MATCH检索至少3个字符的词
+MIN_MATCH_TERM_LENGTH = 3
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def create_fulltext_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    创建全文索引表（幂等）
+
+    Args:
+        cursor: 数据库游标
+
+    Raises:
+        sqlite3.OperationalError: SQLite未编译FTS5或不支持trigram分词器
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_fts_docs (
+            doc_id INTEGER PRIMARY KEY,
+            message_id TEXT NOT NULL,
+            folder TEXT NOT NULL,
+            UNIQUE (message_id, folder)
+        )
+    """
+    )
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS email_fts
+        USING fts5({", ".join(FTS_COLUMNS)}, tokenize = 'trigram')
+    """
+    )
+
+
+def html_to_text(html: str) -> str:
+    """
+    去除HTML标签，返回可检索的纯文本
+
+    Args:
+        html: HTML内容
+
+    Returns:
+        纯文本
+    """
+    if not html:
+        return ""
+    try:
+        from bs4 import BeautifulSoup
+
+        text = BeautifulSoup(html, "html.parser").get_text(" ")
+    except ImportError:
+        # 如果没有BeautifulSoup，使用简单的HTML标签移除
+        text = _HTML_TAG_RE.sub(" ", html)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def build_search_document(
+    email_obj: Email, plain_text: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    根据已解析的邮件构建全文索引文档
+
+    Args:
+        email_obj: 解析后的Email对象
+        plain_text: 已经提取好的纯文本正文（如接收流水线中的结果），
+            默认使用email_obj.text_content
+
+    Returns:
+        以FTS_COLUMNS为键的字典
+    """
+    body = plain_text if plain_text is not None else email_obj.text_content or ""
+
+    # HTML部分与纯文本部分内容相同时（multipart/alternative）不重复索引
+    html = html_to_text(email_obj.html_content or "")
+    if html and _WHITESPACE_RE.sub(" ", body).strip() == html:
+        html = ""
+
+    names = []
+    addresses = [email_obj.from_addr] if email_obj.from_addr else []
+    addresses += list(email_obj.to_addrs or []) + list(email_obj.cc_addrs or [])
+    for addr in addresses:
+        if addr.name:
+            names.append(addr.name)
+        if addr.address:
+            names.append(addr.address)
+
+    return {
+        "subject": email_obj.subject or "",
+        "body": body,
+        "html": html,
+        "names": " ".join(names),
+        "attachments": " ".join(
+            att.filename for att in email_obj.attachments or [] if att.filename
+        ),
+    }
+
+
+def build_basic_document(
+    subject: str, content: str, from_addr: Any, to_addrs: Any
+) -> Dict[str, str]:
+    """
+    没有解析结果时，根据保存接口的参数构建索引文档（不包含附件名）
+
+    Args:
+        subject: 主题
+        content: 纯文本正文
+        from_addr: 发件人
+        to_addrs: 收件人（字符串或列表）
+
+    Returns:
+        以FTS_COLUMNS为键的字典
+    """
+    if isinstance(to_addrs, str):
+        to_addrs = [to_addrs]
+    names = [str(from_addr or "")] + [str(addr) for addr in to_addrs or []]
+    return {
+        "subject": subject or "",
+        "body": content or "",
+        "html": "",
+        "names": " ".join(name for name in names if name),
+        "attachments": "",
+    }
+
+
+def parse_query(query: str) -> Tuple[Optional[str], List[str]]:
+    """
+    把用户输入转换为FTS5查询
+
+    每个空白分隔的词都按短语处理（双引号转义，不解释FTS5语法），多个词之间为AND；
+    少于3个字符的词无法使用trigram索引，单独返回，由调用方用LIKE匹配。
+
+    Args:
+        query: 用户输入的搜索词
+
+    Returns:
+        (MATCH表达式或None, 短词列表)
+    """
+    match_terms = []
+    short_terms = []
+    for term in query.split():
+        if len(term) >= MIN_MATCH_TERM_LENGTH:
+            match_terms.append('"' + term.replace('"', '""') + '"')
+        else:
+            short_terms.append(term)
+    return (" ".join(match_terms) or None), short_terms
+
+
+def make_snippet(text: str, term: str, width: int = 30) -> str:
+    """
+    在文本中截取关键词附近的片段（LIKE检索时没有FTS5的snippet()可用）
+
+    Args:
+        text: 文本
+        term: 关键词
+        width: 关键词两侧保留的字符数
+
+    Returns:
+        带[]标记的片段
+    """
+    text = _WHITESPACE_RE.sub(" ", text or "")
+    pos = text.lower().find(term.lower())
+    if pos < 0:
+        return text[: width * 2]
+    start = max(0, pos - width)
+    end = pos + len(term)
+    return (
+        ("..." if start > 0 else "")
+        + text[start:pos]
+        + "["
+        + text[pos:end]
+        + "]"
+        + text[end : end + width]
+        + ("..." if end + width < len(text) else "")
+    )
+
+
+class FullTextIndex:
+    """邮件全文索引"""
+
+    def __init__(self, db_connection):
+        """
+        初始化全文索引
+
+        Args:
+            db_connection: 数据库连接管理器（DatabaseConnection）
+        """
+        self.db = db_connection
+        self.available = self._check_available()
+        if not self.available:
+            logger.warning("全文索引不可用（SQLite不支持FTS5 trigram），内容搜索将降级")
+
+    def _check_available(self) -> bool:
+        """检查email_fts表是否存在"""
+        try:
+            row = self.db.execute_query(
+                "SELECT 1 AS found FROM sqlite_master WHERE name = 'email_fts'",
+                fetch_one=True,
+            )
+            return bool(row)
+        except Exception as e:
+            logger.error(f"检查全文索引时出错: {e}")
+            return False
+
+    def index_email(
+        self, message_id: str, folder: str, document: Dict[str, str]
+    ) -> bool:
+        """
+        写入（或替换）一封邮件的索引文档
+
+        Args:
+            message_id: 邮件ID
+            folder: 邮件类型（received/sent）
+            document: build_search_document返回的文档
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not self.available:
+            return False
+        try:
+            doc_id_sql = (
+                "SELECT doc_id FROM email_fts_docs WHERE message_id = ? AND folder = ?"
+            )
+            values = tuple(document.get(column, "") or "" for column in FTS_COLUMNS)
+            return self.db.execute_transaction(
+                [
+                    (
+                        "INSERT OR IGNORE INTO email_fts_docs (message_id, folder) "
+                        "VALUES (?, ?)",
+                        (message_id, folder),
+                    ),
+                    (
+                        f"DELETE FROM email_fts WHERE rowid = ({doc_id_sql})",
+                        (message_id, folder),
+                    ),
+                    (
+                        f"INSERT INTO email_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+                        f"SELECT doc_id, ?, ?, ?, ?, ? FROM email_fts_docs "
+                        f"WHERE message_id = ? AND folder = ?",
+                        values + (message_id, folder),
+                    ),
+                ]
+            )
+        except Exception as e:
+            logger.error(f"写入全文索引时出错: {e}")
+            return False
+
+    def remove_email(self, message_id: str, folder: Optional[str] = None) -> bool:
+        """
+        删除一封邮件的索引文档
+
+        Args:
+            message_id: 邮件ID
+            folder: 邮件类型，None表示所有类型
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not self.available:
+            return False
+        try:
+            where = "message_id = ?"
+            params: Tuple[Any, ...] = (message_id,)
+            if folder:
+                where += " AND folder = ?"
+                params += (folder,)
+            return self.db.execute_transaction(
+                [
+                    (
+                        "DELETE FROM email_fts WHERE rowid IN "
+                        f"(SELECT doc_id FROM email_fts_docs WHERE {where})",
+                        params,
+                    ),
+                    (f"DELETE FROM email_fts_docs WHERE {where}", params),
+                ]
+            )
+        except Exception as e:
+            logger.error(f"删除全文索引时出错: {e}")
+            return False
+
+    def clear(self) -> bool:
+        """清空全文索引（重建前使用）"""
+        if not self.available:
+            return False
+        try:
+            return self.db.execute_transaction(
+                [
+                    ("DELETE FROM email_fts", ()),
+                    ("DELETE FROM email_fts_docs", ()),
+                ]
+            )
+        except Exception as e:
+            logger.error(f"清空全文索引时出错: {e}")
+            return False
+
+    def optimize(self) -> bool:
+        """合并FTS5内部的b-tree段，批量重建后提高查询速度"""
+        if not self.available:
+            return False
+        try:
+            self.db.execute_query(
+                "INSERT INTO email_fts (email_fts) VALUES ('optimize')"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"优化全文索引时出错: {e}")
+            return False
+
+    def _build_folder_filter(
+        self,
+        user_email: Optional[str],
+        include_received: bool,
+        include_sent: bool,
+        include_spam: bool,
+        include_deleted: bool,
+    ) -> Tuple[str, List[Any]]:
+        """
+        构建按邮件类型、用户和状态过滤的条件（只返回元数据仍存在的邮件）
+
+        Returns:
+            (WHERE子句, 参数列表)
+        """
+        clauses = []
+        params: List[Any] = []
+
+        if include_received:
+            clause = (
+                "(d.folder = 'received' AND EXISTS (SELECT 1 FROM emails e "
+                "WHERE e.message_id = d.message_id AND e.is_recalled = 0"
+            )
+            if user_email:
+                # 删除和垃圾邮件状态使用该用户自己的标志
+                clause += (
+                    " AND EXISTS (SELECT 1 FROM email_recipients r "
+                    "WHERE r.message_id = e.message_id AND r.address = ?"
+                )
+                params.append(
+                    EmailRepository.normalize_address(user_email) or user_email
+                )
+                flags = "r"
+            else:
+                flags = "e"
+            if not include_deleted:
+                clause += f" AND {flags}.is_deleted = 0"
+            if not include_spam:
+                clause += f" AND {flags}.is_spam = 0"
+            if user_email:
+                clause += ")"
+            clauses.append(clause + "))")
+
+        if include_sent:
+            clause = (
+                "(d.folder = 'sent' AND EXISTS (SELECT 1 FROM sent_emails s "
+                "WHERE s.message_id = d.message_id AND s.is_recalled = 0"
+            )
+            if not include_spam:
+                clause += " AND s.is_spam = 0"
+            if user_email:
+                # 与list_sent_emails一致，兼容"显示名 <邮箱>"格式
+                clause += " AND (s.from_addr = ? OR s.from_addr LIKE ?)"
+                params.extend([user_email, f"%{user_email}%"])
+            clauses.append(clause + "))")
+
+        if not clauses:
+            return "0", params
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def search(
+        self,
+        query: str,
+        user_email: Optional[str] = None,
+        include_received: bool = True,
+        include_sent: bool = True,
+        include_spam: bool = False,
+        include_deleted: bool = False,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        全文检索，按相关度（bm25）排序
+
+        Args:
+            query: 搜索词，多个词之间为AND
+            user_email: 只返回该用户的邮件（收件箱按收件人/发件人，发件箱按发件人）
+            include_received: 是否包含接收邮件
+            include_sent: 是否包含已发送邮件
+            include_spam: 是否包含垃圾邮件
+            include_deleted: 是否包含已删除邮件
+            limit: 每页数量
+            offset: 偏移量
+
+        Returns:
+            [{message_id, type, rank, snippet}]列表
+        """
+        if not self.available or not query or not query.strip():
+            return []
+
+        match_expr, short_terms = parse_query(query)
+        where, params = self._build_folder_filter(
+            user_email, include_received, include_sent, include_spam, include_deleted
+        )
+
+        conditions = [where]
+        match_params: List[Any] = []
+        if match_expr:
+            conditions.insert(0, "email_fts MATCH ?")
+            match_params.append(match_expr)
+        for term in short_terms:
+            pattern = f"%{term}%"
+            conditions.append(
+                "(" + " OR ".join(f"email_fts.{c} LIKE ?" for c in FTS_COLUMNS) + ")"
+            )
+            params.extend([pattern] * len(FTS_COLUMNS))
+
+        if match_expr:
+            # 有MATCH条件时使用bm25排序和FTS5自带的snippet()
+            weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+            select = (
+                f"bm25(email_fts, {weights}) AS rank, "
+                "snippet(email_fts, -1, '[', ']', '...', 16) AS snippet"
+            )
+            order = "rank"
+        else:
+            # 只有短词时无法使用bm25，按写入顺序（最新在前）返回
+            select = "0.0 AS rank, email_fts.subject, email_fts.body"
+            order = "email_fts.rowid DESC"
+
+        sql = (
+            f"SELECT d.message_id, d.folder AS type, {select} "
+            "FROM email_fts JOIN email_fts_docs d ON d.doc_id = email_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY {order} LIMIT ? OFFSET ?"
+        )
+
+        try:
+            rows = self.db.execute_query(
+                sql, tuple(match_params + params + [limit, offset]), fetch_all=True
+            )
+        except Exception as e:
+            logger.error(f"全文检索时出错: {e}")
+            return []
+
+        results = []
+        for row in rows or []:
+            if "snippet" not in row:
+                text = row.pop("body") or ""
+                subject = row.pop("subject") or ""
+                term = short_terms[0]
+                source = text if term.lower() in text.lower() else subject
+                row["snippet"] = make_snippet(source, term)
+            results.append(row)
+        return results
@@ -0,0 +1,320 @@
+"""
+邮件接收流水线 - 每封入站邮件只解析一次、只写入一次
+
+SMTP DATA阶段收到的原始字节在这里补齐缺失的必需头部（From、Date、Message-ID）
+后解析一次，得到的Email对象依次用于校验、垃圾邮件检测、内容存储、数据库索引和全文索引；
+存储的是原始字节本身，不再经过“解析-重新序列化-再解析”的往返。
+
+已转存到临时文件的大邮件以文件对象传入：增量解析（不保留附件内容），
+存储时按块复制，整个过程不把邮件整体读入内存。
+"""
+
+import io
+import re
+import datetime
+from dataclasses import dataclass, field
+from email.utils import format_datetime
+from typing import BinaryIO, List, Optional, Set, Tuple, Union
+
+from common.utils import setup_logging, generate_message_id
+from common.models import Email, EmailAddress
+from common.email_format_handler import EmailFormatHandler
+from .fulltext_index import build_search_document, html_to_text
+
+# 设置日志
+logger = setup_logging("ingest_pipeline")
+
+# 头部字段名（RFC 5322: 除冒号外的可打印ASCII字符）
+_HEADER_NAME_RE = re.compile(rb"^([\x21-\x39\x3b-\x7e]+):")
+
+
+def scan_header_names(raw: bytes) -> Set[str]:
+    """
+    扫描头部区域中出现的字段名（小写），不进行完整解析
+
+    Args:
+        raw: 原始邮件字节
+
+    Returns:
+        头部字段名集合
+    """
+    names = set()
+    for line in raw.split(b"\n"):
+        line = line.rstrip(b"\r")
+        if not line:
+            break
+        match = _HEADER_NAME_RE.match(line)
+        if match:
+            names.add(match.group(1).decode("ascii").lower())
+    return names
+
+
+def read_header_block(fileobj: BinaryIO) -> bytes:
+    """
+    读取文件开头的头部区域（到第一个空行为止），读取后回到原位置
+
+    Args:
+        fileobj: 二进制文件对象
+
+    Returns:
+        头部区域字节
+    """
+    start = fileobj.tell()
+    lines = []
+    for line in iter(fileobj.readline, b""):
+        if not line.rstrip(b"\r\n"):
+            break
+        lines.append(line)
+    fileobj.seek(start)
+    return b"".join(lines)
+
+
+class PrefixedStream(io.RawIOBase):
+    """在文件对象之前拼接补充头部的只读流，不复制文件内容"""
+
+    def __init__(self, prefix: bytes, fileobj: BinaryIO):
+        """
+        初始化拼接流
+
+        Args:
+            prefix: 补充的头部字节
+            fileobj: 原始邮件文件对象（从当前位置开始）
+        """
+        super().__init__()
+        self.prefix = prefix
+        self.fileobj = fileobj
+        self.start = fileobj.tell()
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.position < len(self.prefix):
+            data = self.prefix[self.position : self.position + len(buffer)]
+        else:
+            self.fileobj.seek(self.start + self.position - len(self.prefix))
+            data = self.fileobj.read(len(buffer))
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            end = self.fileobj.seek(0, io.SEEK_END)
+            offset += len(self.prefix) + end - self.start
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+@dataclass
+class IngestMessage:
+    """入站邮件在流水线中的唯一表示"""
+
+    mail_from: str
+    rcpt_tos: List[str]
+    raw: Optional[bytes]  # 将要存储的完整原始字节（已补齐必需头部）
+    email: Email  # 唯一一次解析的结果
+    added_headers: List[str] = field(default_factory=list)
+    # 以文件对象传入的大邮件：要存储的内容流（已补齐必需头部），此时raw为None
+    source: Optional[BinaryIO] = None
+    _plain_text: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        """邮件大小（字节）"""
+        if self.raw is not None:
+            return len(self.raw)
+        position = self.source.tell()
+        size = self.source.seek(0, io.SEEK_END)
+        self.source.seek(position)
+        return size
+
+    @property
+    def plain_text(self) -> str:
+        """用于垃圾邮件检测的纯文本正文，没有纯文本时从HTML中提取"""
+        if self._plain_text is None:
+            text = self.email.text_content or ""
+            if not text and self.email.html_content:
+                text = html_to_text(self.email.html_content)
+            self._plain_text = text
+        return self._plain_text
+
+
+class IngestPipeline:
+    """邮件接收流水线"""
+
+    def __init__(self, email_service, domain: str = "smtp.localhost"):
+        """
+        初始化接收流水线
+
+        Args:
+            email_service: 邮件服务（EmailService）
+            domain: 自动生成Message-ID时使用的域名
+        """
+        self.email_service = email_service
+        self.domain = domain
+
+    @staticmethod
+    def _newline(head: bytes) -> bytes:
+        """邮件使用的换行符"""
+        return b"\r\n" if b"\r\n" in head[:4096] else b"\n"
+
+    def _missing_headers(self, head: bytes, mail_from: str) -> Tuple[List[str], bytes]:
+        """
+        只扫描头部区域，生成需要补充的必需头部
+
+        Args:
+            head: 邮件开头的字节（至少包含完整的头部区域）
+            mail_from: 信封发件人
+
+        Returns:
+            (补充的头部列表, 需要加在邮件之前的字节)
+        """
+        present = scan_header_names(head)
+        newline = self._newline(head)
+        added = []
+        if "from" not in present and mail_from:
+            added.append(f"From: {mail_from}")
+        if "date" not in present:
+            now = datetime.datetime.now().astimezone()
+            added.append(f"Date: {format_datetime(now)}")
+        if "message-id" not in present:
+            added.append(f"Message-ID: {generate_message_id(self.domain)}")
+        if not added:
+            return added, b""
+
+        prefix = newline.join(h.encode("utf-8") for h in added) + newline
+        # 没有头部区域的内容需要补一个空行分隔头部和正文
+        if not present:
+            prefix += newline
+        logger.debug("接收流水线补充头部: %s", added)
+        return added, prefix
+
+    def prepare(
+        self, mail_from: str, rcpt_tos: List[str], data: Union[bytes, str, BinaryIO]
+    ) -> IngestMessage:
+        """
+        补齐必需头部并解析邮件（整个流水线中唯一的一次解析）
+
+        Args:
+            mail_from: 信封发件人
+            rcpt_tos: 信封收件人列表
+            data: DATA阶段收到的原始内容，或已转存邮件的二进制文件对象
+                （可定位，由调用方关闭）
+
+        Returns:
+            IngestMessage对象
+        """
+        raw = source = None
+        if hasattr(data, "read"):
+            start = data.tell()
+            head = read_header_block(data)
+            added, prefix = self._missing_headers(head, mail_from)
+            email_obj = EmailFormatHandler.parse_mime_stream(data, prefix)
+            data.seek(start)
+        else:
+            raw = data.encode("utf-8", errors="surrogateescape") if isinstance(
+                data, str
+            ) else data
+            head = raw
+            added, prefix = self._missing_headers(raw, mail_from)
+            if prefix:
+                raw = prefix + raw
+            email_obj = EmailFormatHandler.parse_mime_message(raw)
+
+        if not email_obj.message_id or email_obj.message_id == "unknown@localhost":
+            # Message-ID头部存在但无法解析：在存储的内容之前补充新的Message-ID，
+            # 保证数据库、撤回和全文索引使用的ID与文件中的一致
+            message_id = generate_message_id(self.domain)
+            email_obj.message_id = message_id.strip("<>")
+            header = f"Message-ID: {message_id}"
+            added.append(header)
+            line = header.encode("utf-8") + self._newline(head)
+            if raw is not None:
+                raw = line + raw
+            else:
+                prefix = line + prefix
+            logger.info("SMTP服务器自动添加Message-ID: %s", email_obj.message_id)
+
+        if source is None and raw is None:
+            source = PrefixedStream(prefix, data) if prefix else data
+
+        # From头部存在但无法解析时，数据库中使用信封发件人
+        if not email_obj.from_addr or email_obj.from_addr.address in (
+            "unknown@localhost",
+            "",
+            "unknown",
+        ):
+            email_obj.from_addr = EmailAddress("", mail_from)
+            logger.info("修复From字段: %s", mail_from)
+
+        return IngestMessage(
+            mail_from=mail_from,
+            rcpt_tos=list(rcpt_tos),
+            raw=raw,
+            email=email_obj,
+            added_headers=added,
+            source=source,
+        )
+
+    def store(self, message: IngestMessage) -> bool:
+        """
+        校验、检测并存储已解析的邮件
+
+        Args:
+            message: IngestMessage对象
+
+        Returns:
+            bool: 是否保存成功
+        """
+        email_obj = message.email
+        return self.email_service.save_email(
+            message_id=email_obj.message_id,
+            from_addr=email_obj.from_addr.address,
+            to_addrs=message.rcpt_tos,
+            subject=email_obj.subject,
+            content=message.plain_text,
+            full_content_for_storage=(
+                message.raw if message.raw is not None else message.source
+            ),
+            date=email_obj.date or datetime.datetime.now(),
+            store_as_is=True,
+            search_document=build_search_document(email_obj),
+        )
+
+    def ingest(
+        self, mail_from: str, rcpt_tos: List[str], data: Union[bytes, str, BinaryIO]
+    ) -> IngestMessage:
+        """
+        处理一封入站邮件
+
+        Args:
+            mail_from: 信封发件人
+            rcpt_tos: 信封收件人列表
+            data: DATA阶段收到的原始内容，或已转存邮件的二进制文件对象
+
+        Returns:
+            已保存的IngestMessage对象
+
+        Raises:
+            Exception: 保存失败时抛出
+        """
+        message = self.prepare(mail_from, rcpt_tos, data)
+        if not self.store(message):
+            logger.error(f"邮件保存失败: {message.email.message_id}")
+            raise Exception("邮件保存失败")
+
+        logger.debug(
+            f"邮件已保存: {message.email.message_id}, "
+            f"From: {message.email.from_addr.address}, 大小: {message.size} 字节"
+        )
+        return message
@@ -0,0 +1,342 @@
+"""
+邮件内容打包格式 - 压缩邮件文件并把较大的MIME部分拆分为按内容哈希共享的数据块
+
+打包后的文件以MAGIC开头，随后是版本、压缩算法和标志字节，剩余部分为压缩后的数据。
+未打包的.eml文件（旧文件或未启用压缩/去重时）原样保存，读取时按前缀区分两种格式。
+
+启用去重时，邮件被切分为若干片段：
+- 内联片段: 头部、MIME边界等，直接保存在邮件文件中；
+- 引用片段: 较大的叶子MIME部分的正文（通常是附件），按SHA-256保存为独立数据块。
+
+拆分只记录原始字节的位置，不重新编码，因此重组后的内容与写入时逐字节一致，
+POP3返回的大小和PGP签名都不受影响。
+"""
+
+import re
+import zlib
+import hashlib
+import struct
+from email.parser import BytesHeaderParser
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from common.utils import setup_logging
+
+# 设置日志
+logger = setup_logging("message_codec")
+
+MAGIC = b"\x00CSM"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">4sBBB")
+
+# 标志位
+FLAG_SEGMENTED = 0x01
+
+# 压缩算法编号（写入文件头，不可修改已有编号）
+CODEC_IDS = {"none": 0, "zlib": 1, "zstd": 2}
+CODEC_NAMES = {value: key for key, value in CODEC_IDS.items()}
+
+# 片段记录
+INLINE_TAG = b"I"
+REF_TAG = b"R"
+LENGTH = struct.Struct(">I")
+DIGEST_SIZE = 32
+
+# 嵌套multipart的最大解析深度
+MAX_MIME_DEPTH = 16
+
+Segment = Union[bytes, Tuple[str, int]]
+
+
+def codec_available(codec: str) -> bool:
+    """
+    检查压缩算法是否可用
+
+    Args:
+        codec: 算法名称（none/zlib/zstd）
+
+    Returns:
+        bool: 是否可用
+    """
+    if codec == "zstd":
+        return zstandard is not None
+    return codec in CODEC_IDS
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """按指定算法压缩数据"""
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """按指定算法解压数据"""
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("邮件使用zstd压缩，但未安装zstandard库")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def is_packed(data: bytes) -> bool:
+    """
+    检查数据是否为打包格式
+
+    Args:
+        data: 文件内容（至少包含开头几个字节）
+
+    Returns:
+        bool: 是否以MAGIC开头
+    """
+    return data[: len(MAGIC)] == MAGIC
+
+
+def pack(body: bytes, codec: str, flags: int = 0) -> bytes:
+    """
+    生成打包格式的文件内容
+
+    Args:
+        body: 原始数据（邮件内容、片段流或数据块）
+        codec: 压缩算法
+        flags: 标志位
+
+    Returns:
+        文件内容
+    """
+    return HEADER.pack(MAGIC, FORMAT_VERSION, CODEC_IDS[codec], flags) + compress(
+        body, codec
+    )
+
+
+def pack_stream(chunks: Iterable[bytes], codec: str) -> Iterator[bytes]:
+    """
+    流式生成打包格式的文件内容，不需要把整个邮件读入内存
+
+    Args:
+        chunks: 原始邮件字节块
+        codec: 压缩算法
+
+    Returns:
+        文件内容字节块的迭代器
+    """
+    yield HEADER.pack(MAGIC, FORMAT_VERSION, CODEC_IDS[codec], 0)
+    if codec == "zlib":
+        compressor = zlib.compressobj(6)
+    elif codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        yield from chunks
+        return
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def unpack(data: bytes) -> Tuple[bytes, int]:
+    """
+    解析打包格式的文件内容
+
+    Args:
+        data: 文件内容
+
+    Returns:
+        (解压后的数据, 标志位)
+    """
+    magic, version, codec_id, flags = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("不支持的邮件存储格式")
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f"未知的压缩算法编号: {codec_id}")
+    return decompress(data[HEADER.size :], CODEC_NAMES[codec_id]), flags
+
+
+def _split_headers(raw: bytes, start: int, end: int) -> Tuple[bytes, int]:
+    """
+    找到MIME部分头部的结束位置
+
+    Returns:
+        (头部字节, 正文起始位置)；没有空行分隔时正文为空
+    """
+    if raw.startswith(b"\r\n", start):
+        return b"", start + 2
+    if raw.startswith(b"\n", start):
+        return b"", start + 1
+
+    candidates = []
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        pos = raw.find(separator, start, end)
+        if pos != -1:
+            candidates.append((pos, pos + len(separator)))
+    if not candidates:
+        return raw[start:end], end
+    header_end, body_start = min(candidates)
+    return raw[start:header_end], body_start
+
+
+def _collect_large_bodies(
+    raw: bytes,
+    start: int,
+    end: int,
+    min_size: int,
+    spans: List[Tuple[int, int]],
+    depth: int = 0,
+) -> None:
+    """递归查找不小于min_size的叶子MIME部分正文，记录其[start, end)位置"""
+    headers, body_start = _split_headers(raw, start, end)
+    part = BytesHeaderParser().parsebytes(headers)
+
+    if part.get_content_maintype() != "multipart":
+        if end - body_start >= min_size:
+            spans.append((body_start, end))
+        return
+
+    boundary = part.get_boundary()
+    if not boundary or depth >= MAX_MIME_DEPTH:
+        return
+
+    delimiter = re.compile(
+        rb"^--" + re.escape(boundary.encode("utf-8", "surrogateescape"))
+        + rb"(--)?[ \t]*\r?$",
+        re.M,
+    )
+    part_start = None
+    for match in delimiter.finditer(raw, body_start, end):
+        if part_start is not None:
+            # 分隔行之前的换行符属于分隔符（RFC 2046）
+            part_end = match.start()
+            if raw[part_end - 2 : part_end] == b"\r\n":
+                part_end -= 2
+            elif raw[part_end - 1 : part_end] == b"\n":
+                part_end -= 1
+            if part_end > part_start:
+                _collect_large_bodies(
+                    raw, part_start, part_end, min_size, spans, depth + 1
+                )
+        if match.group(1):
+            break
+        part_start = match.end() + (1 if raw[match.end() : match.end() + 1] else 0)
+
+
+def split_message(raw: bytes, min_size: int) -> List[Segment]:
+    """
+    把邮件切分为内联片段和待去重的数据块
+
+    Args:
+        raw: 原始邮件字节
+        min_size: 拆分为数据块的最小正文字节数
+
+    Returns:
+        片段列表：bytes为内联片段，(sha256十六进制, bytes)元组为数据块
+    """
+    spans: List[Tuple[int, int]] = []
+    try:
+        _collect_large_bodies(raw, 0, len(raw), min_size, spans)
+    except Exception as e:
+        logger.debug(f"解析MIME结构失败，不拆分附件: {e}")
+        spans = []
+
+    segments: List[Segment] = []
+    position = 0
+    for start, end in spans:
+        if start > position:
+            segments.append(raw[position:start])
+        data = raw[start:end]
+        segments.append((hashlib.sha256(data).hexdigest(), data))
+        position = end
+    if position < len(raw):
+        segments.append(raw[position:])
+    return segments
+
+
+def encode_segments(segments: List[Segment]) -> bytes:
+    """
+    序列化片段列表（数据块只保存哈希和长度）
+
+    Args:
+        segments: split_message返回的片段列表
+
+    Returns:
+        片段流字节
+    """
+    out = []
+    for segment in segments:
+        if isinstance(segment, bytes):
+            out.append(INLINE_TAG + LENGTH.pack(len(segment)) + segment)
+        else:
+            digest, data = segment
+            out.append(REF_TAG + bytes.fromhex(digest) + LENGTH.pack(len(data)))
+    return b"".join(out)
+
+
+def decode_segments(stream: bytes, load_blob: Callable[[str], bytes]) -> bytes:
+    """
+    根据片段流重组邮件内容
+
+    Args:
+        stream: encode_segments生成的片段流
+        load_blob: 按sha256十六进制读取数据块的函数
+
+    Returns:
+        原始邮件字节
+    """
+    out = []
+    position = 0
+    while position < len(stream):
+        tag = stream[position : position + 1]
+        position += 1
+        if tag == INLINE_TAG:
+            (length,) = LENGTH.unpack_from(stream, position)
+            position += LENGTH.size
+            out.append(stream[position : position + length])
+            position += length
+        elif tag == REF_TAG:
+            digest = stream[position : position + DIGEST_SIZE].hex()
+            position += DIGEST_SIZE
+            (length,) = LENGTH.unpack_from(stream, position)
+            position += LENGTH.size
+            data = load_blob(digest)
+            if len(data) != length:
+                raise ValueError(f"数据块长度不一致: {digest}")
+            out.append(data)
+        else:
+            raise ValueError(f"无效的片段类型: {tag!r}")
+    return b"".join(out)
+
+
+def segment_refs(stream: bytes) -> List[str]:
+    """
+    列出片段流引用的数据块，不读取数据块内容
+
+    Args:
+        stream: encode_segments生成的片段流
+
+    Returns:
+        数据块的sha256十六进制列表（去重，按出现顺序）
+    """
+    refs = []
+    position = 0
+    while position < len(stream):
+        tag = stream[position : position + 1]
+        position += 1
+        if tag == INLINE_TAG:
+            (length,) = LENGTH.unpack_from(stream, position)
+            position += LENGTH.size + length
+        elif tag == REF_TAG:
+            digest = stream[position : position + DIGEST_SIZE].hex()
+            position += DIGEST_SIZE + LENGTH.size
+            if digest not in refs:
+                refs.append(digest)
+        else:
+            raise ValueError(f"无效的片段类型: {tag!r}")
+    return refs
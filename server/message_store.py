@@ -0,0 +1,555 @@
+"""
+邮件内容存储后端 - 决定.eml文件在磁盘上的位置和写入方式
+
+- FlatMessageStore: 旧布局，所有邮件放在同一个目录中；
+- ShardedMessageStore: 按message_id的SHA-1前缀分两级子目录存放，
+  单个目录中的文件数保持在较小规模。
+
+两种后端都通过“临时文件 + os.replace”原子写入，读者不会看到写了一半的文件；
+message_id到路径的映射只需计算，不需要列目录。
+
+按配置还可以压缩邮件文件，并把较大的MIME部分作为按内容哈希共享的数据块保存在
+blobs目录下（格式见message_codec）。读取时通过read_file/open_file透明还原。
+数据块的引用计数保存在根目录下的blob_refs.db中，引用它的邮件全部删除或覆盖后
+数据块随之删除；计数表建立之前写入的数据块由sweep_blobs()回收。
+"""
+
+import io
+import os
+import re
+import sqlite3
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from common.utils import setup_logging
+from common.config import (
+    EMAIL_STORAGE_DIR,
+    MESSAGE_STORE_BACKEND,
+    MESSAGE_STORE_SHARD_DEPTH,
+    MESSAGE_STORE_FSYNC,
+    MESSAGE_STORE_COMPRESSION,
+    MESSAGE_STORE_DEDUP_ATTACHMENTS,
+    MESSAGE_STORE_DEDUP_MIN_SIZE,
+)
+from . import message_codec
+
+# 设置日志
+logger = setup_logging("message_store")
+
+
+def safe_filename(message_id: str) -> str:
+    """
+    根据message_id生成安全的文件名（不含扩展名），与之前的存储布局保持一致
+
+    Args:
+        message_id: 邮件ID
+
+    Returns:
+        文件名
+    """
+    # 标准化处理：移除两端空格，去掉<>，@替换为_at_
+    safe_id = message_id.strip().strip("<>").replace("@", "_at_")
+    # 移除Windows文件系统不允许的字符
+    safe_id = re.sub(r'[\\/*?:"<>|]', "_", safe_id)
+    return safe_id.strip()
+
+
+class MessageStore(ABC):
+    """邮件内容存储后端基类"""
+
+    BLOB_DIR = "blobs"
+    BLOB_REFS_DB = "blob_refs.db"
+
+    def __init__(
+        self,
+        root: str = EMAIL_STORAGE_DIR,
+        fsync: bool = MESSAGE_STORE_FSYNC,
+        compression: str = MESSAGE_STORE_COMPRESSION,
+        dedup_attachments: bool = MESSAGE_STORE_DEDUP_ATTACHMENTS,
+        dedup_min_size: int = MESSAGE_STORE_DEDUP_MIN_SIZE,
+    ):
+        """
+        初始化存储后端
+
+        Args:
+            root: 存储根目录
+            fsync: 写入后是否fsync
+            compression: 压缩算法（none/zlib/zstd）
+            dedup_attachments: 是否把较大的MIME部分保存为共享数据块
+            dedup_min_size: 拆分为数据块的最小正文字节数
+        """
+        self.root = root
+        self.fsync = fsync
+        if not message_codec.codec_available(compression):
+            fallback = "zlib" if compression == "zstd" else "none"
+            logger.warning(f"压缩算法 {compression} 不可用，使用{fallback}")
+            compression = fallback
+        self.compression = compression
+        self.dedup_attachments = dedup_attachments
+        self.dedup_min_size = max(1, dedup_min_size)
+
+    @property
+    def packing(self) -> bool:
+        """写入时是否使用打包格式（压缩或去重）"""
+        return self.compression != "none" or self.dedup_attachments
+
+    @abstractmethod
+    def path_for(self, message_id: str) -> str:
+        """
+        计算邮件内容文件的路径（不检查文件是否存在）
+
+        Args:
+            message_id: 邮件ID
+
+        Returns:
+            文件路径
+        """
+
+    def locate(self, message_id: str) -> Optional[str]:
+        """
+        查找已存储的邮件内容文件
+
+        Args:
+            message_id: 邮件ID
+
+        Returns:
+            文件路径，不存在时返回None
+        """
+        path = self.path_for(message_id)
+        return path if os.path.exists(path) else None
+
+    def write(self, message_id: str, content: Union[str, bytes]) -> str:
+        """
+        原子写入邮件内容
+
+        Args:
+            message_id: 邮件ID
+            content: 邮件内容（字符串或原始字节）
+
+        Returns:
+            文件路径
+        """
+        path = self.path_for(message_id)
+        if isinstance(content, str):
+            content = content.encode("utf-8", errors="surrogateescape")
+        old_refs = self.message_blob_refs(path)
+        refs: List[str] = []
+        if self.packing:
+            content, refs = self._pack_message(content)
+        try:
+            self.write_file(path, content)
+        except BaseException:
+            self._release_blobs(refs)
+            raise
+        # 先增加新内容的引用再释放旧内容的引用，覆盖同一邮件时数据块不会被误删
+        self._release_blobs(old_refs)
+        return path
+
+    def write_stream(
+        self, message_id: str, fileobj: BinaryIO, chunk_size: int = 64 * 1024
+    ) -> str:
+        """
+        从文件对象原子写入邮件内容，按块复制，不把整个邮件读入内存
+        （启用附件去重时需要完整内容来拆分MIME结构，仍整体读取）
+
+        Args:
+            message_id: 邮件ID
+            fileobj: 二进制文件对象（从当前位置读到末尾）
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            文件路径
+        """
+        if self.dedup_attachments:
+            return self.write(message_id, fileobj.read())
+
+        path = self.path_for(message_id)
+        old_refs = self.message_blob_refs(path)
+        chunks = iter(lambda: fileobj.read(chunk_size), b"")
+        if self.packing:
+            chunks = message_codec.pack_stream(chunks, self.compression)
+        self._write_chunks(path, chunks)
+        self._release_blobs(old_refs)
+        return path
+
+    def _pack_message(self, content: bytes) -> Tuple[bytes, List[str]]:
+        """
+        压缩邮件内容，启用去重时先把较大的MIME部分写入数据块并增加引用计数
+
+        Returns:
+            (打包后的内容, 引用的数据块哈希列表)
+        """
+        if not self.dedup_attachments:
+            return message_codec.pack(content, self.compression), []
+
+        segments = message_codec.split_message(content, self.dedup_min_size)
+        blobs = {
+            segment[0]: segment[1]
+            for segment in segments
+            if not isinstance(segment, bytes)
+        }
+        if not blobs:
+            return message_codec.pack(content, self.compression), []
+
+        with self._blob_refs() as conn:
+            for digest, data in blobs.items():
+                # 已存在但没有计数的数据块是计数表建立之前写入的，引用数未知（NULL），
+                # 不会被自动删除
+                initial = 1 if self._write_blob(digest, data) else None
+                conn.execute(
+                    "INSERT INTO blob_refs (digest, refs) VALUES (?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET refs = refs + 1",
+                    (digest, initial),
+                )
+        packed = message_codec.pack(
+            message_codec.encode_segments(segments),
+            self.compression,
+            message_codec.FLAG_SEGMENTED,
+        )
+        return packed, list(blobs)
+
+    def blob_path(self, digest: str) -> str:
+        """
+        计算数据块的路径
+
+        Args:
+            digest: 数据块内容的sha256十六进制
+
+        Returns:
+            文件路径
+        """
+        return os.path.join(self.root, self.BLOB_DIR, digest[:2], digest[2:4], digest)
+
+    def _write_blob(self, digest: str, data: bytes) -> bool:
+        """
+        写入数据块；相同内容的数据块已存在时直接复用
+
+        Returns:
+            bool: 是否新写入了数据块
+        """
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return False
+        self.write_file(path, message_codec.pack(data, self.compression))
+        return True
+
+    @contextmanager
+    def _blob_refs(self) -> Iterator[sqlite3.Connection]:
+        """
+        打开引用计数表并开启写事务；写事务在线程和进程之间串行化，
+        增加引用（可能写入数据块）和释放引用（可能删除数据块）不会交错
+        """
+        os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(
+            os.path.join(self.root, self.BLOB_REFS_DB), timeout=30, isolation_level=None
+        )
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_refs "
+                "(digest TEXT PRIMARY KEY, refs INTEGER)"
+            )
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _release_blobs(self, refs: List[str]) -> None:
+        """减少数据块的引用计数，计数归零的数据块被删除"""
+        if not refs:
+            return
+        with self._blob_refs() as conn:
+            for digest in refs:
+                row = conn.execute(
+                    "SELECT refs FROM blob_refs WHERE digest = ?", (digest,)
+                ).fetchone()
+                if row is None or row[0] is None:
+                    # 引用数未知，留给sweep_blobs()处理
+                    continue
+                if row[0] > 1:
+                    conn.execute(
+                        "UPDATE blob_refs SET refs = refs - 1 WHERE digest = ?",
+                        (digest,),
+                    )
+                    continue
+                conn.execute("DELETE FROM blob_refs WHERE digest = ?", (digest,))
+                try:
+                    os.unlink(self.blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"删除数据块时出错: {digest} - {e}")
+
+    def message_blob_refs(self, path: str) -> List[str]:
+        """
+        列出邮件文件引用的数据块
+
+        Args:
+            path: 邮件文件路径
+
+        Returns:
+            数据块哈希列表，文件不存在或没有引用时返回空列表
+        """
+        try:
+            with open(path, "rb") as f:
+                if not message_codec.is_packed(f.read(len(message_codec.MAGIC))):
+                    return []
+                f.seek(0)
+                body, flags = message_codec.unpack(f.read())
+        except FileNotFoundError:
+            return []
+        if not flags & message_codec.FLAG_SEGMENTED:
+            return []
+        return message_codec.segment_refs(body)
+
+    def sweep_blobs(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        标记-清除数据块：扫描存储目录下的全部邮件文件统计实际引用，
+        删除没有被引用的数据块并按实际引用重建计数表（应在服务停止时运行）
+
+        Args:
+            dry_run: 只统计，不删除数据块也不修改计数表
+
+        Returns:
+            统计信息: messages（扫描的邮件文件）, referenced（被引用的数据块）,
+            removed（删除的数据块）
+        """
+        blob_root = os.path.join(self.root, self.BLOB_DIR)
+        counts: Dict[str, int] = {}
+        messages = 0
+        for directory, dirnames, filenames in os.walk(self.root):
+            if os.path.abspath(directory) == os.path.abspath(self.root):
+                dirnames[:] = [d for d in dirnames if d != self.BLOB_DIR]
+            for filename in filenames:
+                if not filename.endswith(".eml") or filename.startswith(".tmp-"):
+                    continue
+                messages += 1
+                path = os.path.join(directory, filename)
+                for digest in self.message_blob_refs(path):
+                    counts[digest] = counts.get(digest, 0) + 1
+
+        removed = 0
+        for directory, _, filenames in os.walk(blob_root):
+            for digest in filenames:
+                if digest in counts or digest.startswith(".tmp-"):
+                    continue
+                removed += 1
+                if not dry_run:
+                    os.unlink(os.path.join(directory, digest))
+
+        if not dry_run:
+            with self._blob_refs() as conn:
+                conn.execute("DELETE FROM blob_refs")
+                conn.executemany(
+                    "INSERT INTO blob_refs (digest, refs) VALUES (?, ?)",
+                    counts.items(),
+                )
+        stats = {"messages": messages, "referenced": len(counts), "removed": removed}
+        logger.info(f"数据块回收完成: {stats}")
+        return stats
+
+    def _read_blob(self, digest: str) -> bytes:
+        """读取并解压数据块"""
+        with open(self.blob_path(digest), "rb") as f:
+            data, _ = message_codec.unpack(f.read())
+        return data
+
+    def read_file(self, path: str) -> bytes:
+        """
+        读取邮件文件并还原为原始邮件字节（兼容未打包的旧文件）
+
+        Args:
+            path: 邮件文件路径
+
+        Returns:
+            原始邮件字节
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        return self.decode(data)
+
+    def decode(self, data: bytes) -> bytes:
+        """
+        把邮件文件内容还原为原始邮件字节
+
+        Args:
+            data: 邮件文件内容
+
+        Returns:
+            原始邮件字节
+        """
+        if not message_codec.is_packed(data):
+            return data
+        body, flags = message_codec.unpack(data)
+        if flags & message_codec.FLAG_SEGMENTED:
+            body = message_codec.decode_segments(body, self._read_blob)
+        return body
+
+    def open_file(self, path: str) -> BinaryIO:
+        """
+        以二进制只读方式打开邮件文件；未打包的文件直接返回文件对象以便流式读取，
+        打包的文件在内存中还原
+
+        Args:
+            path: 邮件文件路径
+
+        Returns:
+            二进制文件对象（由调用方关闭）
+        """
+        f = open(path, "rb")
+        try:
+            prefix = f.read(len(message_codec.MAGIC))
+            if not message_codec.is_packed(prefix):
+                f.seek(0)
+                return f
+            data = prefix + f.read()
+        except BaseException:
+            f.close()
+            raise
+        f.close()
+        return io.BytesIO(self.decode(data))
+
+    def content_size(self, path: str) -> int:
+        """
+        计算邮件文件还原后的原始字节数；未打包的文件直接取文件大小，不读取内容
+
+        Args:
+            path: 邮件文件路径
+
+        Returns:
+            原始邮件字节数
+        """
+        if not self.is_packed_file(path):
+            return os.path.getsize(path)
+        return len(self.read_file(path))
+
+    def is_packed_file(self, path: str) -> bool:
+        """
+        检查邮件文件是否已是打包格式
+
+        Args:
+            path: 邮件文件路径
+
+        Returns:
+            bool: 是否为打包格式
+        """
+        with open(path, "rb") as f:
+            return message_codec.is_packed(f.read(len(message_codec.MAGIC)))
+
+    def write_file(self, path: str, content: Union[str, bytes]) -> None:
+        """
+        先写入同目录下的临时文件，再通过os.replace原子替换目标文件
+
+        Args:
+            path: 目标文件路径
+            content: 文件内容
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8", errors="surrogateescape")
+        self._write_chunks(path, [content])
+
+    def _write_chunks(self, path: str, chunks: Iterable[bytes]) -> None:
+        """依次写入字节块到临时文件，完成后原子替换目标文件"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".eml")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, message_id: str) -> bool:
+        """
+        删除邮件内容文件
+
+        Args:
+            message_id: 邮件ID
+
+        Returns:
+            bool: 文件是否存在并已删除
+        """
+        path = self.locate(message_id)
+        if not path:
+            return False
+        refs = self.message_blob_refs(path)
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.error(f"删除邮件内容文件时出错: {path} - {e}")
+            return False
+        self._release_blobs(refs)
+        return True
+
+
+class FlatMessageStore(MessageStore):
+    """单一目录存储（旧布局）"""
+
+    def path_for(self, message_id: str) -> str:
+        return os.path.join(self.root, f"{safe_filename(message_id)}.eml")
+
+
+class ShardedMessageStore(MessageStore):
+    """按message_id哈希分片的目录存储"""
+
+    def __init__(
+        self,
+        root: str = EMAIL_STORAGE_DIR,
+        fsync: bool = MESSAGE_STORE_FSYNC,
+        depth: int = MESSAGE_STORE_SHARD_DEPTH,
+        **options,
+    ):
+        """
+        初始化分片存储
+
+        Args:
+            root: 存储根目录
+            fsync: 写入后是否fsync
+            depth: 分片目录层数（每层2个十六进制字符）
+            options: 压缩和去重选项，见MessageStore
+        """
+        super().__init__(root, fsync, **options)
+        self.depth = max(1, depth)
+
+    def path_for(self, message_id: str) -> str:
+        # 按文件名使用的规范化ID计算分片，<x@y>和x@y落在同一个文件上
+        filename = safe_filename(message_id)
+        digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        shards = [digest[i * 2 : i * 2 + 2] for i in range(self.depth)]
+        return os.path.join(self.root, *shards, f"{filename}.eml")
+
+
+def create_message_store(
+    backend: str = MESSAGE_STORE_BACKEND, root: str = EMAIL_STORAGE_DIR
+) -> MessageStore:
+    """
+    根据配置创建存储后端
+
+    Args:
+        backend: 后端名称（sharded/flat）
+        root: 存储根目录
+
+    Returns:
+        MessageStore对象
+    """
+    if backend == "flat":
+        return FlatMessageStore(root)
+    if backend != "sharded":
+        logger.warning(f"未知的邮件存储后端 {backend}，使用sharded")
+    return ShardedMessageStore(root)
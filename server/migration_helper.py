@@ -16,6 +16,8 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from common.utils import setup_logging
 from common.config import DB_PATH
 from server.new_db_handler import EmailService
+from server.db_connection import DatabaseConnection
+from server.db_migrations import MigrationRunner
 
 # 设置日志
 logger = setup_logging("migration_helper")
@@ -28,9 +30,18 @@ class DatabaseMigrationHelper:
         """初始化迁移辅助器"""
         self.old_db_path = DB_PATH
         self.backup_db_path = f"{DB_PATH}.backup"
-        self.new_email_service = EmailService()
+        self.migration_runner = MigrationRunner(DatabaseConnection(DB_PATH))
+        # EmailService初始化时会自动执行迁移，因此延迟到备份之后再创建
+        self._email_service = None
         logger.info("数据库迁移辅助器已初始化")
 
+    @property
+    def new_email_service(self) -> EmailService:
+        """延迟创建的EmailService实例"""
+        if self._email_service is None:
+            self._email_service = EmailService()
+        return self._email_service
+
     def backup_current_database(self) -> bool:
         """
         备份当前数据库
@@ -50,6 +61,36 @@ class DatabaseMigrationHelper:
             logger.error(f"备份数据库时出错: {e}")
             return False
 
+    def apply_schema_migrations(self) -> bool:
+        """
+        执行待应用的数据库结构迁移
+
+        Returns:
+            bool: 迁移是否成功
+        """
+        try:
+            if not os.path.exists(self.old_db_path):
+                logger.info("数据库文件不存在，将在首次初始化时创建最新结构")
+                return True
+
+            status = self.migration_runner.get_status()
+            logger.info(
+                f"当前数据库结构版本: v{status['current_version']}，"
+                f"最新版本: v{status['latest_version']}"
+            )
+            for pending in status["pending"]:
+                logger.info(f"  - 待执行: v{pending['version']} {pending['description']}")
+
+            applied = self.migration_runner.migrate()
+            if applied:
+                logger.info(f"已应用迁移: {', '.join(f'v{v}' for v in applied)}")
+            else:
+                logger.info("数据库结构已是最新版本")
+            return True
+        except Exception as e:
+            logger.error(f"执行数据库迁移时出错: {e}")
+            return False
+
     def validate_data_integrity(self) -> bool:
         """
         验证数据完整性
@@ -296,28 +337,36 @@ def main():
         print("✗ 数据库备份失败")
         return
 
-    # 2. 验证数据完整性
-    print("\n2. 验证数据完整性...")
+    # 2. 执行数据库结构迁移
+    print("\n2. 执行数据库结构迁移...")
+    if migration_helper.apply_schema_migrations():
+        print("✓ 数据库结构迁移完成")
+    else:
+        print("✗ 数据库结构迁移失败")
+        return
+
+    # 3. 验证数据完整性
+    print("\n3. 验证数据完整性...")
     if migration_helper.validate_data_integrity():
         print("✓ 数据完整性验证通过")
     else:
         print("✗ 数据完整性验证失败")
         return
 
-    # 3. 运行迁移测试
-    print("\n3. 运行迁移测试...")
+    # 4. 运行迁移测试
+    print("\n4. 运行迁移测试...")
     if migration_helper.run_migration_test():
         print("✓ 迁移测试通过")
     else:
         print("✗ 迁移测试失败")
         return
 
-    # 4. 显示API对比
-    print("\n4. API对比:")
+    # 5. 显示API对比
+    print("\n5. API对比:")
     migration_helper.show_api_comparison()
 
-    # 5. 保存使用指南
-    print("\n5. 保存使用指南...")
+    # 6. 保存使用指南
+    print("\n6. 保存使用指南...")
     if migration_helper.save_usage_guide():
         print("✓ 使用指南已保存")
     else:
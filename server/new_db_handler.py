@@ -7,15 +7,26 @@
 import os
 import datetime
 import json
-from typing import List, Dict, Optional, Any, Union
+from typing import BinaryIO, List, Dict, Optional, Any, Set, Tuple, Union
 
 from common.utils import setup_logging
-from common.config import DB_PATH, EMAIL_STORAGE_DIR
+from common.config import DB_PATH, DB_WRITE_BATCH_ENABLED
 from common.email_validator import EmailValidator
 from .db_connection import DatabaseConnection
 from .db_connection_pool import get_connection_pool
 from .email_repository import EmailRepository
+from .write_batcher import WriteBatcher
+from .sync_state import SyncStateRepository
 from .email_content_manager import EmailContentManager
+from .message_store import create_message_store
+from .parsed_message_cache import file_stamp, get_parsed_message_cache
+from .fulltext_index import (
+    FOLDER_RECEIVED,
+    FOLDER_SENT,
+    FullTextIndex,
+    build_basic_document,
+    build_search_document,
+)
 from .db_models import EmailRecord, SentEmailRecord
 from spam_filter.spam_filter import KeywordSpamFilter
 
@@ -33,7 +44,11 @@ class EmailService:
     """
 
     def __init__(
-        self, db_path: str = DB_PATH, use_connection_pool: bool = True
+        self,
+        db_path: str = DB_PATH,
+        use_connection_pool: bool = True,
+        use_write_batching: bool = DB_WRITE_BATCH_ENABLED,
+        storage_dir: Optional[str] = None,
     ) -> None:
         """
         初始化邮件服务
@@ -41,6 +56,8 @@ class EmailService:
         Args:
             db_path: 数据库文件路径
             use_connection_pool: 是否使用连接池
+            use_write_batching: 是否将新邮件写入合并为批量事务提交
+            storage_dir: 邮件内容存储根目录，默认使用配置中的EMAIL_STORAGE_DIR
         """
         self.db_path = db_path
         self.use_connection_pool = use_connection_pool
@@ -48,46 +65,45 @@ class EmailService:
         # 初始化连接池或单连接
         if use_connection_pool:
             self.connection_pool = get_connection_pool(db_path)
-            # 为了兼容性，也创建一个DatabaseConnection实例
-            self.db_connection = DatabaseConnection(db_path)
         else:
             self.connection_pool = None
-            self.db_connection = DatabaseConnection(db_path)
+
+        # 仓储层的所有语句都通过DatabaseConnection执行；启用连接池时从池中借用连接
+        self.db_connection = DatabaseConnection(db_path, pool=self.connection_pool)
+
+        # 写入批处理器（组提交），save_email在所属批次提交后才返回
+        self.write_batcher = (
+            WriteBatcher(self.db_connection) if use_write_batching else None
+        )
 
         # 初始化组件
-        self.email_repo = EmailRepository(self.db_connection)
-        self.content_manager = EmailContentManager()
+        self.email_repo = EmailRepository(self.db_connection, self.write_batcher)
+        self.content_manager = EmailContentManager(
+            create_message_store(root=storage_dir) if storage_dir else None
+        )
+        # 查看邮件时的解析结果缓存（进程内共享）
+        self.parsed_cache = get_parsed_message_cache()
         self.spam_filter = KeywordSpamFilter()
         self.email_validator = EmailValidator()
 
         # 初始化数据库
         self.db_connection.init_database()
 
-        logger.info(
-            f"邮件服务已初始化: {db_path}, 连接池: {'启用' if use_connection_pool else '禁用'}"
-        )
+        # 全文索引（迁移v4创建email_fts表后可用）
+        self.fulltext_index = FullTextIndex(self.db_connection)
 
-    def _execute_with_pool(self, operation_func, *args, **kwargs):
-        """
-        使用连接池执行数据库操作
+        # POP3客户端同步状态（迁移v6创建pop3_sync_state表后可用）
+        self.sync_state = SyncStateRepository(self.db_connection)
 
-        Args:
-            operation_func: 要执行的操作函数
-            *args: 位置参数
-            **kwargs: 关键字参数
+        logger.info(
+            f"邮件服务已初始化: {db_path}, 连接池: {'启用' if use_connection_pool else '禁用'}, "
+            f"批量写入: {'启用' if use_write_batching else '禁用'}"
+        )
 
-        Returns:
-            操作结果
-        """
-        if self.use_connection_pool and self.connection_pool:
-            try:
-                return operation_func(*args, **kwargs)
-            except Exception as e:
-                logger.error(f"使用连接池执行操作时出错: {e}")
-                # 回退到普通连接
-                return operation_func(*args, **kwargs)
-        else:
-            return operation_func(*args, **kwargs)
+    def close(self) -> None:
+        """关闭邮件服务，提交所有待写入的批次"""
+        if self.write_batcher is not None:
+            self.write_batcher.stop()
 
     def get_pool_status(self) -> Optional[Dict[str, Any]]:
         """
@@ -97,7 +113,10 @@ class EmailService:
             连接池状态信息，如果未使用连接池则返回None
         """
         if self.use_connection_pool and self.connection_pool:
-            return self.connection_pool.get_pool_status()
+            status = self.connection_pool.get_pool_status()
+            if self.write_batcher is not None:
+                status["write_batcher"] = self.write_batcher.get_stats()
+            return status
         return None
 
     def optimize_database(self) -> bool:
@@ -108,22 +127,13 @@ class EmailService:
             bool: 操作是否成功
         """
         try:
-            if self.use_connection_pool and self.connection_pool:
-                # 使用连接池执行优化
-                self.connection_pool.execute_script(
-                    """
-                    PRAGMA optimize;
-                    PRAGMA wal_checkpoint(TRUNCATE);
-                """
-                )
-            else:
-                # 使用普通连接执行优化
-                self.db_connection.execute_script(
-                    """
-                    PRAGMA optimize;
-                    PRAGMA wal_checkpoint(TRUNCATE);
+            # 启用连接池时db_connection会自动借用池中的连接
+            self.db_connection.execute_script(
                 """
-                )
+                PRAGMA optimize;
+                PRAGMA wal_checkpoint(TRUNCATE);
+            """
+            )
 
             logger.info("数据库优化完成")
             return True
@@ -142,8 +152,9 @@ class EmailService:
         content: str = "",  # 这是纯文本内容，用于分析
         date: Optional[datetime.datetime] = None,
         full_content_for_storage: Optional[
-            str
+            Union[str, bytes, BinaryIO]
         ] = None,  # 这是完整的.eml格式内容，用于存储
+        store_as_is: bool = False,
         **kwargs,
     ) -> bool:
         """
@@ -156,8 +167,13 @@ class EmailService:
             subject: 邮件主题
             content: 邮件内容
             date: 邮件日期
-            full_content_for_storage: 完整的.eml格式内容，用于存储
-            **kwargs: 其他选项（is_spam, spam_score等）
+            full_content_for_storage: 完整的.eml格式内容，用于存储；也可以是
+                二进制文件对象（如转存到临时文件的大邮件），原样存储时按块写入
+            store_as_is: 存储内容已是完整格式（如接收流水线中的原始字节），
+                跳过重新解析和格式化，原样写入
+            **kwargs: 其他选项（is_spam, spam_score等）；search_document为
+                build_search_document构建的全文索引文档，未提供时根据主题、
+                纯文本内容和地址构建
 
         Returns:
             bool: 操作是否成功
@@ -204,43 +220,14 @@ class EmailService:
                 to_addrs = [to_addrs]
 
             # 🔙 检查邮件是否已被撤回
-            # 在保存到收件箱之前，检查该邮件是否在已发送邮件中被标记为撤回
-            # 由于邮件服务器可能重新生成Message ID，我们需要多种方式匹配
+            # 由于邮件服务器可能重新生成Message ID，撤回索引同时按Message ID
+            # 和主题+发件人（24小时内发送）匹配；未撤回的邮件只需探测内存中的布隆过滤器
             try:
-                # 方法1：直接通过Message ID匹配
-                sent_email = self.email_repo.get_sent_email_by_id(message_id)
-                if sent_email and sent_email.is_recalled:
-                    logger.info(
-                        f"邮件已被撤回(Message ID匹配)，跳过保存到收件箱: {message_id}"
-                    )
+                if self.email_repo.recall_index.is_recalled(
+                    message_id, from_addr, subject
+                ):
+                    logger.info("邮件已被撤回，跳过保存到收件箱: %s", message_id)
                     return True  # 返回成功，但实际上不保存撤回的邮件
-
-                # 方法2：通过主题+发件人+时间范围匹配（用于Message ID不一致的情况）
-                # 查找最近发送的同主题同发件人的已撤回邮件
-                try:
-                    # 查找24小时内的已撤回邮件
-                    time_limit = datetime.datetime.now() - datetime.timedelta(hours=24)
-
-                    # 查询已撤回的已发送邮件
-                    recent_recalled_emails = self.email_repo.list_sent_emails(
-                        from_addr=from_addr, include_recalled=True, limit=50
-                    )
-
-                    for recalled_email in recent_recalled_emails:
-                        if (
-                            recalled_email.is_recalled
-                            and recalled_email.subject == subject
-                            and recalled_email.from_addr == from_addr
-                            and recalled_email.date >= time_limit
-                        ):
-                            logger.info(
-                                f"邮件已被撤回(主题+发件人匹配)，跳过保存到收件箱: 主题={subject}, 发件人={from_addr}"
-                            )
-                            return True  # 返回成功，但实际上不保存撤回的邮件
-
-                except Exception as match_error:
-                    logger.warning(f"主题匹配检查失败: {match_error}")
-
             except Exception as e:
                 logger.warning(f"检查邮件撤回状态失败，继续保存: {e}")
 
@@ -261,9 +248,18 @@ class EmailService:
                     "date": date.isoformat(),
                 }
                 content_path = self.content_manager.save_content(
-                    message_id, full_content_for_storage, metadata
+                    message_id,
+                    full_content_for_storage,
+                    metadata,
+                    normalize=not store_as_is,
                 )
 
+            # 规范化会改写内容，记录实际保存的字节数，POP3的LIST/STAT/RETR与文件一致
+            if content_path and not store_as_is:
+                size = self.content_manager.content_size(content_path)
+            else:
+                size = self._content_size(full_content_for_storage)
+
             # 创建邮件记录，直接使用spam_result的结果
             email_record = EmailRecord(
                 message_id=message_id,
@@ -271,7 +267,7 @@ class EmailService:
                 to_addrs=to_addrs,
                 subject=subject,
                 date=date,
-                size=len(full_content_for_storage) if full_content_for_storage else 0,
+                size=size,
                 is_spam=spam_result["is_spam"],
                 spam_score=spam_result["score"],
                 content_path=content_path,
@@ -281,15 +277,37 @@ class EmailService:
             success = self.email_repo.create_email(email_record)
 
             if success:
-                logger.info(f"邮件保存成功: {message_id}")
+                search_document = kwargs.get(
+                    "search_document"
+                ) or build_basic_document(subject, content, from_addr, to_addrs)
+                self.fulltext_index.index_email(
+                    message_id, FOLDER_RECEIVED, search_document
+                )
+                logger.info("邮件保存成功: %s", message_id)
 
             return success
         except Exception as e:
             logger.error(f"保存邮件时出错: {e}")
             return False
 
+    @staticmethod
+    def _content_size(content: Optional[Union[str, bytes, BinaryIO]]) -> int:
+        """计算邮件内容的字节数（文件对象按从开头到末尾计算）"""
+        if not content:
+            return 0
+        if hasattr(content, "seek"):
+            size = content.seek(0, os.SEEK_END)
+            content.seek(0)
+            return size
+        if isinstance(content, bytes):
+            return len(content)
+        return len(content.encode("utf-8", errors="surrogateescape"))
+
     def get_email(
-        self, message_id: str, include_content: bool = False
+        self,
+        message_id: str,
+        include_content: bool = False,
+        user_email: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         获取邮件（统一接口）
@@ -297,6 +315,7 @@ class EmailService:
         Args:
             message_id: 邮件ID
             include_content: 是否包含邮件内容
+            user_email: 指定时返回该用户邮箱中的已读/删除/垃圾邮件状态
 
         Returns:
             邮件字典或None
@@ -309,90 +328,16 @@ class EmailService:
 
             # 转换为字典
             email_dict = email_record.to_dict()
+            if user_email:
+                flags = self.email_repo.get_mailbox_flags(message_id, user_email)
+                if flags:
+                    email_dict.update(flags)
 
             # 如果需要，获取邮件内容
             if include_content:
-                full_eml_content = self.content_manager.get_content(
-                    message_id, email_dict
-                )
-                if full_eml_content:
-                    try:
-                        from common.email_format_handler import EmailFormatHandler
-
-                        # 解析邮件内容，提取纯文本或HTML正文
-                        parsed_email_obj = EmailFormatHandler.parse_mime_message(
-                            full_eml_content
-                        )
-                        # 优先使用 html_content，其次 text_content
-                        email_dict["content"] = (
-                            parsed_email_obj.html_content
-                            or parsed_email_obj.text_content
-                            or ""
-                        )
-
-                        # 添加附件信息
-                        if parsed_email_obj.attachments:
-                            email_dict["has_attachments"] = True
-                            email_dict["attachments"] = []
-                            for attachment in parsed_email_obj.attachments:
-                                # 计算附件大小
-                                attachment_size = 0
-                                if (
-                                    hasattr(attachment, "content")
-                                    and attachment.content
-                                ):
-                                    attachment_size = len(attachment.content)
-                                elif hasattr(attachment, "size") and attachment.size:
-                                    attachment_size = attachment.size
-
-                                email_dict["attachments"].append(
-                                    {
-                                        "filename": attachment.filename,
-                                        "content_type": attachment.content_type,
-                                        "size": attachment_size,
-                                    }
-                                )
-                        else:
-                            email_dict["has_attachments"] = False
-                            email_dict["attachments"] = []
-
-                    except Exception as e:
-                        logger.error(f"解析接收邮件内容失败 for {message_id}: {e}")
-                        # 解析失败时尝试简单提取文本内容
-                        try:
-                            import email
-
-                            msg = email.message_from_string(full_eml_content)
-
-                            # 尝试提取纯文本内容
-                            simple_content = ""
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    if part.get_content_type() == "text/plain":
-                                        payload = part.get_payload(decode=True)
-                                        if payload:
-                                            simple_content = payload.decode(
-                                                part.get_content_charset() or "utf-8",
-                                                errors="ignore",
-                                            )
-                                            break
-                            else:
-                                if msg.get_content_type() == "text/plain":
-                                    payload = msg.get_payload(decode=True)
-                                    if payload:
-                                        simple_content = payload.decode(
-                                            msg.get_content_charset() or "utf-8",
-                                            errors="ignore",
-                                        )
-
-                            email_dict["content"] = simple_content or "邮件内容解析失败"
-
-                        except Exception as simple_e:
-                            logger.error(f"简单解析也失败 for {message_id}: {simple_e}")
-                            email_dict["content"] = "邮件内容解析失败，请联系管理员"
-
-                        email_dict["has_attachments"] = False
-                        email_dict["attachments"] = []
+                summary = self._get_parsed_content(message_id, email_dict)
+                if summary:
+                    email_dict.update(summary)
                 else:
                     email_dict["content"] = ""
                     email_dict["has_attachments"] = False
@@ -403,6 +348,90 @@ class EmailService:
             logger.error(f"获取邮件时出错: {e}")
             return None
 
+    def _get_parsed_content(
+        self, message_id: str, record: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取解析后的邮件正文和附件描述，优先使用进程内的解析结果缓存
+
+        Args:
+            message_id: 邮件ID
+            record: 邮件记录字典（提供content_path和修复格式用的元数据）
+
+        Returns:
+            包含content、has_attachments、attachments的字典，没有内容时返回None
+        """
+        filepath = self.content_manager.resolve_path(
+            message_id, record.get("content_path")
+        )
+        stamp = file_stamp(filepath) if filepath else None
+        if stamp is not None:
+            summary = self.parsed_cache.get(message_id, filepath, stamp)
+            if summary is not None:
+                return summary
+
+        full_eml_content = self.content_manager.get_content(message_id, record)
+        if not full_eml_content:
+            return None
+
+        summary = self._parse_content(message_id, full_eml_content)
+        if stamp is not None:
+            self.parsed_cache.put(message_id, filepath, stamp, summary)
+        return summary
+
+    @staticmethod
+    def _parse_content(message_id: str, full_eml_content: str) -> Dict[str, Any]:
+        """解析邮件内容，提取正文（优先HTML）和附件描述"""
+        try:
+            from common.email_format_handler import EmailFormatHandler
+
+            parsed_email_obj = EmailFormatHandler.parse_mime_message(full_eml_content)
+            attachments = []
+            for attachment in parsed_email_obj.attachments or []:
+                # 附件大小在解析时已记录，不需要解码附件内容
+                attachment_size = attachment.size or 0
+
+                attachments.append(
+                    {
+                        "filename": attachment.filename,
+                        "content_type": attachment.content_type,
+                        "size": attachment_size,
+                    }
+                )
+            return {
+                # 优先使用 html_content，其次 text_content
+                "content": parsed_email_obj.html_content
+                or parsed_email_obj.text_content
+                or "",
+                "has_attachments": bool(attachments),
+                "attachments": attachments,
+            }
+        except Exception as e:
+            logger.error(f"解析邮件内容失败 for {message_id}: {e}")
+
+        # 解析失败时尝试简单提取文本内容
+        try:
+            import email
+
+            msg = email.message_from_string(full_eml_content)
+
+            # 尝试提取纯文本内容
+            simple_content = ""
+            for part in msg.walk():
+                if part.get_content_type() == "text/plain":
+                    payload = part.get_payload(decode=True)
+                    if payload:
+                        simple_content = payload.decode(
+                            part.get_content_charset() or "utf-8", errors="ignore"
+                        )
+                        break
+            content = simple_content or "邮件内容解析失败"
+        except Exception as simple_e:
+            logger.error(f"简单解析也失败 for {message_id}: {simple_e}")
+            content = "邮件内容解析失败，请联系管理员"
+
+        return {"content": content, "has_attachments": False, "attachments": []}
+
     def list_emails(
         self,
         user_email: Optional[str] = None,
@@ -445,12 +474,15 @@ class EmailService:
             logger.error(f"获取邮件列表时出错: {e}")
             return []
 
-    def update_email(self, message_id: str, **updates) -> bool:
+    def update_email(
+        self, message_id: str, user_email: Optional[str] = None, **updates
+    ) -> bool:
         """
         更新邮件状态（统一接口）
 
         Args:
             message_id: 邮件ID
+            user_email: 指定时已读/删除/垃圾邮件状态只对该用户的邮箱生效
             **updates: 更新字段（is_read, is_deleted, is_spam等）
 
         Returns:
@@ -465,8 +497,10 @@ class EmailService:
 
             if received_email:
                 # 邮件在接收邮件表中，更新接收邮件状态
-                success = self.email_repo.update_email_status(message_id, **updates)
-                logger.debug(f"更新接收邮件状态: {message_id}, 结果: {success}")
+                success = self.email_repo.update_email_status(
+                    message_id, user_email=user_email, **updates
+                )
+                logger.debug("更新接收邮件状态: %s, 结果: %s", message_id, success)
             else:
                 # 邮件不在接收邮件表中，尝试更新已发送邮件
                 # 对于已发送邮件，只支持部分字段更新
@@ -480,7 +514,7 @@ class EmailService:
                     success = self.email_repo.update_sent_email_status(
                         message_id, **sent_updates
                     )
-                    logger.debug(f"更新已发送邮件状态: {message_id}, 结果: {success}")
+                    logger.debug("更新已发送邮件状态: %s, 结果: %s", message_id, success)
                 else:
                     # 特殊处理：如果是标记删除操作，对于不存在的邮件我们认为操作成功
                     # 因为邮件可能只是从POP3服务器获取但没有保存到数据库
@@ -501,23 +535,29 @@ class EmailService:
             logger.error(f"更新邮件时出错: {e}")
             return False
 
-    def delete_email(self, message_id: str, permanent: bool = False) -> bool:
+    def delete_email(
+        self, message_id: str, permanent: bool = False, user_email: Optional[str] = None
+    ) -> bool:
         """
         删除邮件（统一接口）
 
         Args:
             message_id: 邮件ID
             permanent: 是否永久删除（True）或标记删除（False）
+            user_email: 标记删除时只从该用户的邮箱中删除
 
         Returns:
             bool: 操作是否成功
         """
         try:
+            # 已删除的邮件不再需要缓存的解析结果
+            self.parsed_cache.invalidate(message_id)
             if permanent:
                 # 永久删除：先尝试删除接收邮件，如果失败则尝试删除已发送邮件
                 success = self.email_repo.delete_email(message_id)
                 if not success:
                     success = self.email_repo.delete_sent_email(message_id)
+                self.fulltext_index.remove_email(message_id)
                 # 如果都没有找到，对于永久删除我们也认为成功
                 if not success:
                     logger.info(f"邮件 {message_id} 不在数据库中，永久删除操作视为成功")
@@ -525,7 +565,9 @@ class EmailService:
                 return success
             else:
                 # 标记删除：使用 update_email 方法（已经处理了不存在的情况）
-                return self.update_email(message_id, is_deleted=True)
+                return self.update_email(
+                    message_id, user_email=user_email, is_deleted=True
+                )
         except Exception as e:
             logger.error(f"删除邮件时出错: {e}")
             return False
@@ -619,6 +661,11 @@ class EmailService:
                     message_id, content, metadata
                 )
 
+            if content_path:
+                size = self.content_manager.content_size(content_path)
+            else:
+                size = self._content_size(content)
+
             # 创建已发送邮件记录
             sent_email_record = SentEmailRecord(
                 message_id=message_id,
@@ -628,7 +675,7 @@ class EmailService:
                 bcc_addrs=bcc_addrs or [],
                 subject=subject,
                 date=date,
-                size=len(content) if content else 0,
+                size=size,
                 has_attachments=kwargs.get("has_attachments", False),
                 content_path=content_path,
                 status=kwargs.get("status", "sent"),
@@ -638,12 +685,15 @@ class EmailService:
             )
 
             # 保存到数据库
-            logger.debug(f"准备保存已发送邮件记录: {sent_email_record.to_dict()}")
+            logger.debug("准备保存已发送邮件记录: %s", sent_email_record)
             success = self.email_repo.create_sent_email(sent_email_record)
-            logger.debug(f"数据库保存结果: {success}")
+            logger.debug("数据库保存结果: %s", success)
 
             if success:
-                logger.info(f"已发送邮件保存成功: {message_id}")
+                self._index_sent_email(
+                    message_id, subject, content, from_addr, to_addrs
+                )
+                logger.info("已发送邮件保存成功: %s", message_id)
             else:
                 logger.error(f"已发送邮件数据库保存失败: {message_id}")
 
@@ -652,6 +702,26 @@ class EmailService:
             logger.error(f"保存已发送邮件时出错: {e}")
             return False
 
+    def _index_sent_email(
+        self,
+        message_id: str,
+        subject: str,
+        content: str,
+        from_addr: str,
+        to_addrs: List[str],
+    ) -> None:
+        """为已发送邮件写入全文索引（content为完整的.eml内容）"""
+        try:
+            from common.email_format_handler import EmailFormatHandler
+
+            document = build_search_document(
+                EmailFormatHandler.parse_mime_message(content)
+            )
+        except Exception as e:
+            logger.debug(f"解析已发送邮件失败，使用基本索引文档: {e}")
+            document = build_basic_document(subject, content, from_addr, to_addrs)
+        self.fulltext_index.index_email(message_id, FOLDER_SENT, document)
+
     def get_sent_email(
         self, message_id: str, include_content: bool = False
     ) -> Optional[Dict[str, Any]]:
@@ -673,58 +743,8 @@ class EmailService:
             sent_dict = sent_record.to_dict()
 
             if include_content:
-                full_eml_content = self.content_manager.get_content(
-                    message_id, sent_dict
-                )
-                if full_eml_content:
-                    try:
-                        from common.email_format_handler import EmailFormatHandler
-
-                        parsed_email_obj = EmailFormatHandler.parse_mime_message(
-                            full_eml_content
-                        )
-                        # 优先使用 html_content，其次 text_content
-                        sent_dict["content"] = (
-                            parsed_email_obj.html_content
-                            or parsed_email_obj.text_content
-                            or ""
-                        )
-                    except Exception as e:
-                        logger.error(f"解析已发送邮件内容失败 for {message_id}: {e}")
-                        # 解析失败时尝试简单提取文本内容
-                        try:
-                            import email
-
-                            msg = email.message_from_string(full_eml_content)
-
-                            # 尝试提取纯文本内容
-                            simple_content = ""
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    if part.get_content_type() == "text/plain":
-                                        payload = part.get_payload(decode=True)
-                                        if payload:
-                                            simple_content = payload.decode(
-                                                part.get_content_charset() or "utf-8",
-                                                errors="ignore",
-                                            )
-                                            break
-                            else:
-                                if msg.get_content_type() == "text/plain":
-                                    payload = msg.get_payload(decode=True)
-                                    if payload:
-                                        simple_content = payload.decode(
-                                            msg.get_content_charset() or "utf-8",
-                                            errors="ignore",
-                                        )
-
-                            sent_dict["content"] = simple_content or "邮件内容解析失败"
-
-                        except Exception as simple_e:
-                            logger.error(f"简单解析也失败 for {message_id}: {simple_e}")
-                            sent_dict["content"] = "邮件内容解析失败，请联系管理员"
-                else:
-                    sent_dict["content"] = ""
+                summary = self._get_parsed_content(message_id, sent_dict)
+                sent_dict["content"] = summary["content"] if summary else ""
             else:
                 sent_dict["content"] = ""  # 确保即使不include_content也有这个key
 
@@ -806,64 +826,188 @@ class EmailService:
             logger.error(f"搜索邮件时出错: {e}")
             return []
 
+    def search_fulltext(
+        self,
+        query: str,
+        user_email: Optional[str] = None,
+        include_sent: bool = True,
+        include_received: bool = True,
+        include_spam: bool = False,
+        include_deleted: bool = False,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        全文搜索邮件主题、正文、地址和附件名，按相关度排序
+
+        Args:
+            query: 搜索词，多个词之间为AND
+            user_email: 只返回该用户的邮件
+            include_sent: 是否包含已发送邮件
+            include_received: 是否包含接收邮件
+            include_spam: 是否包含垃圾邮件
+            include_deleted: 是否包含已删除邮件
+            limit: 每页数量
+            offset: 偏移量
+
+        Returns:
+            邮件字典列表，附带type、rank和snippet（关键词用[]标出）
+        """
+        try:
+            hits = self.fulltext_index.search(
+                query,
+                user_email=user_email,
+                include_received=include_received,
+                include_sent=include_sent,
+                include_spam=include_spam,
+                include_deleted=include_deleted,
+                limit=limit,
+                offset=offset,
+            )
+
+            results = []
+            for hit in hits:
+                if hit["type"] == FOLDER_SENT:
+                    record = self.email_repo.get_sent_email_by_id(hit["message_id"])
+                else:
+                    record = self.email_repo.get_email_by_id(hit["message_id"])
+                if not record:
+                    continue
+                email_dict = record.to_dict()
+                email_dict.update(hit)
+                results.append(email_dict)
+            return results
+        except Exception as e:
+            logger.error(f"全文搜索邮件时出错: {e}")
+            return []
+
+    def rebuild_fulltext_index(self, batch_size: int = 500, progress=None) -> int:
+        """
+        从已存储的邮件内容重建全文索引
+
+        Args:
+            batch_size: 每次从数据库读取的邮件数
+            progress: 可选的进度回调，参数为已索引的邮件数
+
+        Returns:
+            已索引的邮件数
+        """
+        from common.email_format_handler import EmailFormatHandler
+
+        if not self.fulltext_index.available:
+            logger.error("全文索引不可用，无法重建")
+            return 0
+
+        self.fulltext_index.clear()
+        indexed = 0
+        tables = ((FOLDER_RECEIVED, "emails"), (FOLDER_SENT, "sent_emails"))
+        for folder, table in tables:
+            offset = 0
+            while True:
+                rows = self.db_connection.execute_query(
+                    f"SELECT message_id, from_addr, to_addrs, subject, content_path "
+                    f"FROM {table} ORDER BY rowid LIMIT ? OFFSET ?",
+                    (batch_size, offset),
+                    fetch_all=True,
+                )
+                if not rows:
+                    break
+                offset += len(rows)
+
+                for row in rows:
+                    message_id = row["message_id"]
+                    document = None
+                    path = self.get_email_content_path(message_id, row["content_path"])
+                    if path:
+                        try:
+                            raw = self.content_manager.read_raw(path)
+                            document = build_search_document(
+                                EmailFormatHandler.parse_mime_message(raw)
+                            )
+                        except Exception as e:
+                            logger.warning(
+                                f"解析邮件失败，使用基本索引文档: {message_id} - {e}"
+                            )
+                    if document is None:
+                        document = build_basic_document(
+                            row["subject"], "", row["from_addr"], row["to_addrs"]
+                        )
+                    if self.fulltext_index.index_email(message_id, folder, document):
+                        indexed += 1
+                        if progress:
+                            progress(indexed)
+
+        self.fulltext_index.optimize()
+        logger.info(f"全文索引重建完成: {indexed} 封邮件")
+        return indexed
+
     # ==================== 兼容性方法 ====================
     # 为了保持向后兼容，提供原有方法的别名
 
     def get_email_content(self, message_id: str) -> Optional[str]:
         """获取邮件内容（兼容性方法）- 学习CLI的做法，直接返回原始邮件内容"""
         try:
-            # 方法1: 直接从文件读取（学习CLI的简单直接方式）
-            safe_id = message_id.strip().strip("<>").replace("@", "_at_")
-            import re
-
-            safe_id = re.sub(r'[\\/*?:"<>|]', "_", safe_id).strip()
-
-            # 尝试多个可能的文件路径
-            potential_paths = [
-                os.path.join(EMAIL_STORAGE_DIR, f"{safe_id}.eml"),
-                os.path.join(EMAIL_STORAGE_DIR, "inbox", f"{safe_id}.eml"),
-                os.path.join(EMAIL_STORAGE_DIR, "sent", f"{safe_id}.eml"),
-            ]
-
-            for filepath in potential_paths:
-                if os.path.exists(filepath):
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    logger.debug(f"直接从文件读取邮件内容: {filepath}")
-                    return content
-
-            # 方法2: 如果直接读取失败，尝试在邮件目录中搜索
-            try:
-                for filename in os.listdir(EMAIL_STORAGE_DIR):
-                    if filename.endswith(".eml") and safe_id in filename:
-                        filepath = os.path.join(EMAIL_STORAGE_DIR, filename)
-                        with open(filepath, "r", encoding="utf-8") as f:
-                            content = f.read()
-                        logger.debug(f"通过搜索找到邮件文件: {filepath}")
-                        return content
-            except Exception as e:
-                logger.debug(f"搜索邮件文件时出错: {e}")
+            filepath = self.get_email_content_path(message_id)
+            if not filepath:
+                logger.warning(f"无法找到邮件内容文件: {message_id}")
+                return None
+
+            return self.content_manager.read_text(filepath)
+
+        except Exception as e:
+            logger.error(f"获取邮件内容时出错: {e}")
+            return None
+
+    def get_email_content_path(
+        self, message_id: str, content_path: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        定位邮件原始内容(.eml)文件
+
+        Args:
+            message_id: 邮件ID
+            content_path: 调用方已知的内容路径（如邮件列表中的content_path），优先使用
 
-            # 方法3: 最后才尝试数据库记录（但不进行复杂的格式化处理）
+        Returns:
+            文件路径，找不到时返回None
+        """
+        # 按记录的路径和存储后端计算出的路径定位，不扫描目录
+        filepath = self.content_manager.resolve_path(message_id, content_path)
+        if filepath:
+            return filepath
+
+        # 调用方没有提供路径时再查询数据库记录
+        if not content_path:
             email_data = self.get_email(message_id)
             if email_data and email_data.get("content_path"):
-                try:
-                    with open(email_data["content_path"], "r", encoding="utf-8") as f:
-                        content = f.read()
-                    logger.debug(
-                        f"从数据库记录的路径读取: {email_data['content_path']}"
-                    )
-                    return content
-                except Exception as e:
-                    logger.warning(
-                        f"无法从数据库记录路径读取: {email_data['content_path']}, {e}"
-                    )
+                if os.path.exists(email_data["content_path"]):
+                    logger.debug(f"使用数据库记录的路径: {email_data['content_path']}")
+                    return email_data["content_path"]
+                logger.warning(f"数据库记录的路径不存在: {email_data['content_path']}")
 
-            logger.warning(f"无法找到邮件内容文件: {message_id}")
-            return None
+        return None
 
+    def open_email_content(
+        self, message_id: str, content_path: Optional[str] = None
+    ) -> Optional[BinaryIO]:
+        """
+        以二进制只读方式打开邮件原始内容，供POP3 RETR/TOP流式发送
+
+        Args:
+            message_id: 邮件ID
+            content_path: 调用方已知的内容路径，优先使用
+
+        Returns:
+            二进制文件对象（由调用方关闭），找不到时返回None
+        """
+        try:
+            filepath = self.get_email_content_path(message_id, content_path)
+            if not filepath:
+                logger.warning(f"无法找到邮件内容文件: {message_id}")
+                return None
+            return self.content_manager.open_raw(filepath)
         except Exception as e:
-            logger.error(f"获取邮件内容时出错: {e}")
+            logger.error(f"打开邮件内容时出错: {e}")
             return None
 
     def get_email_metadata(self, message_id: str) -> Optional[Dict[str, Any]]:
@@ -873,6 +1017,7 @@ class EmailService:
     def save_email_content(self, message_id: str, content: str) -> None:
         """保存邮件内容（兼容性方法）"""
         self.content_manager.save_content(message_id, content)
+        self.parsed_cache.invalidate(message_id)
 
     def save_email_metadata(
         self,
@@ -886,15 +1031,8 @@ class EmailService:
         spam_score: float = 0.0,
     ) -> None:
         """保存邮件元数据（兼容性方法）"""
-        content_path = None
-        # 尝试生成内容路径（用于兼容性）
-        safe_id = message_id.strip().strip("<>").replace("@", "_at_")
-        import re
-
-        safe_id = re.sub(r'[\\/*?:"<>|]', "_", safe_id).strip()
-        potential_path = os.path.join(EMAIL_STORAGE_DIR, f"{safe_id}.eml")
-        if os.path.exists(potential_path):
-            content_path = potential_path
+        # 内容已由save_email_content写入时记录其路径（用于兼容性）
+        content_path = self.content_manager.resolve_path(message_id)
 
         email_record = EmailRecord(
             message_id=message_id,
@@ -910,16 +1048,66 @@ class EmailService:
 
         self.email_repo.create_email(email_record)
 
-    def mark_email_as_read(self, message_id: str) -> bool:
-        """标记邮件为已读（兼容性方法）"""
-        return self.update_email(message_id, is_read=True)
+    def mark_email_as_read(
+        self, message_id: str, user_email: Optional[str] = None
+    ) -> bool:
+        """标记邮件为已读（兼容性方法），指定user_email时只对该用户生效"""
+        return self.update_email(message_id, user_email=user_email, is_read=True)
+
+    def mark_email_as_deleted(
+        self, message_id: str, user_email: Optional[str] = None
+    ) -> bool:
+        """标记邮件为已删除（兼容性方法），指定user_email时只对该用户生效"""
+        return self.update_email(message_id, user_email=user_email, is_deleted=True)
+
+    def mark_emails_deleted(
+        self, message_ids: List[str], user_email: Optional[str] = None
+    ) -> bool:
+        """
+        批量标记邮件为已删除（POP3会话在QUIT时一次性提交）
+
+        Args:
+            message_ids: 邮件ID列表
+            user_email: 指定时只从该用户的邮箱中删除
 
-    def mark_email_as_deleted(self, message_id: str) -> bool:
-        """标记邮件为已删除（兼容性方法）"""
-        return self.update_email(message_id, is_deleted=True)
+        Returns:
+            bool: 操作是否成功
+        """
+        return self.email_repo.mark_emails_deleted(list(message_ids), user_email)
 
-    def mark_email_as_spam(self, message_id: str, spam_score: float = 1.0) -> bool:
-        """标记邮件为垃圾邮件（兼容性方法）"""
+    def list_maildrop(self, user_email: str) -> List[Tuple[str, int, Optional[str]]]:
+        """
+        获取用户邮箱快照（POP3会话使用）
+
+        Args:
+            user_email: 用户邮箱
+
+        Returns:
+            (message_id, size, content_path)列表，排序与list_emails一致
+        """
+        return self.email_repo.list_maildrop(user_email)
+
+    def get_deleted_message_ids(self, user_email: str) -> Set[str]:
+        """
+        获取用户已删除的邮件ID集合（用于过滤从服务器获取的邮件）
+
+        Args:
+            user_email: 用户邮箱
+
+        Returns:
+            已删除邮件的message_id集合
+        """
+        return self.email_repo.get_deleted_message_ids(user_email)
+
+    def mark_email_as_spam(
+        self,
+        message_id: str,
+        spam_score: float = 1.0,
+        user_email: Optional[str] = None,
+    ) -> bool:
+        """标记邮件为垃圾邮件（兼容性方法），指定user_email时只对该用户生效"""
+        if user_email:
+            return self.update_email(message_id, user_email=user_email, is_spam=True)
         return self.update_email(message_id, is_spam=True, spam_score=spam_score)
 
     def delete_email_metadata(self, message_id: str) -> bool:
@@ -973,13 +1161,13 @@ class EmailService:
             邮件数量
         """
         try:
-            emails = self.list_emails(
+            return self.email_repo.count_emails(
                 user_email=user_email,
                 include_deleted=filters.get("include_deleted", False),
                 include_spam=filters.get("include_spam", False),
-                limit=10000,  # 获取大量数据来计数
+                include_recalled=filters.get("include_recalled", False),
+                is_spam=filters.get("is_spam"),
             )
-            return len(emails)
         except Exception as e:
             logger.error(f"获取邮件数量时出错: {e}")
             return 0
@@ -995,8 +1183,9 @@ class EmailService:
             未读邮件数量
         """
         try:
-            emails = self.list_emails(user_email=user_email, limit=10000)
-            return len([email for email in emails if not email.get("is_read", False)])
+            return self.email_repo.count_emails(
+                user_email=user_email, include_spam=True, unread_only=True
+            )
         except Exception as e:
             logger.error(f"获取未读邮件数量时出错: {e}")
             return 0
@@ -1045,6 +1234,7 @@ class EmailService:
             success = self.email_repo.recall_email(message_id, user_email)
 
             if success:
+                self.parsed_cache.invalidate(message_id)
                 return {"success": True, "message": "邮件撤回成功", "recalled": True}
             else:
                 return {
@@ -0,0 +1,208 @@
+"""
+邮件解析结果缓存 - 查看邮件时复用已解析的正文和附件描述
+
+get_email/get_sent_email(include_content=True)每次都要读取.eml文件、验证格式
+并完整解析MIME结构（包括解码所有附件）。查看邮件、垃圾邮件重新扫描和Web页面
+会反复打开同一封邮件，所以解析结果按(Message-ID, 文件路径)缓存，
+并记录文件的修改时间和大小，文件变化后缓存自动失效。
+
+缓存在进程内共享（Web客户端每个请求都会新建EmailService），
+同时限制条目数和估算的总字节数，按LRU淘汰。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from common.utils import setup_logging
+from common.config import PARSED_CACHE_SIZE, PARSED_CACHE_MAX_BYTES
+
+# 设置日志
+logger = setup_logging("parsed_message_cache")
+
+# 每个附件描述的估算开销（字节）
+ATTACHMENT_OVERHEAD = 256
+
+
+def file_stamp(filepath: str) -> Optional[Tuple[int, int]]:
+    """
+    获取文件的(修改时间, 大小)，用于判断缓存是否过期
+
+    Args:
+        filepath: 文件路径
+
+    Returns:
+        (st_mtime_ns, st_size)，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def summary_size(summary: Dict[str, Any]) -> int:
+    """估算解析结果占用的字节数"""
+    size = len(summary.get("content") or "")
+    for attachment in summary.get("attachments") or []:
+        size += ATTACHMENT_OVERHEAD + len(attachment.get("filename") or "")
+    return size
+
+
+class ParsedMessageCache:
+    """邮件解析结果LRU缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = PARSED_CACHE_SIZE,
+        max_bytes: int = PARSED_CACHE_MAX_BYTES,
+    ):
+        """
+        初始化解析结果缓存
+
+        Args:
+            max_entries: 最大缓存邮件数，0表示不缓存
+            max_bytes: 缓存的最大估算总字节数，超过单条上限的结果不缓存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # (Message-ID, 文件路径) -> (文件戳, 解析结果, 估算大小)
+        self.entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(
+        self, message_id: str, filepath: str, stamp: Optional[Tuple[int, int]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的解析结果，文件已变化时视为未命中
+
+        Args:
+            message_id: 邮件ID
+            filepath: 邮件内容文件路径
+            stamp: 文件当前的file_stamp()
+
+        Returns:
+            解析结果字典的副本，未命中时返回None
+        """
+        if self.max_entries <= 0:
+            return None
+
+        key = (message_id, filepath)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if stamp is None or entry[0] != stamp:
+                self._remove(key)
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._copy(entry[1])
+
+    def put(
+        self,
+        message_id: str,
+        filepath: str,
+        stamp: Optional[Tuple[int, int]],
+        summary: Dict[str, Any],
+    ) -> None:
+        """
+        缓存解析结果
+
+        Args:
+            message_id: 邮件ID
+            filepath: 邮件内容文件路径
+            stamp: 读取文件之前取得的file_stamp()
+            summary: 解析结果（content、has_attachments、attachments）
+        """
+        if self.max_entries <= 0 or stamp is None:
+            return
+        size = summary_size(summary)
+        if size > self.max_bytes:
+            logger.debug("解析结果过大，不缓存: %s (%s 字节)", message_id, size)
+            return
+
+        key = (message_id, filepath)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (stamp, self._copy(summary), size)
+            self.total_bytes += size
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.stats["evictions"] += 1
+
+    def invalidate(self, message_id: str) -> None:
+        """
+        清除邮件的所有缓存结果（删除、撤回或内容更新后调用）
+
+        Args:
+            message_id: 邮件ID
+        """
+        with self.lock:
+            stale = [key for key in self.entries if key[0] == message_id]
+            for key in stale:
+                self._remove(key)
+            self.stats["invalidations"] += len(stale)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            包含命中、未命中、淘汰次数、条目数和估算字节数的字典
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.total_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """移除一个条目（调用方持有锁）"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    @staticmethod
+    def _copy(summary: Dict[str, Any]) -> Dict[str, Any]:
+        """复制解析结果，调用方修改返回的字典不影响缓存"""
+        copied = dict(summary)
+        copied["attachments"] = [dict(a) for a in summary.get("attachments") or []]
+        return copied
+
+
+_cache: Optional[ParsedMessageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parsed_message_cache() -> ParsedMessageCache:
+    """获取进程内共享的解析结果缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParsedMessageCache()
+        return _cache
@@ -25,7 +25,7 @@ class POP3Authenticator:
         """
         self.user_auth = user_auth
         self.users = users or {}
-        logger.info(f"POP3认证器已初始化，加载了 {len(self.users)} 个用户")
+        logger.info("POP3认证器已初始化，加载了 %s 个用户", len(self.users))
 
     def authenticate(self, username: str, password: str) -> Tuple[bool, Optional[str]]:
         """
@@ -41,7 +41,7 @@ class POP3Authenticator:
         authenticated = False
         user_email = None
         
-        logger.debug(f"开始认证用户: {username}")
+        logger.debug("开始认证用户: %s", username)
 
         # 尝试使用UserAuth进行认证
         try:
@@ -50,7 +50,7 @@ class POP3Authenticator:
                 authenticated = True
                 # 保存用户邮箱地址，用于后续查询邮件
                 user_email = user.email
-                logger.info(f"用户 {username} 通过UserAuth认证成功 (邮箱: {user_email})")
+                logger.info("用户 %s 通过UserAuth认证成功 (邮箱: %s)", username, user_email)
         except Exception as e:
             logger.error(f"UserAuth认证出错: {e}")
             import traceback
@@ -63,7 +63,7 @@ class POP3Authenticator:
                 authenticated = True
                 # 如果使用简单认证，假设用户名就是邮箱前缀
                 user_email = f"{username}@example.com"
-                logger.info(f"用户 {username} 通过本地用户字典认证成功 (默认邮箱: {user_email})")
+                logger.info("用户 %s 通过本地用户字典认证成功 (默认邮箱: %s)", username, user_email)
 
         if not authenticated:
             logger.warning(f"用户 {username} 认证失败")
@@ -102,7 +102,7 @@ class POP3Authenticator:
                 users = {"admin": "admin123", "user1": "user123", "user2": "user123"}
                 logger.warning("未找到用户，使用默认测试用户")
 
-            logger.info(f"已加载 {len(users)} 个用户")
+            logger.info("已加载 %s 个用户", len(users))
             self.users = users
             return users
         except Exception as e:
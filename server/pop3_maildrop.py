@@ -0,0 +1,203 @@
+"""
+POP3邮箱快照模块 - 会话级邮箱快照和邮箱独占锁
+
+RFC 1939要求会话期间消息编号保持不变、DELE延迟到QUIT（UPDATE状态）才生效，
+并且同一邮箱同一时间只允许一个会话访问。快照在PASS成功后构建一次，
+之后STAT/LIST/UIDL/RETR/TOP/DELE都只访问快照，不再查询数据库。
+"""
+
+import re
+import hashlib
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from common.utils import setup_logging
+
+# 设置日志
+logger = setup_logging("pop3_maildrop")
+
+# RFC 1939: 唯一ID由0x21到0x7E之间的1到70个字符组成
+_UID_RE = re.compile(r"^[\x21-\x7e]{1,70}$")
+
+
+def make_uid(message_id: str) -> str:
+    """
+    根据Message-ID生成UIDL唯一标识符
+
+    去掉尖括号后符合RFC 1939要求的直接使用（与之前的UIDL输出保持一致），
+    否则使用其SHA-1摘要。
+
+    Args:
+        message_id: 邮件ID
+
+    Returns:
+        唯一标识符
+    """
+    uid = message_id.strip("<>")
+    if _UID_RE.match(uid):
+        return uid
+    return hashlib.sha1(message_id.encode("utf-8")).hexdigest()
+
+
+class MaildropSnapshot:
+    """
+    会话级邮箱快照
+
+    message_id、大小、UID和内容路径按消息编号顺序存放在平行数组中，
+    删除标记只在快照中记录，直到QUIT时统一提交。
+    """
+
+    __slots__ = ("message_ids", "sizes", "uids", "content_paths", "deleted")
+
+    def __init__(self, rows: List[Tuple[str, int, Optional[str]]]):
+        """
+        初始化快照
+
+        Args:
+            rows: (message_id, size, content_path)列表
+        """
+        self.message_ids: List[str] = [row[0] for row in rows]
+        self.sizes = array("q", (row[1] or 0 for row in rows))
+        self.uids: List[str] = [make_uid(message_id) for message_id in self.message_ids]
+        self.content_paths: List[Optional[str]] = [row[2] for row in rows]
+        self.deleted = bytearray(len(rows))
+
+    @classmethod
+    def load(cls, email_service, user_email: str) -> "MaildropSnapshot":
+        """
+        从数据库加载用户邮箱快照
+
+        Args:
+            email_service: 邮件服务
+            user_email: 用户邮箱
+
+        Returns:
+            MaildropSnapshot对象
+        """
+        snapshot = cls(email_service.list_maildrop(user_email))
+        logger.debug("已为 %s 构建邮箱快照: %s 封邮件", user_email, len(snapshot))
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.message_ids)
+
+    def index_of(self, msg_num: int) -> Optional[int]:
+        """
+        将消息编号转换为数组下标
+
+        Args:
+            msg_num: 消息编号（从1开始）
+
+        Returns:
+            数组下标，编号无效或已标记删除时返回None
+        """
+        if 1 <= msg_num <= len(self.message_ids) and not self.deleted[msg_num - 1]:
+            return msg_num - 1
+        return None
+
+    def email_at(self, index: int) -> Dict[str, Any]:
+        """
+        以邮件字典的形式返回快照中的一项（RETR/TOP打开内容时使用）
+
+        Args:
+            index: 数组下标
+
+        Returns:
+            包含message_id、size、content_path的字典
+        """
+        return {
+            "message_id": self.message_ids[index],
+            "size": self.sizes[index],
+            "content_path": self.content_paths[index],
+        }
+
+    def mark_deleted(self, index: int) -> None:
+        """标记删除（QUIT时才生效）"""
+        self.deleted[index] = 1
+
+    def reset(self) -> None:
+        """清除所有删除标记（RSET）"""
+        self.deleted = bytearray(len(self.message_ids))
+
+    def visible(self) -> Iterator[int]:
+        """
+        遍历未标记删除的消息
+
+        Returns:
+            数组下标迭代器
+        """
+        for index, deleted in enumerate(self.deleted):
+            if not deleted:
+                yield index
+
+    def stat(self) -> Tuple[int, int]:
+        """
+        统计未标记删除的消息
+
+        Returns:
+            (消息数量, 总字节数)
+        """
+        count = 0
+        total = 0
+        for index in self.visible():
+            count += 1
+            total += self.sizes[index]
+        return count, total
+
+    def deleted_message_ids(self) -> List[str]:
+        """返回已标记删除的邮件ID列表"""
+        return [
+            message_id
+            for message_id, deleted in zip(self.message_ids, self.deleted)
+            if deleted
+        ]
+
+
+class MaildropLocks:
+    """邮箱独占锁（进程内），防止同一用户的并发会话互相干扰"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owners: Dict[str, object] = {}
+
+    def acquire(self, user_email: str, owner: object) -> bool:
+        """
+        获取邮箱锁
+
+        Args:
+            user_email: 用户邮箱
+            owner: 持有者（会话对象）
+
+        Returns:
+            bool: 是否获取成功（同一持有者重复获取视为成功）
+        """
+        key = user_email.lower()
+        with self.lock:
+            current = self.owners.get(key)
+            if current is not None and current is not owner:
+                return False
+            self.owners[key] = owner
+            return True
+
+    def release(self, user_email: str, owner: object) -> None:
+        """
+        释放邮箱锁（只有持有者可以释放）
+
+        Args:
+            user_email: 用户邮箱
+            owner: 持有者
+        """
+        key = user_email.lower()
+        with self.lock:
+            if self.owners.get(key) is owner:
+                del self.owners[key]
+
+    def is_locked(self, user_email: str) -> bool:
+        """邮箱是否已被锁定"""
+        with self.lock:
+            return user_email.lower() in self.owners
+
+
+# 全局邮箱锁（同一进程内的所有POP3服务器共享）
+maildrop_locks = MaildropLocks()
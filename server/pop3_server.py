@@ -23,8 +23,16 @@ from common.config import (
     MAX_CONNECTIONS,
     POP3_REQUEST_QUEUE_SIZE,
 )
+from common.tls_context import get_server_context, tls_stats
 from server.new_db_handler import EmailService
 from server.user_auth import UserAuth
+from server.pop3_maildrop import MaildropSnapshot, maildrop_locks
+from server.pop3_utils import (
+    iter_file_chunks,
+    iter_top_lines,
+    stream_size,
+    write_multiline_response,
+)
 
 # 设置日志
 logger = setup_logging("stable_pop3_server")
@@ -38,9 +46,8 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
         self.user_auth = server.user_auth
         self.authenticated_user = None
         self.use_ssl = server.use_ssl
-        # 邮件列表缓存
-        self.cached_emails = None
-        self.cache_user_email = None
+        # 邮箱快照（PASS成功后构建，会话期间消息编号保持不变）
+        self.maildrop = None
         # 添加连接统计
         self.connection_start_time = time.time()
         self.connection_active = True
@@ -91,7 +98,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                     self.rfile = self.request.makefile("rb", -1)
                     self.wfile = self.request.makefile("wb", 0)
 
-                    logger.debug(f"SSL连接已建立: {self.client_address}")
+                    logger.debug("SSL连接已建立: %s", self.client_address)
                 except ssl.SSLError as e:
                     logger.warning(f"SSL握手失败，客户端可能不支持SSL: {e}")
                     # 关闭连接，让客户端重新以非SSL方式连接
@@ -105,7 +112,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                     self._safe_close_connection()
                     raise
         except Exception as e:
-            logger.debug(f"连接setup失败 (可能是客户端提前断开): {e}")
+            logger.debug("连接setup失败 (可能是客户端提前断开): %s", e)
             self.connection_active = False
             raise
 
@@ -139,11 +146,11 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
 
         # 检查连接是否在setup阶段就失败了
         if not self.connection_active:
-            logger.debug(f"连接在setup阶段失败，跳过处理: {connection_id}")
+            logger.debug("连接在setup阶段失败，跳过处理: %s", connection_id)
             return
 
         try:
-            logger.info(f"新的POP3连接: {connection_id}")
+            logger.info("新的POP3连接: %s", connection_id)
 
             # 发送欢迎消息
             if not self._safe_send_response("+OK POP3 server ready"):
@@ -160,7 +167,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                         break
 
                     self.last_activity = time.time()
-                    logger.debug(f"收到命令: {line} from {connection_id}")
+                    logger.debug("收到命令: %s from %s", line, connection_id)
 
                     # 解析命令
                     parts = line.split(" ", 1)
@@ -178,6 +185,10 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                         self.handle_list(args)
                     elif command == "RETR":
                         self.handle_retr(args)
+                    elif command == "TOP":
+                        self.handle_top(args)
+                    elif command == "UIDL":
+                        self.handle_uidl(args)
                     elif command == "DELE":
                         self.handle_dele(args)
                     elif command == "NOOP":
@@ -191,7 +202,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                         self._safe_send_response(f"-ERR Unknown command: {command}")
 
                 except socket.timeout:
-                    logger.debug(f"POP3连接超时: {connection_id}")
+                    logger.debug("POP3连接超时: %s", connection_id)
                     self._safe_send_response("-ERR Connection timeout")
                     break
                 except (
@@ -199,7 +210,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                     ConnectionAbortedError,
                     BrokenPipeError,
                 ) as e:
-                    logger.debug(f"客户端断开连接: {connection_id} - {e}")
+                    logger.debug("客户端断开连接: %s - %s", connection_id, e)
                     break
                 except Exception as e:
                     logger.warning(f"处理命令时出错: {e} from {connection_id}")
@@ -207,11 +218,14 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
                         break
 
         except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError) as e:
-            logger.debug(f"连接被重置或中止: {connection_id} - {e}")
+            logger.debug("连接被重置或中止: %s - %s", connection_id, e)
         except Exception as e:
-            logger.debug(f"处理连接时出错: {e} from {connection_id}")
+            logger.debug("处理连接时出错: %s from %s", e, connection_id)
         finally:
             self.connection_active = False
+            # 释放邮箱锁，未QUIT的删除标记被丢弃
+            if self.authenticated_user:
+                maildrop_locks.release(self.authenticated_user.email, self)
             connection_duration = time.time() - self.connection_start_time
             logger.info(
                 f"POP3连接关闭: {connection_id}, 持续时间: {connection_duration:.2f}秒"
@@ -227,7 +241,7 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
         except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
             return None
         except Exception as e:
-            logger.debug(f"读取数据时出错: {e}")
+            logger.debug("读取数据时出错: %s", e)
             return None
 
     def _safe_send_response(self, response):
@@ -235,14 +249,14 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
         try:
             self.wfile.write(f"{response}\r\n".encode("utf-8"))
             self.wfile.flush()
-            logger.debug(f"发送响应: {response}")
+            logger.debug("发送响应: %s", response)
             return True
         except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
             logger.debug("发送响应时连接被重置")
             self.connection_active = False
             return False
         except Exception as e:
-            logger.debug(f"发送响应时出错: {e}")
+            logger.debug("发送响应时出错: %s", e)
             self.connection_active = False
             return False
 
@@ -250,43 +264,31 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
         """发送响应（兼容性方法）"""
         return self._safe_send_response(response)
 
-    def get_user_emails(self):
-        """获取用户邮件列表（带缓存）"""
-        if not self.authenticated_user:
-            logger.warning("get_user_emails: 用户未认证")
-            return []
-
-        user_email = self.authenticated_user.email
-        logger.debug(f"get_user_emails: 查询用户 {user_email} 的邮件")
+    def _resolve_message(self, args):
+        """
+        解析消息编号并在快照中定位，无效时直接发送错误响应
 
-        # 检查缓存是否有效
-        if self.cached_emails is not None and self.cache_user_email == user_email:
-            logger.debug(f"get_user_emails: 使用缓存，{len(self.cached_emails)} 封邮件")
-            return self.cached_emails
+        Args:
+            args: 命令参数（第一个字段为消息编号）
 
-        # 重新查询并缓存
+        Returns:
+            快照数组下标，无效时返回None
+        """
         try:
-            logger.debug(f"get_user_emails: 从数据库查询邮件")
-            emails = self.email_service.list_emails(
-                user_email=user_email, include_deleted=False, include_spam=False
-            )
-            self.cached_emails = emails
-            self.cache_user_email = user_email
-            logger.debug(
-                f"get_user_emails: 缓存用户 {user_email} 的 {len(emails)} 封邮件"
-            )
-            return emails
-        except Exception as e:
-            logger.error(f"get_user_emails: 获取用户邮件时出错: {e}")
-            import traceback
+            msg_num = int(args.split()[0])
+        except (ValueError, IndexError):
+            self._safe_send_response("-ERR Invalid message number")
+            return None
 
-            logger.error(f"get_user_emails: 详细错误信息: {traceback.format_exc()}")
-            return []
+        index = self.maildrop.index_of(msg_num)
+        if index is None:
+            if 1 <= msg_num <= len(self.maildrop):
+                self._safe_send_response(f"-ERR Message {msg_num} already deleted")
+            else:
+                self._safe_send_response("-ERR No such message")
+                logger.warning(f"邮件编号 {msg_num} 超出范围 (1-{len(self.maildrop)})")
+        return index
 
-    def invalidate_cache(self):
-        """清除邮件列表缓存"""
-        self.cached_emails = None
-        self.cache_user_email = None
 
     def handle_user(self, username):
         """处理USER命令"""
@@ -298,16 +300,32 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
         if not hasattr(self, "username"):
             self._safe_send_response("-ERR USER command must come first")
             return
+        if self.authenticated_user:
+            self._safe_send_response("-ERR Already authenticated")
+            return
 
         try:
             user = self.user_auth.authenticate(self.username, password)
-            if user:
-                self.authenticated_user = user
-                self._safe_send_response(f"+OK User {self.username} authenticated")
-                logger.info(f"用户认证成功: {self.username}")
-            else:
+            if not user:
                 self._safe_send_response("-ERR Authentication failed")
                 logger.warning(f"用户认证失败: {self.username}")
+                return
+
+            # 获取邮箱独占锁（RFC 1939），同一邮箱同时只允许一个会话
+            if not maildrop_locks.acquire(user.email, self):
+                self._safe_send_response("-ERR [IN-USE] Maildrop already locked")
+                logger.warning(f"邮箱 {user.email} 已被其他会话锁定")
+                return
+
+            try:
+                self.maildrop = MaildropSnapshot.load(self.email_service, user.email)
+            except Exception:
+                maildrop_locks.release(user.email, self)
+                raise
+
+            self.authenticated_user = user
+            self._safe_send_response(f"+OK User {self.username} authenticated")
+            logger.info("用户认证成功: %s, 邮箱快照 %s 封邮件", self.username, len(self.maildrop))
         except Exception as e:
             logger.error(f"认证过程中出错: {e}")
             self._safe_send_response("-ERR Authentication error")
@@ -319,28 +337,12 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
             self._safe_send_response("-ERR Not authenticated")
             return
 
-        try:
-            logger.debug(f"STAT命令: 开始处理，用户 {self.authenticated_user.email}")
-
-            # 使用缓存的邮件列表
-            emails = self.get_user_emails()
-            logger.debug(f"STAT命令: 获取到 {len(emails)} 封邮件")
-
-            total_size = sum(email.get("size", 0) for email in emails)
-            logger.debug(f"STAT命令: 计算总大小 {total_size} 字节")
-
-            response = f"+OK {len(emails)} {total_size}"
-            self._safe_send_response(response)
-            logger.info(
-                f"STAT命令成功: 用户 {self.authenticated_user.email} 有 {len(emails)} 封邮件，总大小 {total_size} 字节"
-            )
-
-        except Exception as e:
-            logger.error(f"处理STAT命令时出错: {e}")
-            import traceback
-
-            logger.error(f"详细错误信息: {traceback.format_exc()}")
-            self._safe_send_response("-ERR Internal server error")
+        count, total_size = self.maildrop.stat()
+        self._safe_send_response(f"+OK {count} {total_size}")
+        logger.debug(
+            f"STAT命令成功: 用户 {self.authenticated_user.email} 有 {count} 封邮件，"
+            f"总大小 {total_size} 字节"
+        )
 
     def handle_list(self, args):
         """处理LIST命令"""
@@ -348,32 +350,65 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
             self._safe_send_response("-ERR Not authenticated")
             return
 
-        try:
-            # 使用缓存的邮件列表
-            emails = self.get_user_emails()
+        if args:  # LIST specific message
+            index = self._resolve_message(args)
+            if index is not None:
+                size = self.maildrop.sizes[index]
+                self._safe_send_response(f"+OK {index + 1} {size}")
+        else:  # LIST all messages
+            count, _ = self.maildrop.stat()
+            lines = [f"+OK {count} messages"]
+            lines.extend(
+                f"{index + 1} {self.maildrop.sizes[index]}"
+                for index in self.maildrop.visible()
+            )
+            lines.append(".")
+            self._safe_send_response("\r\n".join(lines))
 
-            if args:  # LIST specific message
-                try:
-                    msg_num = int(args)
-                    if 1 <= msg_num <= len(emails):
-                        email = emails[msg_num - 1]
-                        size = email.get("size", 0)
-                        self._safe_send_response(f"+OK {msg_num} {size}")
-                    else:
-                        self._safe_send_response("-ERR No such message")
-                except ValueError:
-                    self._safe_send_response("-ERR Invalid message number")
-            else:  # LIST all messages
-                self._safe_send_response(f"+OK {len(emails)} messages")
-                for i, email in enumerate(emails, 1):
-                    size = email.get("size", 0)
-                    if not self._safe_send_response(f"{i} {size}"):
-                        return
-                self._safe_send_response(".")
+    def _send_multiline_stream(self, status_line, chunks):
+        """
+        流式发送多行响应，整个响应只在结束标记处刷新一次
+
+        Args:
+            status_line: 状态行（不含CRLF）
+            chunks: 原始内容字节块
 
+        Returns:
+            int: 发送的字节数，发送失败时返回None
+        """
+        try:
+            # wfile在SSL下是无缓冲的SocketIO，write可能只写出部分数据，
+            # 大块内容直接用sendall写入套接字
+            sent = write_multiline_response(self.request.sendall, status_line, chunks)
+            self.wfile.flush()
+            return sent
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
+            logger.debug("发送多行响应时连接被重置")
+            self.connection_active = False
+            return None
         except Exception as e:
-            logger.error(f"处理LIST命令时出错: {e}")
-            self._safe_send_response("-ERR Internal server error")
+            logger.debug("发送多行响应时出错: %s", e)
+            self.connection_active = False
+            return None
+
+    def _open_message(self, email):
+        """
+        打开邮件原始内容并确定其大小
+
+        Args:
+            email: 邮箱快照中的邮件字典（MaildropSnapshot.email_at）
+
+        Returns:
+            (二进制文件对象, 字节数)，找不到内容时返回(None, 0)
+        """
+        fileobj = self.email_service.open_email_content(
+            email["message_id"], email.get("content_path")
+        )
+        if fileobj is None:
+            return None, 0
+        # 优先使用数据库中预先计算的大小，避免读取整封邮件
+        size = email.get("size") or stream_size(fileobj)
+        return fileobj, size
 
     def handle_retr(self, args):
         """处理RETR命令"""
@@ -381,103 +416,124 @@ class StablePOP3Handler(socketserver.StreamRequestHandler):
             self._safe_send_response("-ERR Not authenticated")
             return
 
+        index = self._resolve_message(args)
+        if index is None:
+            return
+
         try:
-            msg_num = int(args)
-            # 使用缓存的邮件列表
-            emails = self.get_user_emails()
-
-            if 1 <= msg_num <= len(emails):
-                email = emails[msg_num - 1]
-                content = self.email_service.get_email_content(email["message_id"])
-                if content:
-                    # 计算内容大小（字节）
-                    content_bytes = content.encode("utf-8")
-                    content_size = len(content_bytes)
-
-                    if not self._safe_send_response(f"+OK {content_size} octets"):
-                        return
-
-                    # 按POP3协议要求逐行发送内容
-                    # 确保内容格式正确，统一换行符为CRLF
-                    content = (
-                        content.replace("\r\n", "\n")
-                        .replace("\r", "\n")
-                        .replace("\n", "\r\n")
+            fileobj, size = self._open_message(self.maildrop.email_at(index))
+            if fileobj:
+                with fileobj:
+                    sent = self._send_multiline_stream(
+                        f"+OK {size} octets", iter_file_chunks(fileobj)
                     )
-
-                    # 逐行发送邮件内容
-                    for line in content.split("\r\n"):
-                        # 处理行开头的点（透明性规则）
-                        if line.startswith("."):
-                            line = "." + line
-                        if not self._safe_send_response(line):
-                            return
-
-                    # 发送结束标记
-                    self._safe_send_response(".")
+                if sent is not None:
                     logger.debug(
-                        f"RETR命令: 返回邮件 {msg_num} 内容，大小 {content_size} 字节"
+                        f"RETR命令: 返回邮件 {index + 1}，大小 {size} 字节，"
+                        f"发送 {sent} 字节"
                     )
-                else:
-                    self._safe_send_response("-ERR Message content not found")
-                    logger.warning(f"RETR命令: 邮件 {msg_num} 内容未找到")
             else:
-                self._safe_send_response("-ERR No such message")
-                logger.warning(
-                    f"RETR命令: 邮件编号 {msg_num} 超出范围 (1-{len(emails)})"
-                )
+                self._safe_send_response("-ERR Message content not found")
+                logger.warning(f"RETR命令: 邮件 {index + 1} 内容未找到")
 
-        except ValueError:
-            self._safe_send_response("-ERR Invalid message number")
         except Exception as e:
             logger.error(f"处理RETR命令时出错: {e}")
             self._safe_send_response("-ERR Internal server error")
 
-    def handle_dele(self, args):
-        """处理DELE命令"""
+    def handle_top(self, args):
+        """处理TOP命令"""
         if not self.authenticated_user:
             self._safe_send_response("-ERR Not authenticated")
             return
 
+        parts = args.split()
+        if len(parts) != 2:
+            self._safe_send_response("-ERR Usage: TOP msg_num n")
+            return
+
         try:
-            msg_num = int(args)
-            # 使用缓存的邮件列表
-            emails = self.get_user_emails()
-
-            if 1 <= msg_num <= len(emails):
-                email = emails[msg_num - 1]
-                # 实际标记邮件为删除
-                success = self.email_service.mark_email_as_deleted(email["message_id"])
-                if success:
-                    # 清除缓存，因为邮件状态已改变
-                    self.invalidate_cache()
-                    self._safe_send_response(f"+OK Message {msg_num} deleted")
-                    logger.debug(f"DELE命令: 标记邮件 {msg_num} 为删除")
-                else:
-                    self._safe_send_response("-ERR Failed to delete message")
-                    logger.error(f"DELE命令: 删除邮件 {msg_num} 失败")
+            n_lines = int(parts[1])
+            if n_lines < 0:
+                raise ValueError(n_lines)
+        except ValueError:
+            self._safe_send_response("-ERR Invalid parameters")
+            return
+
+        index = self._resolve_message(parts[0])
+        if index is None:
+            return
+
+        try:
+            fileobj, _ = self._open_message(self.maildrop.email_at(index))
+            if fileobj:
+                with fileobj:
+                    self._send_multiline_stream("+OK", iter_top_lines(fileobj, n_lines))
+                logger.debug("TOP命令: 返回邮件 %s 头部和 %s 行正文", index + 1, n_lines)
             else:
-                self._safe_send_response("-ERR No such message")
-                logger.warning(
-                    f"DELE命令: 邮件编号 {msg_num} 超出范围 (1-{len(emails)})"
-                )
+                self._safe_send_response("-ERR Message content not found")
+                logger.warning(f"TOP命令: 邮件 {index + 1} 内容未找到")
 
-        except ValueError:
-            self._safe_send_response("-ERR Invalid message number")
         except Exception as e:
-            logger.error(f"处理DELE命令时出错: {e}")
+            logger.error(f"处理TOP命令时出错: {e}")
             self._safe_send_response("-ERR Internal server error")
 
+    def handle_uidl(self, args):
+        """处理UIDL命令"""
+        if not self.authenticated_user:
+            self._safe_send_response("-ERR Not authenticated")
+            return
+
+        if args:
+            index = self._resolve_message(args)
+            if index is not None:
+                uid = self.maildrop.uids[index]
+                self._safe_send_response(f"+OK {index + 1} {uid}")
+        else:
+            lines = ["+OK"]
+            lines.extend(
+                f"{index + 1} {self.maildrop.uids[index]}"
+                for index in self.maildrop.visible()
+            )
+            lines.append(".")
+            self._safe_send_response("\r\n".join(lines))
+
+    def handle_dele(self, args):
+        """处理DELE命令（只在快照中标记，QUIT时才真正删除）"""
+        if not self.authenticated_user:
+            self._safe_send_response("-ERR Not authenticated")
+            return
+
+        index = self._resolve_message(args)
+        if index is None:
+            return
+
+        self.maildrop.mark_deleted(index)
+        self._safe_send_response(f"+OK Message {index + 1} deleted")
+        logger.debug("DELE命令: 标记邮件 %s 为删除", index + 1)
+
     def handle_noop(self):
         """处理NOOP命令"""
         self._safe_send_response("+OK")
 
     def handle_rset(self):
         """处理RSET命令"""
+        if self.maildrop is not None:
+            self.maildrop.reset()
         self._safe_send_response("+OK")
 
     def handle_quit(self):
-        """处理QUIT命令"""
+        """处理QUIT命令：进入UPDATE状态，一次性提交会话期间的删除标记"""
+        if self.authenticated_user:
+            message_ids = self.maildrop.deleted_message_ids()
+            if message_ids and not self.email_service.mark_emails_deleted(
+                message_ids, self.authenticated_user.email
+            ):
+                logger.error(f"QUIT命令: 批量删除 {len(message_ids)} 封邮件失败")
+                self._safe_send_response("-ERR Some deleted messages not removed")
+                return
+            if message_ids:
+                self.maildrop.reset()
+                logger.info("QUIT命令: 已删除 %s 封邮件", len(message_ids))
         self._safe_send_response("+OK POP3 server signing off")
 
 
@@ -510,13 +566,13 @@ class StablePOP3Server:
         if self.use_ssl:
             self.ssl_context = self._create_ssl_context()
 
-        logger.info(f"POP3服务器已初始化: {host}:{port} (SSL: {use_ssl})")
+        logger.info("POP3服务器已初始化: %s:%s (SSL: %s)", host, port, use_ssl)
 
         # 服务器实例
         self.server_thread = None
 
         ssl_status = "启用" if self.use_ssl else "禁用"
-        logger.info(f"稳定POP3服务器已初始化: {host}:{port}, SSL: {ssl_status}")
+        logger.info("稳定POP3服务器已初始化: %s:%s, SSL: %s", host, port, ssl_status)
 
         # 如果请求的是SSL但实际禁用了，给出提示
         if use_ssl and not self.use_ssl:
@@ -539,31 +595,10 @@ class StablePOP3Server:
                     logger.info("将禁用SSL功能")
                     return None
 
-            # 创建SSL上下文
-            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            # 使用与SMTP服务器共享的SSL上下文（会话恢复、ECDHE密码套件）
+            context = get_server_context(self.ssl_cert_file, self.ssl_key_file)
 
-            # 加载证书链
-            context.load_cert_chain(
-                certfile=self.ssl_cert_file, keyfile=self.ssl_key_file
-            )
-
-            # 设置SSL选项以提高兼容性和安全性
-            context.minimum_version = ssl.TLSVersion.TLSv1_2
-
-            # 设置密码套件，提高兼容性
-            try:
-                context.set_ciphers(
-                    "ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS"
-                )
-            except ssl.SSLError:
-                # 如果自定义密码套件失败，使用默认的
-                logger.warning("无法设置自定义密码套件，使用默认配置")
-
-            # 不要求客户端证书
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-
-            logger.info(f"SSL上下文已创建: {self.ssl_cert_file}")
+            logger.info("SSL上下文已创建: %s", self.ssl_cert_file)
             return context
 
         except Exception as e:
@@ -605,7 +640,7 @@ class StablePOP3Server:
 
             result = subprocess.run(cmd, capture_output=True, text=True, cwd=cert_dir)
             if result.returncode == 0:
-                logger.info(f"使用OpenSSL创建证书成功: {self.ssl_cert_file}")
+                logger.info("使用OpenSSL创建证书成功: %s", self.ssl_cert_file)
                 return
             else:
                 logger.warning(f"OpenSSL命令失败: {result.stderr}")
@@ -689,7 +724,7 @@ class StablePOP3Server:
             with open(self.ssl_cert_file, "wb") as f:
                 f.write(cert.public_bytes(serialization.Encoding.PEM))
 
-            logger.info(f"使用Python生成证书成功: {self.ssl_cert_file}")
+            logger.info("使用Python生成证书成功: %s", self.ssl_cert_file)
 
         except ImportError:
             logger.error("cryptography库未安装，无法生成SSL证书")
@@ -764,7 +799,7 @@ class StablePOP3Server:
                         if hasattr(request, "close"):
                             request.close()
                     except Exception as e:
-                        logger.debug(f"关闭请求时出错: {e}")
+                        logger.debug("关闭请求时出错: %s", e)
                     super().close_request(request)
 
                 def handle_error(self, request, client_address):
@@ -793,7 +828,7 @@ class StablePOP3Server:
             )
             self.server_thread.start()
 
-            logger.info(f"稳定POP3服务器已启动: {self.host}:{self.port}")
+            logger.info("稳定POP3服务器已启动: %s:%s", self.host, self.port)
             logger.info(
                 f"最大连接数: {self.max_connections}, 请求队列大小: {POP3_REQUEST_QUEUE_SIZE}"
             )
@@ -802,6 +837,18 @@ class StablePOP3Server:
             logger.error(f"启动POP3服务器时出错: {e}")
             raise
 
+    def get_tls_metrics(self) -> dict:
+        """
+        获取TLS握手指标（SSL上下文在SMTP和POP3服务器之间共享，统计为合计值）
+
+        Returns:
+            握手总数、完整握手数、会话恢复数和恢复率；未启用TLS时返回空字典
+        """
+        context = self.ssl_context or getattr(self, "stls_context", None)
+        if context is None:
+            return {}
+        return tls_stats(context)
+
     def stop(self):
         """停止POP3服务器"""
         if self.server:
@@ -823,20 +870,40 @@ if __name__ == "__main__":
     parser.add_argument("--host", default="localhost", help="服务器主机名")
     parser.add_argument("--port", type=int, default=995, help="服务器端口")
     parser.add_argument("--no-ssl", dest="ssl", action="store_false", help="禁用SSL")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="使用asyncio服务器（适合大量空闲连接）",
+    )
+    parser.add_argument(
+        "--stls", action="store_true", help="未启用SSL时提供STLS升级（仅asyncio服务器）"
+    )
     parser.set_defaults(ssl=True)
     args = parser.parse_args()
 
     # 创建并启动服务器
-    server = StablePOP3Server(
-        host=args.host,
-        port=args.port,
-        use_ssl=args.ssl,
-    )
+    if args.use_async:
+        from server.async_pop3_server import AsyncPOP3Server
+
+        server = AsyncPOP3Server(
+            host=args.host,
+            port=args.port,
+            use_ssl=args.ssl,
+            enable_stls=args.stls,
+        )
+    else:
+        server = StablePOP3Server(
+            host=args.host,
+            port=args.port,
+            use_ssl=args.ssl,
+        )
     server.start()
 
     try:
         print(f"稳定POP3服务器已启动: {args.host}:{args.port}")
         print(f"SSL: {'启用' if args.ssl else '禁用'}")
+        print(f"服务器引擎: {'asyncio' if args.use_async else '线程'}")
         print("按Ctrl+C停止服务器")
 
         while True:
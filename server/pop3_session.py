@@ -52,6 +52,7 @@ class POP3Session:
             email_service=self.email_service,  # 传递邮件服务
             authenticator=self.authenticator,
             send_response_callback=self.send_response,
+            send_bytes_callback=self.send_bytes,
         )
 
         # 会话统计信息
@@ -121,12 +122,11 @@ class POP3Session:
             except:
                 pass
         finally:
-            # 如果在UPDATE状态，执行删除操作
+            # 释放邮箱锁（删除操作已在QUIT时提交，未QUIT的删除标记被丢弃）
             try:
-                if self.command_handler.state == "UPDATE":
-                    self.command_handler.perform_deletions()
+                self.command_handler.release_maildrop()
             except Exception as e:
-                logger.error(f"执行删除操作时出错: {e}")
+                logger.error(f"释放邮箱锁时出错: {e}")
 
             # 关闭连接
             try:
@@ -228,6 +228,20 @@ class POP3Session:
             logger.error(f"异常详情: {traceback.format_exc()}")
             return None
 
+    def send_bytes(self, data: bytes) -> None:
+        """
+        发送已编码的原始字节（RETR/TOP的流式多行响应）
+
+        Args:
+            data: 要发送的字节
+        """
+        try:
+            self.socket.sendall(data)
+            self.bytes_sent += len(data)
+        except (ssl.SSLError, ConnectionError) as e:
+            logger.error(f"发送数据时连接错误: {e}")
+            raise
+
     def send_response(self, response: str) -> None:
         """
         发送POP3响应
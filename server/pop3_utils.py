@@ -6,9 +6,11 @@ import os
 import socket
 import logging
 import ssl
-from typing import List, Optional
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional
 
 from common.utils import setup_logging
+from common.config import POP3_STREAM_CHUNK_SIZE
+from common.tls_context import get_server_context
 
 # 设置日志
 logger = setup_logging("pop3_utils")
@@ -106,7 +108,7 @@ def close_socket_safely(sock) -> bool:
 
 def create_ssl_context(cert_file: str, key_file: str) -> Optional[ssl.SSLContext]:
     """
-    创建SSL上下文
+    获取SSL上下文（与SMTP/POP3服务器共享，支持会话恢复）
 
     Args:
         cert_file: SSL证书文件路径
@@ -116,8 +118,7 @@ def create_ssl_context(cert_file: str, key_file: str) -> Optional[ssl.SSLContext
         SSL上下文，如果创建失败则返回None
     """
     try:
-        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+        context = get_server_context(cert_file, key_file)
         logger.info(f"已加载SSL证书: {cert_file}")
         return context
     except Exception as e:
@@ -151,3 +152,146 @@ def validate_host(host: str) -> str:
             host = "localhost"
     
     return host
+
+
+def iter_file_chunks(
+    fileobj: BinaryIO, chunk_size: int = POP3_STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    按固定大小分块读取文件
+
+    Args:
+        fileobj: 二进制文件对象
+        chunk_size: 每块字节数
+
+    Returns:
+        字节块迭代器
+    """
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def stream_size(fileobj: BinaryIO) -> int:
+    """
+    计算可定位文件对象的字节数（普通文件或内存中还原的邮件），读取位置回到开头
+
+    Args:
+        fileobj: 二进制文件对象
+
+    Returns:
+        字节数
+    """
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    return size
+
+
+def iter_top_lines(fileobj: BinaryIO, body_lines: int) -> Iterator[bytes]:
+    """
+    读取TOP命令需要的内容：全部头部、分隔空行以及正文的前n行
+
+    Args:
+        fileobj: 二进制文件对象
+        body_lines: 正文行数
+
+    Returns:
+        原始行迭代器（保留行尾换行符）
+    """
+    in_header = True
+    remaining = body_lines
+    for line in fileobj:
+        if in_header:
+            yield line
+            if line in (b"\r\n", b"\n"):
+                in_header = False
+            continue
+        if remaining <= 0:
+            break
+        yield line
+        remaining -= 1
+
+
+def dot_stuff_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    将多行响应内容的换行统一为CRLF并做点填充（RFC 1939），最后追加结束标记
+
+    按缓冲区整体替换而不是逐行处理，跨块边界的CR和行首状态会被保留。
+
+    Args:
+        chunks: 原始内容字节块
+
+    Returns:
+        可直接发送的字节块迭代器
+    """
+    at_line_start = True
+    pending_cr = False
+    for chunk in chunks:
+        # 块末尾的CR可能与下一块开头的LF组成CRLF，留到下一块处理
+        if pending_cr:
+            chunk = b"\r" + chunk
+            pending_cr = False
+        if chunk.endswith(b"\r"):
+            chunk = chunk[:-1]
+            pending_cr = True
+        if not chunk:
+            continue
+
+        data = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        if at_line_start and data.startswith(b"."):
+            data = b"." + data
+        at_line_start = data.endswith(b"\n")
+        yield data.replace(b"\n.", b"\n..").replace(b"\n", b"\r\n")
+
+    if pending_cr:
+        at_line_start = True
+        yield b"\r\n"
+
+    # 内容不以换行结尾时先补CRLF，再发送结束标记
+    yield b".\r\n" if at_line_start else b"\r\n.\r\n"
+
+
+def write_multiline_response(
+    write: Callable[[bytes], object],
+    status_line: str,
+    chunks: Iterable[bytes],
+    buffer_size: int = POP3_STREAM_CHUNK_SIZE,
+) -> int:
+    """
+    流式发送多行响应（状态行、点填充后的内容和结束标记）
+
+    小块内容先合并到缓冲区，凑满buffer_size再写出；大块直接写出，不再复制。
+
+    Args:
+        write: 写出函数（如socket.sendall），必须完整写出传入的数据
+        status_line: 状态行（不含CRLF），如"+OK 1024 octets"
+        chunks: 原始内容字节块
+        buffer_size: 合并缓冲区大小
+
+    Returns:
+        发送的总字节数
+    """
+    buffer = bytearray(f"{status_line}\r\n".encode("utf-8"))
+    total = 0
+    for piece in dot_stuff_chunks(chunks):
+        if len(piece) >= buffer_size:
+            if buffer:
+                write(buffer)
+                total += len(buffer)
+                buffer = bytearray()
+            write(piece)
+            total += len(piece)
+            continue
+
+        buffer += piece
+        if len(buffer) >= buffer_size:
+            write(buffer)
+            total += len(buffer)
+            buffer = bytearray()
+
+    if buffer:
+        write(buffer)
+        total += len(buffer)
+    return total
@@ -0,0 +1,294 @@
+"""
+撤回索引模块 - 撤回记录（墓碑）表和内存布隆过滤器
+
+接收邮件时需要判断邮件是否已被发件人撤回。撤回只影响极少数邮件，
+所以每条撤回记录按两个键加入布隆过滤器：
+- Message-ID
+- 发件人 + 主题哈希（服务器可能重新生成Message-ID，按发件人和主题匹配
+  RECALL_MATCH_WINDOW内发送的邮件）
+
+两个键都未命中时邮件一定没有被撤回，不需要查询数据库；命中时再查询
+recall_tombstones表确认（排除误判和超出时间窗口的记录）。
+
+布隆过滤器在进程内按数据库路径共享，启动时从表中重建；其他进程
+（如Web客户端）写入的撤回记录每RECALL_INDEX_REFRESH_INTERVAL秒按rowid增量加载。
+"""
+
+import math
+import time
+import hashlib
+import datetime
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from common.utils import setup_logging
+from common.config import RECALL_BLOOM_CAPACITY, RECALL_INDEX_REFRESH_INTERVAL
+
+# 设置日志
+logger = setup_logging("recall_index")
+
+# 按发件人+主题匹配时，只匹配这段时间内发送的邮件
+RECALL_MATCH_WINDOW = datetime.timedelta(hours=24)
+
+
+def create_recall_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    创建撤回记录表（幂等）
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS recall_tombstones (
+            id INTEGER PRIMARY KEY,
+            message_id TEXT NOT NULL UNIQUE,
+            from_addr TEXT NOT NULL,
+            subject_hash TEXT NOT NULL,
+            sent_at TEXT,
+            recalled_at TEXT NOT NULL
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_recall_tombstones_sender
+        ON recall_tombstones (from_addr, subject_hash, sent_at)
+    """
+    )
+
+
+def subject_hash(subject: Optional[str]) -> str:
+    """主题的哈希（撤回记录按发件人+主题哈希匹配）"""
+    return hashlib.sha1((subject or "").encode("utf-8")).hexdigest()[:16]
+
+
+class BloomFilter:
+    """布隆过滤器：判断“一定不存在”或“可能存在”"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        初始化布隆过滤器
+
+        Args:
+            capacity: 预期元素数量
+            error_rate: capacity个元素时的误判率
+        """
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        # 双重哈希：h1 + i * h2
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        """加入元素"""
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+
+class RecallIndex:
+    """撤回记录索引"""
+
+    def __init__(
+        self,
+        db_connection,
+        capacity: int = RECALL_BLOOM_CAPACITY,
+        refresh_interval: float = RECALL_INDEX_REFRESH_INTERVAL,
+    ):
+        """
+        初始化撤回索引并从数据库加载已有记录
+
+        Args:
+            db_connection: 数据库连接管理器
+            capacity: 布隆过滤器预期容量，记录数超出时自动扩容重建
+            refresh_interval: 从数据库增量加载其他进程写入记录的间隔（秒）
+        """
+        self.db = db_connection
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.bloom = BloomFilter(capacity)
+        self.last_id = 0
+        self.last_refresh = 0.0
+        self._refresh()
+
+    @staticmethod
+    def _message_key(message_id: str) -> str:
+        return f"m:{message_id}"
+
+    @staticmethod
+    def _sender_key(from_addr: str, hashed_subject: str) -> str:
+        return f"s:{from_addr}\x00{hashed_subject}"
+
+    def _load(self, after_id: int) -> list:
+        """读取id大于after_id的撤回记录"""
+        try:
+            return self.db.execute_query(
+                "SELECT id, message_id, from_addr, subject_hash "
+                "FROM recall_tombstones WHERE id > ? ORDER BY id",
+                (after_id,),
+                fetch_all=True,
+            )
+        except Exception as e:
+            # 表不存在（迁移未执行）等情况下保持为空
+            logger.warning(f"加载撤回记录失败: {e}")
+            return []
+
+    def _refresh(self) -> None:
+        """增量加载其他进程写入的撤回记录，超出容量时扩容重建"""
+        rows = self._load(self.last_id)
+        with self.lock:
+            self.last_refresh = time.monotonic()
+            # 每条记录占两个键
+            if self.bloom.count + 2 * len(rows) <= self.bloom.capacity:
+                for row in rows:
+                    self._add_keys(
+                        row["message_id"], row["from_addr"], row["subject_hash"]
+                    )
+                    self.last_id = row["id"]
+                return
+
+        rows = self._load(0)
+        bloom = BloomFilter(max(self.capacity, 4 * len(rows)))
+        for row in rows:
+            bloom.add(self._message_key(row["message_id"]))
+            bloom.add(self._sender_key(row["from_addr"], row["subject_hash"]))
+        with self.lock:
+            self.bloom = bloom
+            self.capacity = bloom.capacity
+            if rows:
+                self.last_id = rows[-1]["id"]
+        logger.info(f"撤回索引已重建: {len(rows)} 条记录")
+
+    def _add_keys(self, message_id: str, from_addr: str, hashed_subject: str) -> None:
+        self.bloom.add(self._message_key(message_id))
+        self.bloom.add(self._sender_key(from_addr, hashed_subject))
+
+    def _maybe_recalled(self, message_id: str, sender_key: str) -> bool:
+        """布隆过滤器探测（可能误判为True，不会误判为False）"""
+        if time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self._refresh()
+        return self._message_key(message_id) in self.bloom or sender_key in self.bloom
+
+    def record(
+        self,
+        message_id: str,
+        from_addr: str,
+        subject: Optional[str],
+        sent_at: Optional[datetime.datetime] = None,
+    ) -> bool:
+        """
+        写入撤回记录并加入布隆过滤器
+
+        Args:
+            message_id: 邮件ID
+            from_addr: 发件人地址
+            subject: 邮件主题
+            sent_at: 邮件发送时间
+
+        Returns:
+            bool: 操作是否成功
+        """
+        hashed_subject = subject_hash(subject)
+        success = self.db.execute_transaction(
+            [
+                (
+                    "INSERT OR REPLACE INTO recall_tombstones "
+                    "(message_id, from_addr, subject_hash, sent_at, recalled_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        message_id,
+                        from_addr or "",
+                        hashed_subject,
+                        sent_at.isoformat() if sent_at else None,
+                        datetime.datetime.now().isoformat(),
+                    ),
+                )
+            ]
+        )
+        if success:
+            with self.lock:
+                self._add_keys(message_id, from_addr or "", hashed_subject)
+        return success
+
+    def is_recalled(
+        self,
+        message_id: str,
+        from_addr: str,
+        subject: Optional[str],
+        now: Optional[datetime.datetime] = None,
+    ) -> bool:
+        """
+        判断接收的邮件是否已被撤回
+
+        Args:
+            message_id: 邮件ID
+            from_addr: 发件人地址
+            subject: 邮件主题
+            now: 当前时间（用于按发件人+主题匹配的时间窗口）
+
+        Returns:
+            bool: 是否已被撤回
+        """
+        hashed_subject = subject_hash(subject)
+        sender_key = self._sender_key(from_addr or "", hashed_subject)
+        if not self._maybe_recalled(message_id, sender_key):
+            return False
+
+        row = self.db.execute_query(
+            "SELECT 1 FROM recall_tombstones WHERE message_id = ?",
+            (message_id,),
+            fetch_one=True,
+        )
+        if row:
+            logger.info(f"邮件已被撤回(Message ID匹配): {message_id}")
+            return True
+
+        since = (now or datetime.datetime.now()) - RECALL_MATCH_WINDOW
+        row = self.db.execute_query(
+            "SELECT 1 FROM recall_tombstones "
+            "WHERE from_addr = ? AND subject_hash = ? AND sent_at >= ?",
+            (from_addr or "", hashed_subject, since.isoformat()),
+            fetch_one=True,
+        )
+        if row:
+            logger.info(f"邮件已被撤回(主题+发件人匹配): 发件人={from_addr}")
+            return True
+        return False
+
+
+_indexes: Dict[str, RecallIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_recall_index(db_connection) -> RecallIndex:
+    """
+    获取数据库对应的撤回索引（进程内按数据库路径共享）
+
+    Args:
+        db_connection: 数据库连接管理器
+
+    Returns:
+        RecallIndex
+    """
+    with _indexes_lock:
+        index = _indexes.get(db_connection.db_path)
+        if index is None:
+            index = RecallIndex(db_connection)
+            _indexes[db_connection.db_path] = index
+        return index
@@ -17,12 +17,11 @@ from aiosmtpd.controller import Controller
 from aiosmtpd.smtp import SMTP as SMTPServer, LoginPassword
 from aiosmtpd.smtp import AuthResult
 import threading
-from bs4 import BeautifulSoup
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from common.utils import setup_logging, generate_message_id
+from common.utils import setup_logging
 from common.config import (
     SSL_CERT_FILE,
     SSL_KEY_FILE,
@@ -30,16 +29,97 @@ from common.config import (
     MAX_CONNECTIONS,
     CONNECTION_TIMEOUT,
     SMTP_CONCURRENT_HANDLER_COUNT,
+    SMTP_PROCESSING_MODE,
+    SMTP_PROCESSING_QUEUE_SIZE,
+    SMTP_MAX_MESSAGE_SIZE,
+    SMTP_SPOOL_MEMORY_LIMIT,
+    SMTP_SPOOL_DIR,
 )
 from common.port_config import resolve_port
-from common.email_format_handler import EmailFormatHandler
+from common.tls_context import get_server_context, tls_stats
 from server.new_db_handler import EmailService
 from server.user_auth import UserAuth
+from server.smtp_worker_pool import SMTPWorkerPool, WorkerPoolFull
+from server.ingest_pipeline import IngestPipeline
+from server.smtp_spool import SpoolingSMTP
 
 # 设置日志
 logger = setup_logging("stable_smtp_server")
 
 
+def process_incoming_email(db_handler: EmailService, mail_from, rcpt_tos, email_content):
+    """
+    处理邮件存储 - 通过接收流水线只解析一次、只写入一次
+
+    Args:
+        db_handler: 邮件服务
+        mail_from: 信封发件人
+        rcpt_tos: 信封收件人列表
+        email_content: DATA阶段收到的原始内容（字节、字符串或已转存邮件的文件对象）
+    """
+    try:
+        IngestPipeline(db_handler).ingest(mail_from, rcpt_tos, email_content)
+    except Exception as e:
+        logger.error(f"处理邮件存储时出错: {e}")
+        raise
+
+
+# 进程模式下每个工作进程独立持有的邮件服务
+_worker_db_handler = None
+
+
+def _init_worker_process(db_path: str) -> None:
+    """进程模式工作进程初始化：创建进程内独立的EmailService"""
+    global _worker_db_handler
+    _worker_db_handler = EmailService(db_path)
+
+
+def _process_email_in_worker(mail_from, rcpt_tos, email_content):
+    """进程模式下在工作进程中处理邮件"""
+    process_incoming_email(_worker_db_handler, mail_from, rcpt_tos, email_content)
+
+
+def _process_spooled_email_in_worker(mail_from, rcpt_tos, spool_path):
+    """进程模式下在工作进程中处理已转存到临时文件的邮件（只传递文件路径）"""
+    with open(spool_path, "rb") as f:
+        process_incoming_email(_worker_db_handler, mail_from, rcpt_tos, f)
+
+
+# SMTP协议实例中表示“凭据已收到、等待在线程池中验证”的标记
+_AUTH_DEFERRED = AuthResult(success=False, handled=True)
+
+
+class StableSMTPProtocol(SpoolingSMTP):
+    """
+    稳定SMTP服务器使用的协议实现
+
+    aiosmtpd在事件循环中同步调用authenticator，而密码验证要执行KDF（scrypt等），
+    会阻塞所有会话。这里先收下凭据，再在线程池中调用authenticator。
+    _authenticate是aiosmtpd 1.4的私有方法，版本固定见requirements.txt。
+    """
+
+    def _authenticate(self, mechanism, auth_data):
+        self._deferred_auth = (mechanism, auth_data)
+        return _AUTH_DEFERRED
+
+    async def _finish_auth(self, result):
+        """在线程池中完成被推迟的认证"""
+        if result is not _AUTH_DEFERRED:
+            return result
+        mechanism, auth_data = self._deferred_auth
+        self._deferred_auth = None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, super()._authenticate, mechanism, auth_data
+        )
+
+    async def auth_PLAIN(self, _, args):
+        return await self._finish_auth(await super().auth_PLAIN(_, args))
+
+    async def auth_LOGIN(self, _, args):
+        return await self._finish_auth(await super().auth_LOGIN(_, args))
+
+
 class StableSMTPHandler:
     """稳定的SMTP处理器 - 统一使用EmailFormatHandler"""
 
@@ -48,6 +128,8 @@ class StableSMTPHandler:
         self.server_instance = server_instance
         self.user_auth = UserAuth()
         self.authenticated_sessions = set()
+        # 邮件处理工作池，由服务器在start()时创建；为None时在事件循环中直接处理
+        self.worker_pool = None
 
         logger.info("稳定SMTP处理器已初始化")
 
@@ -64,18 +146,46 @@ class StableSMTPHandler:
             # 获取邮件内容
             mail_from = envelope.mail_from
             rcpt_tos = envelope.rcpt_tos
-            content = envelope.content
-
-            # 解析邮件内容
-            if isinstance(content, bytes):
-                email_content = content.decode("utf-8", errors="replace")
+            # 大邮件已由SpoolingSMTP转存到临时文件，按文件处理，不整体读入内存
+            spool = getattr(envelope, "spool", None)
+            if spool is not None and not spool.in_memory:
+                email_content = None
             else:
-                email_content = content
+                # 优先使用未经解码的原始DATA字节，原样存储
+                email_content = envelope.original_content or envelope.content
 
-            # 处理邮件存储
-            self._process_email(mail_from, rcpt_tos, email_content)
+            # 处理邮件存储：解析、过滤、写文件和数据库都在工作池中执行，
+            # 不阻塞事件循环上的其他SMTP会话；250仅在保存完成后返回
+            if self.worker_pool is not None:
+                try:
+                    if email_content is None and self.worker_pool.mode == "process":
+                        await self.worker_pool.run(
+                            _process_spooled_email_in_worker,
+                            mail_from,
+                            rcpt_tos,
+                            spool.path,
+                        )
+                    elif email_content is None:
+                        await self.worker_pool.run(
+                            self._process_spooled_email, mail_from, rcpt_tos, spool
+                        )
+                    elif self.worker_pool.mode == "process":
+                        await self.worker_pool.run(
+                            _process_email_in_worker, mail_from, rcpt_tos, email_content
+                        )
+                    else:
+                        await self.worker_pool.run(
+                            self._process_email, mail_from, rcpt_tos, email_content
+                        )
+                except WorkerPoolFull as e:
+                    logger.warning(f"{e}，暂时拒绝邮件: {mail_from}")
+                    return "451 4.3.2 Server busy, try again later"
+            elif email_content is None:
+                self._process_spooled_email(mail_from, rcpt_tos, spool)
+            else:
+                self._process_email(mail_from, rcpt_tos, email_content)
 
-            logger.info(f"邮件处理完成: {mail_from} -> {rcpt_tos}")
+            logger.info("邮件处理完成: %s -> %s", mail_from, rcpt_tos)
             return "250 Message accepted for delivery"
 
         except Exception as e:
@@ -83,64 +193,13 @@ class StableSMTPHandler:
             return "451 Requested action aborted: error in processing"
 
     def _process_email(self, mail_from, rcpt_tos, email_content):
-        """处理邮件存储 - 使用统一的EmailFormatHandler"""
-        try:
-            # 使用统一的邮件格式处理器解析邮件
-            email_obj = EmailFormatHandler.parse_email_content(email_content)
-
-            # 修复From字段：如果解析出的From字段不正确，使用envelope的mail_from
-            if not email_obj.from_addr or email_obj.from_addr.address in [
-                "unknown@localhost",
-                "",
-                "unknown",
-            ]:
-                from common.models import EmailAddress
-
-                email_obj.from_addr = EmailAddress("", mail_from)
-                logger.info(f"修复From字段: {mail_from}")
-
-            # 检查和修复Message-ID
-            if not email_obj.message_id or email_obj.message_id == "unknown@localhost":
-                # 生成新的Message-ID
-                new_message_id = generate_message_id("smtp.localhost")
-                email_obj.message_id = new_message_id
-                logger.info(f"SMTP服务器自动添加Message-ID: {new_message_id}")
-
-            # 重新格式化邮件内容，确保包含正确的头部信息
-            formatted_content_for_storage = EmailFormatHandler.format_email_for_storage(
-                email_obj
-            )
+        """处理邮件存储 - 通过接收流水线处理"""
+        process_incoming_email(self.db_handler, mail_from, rcpt_tos, email_content)
 
-            # 提取纯文本内容用于后续处理
-            plain_text_content = email_obj.text_content or ""
-            if not plain_text_content and email_obj.html_content:
-                # 如果没有纯文本，从HTML中提取
-                soup = BeautifulSoup(email_obj.html_content, "html.parser")
-                plain_text_content = soup.get_text()
-
-            # 使用新的EmailService统一接口保存邮件
-            # 注意：垃圾邮件检测的职责已完全移交到save_email方法内部
-            success = self.db_handler.save_email(
-                message_id=email_obj.message_id,
-                from_addr=email_obj.from_addr.address,  # 使用修复后的from_addr
-                to_addrs=rcpt_tos,
-                subject=email_obj.subject,
-                content=plain_text_content,  # 传递纯文本内容用于分析
-                full_content_for_storage=formatted_content_for_storage,  # 传递完整格式化内容用于存储
-                date=email_obj.date or datetime.datetime.now(),
-            )
-
-            if not success:
-                logger.error(f"邮件保存失败: {email_obj.message_id}")
-                raise Exception("邮件保存失败")
-
-            logger.debug(
-                f"邮件已保存: {email_obj.message_id}, From: {email_obj.from_addr.address}"
-            )
-
-        except Exception as e:
-            logger.error(f"处理邮件存储时出错: {e}")
-            raise
+    def _process_spooled_email(self, mail_from, rcpt_tos, spool):
+        """处理已转存到临时文件的邮件 - 以文件对象交给接收流水线"""
+        with spool.open() as f:
+            process_incoming_email(self.db_handler, mail_from, rcpt_tos, f)
 
 
 class StableSMTPServer:
@@ -156,15 +215,28 @@ class StableSMTPServer:
         ssl_cert_file: str = SSL_CERT_FILE,
         ssl_key_file: str = SSL_KEY_FILE,
         max_connections: int = MAX_CONNECTIONS,
+        processing_workers: int = SMTP_CONCURRENT_HANDLER_COUNT,
+        processing_mode: str = SMTP_PROCESSING_MODE,
+        processing_queue_size: int = SMTP_PROCESSING_QUEUE_SIZE,
+        max_message_size: int = SMTP_MAX_MESSAGE_SIZE,
+        spool_memory_limit: int = SMTP_SPOOL_MEMORY_LIMIT,
+        spool_dir: str = SMTP_SPOOL_DIR,
     ):
         self.host = host
         self.port = port
+        self._owns_db_handler = db_handler is None
         self.db_handler = db_handler or EmailService()
         self.require_auth = require_auth
         self.use_ssl = use_ssl
         self.ssl_cert_file = ssl_cert_file
         self.ssl_key_file = ssl_key_file
         self.max_connections = max_connections
+        self.processing_workers = processing_workers
+        self.processing_mode = processing_mode
+        self.processing_queue_size = processing_queue_size
+        self.max_message_size = max_message_size
+        self.spool_memory_limit = spool_memory_limit
+        self.spool_dir = spool_dir
 
         # 创建处理器
         self.handler = StableSMTPHandler(self.db_handler, self)
@@ -194,16 +266,8 @@ class StableSMTPServer:
             ):
                 self._create_self_signed_cert()
 
-            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            context.load_cert_chain(
-                certfile=self.ssl_cert_file, keyfile=self.ssl_key_file
-            )
-
-            # 设置SSL选项以提高兼容性
-            context.minimum_version = ssl.TLSVersion.TLSv1_2
-            context.set_ciphers(
-                "ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS"
-            )
+            # 使用与POP3服务器共享的SSL上下文（会话恢复、ECDHE密码套件）
+            context = get_server_context(self.ssl_cert_file, self.ssl_key_file)
 
             logger.info(f"SSL上下文已创建: {self.ssl_cert_file}")
             return context
@@ -383,17 +447,43 @@ class StableSMTPServer:
             # 测试端口是否可用
             self._test_port_availability()
 
+            # 创建邮件处理工作池，使阻塞的解析和存储工作不占用事件循环
+            self.handler.worker_pool = SMTPWorkerPool(
+                max_workers=self.processing_workers,
+                queue_size=self.processing_queue_size,
+                mode=self.processing_mode,
+                initializer=_init_worker_process,
+                initargs=(self.db_handler.db_path,),
+            )
+
             # 创建自定义的服务器工厂，支持连接数限制和Windows优化
             class LimitedConnectionController(Controller):
-                def __init__(self, handler, hostname, port, max_connections, **kwargs):
+                def __init__(
+                    self,
+                    handler,
+                    hostname,
+                    port,
+                    max_connections,
+                    spool_memory_limit,
+                    spool_dir,
+                    **kwargs,
+                ):
                     self.max_connections = max_connections
                     self.current_connections = 0
                     self.connection_lock = threading.Lock()
+                    self.spool_memory_limit = spool_memory_limit
+                    self.spool_dir = spool_dir
                     super().__init__(handler, hostname=hostname, port=port, **kwargs)
 
                 def factory(self):
-                    # 创建SMTP实例，并添加连接计数和Windows优化
-                    smtp_instance = super().factory()
+                    # 创建SMTP实例（DATA边接收边暂存，认证在线程池中执行），
+                    # 并添加连接计数和Windows优化
+                    smtp_instance = StableSMTPProtocol(
+                        self.handler,
+                        spool_memory_limit=self.spool_memory_limit,
+                        spool_dir=self.spool_dir,
+                        **self.SMTP_kwargs,
+                    )
                     original_connection_made = smtp_instance.connection_made
                     original_connection_lost = smtp_instance.connection_lost
 
@@ -463,14 +553,17 @@ class StableSMTPServer:
                 hostname=self.host,
                 port=self.port,
                 max_connections=self.max_connections,
+                spool_memory_limit=self.spool_memory_limit,
+                spool_dir=self.spool_dir,
                 authenticator=self.auth_callback if self.require_auth else None,
                 auth_require_tls=False,  # 允许非TLS认证以提高兼容性
                 ssl_context=self.ssl_context,
                 ready_timeout=30,
                 enable_SMTPUTF8=True,
-                decode_data=True,  # 确保数据解码
-                # Windows兼容性优化
-                data_size_limit=10 * 1024 * 1024,  # 10MB限制
+                # 处理器直接使用原始DATA字节，不再额外解码出一份字符串
+                decode_data=False,
+                # EHLO中公布SIZE扩展；MAIL FROM的SIZE参数超限时立即返回552
+                data_size_limit=self.max_message_size,
             )
 
             # 启动控制器
@@ -478,7 +571,8 @@ class StableSMTPServer:
 
             logger.info(f"稳定SMTP服务器已启动: {self.host}:{self.port}")
             logger.info(
-                f"最大连接数: {self.max_connections}, 并发处理器: {SMTP_CONCURRENT_HANDLER_COUNT}"
+                f"最大连接数: {self.max_connections}, 并发处理器: {self.processing_workers} "
+                f"({self.processing_mode}), 处理队列上限: {self.processing_queue_size}"
             )
 
         except Exception as e:
@@ -489,8 +583,33 @@ class StableSMTPServer:
                 except:
                     pass
             self.controller = None
+            if self.handler.worker_pool:
+                self.handler.worker_pool.shutdown(wait=False)
+                self.handler.worker_pool = None
             raise
 
+    def get_processing_metrics(self) -> dict:
+        """
+        获取邮件处理工作池指标
+
+        Returns:
+            队列深度、等待时间等指标；服务器未启动时返回空字典
+        """
+        if self.handler.worker_pool:
+            return self.handler.worker_pool.get_metrics()
+        return {}
+
+    def get_tls_metrics(self) -> dict:
+        """
+        获取TLS握手指标（SSL上下文在SMTP和POP3服务器之间共享，统计为合计值）
+
+        Returns:
+            握手总数、完整握手数、会话恢复数和恢复率；未启用SSL时返回空字典
+        """
+        if self.ssl_context is None:
+            return {}
+        return tls_stats(self.ssl_context)
+
     def _test_port_availability(self):
         """测试端口可用性"""
         try:
@@ -510,6 +629,15 @@ class StableSMTPServer:
             self.controller = None
             logger.info("稳定SMTP服务器已停止")
 
+        # 等待已接收的邮件处理完成
+        if self.handler.worker_pool:
+            self.handler.worker_pool.shutdown(wait=True)
+            self.handler.worker_pool = None
+
+        # 提交尚未写入的批次（仅关闭由本服务器创建的邮件服务）
+        if self._owns_db_handler:
+            self.db_handler.close()
+
 
 if __name__ == "__main__":
     import argparse
@@ -519,6 +647,12 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=465, help="服务器端口")
     parser.add_argument("--no-ssl", dest="ssl", action="store_false", help="禁用SSL")
     parser.add_argument("--no-auth", dest="auth", action="store_false", help="禁用认证")
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=SMTP_MAX_MESSAGE_SIZE,
+        help="单封邮件最大字节数（SIZE扩展）",
+    )
     parser.set_defaults(ssl=True, auth=True)
     args = parser.parse_args()
 
@@ -528,6 +662,7 @@ if __name__ == "__main__":
         port=args.port,
         require_auth=args.auth,
         use_ssl=args.ssl,
+        max_message_size=args.max_size,
     )
     server.start()
 
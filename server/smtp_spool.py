@@ -0,0 +1,275 @@
+"""
+SMTP DATA暂存 - 边接收边写入，大邮件不在内存中整体缓冲
+
+aiosmtpd默认把DATA的所有行保存在列表中，结束后再拼接为envelope.content，
+大邮件在每个并发会话中都要占用数倍于邮件大小的内存。这里的SpoolingSMTP
+逐行去除点填充后写入MessageSpool：小邮件仍保存在内存中，超过阈值后转存到
+临时文件，处理器通过envelope.spool读取。
+
+超过data_size_limit时与aiosmtpd一致：继续读完DATA但丢弃内容，最后返回552。
+
+smtp_DATA/_receive_data按aiosmtpd 1.4的SMTP.smtp_DATA改写，并使用其私有的
+_DataState，因此requirements.txt中把aiosmtpd固定在1.4.*；升级时需要对照新版本的
+smtp_DATA重新核对。
+"""
+
+import io
+import os
+import asyncio
+import tempfile
+from typing import BinaryIO, Optional
+
+from aiosmtpd.smtp import MISSING, SMTP, _DataState, syntax
+
+from common.utils import setup_logging
+from common.config import SMTP_SPOOL_MEMORY_LIMIT, SMTP_SPOOL_DIR
+
+# 设置日志
+logger = setup_logging("smtp_spool")
+
+
+class MessageSpool:
+    """邮件内容暂存区：先写内存，超过阈值后转存到临时文件"""
+
+    def __init__(
+        self,
+        memory_limit: int = SMTP_SPOOL_MEMORY_LIMIT,
+        spool_dir: Optional[str] = SMTP_SPOOL_DIR,
+    ):
+        """
+        初始化暂存区
+
+        Args:
+            memory_limit: 保存在内存中的最大字节数
+            spool_dir: 临时文件目录，None时使用系统临时目录
+        """
+        self.memory_limit = memory_limit
+        self.spool_dir = spool_dir
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def in_memory(self) -> bool:
+        """内容是否仍保存在内存中"""
+        return self.path is None
+
+    def write(self, data: bytes) -> None:
+        """
+        追加内容
+
+        Args:
+            data: 要写入的字节
+        """
+        self.size += len(data)
+        if self._file is not None:
+            self._file.write(data)
+            return
+        self._buffer.write(data)
+        if self.size > self.memory_limit:
+            self._rollover()
+
+    def _rollover(self) -> None:
+        """把内存中的内容转存到临时文件"""
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(
+            dir=self.spool_dir, prefix="smtp-", suffix=".eml"
+        )
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+        logger.debug(f"DATA内容超过{self.memory_limit}字节，转存到临时文件: {self.path}")
+
+    def finish(self) -> None:
+        """结束写入（刷新临时文件）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def getvalue(self) -> bytes:
+        """
+        获取内存中的内容
+
+        Returns:
+            邮件字节
+
+        Raises:
+            ValueError: 内容已转存到临时文件时抛出
+        """
+        if not self.in_memory:
+            raise ValueError("内容已转存到临时文件，请使用open()读取")
+        return self._buffer.getvalue()
+
+    def open(self) -> BinaryIO:
+        """
+        以二进制只读方式打开内容（由调用方关闭）
+
+        Returns:
+            文件对象
+        """
+        if self.in_memory:
+            return io.BytesIO(self._buffer.getvalue())
+        self.finish()
+        return open(self.path, "rb")
+
+    def close(self) -> None:
+        """释放内存并删除临时文件"""
+        self.finish()
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                logger.warning(f"删除DATA临时文件失败: {self.path} - {e}")
+            self.path = None
+        self._buffer = io.BytesIO()
+        self.size = 0
+
+
+class SpoolingSMTP(SMTP):
+    """
+    逐行暂存DATA内容的SMTP协议实现
+
+    处理器在handle_DATA中通过envelope.spool读取内容；内容仍在内存中时同时设置
+    envelope.content/original_content，兼容只读取这两个属性的处理器。
+    handle_DATA返回后暂存区（包括临时文件）被释放。
+    """
+
+    def __init__(
+        self,
+        handler,
+        *args,
+        spool_memory_limit: int = SMTP_SPOOL_MEMORY_LIMIT,
+        spool_dir: Optional[str] = SMTP_SPOOL_DIR,
+        **kwargs,
+    ):
+        """
+        初始化SMTP协议实例
+
+        Args:
+            handler: SMTP处理器
+            spool_memory_limit: DATA内容保存在内存中的最大字节数
+            spool_dir: DATA临时文件目录
+            其余参数同aiosmtpd.smtp.SMTP
+        """
+        super().__init__(handler, *args, **kwargs)
+        self.spool_memory_limit = spool_memory_limit
+        self.spool_dir = spool_dir
+
+    @syntax("DATA")
+    async def smtp_DATA(self, arg: str) -> None:
+        if await self.check_helo_needed():
+            return
+        if await self.check_auth_needed("DATA"):
+            return
+        assert self.envelope is not None
+        if not self.envelope.rcpt_tos:
+            await self.push("503 Error: need RCPT command")
+            return
+        if arg:
+            await self.push("501 Syntax: DATA")
+            return
+
+        await self.push("354 End data with <CR><LF>.<CR><LF>")
+        spool = MessageSpool(self.spool_memory_limit, self.spool_dir)
+        try:
+            state = await self._receive_data(spool)
+            spool.finish()
+
+            if state == _DataState.TOO_LONG:
+                await self.push("500 Line too long (see RFC5321 4.5.3.1.6)")
+                self._set_post_data_state()
+                return
+            if state == _DataState.TOO_MUCH:
+                logger.warning(f"邮件超过大小限制 {self.data_size_limit} 字节，已拒绝")
+                await self.push("552 Error: Too much mail data")
+                self._set_post_data_state()
+                return
+
+            strict_ascii = self._decode_data and not self.enable_SMTPUTF8
+            if strict_ascii and not self._spool_is_ascii(spool):
+                # 与aiosmtpd一致：未启用SMTPUTF8时拒绝非ASCII内容
+                spool.close()
+                await self.push("500 Error: strict ASCII mode")
+                return
+
+            self.envelope.spool = spool
+            if spool.in_memory:
+                original_content = spool.getvalue()
+                self.envelope.original_content = original_content
+                self.envelope.content = original_content
+                if self._decode_data:
+                    self.envelope.content = (
+                        original_content.decode("ascii")
+                        if strict_ascii
+                        else original_content.decode("utf-8", errors="surrogateescape")
+                    )
+
+            status = MISSING
+            if "DATA" in self._handle_hooks:
+                status = await self._call_handler_hook("DATA")
+        finally:
+            spool.close()
+
+        self._set_post_data_state()
+        await self.push("250 OK" if status is MISSING else status)
+
+    @staticmethod
+    def _spool_is_ascii(spool: MessageSpool) -> bool:
+        """按块检查暂存的内容是否全部为ASCII"""
+        with spool.open() as f:
+            return all(chunk.isascii() for chunk in iter(lambda: f.read(65536), b""))
+
+    async def _receive_data(self, spool: MessageSpool) -> _DataState:
+        """
+        读取DATA直到结束行，逐行去除点填充后写入暂存区
+
+        Returns:
+            DATA状态（正常、行过长或超出大小限制）
+        """
+        num_bytes = 0
+        limit = self.data_size_limit
+        line_fragments = []
+        state = _DataState.NOMINAL
+        while self.transport is not None:
+            try:
+                line = await self._reader.readuntil(b"\r\n")
+                assert line.endswith(b"\r\n")
+            except asyncio.CancelledError:
+                logger.info("DATA阶段连接断开")
+                self._writer.close()
+                raise
+            except asyncio.LimitOverrunError as e:
+                # 行超过StreamReader的缓冲上限：丢弃已接收内容，读完后返回500
+                if state == _DataState.NOMINAL:
+                    state = _DataState.TOO_LONG
+                    spool.close()
+                line = await self._reader.read(e.consumed)
+                assert not line.endswith(b"\r\n")
+
+            # 单独的点号行表示DATA结束
+            if not line_fragments and line == b".\r\n":
+                break
+            num_bytes += len(line)
+            if state == _DataState.NOMINAL and limit and num_bytes > limit:
+                # 超出大小限制后只计数不保存，读完DATA再返回552（RFC 5321 4.2.5）
+                state = _DataState.TOO_MUCH
+                spool.close()
+            line_fragments.append(line)
+            if not line.endswith(b"\r\n"):
+                continue
+            if state == _DataState.NOMINAL:
+                line = b"".join(line_fragments)
+                if len(line) > self.line_length_limit:
+                    state = _DataState.TOO_LONG
+                    spool.close()
+                else:
+                    # 去除点填充（RFC 5321 4.5.2）
+                    spool.write(line[1:] if line.startswith(b".") else line)
+            line_fragments.clear()
+
+        # 残留未完成的行说明连接已关闭
+        if state == _DataState.NOMINAL:
+            assert not line_fragments
+        return state
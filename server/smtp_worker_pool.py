@@ -0,0 +1,182 @@
+"""
+SMTP邮件处理工作池 - 将解析、过滤和存储等阻塞工作移出aiosmtpd事件循环
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from common.utils import setup_logging
+from common.config import (
+    SMTP_CONCURRENT_HANDLER_COUNT,
+    SMTP_PROCESSING_MODE,
+    SMTP_PROCESSING_QUEUE_SIZE,
+)
+
+# 设置日志
+logger = setup_logging("smtp_worker_pool")
+
+
+class WorkerPoolFull(Exception):
+    """工作池已满（正在处理和排队的任务数达到上限）"""
+
+    pass
+
+
+def _timed_call(func: Callable, *args) -> tuple:
+    """在工作线程/进程中执行任务，并返回实际开始执行的时间戳"""
+    started_at = time.time()
+    return started_at, func(*args)
+
+
+class SMTPWorkerPool:
+    """
+    有界的SMTP邮件处理工作池
+
+    正在执行与排队等待的任务总数超过 workers + queue_size 时拒绝新任务，
+    由调用方向客户端返回451，使发送方稍后重试，而不是无限堆积内存。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = SMTP_CONCURRENT_HANDLER_COUNT,
+        queue_size: int = SMTP_PROCESSING_QUEUE_SIZE,
+        mode: str = SMTP_PROCESSING_MODE,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        """
+        初始化工作池
+
+        Args:
+            max_workers: 工作线程/进程数量
+            queue_size: 允许排队等待的任务数量
+            mode: "thread" 或 "process"
+            initializer: 进程模式下每个工作进程的初始化函数
+            initargs: 初始化函数参数
+        """
+        self.max_workers = max(1, max_workers)
+        self.queue_size = max(0, queue_size)
+        self.capacity = self.max_workers + self.queue_size
+        self.mode = mode if mode in ("thread", "process") else "thread"
+
+        if self.mode == "process":
+            self.executor: Executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=initializer,
+                initargs=initargs,
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="smtp-worker"
+            )
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "total_process_time": 0.0,
+        }
+
+        logger.info(
+            f"SMTP处理工作池已初始化: 模式 {self.mode}, 工作者 {self.max_workers}, "
+            f"队列上限 {self.queue_size}"
+        )
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        在工作池中执行任务并等待结果
+
+        Args:
+            func: 要执行的函数（进程模式下必须可被pickle）
+            *args: 函数参数
+
+        Returns:
+            函数返回值
+
+        Raises:
+            WorkerPoolFull: 工作池已满时抛出
+        """
+        with self.lock:
+            if self.pending >= self.capacity:
+                self.metrics["rejected"] += 1
+                raise WorkerPoolFull(
+                    f"SMTP处理队列已满: {self.pending}/{self.capacity}"
+                )
+            self.pending += 1
+            self.metrics["submitted"] += 1
+            queue_depth = max(0, self.pending - self.max_workers)
+            self.metrics["max_queue_depth"] = max(
+                self.metrics["max_queue_depth"], queue_depth
+            )
+
+        submitted_at = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            started_at, result = await loop.run_in_executor(
+                self.executor, _timed_call, func, *args
+            )
+            finished_at = time.time()
+            wait_time = max(0.0, started_at - submitted_at)
+            with self.lock:
+                self.metrics["completed"] += 1
+                self.metrics["total_wait_time"] += wait_time
+                self.metrics["max_wait_time"] = max(
+                    self.metrics["max_wait_time"], wait_time
+                )
+                self.metrics["total_process_time"] += finished_at - started_at
+            return result
+        except Exception:
+            with self.lock:
+                self.metrics["failed"] += 1
+            raise
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取工作池指标
+
+        Returns:
+            包含队列深度、等待时间等统计的字典
+        """
+        with self.lock:
+            metrics = dict(self.metrics)
+            pending = self.pending
+
+        completed = metrics["completed"]
+        metrics.update(
+            {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "capacity": self.capacity,
+                "in_flight": pending,
+                "queue_depth": max(0, pending - self.max_workers),
+                "avg_wait_time": (
+                    metrics["total_wait_time"] / completed if completed else 0.0
+                ),
+                "avg_process_time": (
+                    metrics["total_process_time"] / completed if completed else 0.0
+                ),
+            }
+        )
+        return metrics
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        关闭工作池
+
+        Args:
+            wait: 是否等待正在处理的任务完成
+        """
+        self.executor.shutdown(wait=wait)
+        logger.info("SMTP处理工作池已关闭")
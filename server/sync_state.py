@@ -0,0 +1,123 @@
+"""
+POP3同步状态 - 按账户记录已下载到本地存储的邮件（UIDL -> Message-ID）
+
+POP3客户端每次同步只需要一次UIDL往返：UIDL已记录的邮件直接从本地存储读取，
+只有新的UIDL才需要RETR。服务器上已经不存在的UIDL从状态中移除，
+本地保存的邮件不受影响。
+"""
+
+import datetime
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+from common.utils import setup_logging
+
+# 设置日志
+logger = setup_logging("sync_state")
+
+
+def create_sync_state_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    创建同步状态表（幂等）
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pop3_sync_state (
+            account TEXT NOT NULL,
+            uidl TEXT NOT NULL,
+            message_id TEXT NOT NULL,
+            synced_at TEXT NOT NULL,
+            PRIMARY KEY (account, uidl)
+        )
+    """
+    )
+
+
+class SyncStateRepository:
+    """POP3同步状态仓储类"""
+
+    def __init__(self, db_connection):
+        """
+        初始化同步状态仓储
+
+        Args:
+            db_connection: 数据库连接管理器
+        """
+        self.db = db_connection
+
+    @staticmethod
+    def normalize_account(account: str) -> str:
+        """账户标识统一为小写（邮箱地址或 用户名@主机）"""
+        return (account or "").strip().lower()
+
+    def get_synced(self, account: str) -> Dict[str, str]:
+        """
+        获取账户已同步的邮件
+
+        Args:
+            account: 账户标识
+
+        Returns:
+            UIDL -> Message-ID字典
+        """
+        rows = self.db.execute_query(
+            "SELECT uidl, message_id FROM pop3_sync_state WHERE account = ?",
+            (self.normalize_account(account),),
+            fetch_all=True,
+        )
+        return {row["uidl"]: row["message_id"] for row in rows or []}
+
+    def record_synced(self, account: str, entries: Iterable[Tuple[str, str]]) -> bool:
+        """
+        记录已保存到本地存储的邮件
+
+        Args:
+            account: 账户标识
+            entries: (UIDL, Message-ID)序列
+
+        Returns:
+            bool: 操作是否成功
+        """
+        now = datetime.datetime.now().isoformat()
+        account = self.normalize_account(account)
+        rows = [(account, uidl, message_id, now) for uidl, message_id in entries]
+        if not rows:
+            return True
+        return self.db.execute_transaction(
+            [
+                (
+                    "INSERT OR REPLACE INTO pop3_sync_state "
+                    "(account, uidl, message_id, synced_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            ]
+        )
+
+    def forget(self, account: str, uidls: List[str]) -> bool:
+        """
+        移除服务器上已不存在的UIDL
+
+        Args:
+            account: 账户标识
+            uidls: UIDL列表
+
+        Returns:
+            bool: 操作是否成功
+        """
+        if not uidls:
+            return True
+        account = self.normalize_account(account)
+        success = self.db.execute_transaction(
+            [
+                (
+                    "DELETE FROM pop3_sync_state WHERE account = ? AND uidl = ?",
+                    [(account, uidl) for uidl in uidls],
+                )
+            ]
+        )
+        if success:
+            logger.debug("已移除 %s 的 %s 条同步状态", account, len(uidls))
+        return success
@@ -3,14 +3,19 @@
 """
 
 import os
+import hmac
+import time
 import sqlite3
 import datetime
 import secrets
 import hashlib
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple, Any
 
 from common.utils import setup_logging, hash_password, verify_password
-from common.config import DB_PATH
+from common.password_hashing import needs_rehash
+from common.config import DB_PATH, AUTH_CACHE_TTL, AUTH_CACHE_SIZE
 from common.models import User
 
 # 设置日志
@@ -18,16 +23,42 @@ logger = setup_logging("user_auth")
 
 
 class UserAuth:
-    """用户认证类，处理用户管理和认证"""
-
-    def __init__(self, db_path: str = DB_PATH):
+    """
+    用户认证类，处理用户管理和认证
+
+    SMTP AUTH和POP3 PASS都会调用authenticate，客户端每分钟轮询一次。为了不在每次
+    登录时都查询数据库并执行KDF，这里缓存两类数据（都在cache_ttl秒后过期）：
+    - 用户记录：按用户名缓存，change_password/deactivate_user/activate_user时失效
+    - 已验证的凭据：键为进程内随机密钥对用户名和密码的HMAC摘要（不保存明文密码），
+      同时记录验证时的密码哈希，密码被修改后旧凭据自然失效
+    其他进程修改用户（如user_manager.py）时，最多在cache_ttl秒后生效。
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        cache_ttl: int = AUTH_CACHE_TTL,
+        cache_size: int = AUTH_CACHE_SIZE,
+    ):
         """
         初始化用户认证
 
         Args:
             db_path: 数据库文件路径
+            cache_ttl: 认证结果和用户记录的缓存时间（秒），0表示不缓存
+            cache_size: 每类缓存的最大条目数
         """
         self.db_path = db_path
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+
+        # 认证缓存
+        self._cache_lock = threading.Lock()
+        self._cache_secret = secrets.token_bytes(32)
+        # 凭据摘要 -> (过期时间, 用户名, 验证时的密码哈希)
+        self._verified: "OrderedDict[bytes, Tuple[float, str, str]]" = OrderedDict()
+        # 用户名 -> (过期时间, User)
+        self._users: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
 
         # 确保目录存在
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -109,6 +140,10 @@ class UserAuth:
         """
         验证用户凭据
 
+        命中认证缓存时不查询数据库也不执行KDF；完整验证成功后，如果存储的密码哈希
+        使用旧算法或成本参数已变化，则用当前配置重新哈希并保存。
+        KDF计算是CPU密集型的，事件循环中的调用方应在线程池中执行本方法。
+
         Args:
             username: 用户名
             password: 密码
@@ -118,7 +153,7 @@ class UserAuth:
         """
         try:
             # 获取用户
-            user = self.get_user_by_username(username)
+            user = self._get_cached_user(username)
             if not user:
                 logger.warning(f"用户不存在: {username}")
                 return None
@@ -128,9 +163,19 @@ class UserAuth:
                 logger.warning(f"用户未激活: {username}")
                 return None
 
+            digest = self._credential_digest(username, password)
+            if self._is_verified(digest, user.password_hash):
+                logger.debug(f"用户认证成功(缓存): {username}")
+                return user
+
             # 验证密码
             if verify_password(password, user.password_hash, user.salt):
-                # 更新最后登录时间
+                if needs_rehash(user.password_hash):
+                    user = self._upgrade_password_hash(user, password)
+
+                self._remember_verified(digest, username, user.password_hash)
+
+                # 更新最后登录时间（缓存命中的登录不再逐次写库）
                 self.update_last_login(username)
 
                 logger.info(f"用户认证成功: {username}")
@@ -142,6 +187,110 @@ class UserAuth:
             logger.error(f"认证用户时出错: {e}")
             return None
 
+    def invalidate_user(self, username: str) -> None:
+        """
+        清除用户的缓存记录和已验证凭据
+
+        Args:
+            username: 用户名
+        """
+        with self._cache_lock:
+            self._users.pop(username, None)
+            stale = [k for k, v in self._verified.items() if v[1] == username]
+            for key in stale:
+                del self._verified[key]
+
+    def _get_cached_user(self, username: str) -> Optional[User]:
+        """获取用户记录，优先使用未过期的缓存"""
+        if self.cache_ttl <= 0:
+            return self.get_user_by_username(username)
+
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._users.get(username)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        user = self.get_user_by_username(username)
+        if user:
+            with self._cache_lock:
+                self._users[username] = (now + self.cache_ttl, user)
+                self._users.move_to_end(username)
+                while len(self._users) > self.cache_size:
+                    self._users.popitem(last=False)
+        return user
+
+    def _credential_digest(self, username: str, password: str) -> bytes:
+        """计算凭据的HMAC摘要，作为认证缓存的键"""
+        message = username.encode("utf-8") + b"\0" + password.encode("utf-8")
+        return hmac.new(self._cache_secret, message, hashlib.sha256).digest()
+
+    def _is_verified(self, digest: bytes, password_hash: str) -> bool:
+        """凭据是否在有效期内验证过，且之后密码未被修改"""
+        if self.cache_ttl <= 0:
+            return False
+        with self._cache_lock:
+            entry = self._verified.get(digest)
+            if not entry:
+                return False
+            if entry[0] <= time.monotonic() or entry[2] != password_hash:
+                del self._verified[digest]
+                return False
+            return True
+
+    def _remember_verified(self, digest: bytes, username: str, password_hash: str) -> None:
+        """记录验证成功的凭据"""
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            expires = time.monotonic() + self.cache_ttl
+            self._verified[digest] = (expires, username, password_hash)
+            self._verified.move_to_end(digest)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def _upgrade_password_hash(self, user: User, password: str) -> User:
+        """使用当前配置的算法重新哈希密码并保存，失败时继续使用旧哈希"""
+        password_hash, salt = hash_password(password)
+        if not self._store_password_hash(user.username, password_hash, salt):
+            return user
+
+        logger.info(f"用户密码哈希已升级: {user.username}")
+        self.invalidate_user(user.username)
+        user.password_hash = password_hash
+        user.salt = salt
+        return user
+
+    def _store_password_hash(self, username: str, password_hash: str, salt: str) -> bool:
+        """
+        保存用户的密码哈希和盐值
+
+        Args:
+            username: 用户名
+            password_hash: 存储格式的密码哈希
+            salt: 盐值
+
+        Returns:
+            操作是否成功
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+            UPDATE users SET password_hash = ?, salt = ? WHERE username = ?
+            """,
+                (password_hash, salt, username),
+            )
+
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"保存密码哈希时出错: {e}")
+            return False
+
     def get_user_by_username(self, username: str) -> Optional[User]:
         """
         通过用户名获取用户
@@ -252,29 +401,16 @@ class UserAuth:
         Returns:
             操作是否成功
         """
-        try:
-            # 哈希新密码
-            password_hash, salt = hash_password(new_password)
-
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        # 哈希新密码
+        password_hash, salt = hash_password(new_password)
 
-            cursor.execute(
-                """
-            UPDATE users SET password_hash = ?, salt = ? WHERE username = ?
-            """,
-                (password_hash, salt, username),
-            )
-
-            conn.commit()
-            conn.close()
-
-            logger.info(f"用户密码已修改: {username}")
-            return True
-        except Exception as e:
-            logger.error(f"修改密码时出错: {e}")
+        if not self._store_password_hash(username, password_hash, salt):
             return False
 
+        self.invalidate_user(username)
+        logger.info(f"用户密码已修改: {username}")
+        return True
+
     def deactivate_user(self, username: str) -> bool:
         """
         停用用户
@@ -299,6 +435,7 @@ class UserAuth:
             conn.commit()
             conn.close()
 
+            self.invalidate_user(username)
             logger.info(f"用户已停用: {username}")
             return True
         except Exception as e:
@@ -329,6 +466,7 @@ class UserAuth:
             conn.commit()
             conn.close()
 
+            self.invalidate_user(username)
             logger.info(f"用户已激活: {username}")
             return True
         except Exception as e:
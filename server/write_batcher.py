@@ -0,0 +1,192 @@
+"""
+写入批处理器 - 将并发会话的邮件写入合并到同一个事务中提交（组提交）
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Optional, Tuple
+
+from common.utils import setup_logging
+from common.config import DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY_MS
+
+# 设置日志
+logger = setup_logging("write_batcher")
+
+# 停止信号
+_STOP = object()
+
+
+class WriteBatcher:
+    """
+    写入批处理器
+
+    调用方通过submit()提交一组需要原子执行的语句并得到Future；
+    后台线程每凑满max_batch_size组或等待max_delay_ms毫秒后，
+    在一个事务中执行整批语句并提交，提交完成后才完成对应的Future，
+    因此调用方在Future完成时即可确认数据已持久化。
+    """
+
+    def __init__(
+        self,
+        db_connection,
+        max_batch_size: int = DB_WRITE_BATCH_SIZE,
+        max_delay_ms: int = DB_WRITE_BATCH_DELAY_MS,
+    ):
+        """
+        初始化写入批处理器
+
+        Args:
+            db_connection: 数据库连接管理器（DatabaseConnection）
+            max_batch_size: 每个批次最多合并的提交数
+            max_delay_ms: 批次中第一个提交最长等待的毫秒数
+        """
+        self.db = db_connection
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max(0, max_delay_ms) / 1000.0
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.lock = threading.Lock()
+        # 保护_running的检查与入队，stop()之后不会再有提交进入队列
+        self._submit_lock = threading.Lock()
+        self.stats = {"batches": 0, "items": 0, "fallbacks": 0, "max_batch": 0}
+        self._running = True
+
+        self._thread = threading.Thread(
+            target=self._run, name="db-write-batcher", daemon=True
+        )
+        self._thread.start()
+
+        logger.info(
+            f"写入批处理器已启动: 批次大小 {self.max_batch_size}, "
+            f"最长等待 {max_delay_ms} 毫秒"
+        )
+
+    def submit(self, statements: List[Tuple[str, Any]]) -> Future:
+        """
+        提交一组需要原子执行的语句
+
+        Args:
+            statements: (SQL语句, 参数)列表；参数为列表时使用executemany
+
+        Returns:
+            Future: 批次提交成功后结果为True，失败时带有异常
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if not self._running:
+                future.set_exception(RuntimeError("写入批处理器已停止"))
+                return future
+            self.queue.put((statements, future))
+        return future
+
+    def _collect_batch(self, first) -> List[Tuple[List[Tuple[str, Any]], Future]]:
+        """以第一个提交为起点收集一个批次"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (
+                    self.queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self.queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # 当前批次处理完后再退出
+                self.queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        """后台线程主循环"""
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                break
+            batch = self._collect_batch(first)
+            self._flush(batch)
+
+        # 处理停止信号之后才入队的提交，保证每个Future都会完成
+        leftover = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._flush(leftover)
+
+    def _flush(self, batch: List[Tuple[List[Tuple[str, Any]], Future]]) -> None:
+        """在单个事务中执行一个批次，失败时逐条回退执行"""
+        try:
+            with self.db.borrow_connection() as conn:
+                try:
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN IMMEDIATE")
+                    cursor = conn.cursor()
+                    for statements, _ in batch:
+                        for query, params in statements:
+                            if isinstance(params, list):
+                                cursor.executemany(query, params)
+                            else:
+                                cursor.execute(query, params)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            for _, future in batch:
+                future.set_result(True)
+
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["items"] += len(batch)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            logger.debug(f"批量提交完成: {len(batch)} 项")
+
+        except Exception as e:
+            # 整批失败时逐条执行，避免一条坏数据拖累整批
+            logger.warning(f"批量提交失败，改为逐条提交: {e}")
+            with self.lock:
+                self.stats["fallbacks"] += 1
+            for statements, future in batch:
+                try:
+                    future.set_result(self.db.execute_transaction(statements))
+                except Exception as item_error:
+                    future.set_exception(item_error)
+
+    def get_stats(self) -> dict:
+        """
+        获取批处理统计
+
+        Returns:
+            包含批次数、提交项数、回退次数、最大批次和队列长度的字典
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        stats["pending"] = self.queue.qsize()
+        stats["avg_batch"] = (
+            stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        return stats
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """
+        停止批处理器，已提交的写入会在退出前全部执行
+
+        Args:
+            timeout: 等待后台线程退出的秒数
+        """
+        with self._submit_lock:
+            if not self._running:
+                return
+            self._running = False
+            self.queue.put(_STOP)
+        self._thread.join(timeout)
+        logger.info("写入批处理器已停止")
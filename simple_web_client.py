@@ -34,6 +34,7 @@ from common.models import Email, EmailAddress, Attachment
 from common.utils import setup_logging, generate_message_id
 from client.smtp_client import SMTPClient
 from client.pop3_client_refactored import POP3Client
+from client.pop3_sync import POP3MailboxSync
 
 # 设置日志
 logger = setup_logging("simple_web_client")
@@ -258,12 +259,14 @@ class WebCLIBridge:
             return {"success": False, "error": f"发送邮件时出错: {str(e)}"}
 
     def receive_emails(self, limit=20):
-        """接收邮件 - 直接使用CLI的POP3客户端"""
+        """接收邮件 - 按UIDL增量同步，只下载新邮件，其余从本地存储读取"""
         try:
             pop3_config = self.get_pop3_config()
             if not pop3_config:
                 return {"success": False, "error": "未找到POP3配置"}
 
+            from server.new_db_handler import EmailService
+
             # 创建POP3客户端 - 完全复用CLI逻辑
             pop3_client = POP3Client(
                 host=pop3_config["host"],
@@ -272,13 +275,20 @@ class WebCLIBridge:
                 username=pop3_config["username"],
                 password=pop3_config["password"],
             )
+            mailbox_sync = POP3MailboxSync(
+                pop3_client, EmailService(), self.current_account.get("email")
+            )
 
-            # 连接并接收邮件
+            # 连接并同步邮件（已同步的邮件只需要一次UIDL往返）
             pop3_client.connect()
-            emails = pop3_client.retrieve_all_emails(limit=limit)
-            pop3_client.disconnect()
+            try:
+                result = mailbox_sync.sync(limit=limit)
+            finally:
+                pop3_client.disconnect()
 
-            return {"success": True, "emails": emails}
+            # 从本地存储读取，已删除的邮件按本地索引过滤
+            emails = mailbox_sync.load_emails(result.message_ids)
+            return {"success": True, "emails": emails, "new_count": result.new_count}
 
         except Exception as e:
             logger.error(f"接收邮件异常: {e}")
@@ -559,41 +569,11 @@ def receive_emails_page():
     if result["success"]:
         emails = result["emails"]
 
-        # 从数据库获取已删除邮件列表，用于过滤
-        try:
-            from server.new_db_handler import EmailService
-
-            db_service = EmailService()
-            deleted_emails = db_service.list_emails(
-                user_email=session["email"],
-                include_deleted=True,
-                include_spam=True,
-                include_recalled=True,  # 包含已撤回邮件以便过滤
-                limit=2000,  # 获取足够多的已删除邮件记录
-            )
-            # 创建已删除邮件ID集合，只包含is_deleted=True的邮件
-            deleted_message_ids = {
-                email["message_id"]
-                for email in deleted_emails
-                if email.get("is_deleted", False)
-            }
-            logger.info(f"发现 {len(deleted_message_ids)} 封已删除邮件，将从显示中过滤")
-        except Exception as e:
-            logger.warning(f"获取已删除邮件列表失败: {e}")
-            deleted_message_ids = set()
-
-        # 将Email对象转换为字典格式，并过滤已删除邮件
+        # 已删除的邮件在receive_emails中按本地索引过滤
         emails_dict = []
-        filtered_count = 0
         for email in emails:
             email_dict = email.to_dict()
 
-            # 检查是否为已删除邮件
-            if email_dict.get("message_id") in deleted_message_ids:
-                filtered_count += 1
-                logger.debug(f"过滤已删除邮件: {email_dict.get('message_id')}")
-                continue
-
             # 格式化日期字段以便模板使用
             if email_dict.get("date"):
                 try:
@@ -614,11 +594,6 @@ def receive_emails_page():
                     email_dict["formatted_datetime"] = email_dict["date"]
             emails_dict.append(email_dict)
 
-        if filtered_count > 0:
-            logger.info(
-                f"已过滤 {filtered_count} 封已删除邮件，显示 {len(emails_dict)} 封邮件"
-            )
-
         # 根据实际获取的数量显示不同的消息
         if limit == "all":
             flash(f"成功接收 {len(emails)} 封邮件（全部邮件）", "success")
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# spam_filter/matcher.py
+"""
+关键词匹配引擎 - 每个字段只扫描一次，判断哪些关键词（正则表达式）出现在文本中
+
+- 纯字面量关键词（不含正则元字符，或只含转义的标点）合并为Aho-Corasick自动机，
+  一次扫描找出所有候选，候选再用原始编译的正则确认。忽略大小写时文本和关键词
+  都按re.IGNORECASE的规则归一化（见ignorecase_fold），re认为相同的字符归一化后
+  一定相同，因此不会漏掉候选；
+- 真正的正则表达式仍逐个匹配，结果与逐个pattern.search完全一致。
+
+关键词较少时纯Python自动机比C实现的正则慢，因此字面量数量达到
+AUTOMATON_MIN_LITERALS后才启用自动机。把正则合并成一个交替表达式在CPython的
+re中并不会更快（每个位置依次尝试所有分支，且失去了字面量前缀的快速查找），
+实测比逐个匹配更慢，因此没有采用。
+"""
+
+import re
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+# re忽略大小写时额外视为等价的字符表（Python 3.11+在re._casefix中，之前在sre_compile中）
+try:
+    from re._casefix import _EXTRA_CASES
+except ImportError:
+    try:
+        from sre_compile import _ignorecase_fixes as _EXTRA_CASES
+    except ImportError:
+        _EXTRA_CASES = None
+
+# 启用Aho-Corasick自动机的最少字面量关键词数
+AUTOMATON_MIN_LITERALS = 64
+
+# 只包含普通字符和转义标点的正则，可以当作字面量处理
+_LITERAL_PATTERN_RE = re.compile(r"(?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])+")
+_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def _build_ignorecase_table() -> Optional[Dict[int, int]]:
+    """
+    构建re额外视为等价的小写字符（如i/ı、s/ſ、σ/ς）到同一代表字符的映射
+
+    Returns:
+        str.translate映射表，无法取得re的等价字符表时返回None
+    """
+    if _EXTRA_CASES is None:
+        return None
+    table = {}
+    for lower, extras in _EXTRA_CASES.items():
+        group = (lower,) + tuple(extras)
+        for ch in group:
+            if ch != min(group):
+                table[ch] = min(group)
+    return table
+
+
+_IGNORECASE_TABLE = _build_ignorecase_table()
+# 需要映射的字符；文本中没有这些字符时跳过较慢的translate
+_IGNORECASE_CHARS_RE = (
+    re.compile("[" + "".join(re.escape(chr(c)) for c in _IGNORECASE_TABLE) + "]")
+    if _IGNORECASE_TABLE
+    else None
+)
+
+
+def literal_of(pattern: str) -> Optional[str]:
+    """
+    如果正则表达式等价于一个字面量字符串，返回该字符串
+
+    Args:
+        pattern: 正则表达式
+
+    Returns:
+        字面量字符串，不是字面量时返回None
+    """
+    if _LITERAL_PATTERN_RE.fullmatch(pattern):
+        return _ESCAPE_RE.sub(r"\1", pattern)
+    return None
+
+
+def ignorecase_fold(text: str) -> str:
+    """
+    按re.IGNORECASE的规则归一化大小写
+
+    re忽略大小写时逐字符比较简单小写映射，并把少数字符额外视为等价；
+    这里做同样的映射（不像casefold那样展开或改变字符），re认为相同的两段文本
+    归一化后一定相同。
+
+    Args:
+        text: 待归一化文本
+
+    Returns:
+        归一化后的文本
+    """
+    if "\u0130" in text:
+        # 'İ'.lower()会展开为两个字符，re使用的简单小写映射是'i'
+        text = text.replace("\u0130", "i")
+    text = text.lower()
+    if _IGNORECASE_CHARS_RE is not None and _IGNORECASE_CHARS_RE.search(text):
+        text = text.translate(_IGNORECASE_TABLE)
+    return text
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式字符串匹配自动机"""
+
+    def __init__(self, words: List[str]):
+        """
+        构建自动机
+
+        Args:
+            words: 模式字符串列表（调用方负责大小写归一化）
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[tuple] = [()]
+
+        for index, word in enumerate(words):
+            state = 0
+            for ch in word:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][ch] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (index,)
+
+        # 广度优先计算失败指针，并把失败状态的输出合并进来
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find_all(self, text: str) -> Set[int]:
+        """
+        扫描文本，返回出现过的模式下标
+
+        Args:
+            text: 待扫描文本
+
+        Returns:
+            模式下标集合
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class KeywordMatcher:
+    """一组关键词（正则表达式）的编译匹配器"""
+
+    def __init__(self, keywords: List[str], flags: int = re.IGNORECASE):
+        """
+        编译关键词
+
+        Args:
+            keywords: 关键词（正则表达式）列表
+            flags: 正则编译标志
+        """
+        self.keywords = list(keywords)
+        self.patterns = [re.compile(k, flags) for k in self.keywords]
+
+        literal_indexes = []
+        literal_words = []
+        for index, keyword in enumerate(self.keywords):
+            literal = literal_of(keyword)
+            if literal is not None:
+                literal_indexes.append(index)
+                literal_words.append(literal)
+
+        self.automaton: Optional[AhoCorasick] = None
+        self.automaton_indexes: List[int] = []
+        ignorecase = bool(flags & re.IGNORECASE)
+        if len(literal_words) >= AUTOMATON_MIN_LITERALS and (
+            _IGNORECASE_TABLE is not None or not ignorecase
+        ):
+            # 忽略大小写时按re的规则归一化，候选再由原始正则确认
+            fold = ignorecase_fold if ignorecase else (lambda s: s)
+            self.fold = fold
+            self.automaton = AhoCorasick([fold(word) for word in literal_words])
+            self.automaton_indexes = literal_indexes
+
+        automaton_set = set(self.automaton_indexes)
+        self.regex_indexes = [
+            i for i in range(len(self.keywords)) if i not in automaton_set
+        ]
+
+    def match(self, text: str) -> List[int]:
+        """
+        找出在文本中出现的关键词
+
+        Args:
+            text: 待匹配文本
+
+        Returns:
+            命中的关键词下标（按关键词顺序），与逐个pattern.search的结果一致
+        """
+        matched = []
+
+        if self.automaton is not None:
+            # 每个字段只扫描一次，得到所有出现过的字面量
+            candidates = self.automaton.find_all(self.fold(text))
+            for candidate in candidates:
+                index = self.automaton_indexes[candidate]
+                if self.patterns[index].search(text):
+                    matched.append(index)
+
+        for index in self.regex_indexes:
+            if self.patterns[index].search(text):
+                matched.append(index)
+
+        # 按关键词顺序返回，保证matched_keywords的顺序不变
+        matched.sort()
+        return matched
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 # spam_filter/spam_filter.py
-import re
 from typing import List, Dict
 from pathlib import Path
 import json
 from common.utils import setup_logging
+from spam_filter.matcher import KeywordMatcher
 
 logger = setup_logging("spam_filter")
 
@@ -21,16 +21,16 @@ class KeywordSpamFilter:
         self.max_threshold = 4.0  # 最高阈值
 
         # 初始化匹配模式（支持正则表达式）
+        self._build_matchers()
+
+    def _build_matchers(self) -> None:
+        """为每个字段编译关键词匹配器，每个字段只需扫描一次"""
+        self.matchers = {
+            field: KeywordMatcher(self.keywords.get(field, []))
+            for field in ("subject", "body", "sender")
+        }
         self.patterns = {
-            "subject": [
-                re.compile(k, re.IGNORECASE) for k in self.keywords.get("subject", [])
-            ],
-            "body": [
-                re.compile(k, re.IGNORECASE) for k in self.keywords.get("body", [])
-            ],
-            "sender": [
-                re.compile(k, re.IGNORECASE) for k in self.keywords.get("sender", [])
-            ],
+            field: matcher.patterns for field, matcher in self.matchers.items()
         }
 
     def _load_keywords(self) -> Dict[str, List[str]]:
@@ -57,31 +57,28 @@ class KeywordSpamFilter:
 
         # 检查发件人
         sender = email_data.get("from_addr", "")
-        for pattern in self.patterns["sender"]:
-            if pattern.search(sender):
-                score += 1.0
-                match_count += 1
-                matched.append(f"sender:{pattern.pattern}")
+        for index in self.matchers["sender"].match(sender):
+            score += 1.0
+            match_count += 1
+            matched.append(f"sender:{self.matchers['sender'].keywords[index]}")
 
         # 检查主题
         subject = email_data.get("subject", "")
         subject_matches = 0
-        for pattern in self.patterns["subject"]:
-            if pattern.search(subject):
-                score += 2.0
-                subject_matches += 1
-                match_count += 1
-                matched.append(f"subject:{pattern.pattern}")
+        for index in self.matchers["subject"].match(subject):
+            score += 2.0
+            subject_matches += 1
+            match_count += 1
+            matched.append(f"subject:{self.matchers['subject'].keywords[index]}")
 
         # 检查正文
         content = email_data.get("content", "")
         content_matches = 0
-        for pattern in self.patterns["body"]:
-            if pattern.search(content):
-                score += 1.5
-                content_matches += 1
-                match_count += 1
-                matched.append(f"body:{pattern.pattern}")
+        for index in self.matchers["body"].match(content):
+            score += 1.5
+            content_matches += 1
+            match_count += 1
+            matched.append(f"body:{self.matchers['body'].keywords[index]}")
 
         # 动态阈值调整
         effective_threshold = self.threshold
@@ -171,19 +168,7 @@ class KeywordSpamFilter:
         try:
             self.keywords = self._load_keywords()
             # 重新初始化匹配模式
-            self.patterns = {
-                "subject": [
-                    re.compile(k, re.IGNORECASE)
-                    for k in self.keywords.get("subject", [])
-                ],
-                "body": [
-                    re.compile(k, re.IGNORECASE) for k in self.keywords.get("body", [])
-                ],
-                "sender": [
-                    re.compile(k, re.IGNORECASE)
-                    for k in self.keywords.get("sender", [])
-                ],
-            }
+            self._build_matchers()
             logger.info("垃圾邮件关键词已重新加载")
             return True
         except Exception as e:
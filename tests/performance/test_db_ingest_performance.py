@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库写入性能测试 - 对比逐条新建连接、连接池和批量组提交时的邮件元数据写入开销
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import datetime
+import argparse
+import concurrent.futures
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from server.db_connection import DatabaseConnection
+from server.db_connection_pool import DatabaseConnectionPool
+from server.db_models import EmailRecord
+from server.email_repository import EmailRepository
+from server.write_batcher import WriteBatcher
+
+
+class DBIngestBenchmark:
+    """邮件元数据写入基准测试"""
+
+    def __init__(self, num_messages=2000, num_threads=8):
+        self.num_messages = num_messages
+        self.num_threads = num_threads
+
+    def _make_record(self, prefix, index):
+        """构造测试邮件记录"""
+        return EmailRecord(
+            message_id=f"<{prefix}.{index}@bench.local>",
+            from_addr="sender@bench.local",
+            to_addrs=[f"user{index % 50:03d}@bench.local", "all@bench.local"],
+            subject=f"基准测试邮件 #{index}",
+            date=datetime.datetime.now(),
+            size=2048,
+        )
+
+    def run_case(self, name, use_pool, use_batching=False):
+        """
+        执行一组写入并统计耗时
+
+        Args:
+            name: 测试名称
+            use_pool: 是否使用连接池
+            use_batching: 是否使用批量组提交
+
+        Returns:
+            每封邮件的平均耗时（毫秒）
+        """
+        test_dir = tempfile.mkdtemp()
+        pool = None
+        batcher = None
+        try:
+            db_path = os.path.join(test_dir, "bench.db")
+            if use_pool:
+                pool = DatabaseConnectionPool(db_path, pool_size=self.num_threads)
+            db = DatabaseConnection(db_path, pool=pool)
+            db.init_database()
+            if use_batching:
+                batcher = WriteBatcher(db)
+            repo = EmailRepository(db, batcher)
+
+            def ingest(index):
+                repo.create_email(self._make_record(name, index))
+                # save_email 在写入前还会做一次撤回检查查询
+                repo.get_sent_email_by_id(f"<{name}.{index}@bench.local>")
+
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(self.num_threads) as executor:
+                list(executor.map(ingest, range(self.num_messages)))
+            duration = time.perf_counter() - start
+
+            stored = repo.count_emails(include_spam=True)
+            per_message_ms = duration * 1000 / self.num_messages
+            print(
+                f"[INFO] {name:<8} 写入 {stored}/{self.num_messages} 封, "
+                f"总耗时 {duration:.2f} 秒, 平均 {per_message_ms:.3f} 毫秒/封, "
+                f"吞吐量 {self.num_messages / duration:.0f} 封/秒"
+            )
+            if batcher:
+                stats = batcher.get_stats()
+                print(
+                    f"[INFO] {name:<8} 批次数 {stats['batches']}, "
+                    f"平均批次大小 {stats['avg_batch']:.1f}, 最大批次 {stats['max_batch']}"
+                )
+            return per_message_ms
+        finally:
+            if batcher:
+                batcher.stop()
+            if pool:
+                pool.close_all()
+            shutil.rmtree(test_dir, ignore_errors=True)
+
+    def run(self):
+        """运行对比测试"""
+        print("数据库写入性能测试")
+        print("=" * 50)
+        print(f"邮件数: {self.num_messages}, 并发线程: {self.num_threads}")
+
+        direct = self.run_case("direct", use_pool=False)
+        pooled = self.run_case("pooled", use_pool=True)
+        batched = self.run_case("batched", use_pool=True, use_batching=True)
+
+        print(f"[INFO] 连接池加速比: {direct / pooled:.2f}x")
+        print(f"[INFO] 批量提交加速比: {direct / batched:.2f}x")
+        return pooled < direct
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="数据库写入性能测试")
+    parser.add_argument("--messages", type=int, default=2000, help="写入邮件数量")
+    parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    args = parser.parse_args()
+
+    benchmark = DBIngestBenchmark(args.messages, args.threads)
+    if benchmark.run():
+        print("\n[SUCCESS] 连接池写入开销低于逐条建立连接")
+    else:
+        print("\n[FAIL] 连接池未带来性能提升")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+头部解码性能测试 - 在模拟邮箱的头部语料上对比未缓存和缓存的RFC 2047解码、
+地址解析和地址验证
+"""
+
+import sys
+import time
+import base64
+import random
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from common.email_header_processor import EmailHeaderProcessor
+from common.email_validator import EmailValidator, _is_valid_email_cached
+
+
+def encode_word(text: str) -> str:
+    """RFC 2047 base64编码词"""
+    return f"=?utf-8?B?{base64.b64encode(text.encode()).decode()}?="
+
+
+def build_corpus(num_messages: int, num_senders: int, seed: int = 1):
+    """
+    构造邮箱头部语料：发件人和邮件列表地址在邮件之间大量重复，主题大多不同
+
+    Returns:
+        [(From, To, Subject), ...]
+    """
+    rng = random.Random(seed)
+    names = ["张三", "李四", "王五", "赵六", "Alice", "Bob", "系统通知", "课程助教"]
+    senders = [
+        f"{encode_word(rng.choice(names) + str(i))} <sender{i}@bench.local>"
+        for i in range(num_senders)
+    ]
+    lists = [
+        ", ".join(f"user{j}@bench.local" for j in range(i, i + 5)) for i in range(20)
+    ]
+    corpus = []
+    for i in range(num_messages):
+        subject = encode_word(f"第{i % (num_messages // 4 or 1)}期 周报")
+        corpus.append((rng.choice(senders), rng.choice(lists), subject))
+    return corpus
+
+
+class HeaderDecodeBenchmark:
+    """头部解码基准测试"""
+
+    def __init__(self, num_messages=20000, num_senders=300):
+        self.corpus = build_corpus(num_messages, num_senders)
+
+    def _uncached(self, from_value, to_value, subject):
+        processor = EmailHeaderProcessor
+        processor._decode_header_uncached(subject)
+        processor._parse_address_uncached(from_value)
+        for part in to_value.split(","):
+            processor._parse_address_uncached(part.strip())
+            _is_valid_email_cached.__wrapped__(part)
+
+    def _cached(self, from_value, to_value, subject):
+        processor = EmailHeaderProcessor
+        processor.decode_header_value(subject)
+        processor.parse_address(from_value)
+        processor.parse_address_list(to_value)
+        for part in to_value.split(","):
+            EmailValidator._is_valid_email(part)
+
+    def run_case(self, name, func):
+        """
+        处理全部语料并统计耗时
+
+        Returns:
+            每封邮件的平均耗时（微秒）
+        """
+        start = time.perf_counter()
+        for headers in self.corpus:
+            func(*headers)
+        per_message_us = (time.perf_counter() - start) * 1e6 / len(self.corpus)
+        print(f"[INFO] {name:<9} 平均 {per_message_us:.1f} 微秒/封")
+        return per_message_us
+
+    def run(self):
+        """运行对比测试"""
+        print("头部解码性能测试")
+        print("=" * 50)
+        print(f"邮件数: {len(self.corpus)}")
+
+        EmailHeaderProcessor.clear_caches()
+        _is_valid_email_cached.cache_clear()
+        uncached = self.run_case("uncached", self._uncached)
+        cached = self.run_case("cached", self._cached)
+
+        info = EmailHeaderProcessor.cache_info()
+        for name, stats in info.items():
+            lookups = stats["hits"] + stats["misses"]
+            print(
+                f"[INFO] {name:<9} 缓存命中率 {stats['hits'] / lookups:.1%}, "
+                f"条目数 {stats['currsize']}"
+            )
+        print(f"[INFO] 缓存加速比: {uncached / cached:.2f}x")
+        return cached < uncached
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="头部解码性能测试")
+    parser.add_argument("--messages", type=int, default=20000, help="邮件数量")
+    parser.add_argument("--senders", type=int, default=300, help="不同发件人数量")
+    args = parser.parse_args()
+
+    benchmark = HeaderDecodeBenchmark(args.messages, args.senders)
+    if benchmark.run():
+        print("\n[SUCCESS] 缓存后的头部解码开销低于未缓存")
+    else:
+        print("\n[FAIL] 缓存未带来性能提升")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+头部解析性能测试 - 对比完整MIME解析（parse_mime_message）和只解析头部块
+（parse_headers_fast）在大正文、大附件邮件上的开销
+"""
+
+import sys
+import time
+import base64
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from common.email_format_handler import EmailFormatHandler
+
+
+def build_message(body_kb: int) -> str:
+    """构造带一个大附件的测试邮件"""
+    attachment = base64.encodebytes(b"\x00\x01\x02\x03" * (body_kb * 256)).decode()
+    return (
+        "From: =?utf-8?B?5byg5LiJ?= <zhang@bench.local>\r\n"
+        "To: user@bench.local\r\n"
+        "Subject: =?utf-8?B?5Z+65YeG5rWL6K+V?=\r\n"
+        "Date: Mon, 01 Jan 2024 08:00:00 +0000\r\n"
+        "Message-ID: <header-bench@bench.local>\r\n"
+        "MIME-Version: 1.0\r\n"
+        'Content-Type: multipart/mixed; boundary="bench"\r\n'
+        "\r\n"
+        "--bench\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "\r\n"
+        "正文\r\n"
+        "--bench\r\n"
+        "Content-Type: application/octet-stream\r\n"
+        'Content-Disposition: attachment; filename="bench.bin"\r\n'
+        "Content-Transfer-Encoding: base64\r\n"
+        "\r\n"
+        f"{attachment}"
+        "--bench--\r\n"
+    )
+
+
+class HeaderParseBenchmark:
+    """头部解析基准测试"""
+
+    def __init__(self, body_kb=4096, iterations=20):
+        self.body_kb = body_kb
+        self.iterations = iterations
+
+    def run_case(self, name, func, message):
+        """
+        重复解析同一封邮件并统计耗时
+
+        Returns:
+            每次解析的平均耗时（毫秒）
+        """
+        start = time.perf_counter()
+        for _ in range(self.iterations):
+            result = func(message)
+            # 两种方式都要得到解码后的主题和发件人
+            assert result.subject == "基准测试", result.subject
+            assert result.from_addr.address == "zhang@bench.local"
+        per_call_ms = (time.perf_counter() - start) * 1000 / self.iterations
+        print(f"[INFO] {name:<6} 平均 {per_call_ms:.3f} 毫秒/封")
+        return per_call_ms
+
+    def run(self):
+        """运行对比测试"""
+        print("头部解析性能测试")
+        print("=" * 50)
+        message = build_message(self.body_kb)
+        print(f"邮件大小: {len(message) / 1024:.0f} KB, 重复次数: {self.iterations}")
+
+        full = self.run_case("full", EmailFormatHandler.parse_mime_message, message)
+        fast = self.run_case("fast", EmailFormatHandler.parse_headers_fast, message)
+
+        print(f"[INFO] 头部解析加速比: {full / fast:.1f}x")
+        return fast < full
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="头部解析性能测试")
+    parser.add_argument("--body-kb", type=int, default=4096, help="附件大小（KB）")
+    parser.add_argument("--iterations", type=int, default=20, help="重复解析次数")
+    args = parser.parse_args()
+
+    benchmark = HeaderParseBenchmark(args.body_kb, args.iterations)
+    if benchmark.run():
+        print("\n[SUCCESS] 头部解析开销低于完整MIME解析")
+    else:
+        print("\n[FAIL] 头部解析未带来性能提升")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
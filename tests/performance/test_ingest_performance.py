@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮件接收性能测试 - 对比旧的多次解析流程与单次解析接收流水线的解析次数和CPU耗时
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import datetime
+import argparse
+from email.parser import Parser, BytesParser
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from bs4 import BeautifulSoup
+
+from common.models import Email, EmailAddress, Attachment
+from common.email_format_handler import EmailFormatHandler
+from server.new_db_handler import EmailService
+from server.ingest_pipeline import IngestPipeline
+
+
+class ParseCounter:
+    """统计标准库MIME解析器的调用次数"""
+
+    def __init__(self):
+        self.count = 0
+        self._originals = {}
+
+    def __enter__(self):
+        for cls, name in ((Parser, "parsestr"), (BytesParser, "parsebytes")):
+            original = getattr(cls, name)
+            self._originals[(cls, name)] = original
+
+            def wrapper(parser, *args, _original=original, **kwargs):
+                self.count += 1
+                return _original(parser, *args, **kwargs)
+
+            setattr(cls, name, wrapper)
+        return self
+
+    def __exit__(self, *exc):
+        for (cls, name), original in self._originals.items():
+            setattr(cls, name, original)
+
+
+def build_corpus():
+    """
+    构造测试邮件集合：tests/目录下的.eml文件，加上覆盖常见结构的生成邮件
+
+    Returns:
+        (名称, 原始字节)列表
+    """
+    corpus = []
+    tests_dir = Path(__file__).resolve().parent.parent
+    for path in sorted(tests_dir.rglob("*.eml")):
+        corpus.append((path.name, path.read_bytes()))
+
+    sender = EmailAddress("发件人", "sender@example.com")
+    recipient = [EmailAddress("收件人", "bob@example.com")]
+    samples = [
+        ("plain", "纯文本邮件", "这是一封纯文本测试邮件。\n" * 20, "", []),
+        ("html", "HTML邮件", "", "<html><body><p>HTML正文</p></body></html>" * 20, []),
+        (
+            "attachment",
+            "带附件的邮件",
+            "请查收附件。",
+            "",
+            [Attachment("report.bin", "application/octet-stream", os.urandom(64 * 1024))],
+        ),
+    ]
+    for name, subject, text, html, attachments in samples:
+        email_obj = Email(
+            message_id=f"<{name}@bench.local>",
+            subject=subject,
+            from_addr=sender,
+            to_addrs=recipient,
+            text_content=text,
+            html_content=html,
+            attachments=attachments,
+            date=datetime.datetime.now(),
+        )
+        raw = EmailFormatHandler.format_email_for_storage(email_obj)
+        corpus.append((name, raw.replace("\n", "\r\n").encode("utf-8")))
+    return corpus
+
+
+def legacy_ingest(service, mail_from, rcpt_tos, raw):
+    """旧的接收流程：解析、重新序列化、HTML提取，再由save_content再次解析和格式化"""
+    email_obj = EmailFormatHandler.parse_email_content(raw.decode("utf-8", "replace"))
+    formatted = EmailFormatHandler.format_email_for_storage(email_obj)
+    plain_text = email_obj.text_content or ""
+    if not plain_text and email_obj.html_content:
+        plain_text = BeautifulSoup(email_obj.html_content, "html.parser").get_text()
+    service.save_email(
+        message_id=email_obj.message_id,
+        from_addr=email_obj.from_addr.address,
+        to_addrs=rcpt_tos,
+        subject=email_obj.subject,
+        content=plain_text,
+        full_content_for_storage=formatted,
+        date=email_obj.date or datetime.datetime.now(),
+    )
+
+
+def run_case(name, ingest, corpus, rounds):
+    """
+    执行一组接收并统计解析次数和CPU耗时
+
+    Returns:
+        (每封邮件解析次数, 每封邮件CPU毫秒)
+    """
+    test_dir = tempfile.mkdtemp()
+    service = EmailService(
+        os.path.join(test_dir, "bench.db"),
+        storage_dir=os.path.join(test_dir, "emails"),
+    )
+    try:
+        total = len(corpus) * rounds
+        with ParseCounter() as counter:
+            start = time.process_time()
+            for i in range(rounds):
+                for msg_name, raw in corpus:
+                    # 每轮替换Message-ID，避免重复写入被忽略
+                    data = raw.replace(b"@bench.local>", f".{i}@bench.local>".encode())
+                    ingest(service, "sender@example.com", ["bob@example.com"], data)
+            cpu = time.process_time() - start
+
+        parses = counter.count / total
+        cpu_ms = cpu * 1000 / total
+        print(f"[INFO] {name:<8} 每封解析 {parses:.1f} 次, CPU {cpu_ms:.3f} 毫秒/封")
+        return parses, cpu_ms
+    finally:
+        service.close()
+        shutil.rmtree(test_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="邮件接收性能测试")
+    parser.add_argument("--rounds", type=int, default=50, help="每封邮件重复次数")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    print("邮件接收性能测试")
+    print("=" * 50)
+    print(f"测试邮件: {', '.join(name for name, _ in corpus)}, 轮数: {args.rounds}")
+
+    before = run_case("legacy", legacy_ingest, corpus, args.rounds)
+    after = run_case(
+        "pipeline",
+        lambda service, *a: IngestPipeline(service).ingest(*a),
+        corpus,
+        args.rounds,
+    )
+
+    print(f"[INFO] 解析次数: {before[0]:.1f} -> {after[0]:.1f}")
+    print(f"[INFO] CPU加速比: {before[1] / after[1]:.2f}x")
+    if after[0] < before[0]:
+        print("\n[SUCCESS] 接收流水线减少了重复解析")
+    else:
+        print("\n[FAIL] 接收流水线未减少解析次数")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+垃圾邮件过滤性能测试 - 关键词数量从当前配置扩展到10000条时，
+对比逐个正则匹配与合并匹配引擎的单封邮件分析耗时
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from spam_filter.matcher import KeywordMatcher
+
+CONFIG_PATH = (
+    Path(__file__).resolve().parent.parent.parent / "config" / "spam_keywords.json"
+)
+
+
+class SpamFilterBenchmark:
+    """关键词匹配基准测试"""
+
+    def __init__(self, sizes, iterations=20, body_length=8000):
+        self.sizes = sizes
+        self.iterations = iterations
+        self.rng = random.Random(2024)
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            self.base_keywords = json.load(f)["body"]
+        self.body = self._make_body(body_length)
+
+    def _make_word(self):
+        """生成随机关键词"""
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        return "".join(self.rng.choice(letters) for _ in range(self.rng.randint(5, 12)))
+
+    def _make_body(self, length):
+        """生成测试邮件正文（包含少量配置中的关键词）"""
+        words = []
+        total = 0
+        while total < length:
+            word = self._make_word()
+            words.append(word)
+            total += len(word) + 1
+        words[len(words) // 2] = self.base_keywords[0]
+        return " ".join(words)
+
+    def _keywords(self, size):
+        """在配置关键词基础上补充随机关键词到指定数量"""
+        keywords = list(self.base_keywords)
+        while len(keywords) < size:
+            keywords.append(self._make_word())
+        return keywords
+
+    def _time(self, func):
+        """返回多次调用的平均耗时（毫秒）"""
+        start = time.perf_counter()
+        for _ in range(self.iterations):
+            result = func()
+        return (time.perf_counter() - start) * 1000 / self.iterations, result
+
+    def run_case(self, size):
+        """
+        对指定数量的关键词执行对比测试
+
+        Args:
+            size: 关键词数量
+
+        Returns:
+            (结果是否一致, 加速比)
+        """
+        keywords = self._keywords(size)
+        patterns = [re.compile(k, re.IGNORECASE) for k in keywords]
+        matcher = KeywordMatcher(keywords)
+
+        naive_ms, naive = self._time(
+            lambda: [i for i, p in enumerate(patterns) if p.search(self.body)]
+        )
+        matcher_ms, matched = self._time(lambda: matcher.match(self.body))
+
+        engine = "automaton" if matcher.automaton is not None else "regex"
+        speedup = naive_ms / matcher_ms if matcher_ms else float("inf")
+        print(
+            f"[INFO] 关键词 {len(keywords):>6} 条 ({engine:<9}): "
+            f"逐个匹配 {naive_ms:8.3f} 毫秒, 合并匹配 {matcher_ms:8.3f} 毫秒, "
+            f"加速比 {speedup:.2f}x, 命中 {len(matched)}"
+        )
+        return naive == matched, speedup
+
+    def run(self):
+        """运行所有规模的测试"""
+        print("垃圾邮件关键词匹配性能测试")
+        print("=" * 50)
+        print(f"正文长度: {len(self.body)} 字符, 每组迭代: {self.iterations}")
+
+        consistent = True
+        speedups = []
+        for size in self.sizes:
+            same, speedup = self.run_case(max(size, len(self.base_keywords)))
+            consistent = consistent and same
+            speedups.append(speedup)
+        return consistent, speedups
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="垃圾邮件关键词匹配性能测试")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[0, 100, 1000, 10000],
+        help="关键词数量（0表示只使用当前配置）",
+    )
+    parser.add_argument("--iterations", type=int, default=20, help="每组迭代次数")
+    args = parser.parse_args()
+
+    benchmark = SpamFilterBenchmark(args.sizes, args.iterations)
+    consistent, speedups = benchmark.run()
+    if not consistent:
+        print("\n[FAIL] 合并匹配结果与逐个匹配不一致")
+        sys.exit(1)
+    if speedups[-1] > 1.0:
+        print("\n[SUCCESS] 大规模关键词下合并匹配快于逐个匹配")
+    else:
+        print("\n[FAIL] 合并匹配未带来性能提升")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+asyncio POP3服务器测试 - 测试命令语义、大量空闲连接和STLS升级
+"""
+
+import sys
+import os
+import ssl
+import socket
+import poplib
+import unittest
+import tempfile
+import shutil
+import datetime
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.async_pop3_server import AsyncPOP3Server
+from server.new_db_handler import EmailService
+from server.pop3_auth import POP3Authenticator
+from server.user_auth import UserAuth
+
+
+class TestAsyncPOP3Server(unittest.TestCase):
+    """asyncio POP3服务器测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        db_path = os.path.join(self.test_dir, "pop3.db")
+        self.email_service = EmailService(
+            db_path, storage_dir=os.path.join(self.test_dir, "emails")
+        )
+        user_auth = UserAuth(db_path)
+        user_auth.create_user("bob", "bob@example.com", "secret123")
+
+        self.raw = (
+            b"From: alice@example.com\r\n"
+            b"Subject: async\r\n"
+            b"Message-ID: <async@example.com>\r\n"
+            b"\r\n"
+            b".dot\r\n" + b"line\r\n" * 2000
+        )
+        self.email_service.save_email(
+            message_id="<async@example.com>",
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject="async",
+            content="",
+            full_content_for_storage=self.raw,
+            date=datetime.datetime.now(),
+            store_as_is=True,
+        )
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            self.port = s.getsockname()[1]
+
+        self.server = AsyncPOP3Server(
+            host="localhost",
+            port=self.port,
+            use_ssl=False,
+            ssl_cert_file=os.path.join(self.test_dir, "certs", "server.crt"),
+            ssl_key_file=os.path.join(self.test_dir, "certs", "server.key"),
+            enable_stls=True,
+            executor_workers=4,
+        )
+        self.server.email_service = self.email_service
+        self.server.user_auth = user_auth
+        self.server.authenticator = POP3Authenticator(user_auth)
+        self.server.start()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.server.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_retr_and_top(self):
+        """测试与POP3CommandHandler一致的命令语义"""
+        client = poplib.POP3("localhost", self.port, timeout=10)
+        try:
+            client.user("bob")
+            client.pass_("secret123")
+            self.assertEqual(client.stat(), (1, len(self.raw)))
+
+            _, lines, _ = client.retr(1)
+            self.assertEqual(b"\r\n".join(lines) + b"\r\n", self.raw)
+
+            _, lines, _ = client.top(1, 1)
+            self.assertEqual(lines[-2:], [b"", b".dot"])
+        finally:
+            client.quit()
+
+    def test_idle_connections_do_not_use_threads(self):
+        """测试空闲连接不占用线程"""
+        threads_before = threading.active_count()
+        sockets = []
+        try:
+            for _ in range(100):
+                sock = socket.create_connection(("localhost", self.port), timeout=10)
+                sock.makefile("rb").readline()
+                sockets.append(sock)
+
+            self.assertEqual(self.server.current_connections, 100)
+            self.assertLessEqual(threading.active_count(), threads_before + 4)
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    def test_stls(self):
+        """测试STLS升级后继续会话"""
+        if self.server.stls_context is None:
+            self.skipTest("无法生成测试证书")
+
+        client = poplib.POP3("localhost", self.port, timeout=10)
+        try:
+            self.assertIn("STLS", client.capa())
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            client.stls(context)
+
+            self.assertNotIn("STLS", client.capa())
+            client.user("bob")
+            client.pass_("secret123")
+            self.assertEqual(client.stat()[0], 1)
+        finally:
+            client.quit()
+
+    def test_stls_session_resumption(self):
+        """测试重连时恢复TLS会话，并统计握手次数"""
+        if self.server.stls_context is None:
+            self.skipTest("无法生成测试证书")
+
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        session = None
+        reused = []
+        for _ in range(3):
+            sock = socket.create_connection(("localhost", self.port), timeout=10)
+            reader = sock.makefile("rb")
+            reader.readline()
+            sock.sendall(b"STLS\r\n")
+            self.assertTrue(reader.readline().startswith(b"+OK"))
+
+            tls_sock = context.wrap_socket(
+                sock, server_hostname="localhost", session=session
+            )
+            reused.append(tls_sock.session_reused)
+            # 读取响应后客户端才会处理TLS 1.3握手后发放的会话票据
+            tls_sock.sendall(b"NOOP\r\n")
+            tls_sock.makefile("rb").readline()
+            session = tls_sock.session
+            tls_sock.sendall(b"QUIT\r\n")
+            tls_sock.close()
+
+        self.assertEqual(reused, [False, True, True])
+        metrics = self.server.get_tls_metrics()
+        self.assertGreaterEqual(metrics["resumed"], 2)
+        self.assertGreater(metrics["resumption_ratio"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+数据库迁移测试 - 测试版本化迁移的执行顺序、幂等性和索引使用
+"""
+
+import sys
+import os
+import unittest
+import sqlite3
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.db_connection import DatabaseConnection
+from server.db_migrations import MIGRATIONS, Migration, MigrationRunner
+
+
+class TestDatabaseMigrations(unittest.TestCase):
+    """数据库迁移测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "test_migrations.db")
+        self.db = DatabaseConnection(self.db_path)
+        self.db.init_database()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_all_migrations_applied(self):
+        """测试初始化后所有迁移均已应用"""
+        runner = MigrationRunner(self.db)
+        self.assertEqual(runner.get_current_version(), MIGRATIONS[-1].version)
+        self.assertEqual(runner.get_pending_migrations(), [])
+
+    def test_migrate_is_idempotent(self):
+        """测试重复执行迁移不会重复应用"""
+        self.db.init_database()
+        self.assertEqual(MigrationRunner(self.db).migrate(), [])
+
+        rows = self.db.execute_query(
+            "SELECT version FROM schema_version", fetch_all=True
+        )
+        self.assertEqual(len(rows), len(MIGRATIONS))
+
+    def test_failed_migration_rolls_back(self):
+        """测试迁移失败时回滚且不记录版本"""
+
+        def broken(cursor):
+            cursor.execute("CREATE TABLE broken_table (id INTEGER)")
+            raise RuntimeError("boom")
+
+        runner = MigrationRunner(
+            self.db, MIGRATIONS + [Migration(999, "broken", broken)]
+        )
+        with self.assertRaises(RuntimeError):
+            runner.migrate()
+
+        self.assertEqual(runner.get_current_version(), MIGRATIONS[-1].version)
+        table = self.db.execute_query(
+            "SELECT name FROM sqlite_master WHERE name = 'broken_table'",
+            fetch_one=True,
+        )
+        self.assertIsNone(table)
+
+    def test_skipped_fulltext_step_rerun(self):
+        """测试未支持FTS5时跳过的全文索引表在之后启动时重新创建"""
+        db_path = os.path.join(self.test_dir, "no_fts.db")
+        db = DatabaseConnection(db_path)
+        with mock.patch(
+            "server.fulltext_index.create_fulltext_schema",
+            side_effect=sqlite3.OperationalError("no such module: fts5"),
+        ):
+            db.init_database()
+
+        runner = MigrationRunner(db)
+        self.assertEqual(runner.get_current_version(), MIGRATIONS[-1].version)
+        exists = "SELECT name FROM sqlite_master WHERE name = 'email_fts'"
+        self.assertIsNone(db.execute_query(exists, fetch_one=True))
+
+        self.assertEqual(runner.migrate(), [])
+        self.assertIsNotNone(db.execute_query(exists, fetch_one=True))
+
+    def test_listing_queries_use_indexes(self):
+        """测试列表查询使用索引而不是全表排序"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM emails "
+                "WHERE is_deleted = 0 AND is_recalled = 0 ORDER BY date DESC LIMIT 50"
+            ).fetchall()
+            details = " ".join(row[-1] for row in plan)
+            self.assertIn("idx_emails_listing", details)
+            self.assertNotIn("TEMP B-TREE", details)
+
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM users WHERE email = ?",
+                ("a@example.com",),
+            ).fetchall()
+            self.assertIn("idx_users_email", " ".join(row[-1] for row in plan))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+"""
+邮件仓储测试 - 测试收件人索引表的写入、查询与计数，以及每个收件人独立的邮件状态
+"""
+
+import sys
+import os
+import unittest
+import sqlite3
+import tempfile
+import shutil
+import json
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.db_connection import DatabaseConnection
+from server.db_connection_pool import DatabaseConnectionPool
+from server.db_models import EmailRecord
+from server.email_repository import EmailRepository
+
+
+class TestEmailRepository(unittest.TestCase):
+    """邮件仓储测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "test_repo.db")
+        self.db = DatabaseConnection(self.db_path)
+        self.db.init_database()
+        self.repo = EmailRepository(self.db)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _create(self, message_id, from_addr, to_addrs, **kwargs):
+        record = EmailRecord(
+            message_id=message_id,
+            from_addr=from_addr,
+            to_addrs=to_addrs,
+            subject=kwargs.pop("subject", "测试"),
+            date=kwargs.pop("date", datetime.datetime.now()),
+            size=kwargs.pop("size", 100),
+            **kwargs,
+        )
+        self.assertTrue(self.repo.create_email(record))
+
+    def test_list_emails_by_recipient(self):
+        """测试按收件人地址查询邮件"""
+        self._create("<1@test>", "alice@example.com", ["Bob <BOB@example.com>"])
+        self._create("<2@test>", "carol@example.com", [{"address": "bob@example.com"}])
+        self._create("<3@test>", "carol@example.com", ["dave@example.com"])
+
+        ids = {e.message_id for e in self.repo.list_emails(user_email="bob@example.com")}
+        self.assertEqual(ids, {"<1@test>", "<2@test>"})
+
+        # 发件人同样可以查到自己的邮件
+        ids = {e.message_id for e in self.repo.list_emails(user_email="alice@example.com")}
+        self.assertEqual(ids, {"<1@test>"})
+
+    def test_no_substring_false_positive(self):
+        """测试地址精确匹配，不会误匹配包含该地址的其他地址"""
+        self._create("<1@test>", "x@example.com", ["ab@example.com"])
+        self.assertEqual(self.repo.list_emails(user_email="b@example.com"), [])
+
+    def test_count_emails(self):
+        """测试邮件计数"""
+        self._create("<1@test>", "a@example.com", ["bob@example.com"])
+        self._create("<2@test>", "a@example.com", ["bob@example.com"], is_read=True)
+        self._create("<3@test>", "a@example.com", ["bob@example.com"], is_spam=True)
+
+        self.assertEqual(self.repo.count_emails(user_email="bob@example.com"), 2)
+        self.assertEqual(
+            self.repo.count_emails(user_email="bob@example.com", include_spam=True), 3
+        )
+        self.assertEqual(
+            self.repo.count_emails(
+                user_email="bob@example.com", include_spam=True, unread_only=True
+            ),
+            2,
+        )
+
+    def test_per_recipient_flags(self):
+        """测试已读/删除/垃圾邮件状态按收件人独立保存"""
+        recipients = ["bob@example.com", "carol@example.com", "dave@example.com"]
+        self._create("<1@test>", "alice@example.com", recipients)
+        self._create("<2@test>", "alice@example.com", recipients)
+
+        self.assertTrue(
+            self.repo.update_email_status("<1@test>", "BOB@example.com", is_read=True)
+        )
+        self.assertTrue(
+            self.repo.mark_emails_deleted(["<2@test>"], user_email="bob@example.com")
+        )
+        self.repo.update_email_status("<1@test>", "carol@example.com", is_spam=True)
+
+        bob = self.repo.list_emails(user_email="bob@example.com")
+        self.assertEqual([(e.message_id, e.is_read) for e in bob], [("<1@test>", True)])
+        self.assertEqual(
+            [row[0] for row in self.repo.list_maildrop("bob@example.com")], ["<1@test>"]
+        )
+        self.assertEqual(
+            self.repo.count_emails(user_email="bob@example.com", include_deleted=True),
+            2,
+        )
+
+        carol = self.repo.list_emails(user_email="carol@example.com")
+        self.assertEqual([e.message_id for e in carol], ["<2@test>"])
+        self.assertFalse(carol[0].is_read)
+        self.assertEqual(
+            self.repo.count_emails(user_email="dave@example.com", unread_only=True), 2
+        )
+        self.assertEqual(
+            self.repo.get_mailbox_flags("<1@test>", "bob@example.com"),
+            {"is_read": True, "is_deleted": False, "is_spam": False},
+        )
+        self.assertIsNone(self.repo.get_mailbox_flags("<1@test>", "eve@example.com"))
+
+        # 不指定用户时更新所有收件人，并保留emails表上的全局状态
+        self.assertTrue(self.repo.update_email_status("<1@test>", is_read=True))
+        self.assertEqual(
+            self.repo.count_emails(user_email="dave@example.com", unread_only=True), 1
+        )
+        self.assertTrue(self.repo.get_email_by_id("<1@test>").is_read)
+
+    def test_sender_and_recipient_listed_once(self):
+        """测试发给自己的邮件只出现一次，状态同时作用于两种身份"""
+        self._create("<self@test>", "alice@example.com", ["alice@example.com"])
+
+        emails = self.repo.list_emails(user_email="alice@example.com")
+        self.assertEqual([e.message_id for e in emails], ["<self@test>"])
+        self.assertEqual(self.repo.count_emails(user_email="alice@example.com"), 1)
+
+        self.repo.update_email_status(
+            "<self@test>", "alice@example.com", is_deleted=True
+        )
+        self.assertEqual(self.repo.list_emails(user_email="alice@example.com"), [])
+        self.assertEqual(self.repo.list_maildrop("alice@example.com"), [])
+
+    def test_delete_removes_recipients(self):
+        """测试删除邮件时同时删除收件人索引"""
+        self._create("<1@test>", "a@example.com", ["bob@example.com"])
+        self.assertTrue(self.repo.delete_email("<1@test>"))
+
+        rows = self.db.execute_query(
+            "SELECT * FROM email_recipients WHERE message_id = ?",
+            ("<1@test>",),
+            fetch_all=True,
+        )
+        self.assertEqual(rows, [])
+
+    def test_backfill_existing_emails(self):
+        """测试旧数据库升级时回填收件人索引"""
+        legacy_path = os.path.join(self.test_dir, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute(
+            "CREATE TABLE emails (message_id TEXT PRIMARY KEY, from_addr TEXT, "
+            "to_addrs TEXT, subject TEXT, date TEXT, size INTEGER, is_read INTEGER, "
+            "is_deleted INTEGER, is_spam INTEGER, spam_score REAL, content_path TEXT, "
+            "is_recalled INTEGER, recalled_at TEXT, recalled_by TEXT)"
+        )
+        conn.execute(
+            "INSERT INTO emails (message_id, from_addr, to_addrs, subject, date, "
+            "size, spam_score) VALUES (?, ?, ?, ?, ?, 0, 0.0)",
+            (
+                "<old@test>",
+                "a@example.com",
+                json.dumps(["Bob <bob@example.com>"]),
+                "旧邮件",
+                datetime.datetime.now().isoformat(),
+            ),
+        )
+        conn.commit()
+        conn.close()
+
+        legacy_db = DatabaseConnection(legacy_path)
+        legacy_db.init_database()
+        repo = EmailRepository(legacy_db)
+
+        ids = [e.message_id for e in repo.list_emails(user_email="bob@example.com")]
+        self.assertEqual(ids, ["<old@test>"])
+
+    def test_backfill_mailbox_flags(self):
+        """测试升级时从emails表回填每个收件人的状态标志"""
+        self._create("<read@test>", "a@example.com", ["bob@example.com"], is_read=True)
+        self.db.execute_query(
+            "UPDATE email_recipients SET is_read = 0 WHERE message_id = ?",
+            ("<read@test>",),
+        )
+        self.db.execute_query("DELETE FROM schema_version WHERE version >= 5")
+        self.db.init_database()
+
+        flags = self.repo.get_mailbox_flags("<read@test>", "bob@example.com")
+        self.assertTrue(flags["is_read"])
+
+
+class TestEmailRepositoryPooled(TestEmailRepository):
+    """使用连接池时的邮件仓储测试"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "test_repo.db")
+        self.pool = DatabaseConnectionPool(self.db_path, pool_size=2)
+        self.db = DatabaseConnection(self.db_path, pool=self.pool)
+        self.db.init_database()
+        self.repo = EmailRepository(self.db)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.pool.close_all()
+        super().tearDown()
+
+    def test_failed_transaction_rolls_back(self):
+        """测试池化连接上的事务失败时整体回滚"""
+        with self.assertRaises(Exception):
+            self.db.execute_transaction(
+                [
+                    (
+                        "INSERT INTO email_recipients (message_id, address, role) "
+                        "VALUES (?, ?, ?)",
+                        ("<x@test>", "a@example.com", "to"),
+                    ),
+                    ("INSERT INTO no_such_table VALUES (1)", ()),
+                ]
+            )
+
+        rows = self.db.execute_query(
+            "SELECT * FROM email_recipients", fetch_all=True
+        )
+        self.assertEqual(rows, [])
+        self.assertEqual(self.pool.get_pool_status()["available_connections"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+全文索引测试 - 测试入站邮件写入FTS5索引、相关度排序、片段、分页和索引重建
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.fulltext_index import make_snippet, parse_query
+from server.ingest_pipeline import IngestPipeline
+from server.new_db_handler import EmailService
+
+
+def build_raw(message_id, subject, body, html=None, attachment=None):
+    """构造测试邮件"""
+    headers = (
+        f"From: Alice Zhang <alice@example.com>\r\n"
+        f"To: Bob <bob@example.com>\r\n"
+        f"Subject: {subject}\r\n"
+        f"Date: Mon, 01 Jan 2024 10:00:00 +0800\r\n"
+        f"Message-ID: {message_id}\r\n"
+        f"MIME-Version: 1.0\r\n"
+    )
+    if not html and not attachment:
+        return (
+            headers + "Content-Type: text/plain; charset=utf-8\r\n"
+            "Content-Transfer-Encoding: 8bit\r\n\r\n" + body + "\r\n"
+        ).encode("utf-8")
+
+    parts = [
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "Content-Transfer-Encoding: 8bit\r\n\r\n" + body
+    ]
+    if html:
+        parts.append(
+            "Content-Type: text/html; charset=utf-8\r\n"
+            "Content-Transfer-Encoding: 8bit\r\n\r\n" + html
+        )
+    if attachment:
+        parts.append(
+            "Content-Type: application/pdf\r\n"
+            f'Content-Disposition: attachment; filename="{attachment}"\r\n'
+            "Content-Transfer-Encoding: base64\r\n\r\nJVBERi0xLjQK"
+        )
+    boundary = "BOUNDARY"
+    body_text = "".join(f"--{boundary}\r\n{part}\r\n" for part in parts)
+    return (
+        headers
+        + f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'
+        + body_text
+        + f"--{boundary}--\r\n"
+    ).encode("utf-8")
+
+
+class TestFullTextSearch(unittest.TestCase):
+    """全文索引测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.service = EmailService(
+            os.path.join(self.test_dir, "fts.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+        if not self.service.fulltext_index.available:
+            self.skipTest("SQLite不支持FTS5 trigram")
+        self.pipeline = IngestPipeline(self.service)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.service.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def ingest(self, *args, **kwargs):
+        """通过接收流水线保存一封邮件"""
+        self.pipeline.ingest(
+            "alice@example.com", ["bob@example.com"], build_raw(*args, **kwargs)
+        )
+
+    def test_body_html_and_attachment_are_indexed(self):
+        """测试正文、HTML文本、附件名和显示名都可以检索"""
+        self.ingest("<fts1@example.com>", "周报", "本周完成了数据库迁移工作")
+        self.ingest(
+            "<fts2@example.com>",
+            "通知",
+            "见附件",
+            html="<p>年度<b>预算审批</b>流程</p>",
+            attachment="budget-2024.pdf",
+        )
+
+        hits = self.service.search_fulltext("数据库迁移", user_email="bob@example.com")
+        self.assertEqual([h["message_id"] for h in hits], ["<fts1@example.com>"])
+        self.assertIn("[数据库迁移]", hits[0]["snippet"])
+        self.assertEqual(hits[0]["type"], "received")
+        self.assertEqual(hits[0]["subject"], "周报")
+
+        self.assertEqual(len(self.service.search_fulltext("预算审批")), 1)
+        self.assertEqual(len(self.service.search_fulltext("budget-2024")), 1)
+        self.assertEqual(len(self.service.search_fulltext("Alice Zhang")), 2)
+        self.assertEqual(self.service.search_fulltext("不存在的内容"), [])
+
+    def test_user_filter_ranking_and_paging(self):
+        """测试用户过滤、主题命中优先和分页"""
+        self.ingest("<rank1@example.com>", "普通邮件", "正文提到了项目计划")
+        self.ingest("<rank2@example.com>", "项目计划", "详细内容见下文")
+
+        hits = self.service.search_fulltext("项目计划", user_email="bob@example.com")
+        self.assertEqual(
+            [h["message_id"] for h in hits],
+            ["<rank2@example.com>", "<rank1@example.com>"],
+        )
+        self.assertEqual(
+            self.service.search_fulltext("项目计划", user_email="carol@example.com"), []
+        )
+
+        page = self.service.search_fulltext("项目计划", limit=1, offset=1)
+        self.assertEqual([h["message_id"] for h in page], ["<rank1@example.com>"])
+
+        # 已删除的邮件不再出现在结果中
+        self.service.mark_email_as_deleted("<rank2@example.com>")
+        hits = self.service.search_fulltext("项目计划")
+        self.assertEqual([h["message_id"] for h in hits], ["<rank1@example.com>"])
+
+    def test_short_terms_and_query_syntax(self):
+        """测试少于3个字符的词和FTS5特殊字符"""
+        self.ingest("<short@example.com>", "会议", 'AND "quoted" 会议纪要 NEAR(x)')
+
+        hits = self.service.search_fulltext("会议")
+        self.assertEqual(len(hits), 1)
+        self.assertIn("[会议]", hits[0]["snippet"])
+        self.assertEqual(len(self.service.search_fulltext('"quoted" NEAR(x)')), 1)
+        self.assertEqual(len(self.service.search_fulltext("纪要 quoted")), 1)
+        self.assertEqual(parse_query('a "bc" def'), ('"""bc""" "def"', ["a"]))
+        self.assertEqual(make_snippet("hello world", "wor", 3), "...lo [wor]ld")
+
+    def test_rebuild_index(self):
+        """测试从已存储的邮件重建索引"""
+        self.ingest("<rebuild@example.com>", "重建", "索引重建测试内容")
+        self.service.save_email(
+            message_id="<plain@example.com>",
+            from_addr="carol@example.com",
+            to_addrs=["bob@example.com"],
+            subject="纯文本保存",
+            content="通过保存接口写入的正文",
+            full_content_for_storage=build_raw(
+                "<plain@example.com>", "纯文本保存", "通过保存接口写入的正文"
+            ),
+            date=datetime.datetime(2024, 1, 2),
+        )
+        self.assertEqual(len(self.service.search_fulltext("保存接口写入")), 1)
+
+        self.service.fulltext_index.clear()
+        self.assertEqual(self.service.search_fulltext("索引重建测试"), [])
+
+        self.assertEqual(self.service.rebuild_fulltext_index(batch_size=1), 2)
+        self.assertEqual(len(self.service.search_fulltext("索引重建测试")), 1)
+        self.assertEqual(len(self.service.search_fulltext("保存接口写入")), 1)
+
+        self.service.delete_email("<rebuild@example.com>", permanent=True)
+        self.assertEqual(self.service.search_fulltext("索引重建测试"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+头部解码缓存测试 - 测试RFC 2047解码、地址解析和地址验证的缓存结果与未缓存一致
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from email.header import Header
+
+from common.email_header_processor import EmailHeaderProcessor
+from common.email_validator import EmailValidator
+
+HEADER_VALUES = [
+    "=?utf-8?B?5rWL6K+V?=",
+    "=?utf-8?Q?=E6=B5=8B=E8=AF=95?= =?utf-8?B?6YKu5Lu2?=",
+    "Re: =?gb2312?B?xOO6ww==?=  plain   text",
+    "=?unknown-charset?B?5rWL6K+V?=",
+    "plain subject",
+    "=?utf-8?B?5byg5LiJ?= <zhang@example.com>",
+]
+
+
+class TestHeaderCache(unittest.TestCase):
+    """头部解码缓存测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        EmailHeaderProcessor.clear_caches()
+
+    def test_decode_matches_uncached(self):
+        """测试缓存解码与未缓存解码结果一致，重复值命中缓存"""
+        for value in HEADER_VALUES * 3:
+            self.assertEqual(
+                EmailHeaderProcessor.decode_header_value(value),
+                EmailHeaderProcessor._decode_header_uncached(value),
+            )
+        self.assertEqual(
+            EmailHeaderProcessor.decode_header_value(HEADER_VALUES[1]), "测试邮件"
+        )
+        self.assertEqual(
+            EmailHeaderProcessor.decode_header_value(HEADER_VALUES[2]),
+            "Re: 你好 plain text",
+        )
+        info = EmailHeaderProcessor.cache_info()["decode"]
+        self.assertGreaterEqual(info["hits"], 2 * len(HEADER_VALUES))
+
+    def test_non_string_values_are_not_cached(self):
+        """测试Header对象等不可哈希的值直接解码"""
+        header = Header("测试", "utf-8")
+        self.assertEqual(EmailHeaderProcessor.decode_header_value(header), "测试")
+
+    def test_parse_address_returns_new_objects(self):
+        """测试地址解析结果缓存，但每次返回新的EmailAddress对象"""
+        first = EmailHeaderProcessor.parse_address(HEADER_VALUES[-1])
+        second = EmailHeaderProcessor.parse_address(HEADER_VALUES[-1])
+        self.assertEqual((first.name, first.address), ("张三", "zhang@example.com"))
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(EmailHeaderProcessor.cache_info()["address"]["hits"], 1)
+
+        addresses = EmailHeaderProcessor.parse_address_list(
+            "a@example.com, =?utf-8?B?5byg5LiJ?= <zhang@example.com>, invalid"
+        )
+        self.assertEqual(
+            [addr.address for addr in addresses], ["a@example.com", "zhang@example.com"]
+        )
+
+    def test_email_validation(self):
+        """测试地址验证（带显示名称、无效地址）"""
+        self.assertTrue(EmailValidator._is_valid_email("Bob <bob@example.com>"))
+        self.assertTrue(EmailValidator._is_valid_email("Bob <bob@example.com>"))
+        self.assertFalse(EmailValidator._is_valid_email("bob@localhost"))
+        self.assertFalse(EmailValidator._is_valid_email(""))
+        self.assertFalse(EmailValidator._is_valid_email(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+头部快速解析测试 - 测试只解析头部块、延迟解码以及格式验证使用头部解析
+"""
+
+import sys
+import io
+import mmap
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.email_format_handler import EmailFormatHandler
+from common.email_header_processor import EmailHeaderProcessor
+
+HEADERS = (
+    "From: =?utf-8?B?5byg5LiJ?= <zhang@example.com>\r\n"
+    "To: bob@example.com, carol@example.com\r\n"
+    "Subject: =?utf-8?B?5rWL6K+V?=\r\n"
+    "Date: Mon, 01 Jan 2024 08:00:00 +0000\r\n"
+    "Message-ID: <fast@example.com>\r\n"
+    "X-Long: first\r\n"
+    " continued\r\n"
+)
+BODY = "Subject: not a header\r\n" + "x" * 100000 + "\r\n"
+MESSAGE = HEADERS + "\r\n" + BODY
+
+
+class TestHeaderFastPath(unittest.TestCase):
+    """头部快速解析测试类"""
+
+    def test_parse_headers_from_str_bytes_and_file(self):
+        """测试从字符串、字节、mmap和文件对象解析出相同的头部"""
+        raw = MESSAGE.encode("utf-8")
+        with tempfile.TemporaryFile() as f:
+            f.write(raw)
+            f.flush()
+            f.seek(0)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sources = [MESSAGE, raw, mapped, io.BytesIO(raw), io.StringIO(MESSAGE)]
+                for source in sources:
+                    summary = EmailFormatHandler.parse_headers_fast(source)
+                    self.assertEqual(summary.message_id, "fast@example.com")
+                    self.assertEqual(summary.subject, "测试")
+                    self.assertEqual(summary.from_addr.name, "张三")
+                    self.assertEqual(len(summary.to_addrs), 2)
+                    self.assertEqual(summary.date.year, 2024)
+                    self.assertEqual(summary.get("X-Long"), "first\r\n continued")
+
+    def test_body_is_not_read(self):
+        """测试文件对象只读取到头部结束的空行"""
+        fileobj = io.BytesIO(MESSAGE.encode("utf-8"))
+        EmailFormatHandler.parse_headers_fast(fileobj)
+        self.assertEqual(fileobj.tell(), len(HEADERS) + 2)
+
+    def test_decoding_is_lazy(self):
+        """测试只读取原始头部时不做RFC 2047解码"""
+        with mock.patch.object(
+            EmailHeaderProcessor, "decode_header_value", side_effect=AssertionError
+        ):
+            summary = EmailFormatHandler.parse_headers_fast(MESSAGE)
+            self.assertIn("From", summary)
+            self.assertTrue(summary.get("Date"))
+
+    def test_missing_headers_and_validation(self):
+        """测试缺少头部时的默认值，格式验证只看头部块"""
+        summary = EmailFormatHandler.parse_headers_fast("\r\nFrom: body@example.com\r\n")
+        self.assertEqual(summary.from_addr.address, "unknown@localhost")
+        self.assertIsNone(summary.date)
+
+        self.assertTrue(EmailFormatHandler.validate_email_format(MESSAGE))
+        self.assertFalse(
+            EmailFormatHandler.validate_email_format("Subject: x\r\n\r\nbody\r\n")
+        )
+        # 正文中形似头部的行不算作头部字段
+        self.assertFalse(
+            EmailFormatHandler.validate_email_format(
+                "Subject: x\r\n\r\nFrom: a@example.com\r\nDate: today\r\n"
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+接收流水线测试 - 测试入站邮件只解析一次并原样存储
+"""
+
+import sys
+import base64
+import os
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.email_format_handler import EmailFormatHandler
+from server.ingest_pipeline import IngestPipeline, scan_header_names
+from server.new_db_handler import EmailService
+
+
+class TestIngestPipeline(unittest.TestCase):
+    """接收流水线测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.service = EmailService(
+            os.path.join(self.test_dir, "ingest.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+        self.pipeline = IngestPipeline(self.service)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_scan_header_names(self):
+        """测试只扫描头部区域"""
+        raw = b"From: a@example.com\r\nSubject: x\r\n\r\nTo: not-a-header\r\n"
+        self.assertEqual(scan_header_names(raw), {"from", "subject"})
+
+    def test_message_parsed_once_and_stored_verbatim(self):
+        """测试完整邮件只解析一次，存储内容与DATA字节一致"""
+        raw = (
+            b"From: Alice <alice@example.com>\r\n"
+            b"To: bob@example.com\r\n"
+            b"Subject: =?utf-8?b?5rWL6K+V?=\r\n"
+            b"Date: Mon, 01 Jan 2024 10:00:00 +0800\r\n"
+            b"Message-ID: <once@example.com>\r\n"
+            b"\r\n"
+            b"hello pipeline\r\n"
+        )
+
+        with mock.patch.object(
+            EmailFormatHandler,
+            "parse_mime_message",
+            wraps=EmailFormatHandler.parse_mime_message,
+        ) as parse:
+            message = self.pipeline.ingest("alice@example.com", ["bob@example.com"], raw)
+            self.assertEqual(parse.call_count, 1)
+
+        self.assertEqual(message.raw, raw)
+        self.assertEqual(message.added_headers, [])
+
+        stored = self.service.get_email("<once@example.com>")
+        self.assertEqual(stored["size"], len(raw))
+        self.assertEqual(stored["subject"], "测试")
+        with open(stored["content_path"], "rb") as f:
+            self.assertEqual(f.read(), raw)
+
+        full = self.service.get_email("<once@example.com>", include_content=True)
+        self.assertIn("hello pipeline", full["content"])
+
+    def test_missing_headers_are_added(self):
+        """测试缺少必需头部时在原始内容前补充"""
+        raw = b"Subject: bare\n\n<p>only <b>html</b></p>\n"
+        message = self.pipeline.prepare("sender@example.com", ["bob@example.com"], raw)
+
+        self.assertTrue(message.raw.endswith(raw))
+        headers = scan_header_names(message.raw)
+        self.assertTrue({"from", "date", "message-id", "subject"} <= headers)
+        self.assertEqual(message.email.from_addr.address, "sender@example.com")
+        self.assertTrue(message.email.message_id)
+
+    def test_unparsable_message_id_replaced_in_stored_content(self):
+        """测试Message-ID头部为空时，生成的ID同时写入存储的内容"""
+        raw = (
+            b"From: a@example.com\r\n"
+            b"Date: Mon, 01 Jan 2024 10:00:00 +0800\r\n"
+            b"Message-ID: \r\n"
+            b"Subject: empty id\r\n"
+            b"\r\n"
+            b"body\r\n"
+        )
+        path = os.path.join(self.test_dir, "empty-id.eml")
+        with open(path, "wb") as f:
+            f.write(raw)
+
+        with open(path, "rb") as f:
+            for data in (raw, f):
+                message = self.pipeline.ingest("a@example.com", ["bob@example.com"], data)
+                message_id = message.email.message_id
+                self.assertTrue(message_id)
+
+                stored = self.service.get_email(f"<{message_id}>")
+                self.assertIsNotNone(stored)
+                with open(stored["content_path"], "rb") as stored_file:
+                    headers = EmailFormatHandler.parse_headers_fast(stored_file)
+                self.assertEqual(headers.message_id, message_id)
+
+    def test_spooled_message_streamed(self):
+        """测试已转存的大邮件以文件对象增量解析、按块存储，附件内容不保留在内存中"""
+        attachment = b"A" * 300000
+        raw = (
+            b"To: bob@example.com\r\n"
+            b"Subject: spooled\r\n"
+            b"MIME-Version: 1.0\r\n"
+            b'Content-Type: multipart/mixed; boundary="XX"\r\n'
+            b"\r\n"
+            b"--XX\r\n"
+            b"Content-Type: text/plain; charset=utf-8\r\n"
+            b"\r\n"
+            b"large body\r\n"
+            b"--XX\r\n"
+            b"Content-Type: application/octet-stream\r\n"
+            b'Content-Disposition: attachment; filename="big.bin"\r\n'
+            b"Content-Transfer-Encoding: base64\r\n"
+            b"\r\n" + base64.encodebytes(attachment).replace(b"\n", b"\r\n") + b"--XX--\r\n"
+        )
+        path = os.path.join(self.test_dir, "spool.eml")
+        with open(path, "wb") as f:
+            f.write(raw)
+
+        with open(path, "rb") as f:
+            message = self.pipeline.ingest("alice@example.com", ["bob@example.com"], f)
+
+        self.assertIsNone(message.raw)
+        self.assertIn("large body", message.email.text_content)
+        self.assertEqual(len(message.email.attachments), 1)
+        self.assertEqual(message.email.attachments[0].size, len(attachment))
+        self.assertFalse(message.email.attachments[0].content)
+
+        stored = self.service.get_email(f"<{message.email.message_id}>")
+        with open(stored["content_path"], "rb") as f:
+            content = f.read()
+        self.assertTrue(content.endswith(raw))
+        self.assertEqual(stored["size"], len(content))
+        self.assertTrue({"from", "date", "message-id"} <= scan_header_names(content))
+
+
+if __name__ == "__main__":
+    unittest.main()
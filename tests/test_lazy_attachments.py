@@ -0,0 +1,98 @@
+"""
+按需解码附件测试 - 测试解析时不解码附件、访问时解码以及分块写入文件
+"""
+
+import sys
+import io
+import os
+import base64
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from client.mime_handler import MIMEHandler
+from common.email_content_processor import LazyAttachment
+from common.email_format_handler import EmailFormatHandler
+
+
+def build_message(data: bytes, encoding: str = "base64") -> str:
+    """构建带一个附件的邮件"""
+    if encoding == "base64":
+        body = base64.encodebytes(data).decode("ascii")
+    else:
+        body = data.decode("ascii") + "\r\n"
+    return (
+        "From: alice@example.com\r\n"
+        "To: bob@example.com\r\n"
+        "Subject: lazy\r\n"
+        "MIME-Version: 1.0\r\n"
+        'Content-Type: multipart/mixed; boundary="b"\r\n'
+        "\r\n"
+        "--b\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "\r\n"
+        "see attachment\r\n"
+        "--b\r\n"
+        "Content-Type: application/octet-stream\r\n"
+        'Content-Disposition: attachment; filename="data.bin"\r\n'
+        f"Content-Transfer-Encoding: {encoding}\r\n"
+        "\r\n"
+        f"{body}"
+        "--b--\r\n"
+    )
+
+
+class TestLazyAttachments(unittest.TestCase):
+    """按需解码附件测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.data = os.urandom(300 * 1024 + 7)
+        self.email = EmailFormatHandler.parse_mime_message(build_message(self.data))
+        self.attachment = self.email.attachments[0]
+
+    def test_parse_records_size_without_decoding(self):
+        """测试解析后附件只有描述信息，大小与解码结果一致"""
+        self.assertIsInstance(self.attachment, LazyAttachment)
+        self.assertFalse(self.attachment.is_loaded)
+        self.assertEqual(self.attachment.filename, "data.bin")
+        self.assertEqual(self.attachment.size, len(self.data))
+        self.assertEqual(self.email.text_content.strip(), "see attachment")
+        self.assertNotIn("loaded=True", repr(self.attachment))
+
+    def test_content_decoded_on_access(self):
+        """测试访问content时解码"""
+        self.assertEqual(self.attachment.content, self.data)
+        self.assertTrue(self.attachment.is_loaded)
+
+    def test_write_to_streams_decoded_content(self):
+        """测试分块写入的内容与解码结果一致，且不保留解码结果"""
+        output = io.BytesIO()
+        self.assertEqual(self.attachment.write_to(output), len(self.data))
+        self.assertEqual(output.getvalue(), self.data)
+        self.assertFalse(self.attachment.is_loaded)
+
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = MIMEHandler.decode_attachment(self.attachment, test_dir)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+        finally:
+            shutil.rmtree(test_dir, ignore_errors=True)
+
+    def test_other_encodings_decoded_eagerly(self):
+        """测试非base64编码的附件仍在解析时解码"""
+        email = EmailFormatHandler.parse_mime_message(
+            build_message(b"plain bytes", encoding="7bit")
+        )
+        attachment = email.attachments[0]
+        self.assertNotIsInstance(attachment, LazyAttachment)
+        self.assertEqual(attachment.content.strip(), b"plain bytes")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+日志后端测试 - 测试共享处理器、队列丢弃和按子系统限速
+"""
+
+import sys
+import queue
+import logging
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common import logging_backend
+from common.utils import setup_logging
+
+
+def _record(level=logging.INFO, msg="message"):
+    return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+
+class TestLoggingBackend(unittest.TestCase):
+    """日志后端测试类"""
+
+    def test_loggers_share_one_handler(self):
+        """测试所有日志记录器共享同一个处理器"""
+        first = setup_logging("test_logging_backend_a")
+        second = setup_logging("test_logging_backend_b")
+        self.assertEqual(len(first.handlers), 1)
+        self.assertIs(first.handlers[0], second.handlers[0])
+
+        # 重复调用不会重复添加处理器
+        setup_logging("test_logging_backend_a")
+        self.assertEqual(len(first.handlers), 1)
+
+    def test_full_queue_drops_without_blocking(self):
+        """测试队列满时丢弃记录并计数"""
+        handler = logging_backend.DroppingQueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.handle(_record())
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_rate_limit_filter(self):
+        """测试超过每秒上限的INFO记录被丢弃，WARNING不受限制"""
+        rate_filter = logging_backend.RateLimitFilter(2)
+        with mock.patch("common.logging_backend.time.monotonic", return_value=100.0):
+            passed = [rate_filter.filter(_record()) for _ in range(5)]
+            self.assertEqual(passed, [True, True, False, False, False])
+            self.assertTrue(rate_filter.filter(_record(logging.WARNING)))
+
+        # 下一秒的第一条记录带上丢弃数量
+        with mock.patch("common.logging_backend.time.monotonic", return_value=101.0):
+            record = _record()
+            self.assertTrue(rate_filter.filter(record))
+            self.assertIn("3", record.getMessage())
+
+    def test_parse_rate_limits(self):
+        """测试解析按子系统的限速配置"""
+        self.assertEqual(
+            logging_backend.parse_rate_limits("pop3=50, db_pool=20,bad=x,"),
+            {"pop3": 50, "db_pool": 20},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,377 @@
+"""
+邮件存储后端测试 - 测试分片路径、原子写入、无目录扫描的定位、压缩和附件去重以及旧布局迁移
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import base64
+import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server import message_codec
+from server.email_content_manager import EmailContentManager
+from server.message_store import (
+    FlatMessageStore,
+    MessageStore,
+    ShardedMessageStore,
+)
+from server.new_db_handler import EmailService
+from tools.migrate_message_store import migrate_messages
+
+RAW = (
+    b"From: alice@example.com\r\n"
+    b"To: bob@example.com\r\n"
+    b"Subject: store\r\n"
+    b"Message-ID: <store@example.com>\r\n"
+    b"\r\n"
+    b"body\r\n"
+)
+
+
+class TestMessageStore(unittest.TestCase):
+    """邮件存储后端测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.store = ShardedMessageStore(self.test_dir, depth=2)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_sharded_path(self):
+        """测试路径由message_id哈希决定，文件名保持可读"""
+        path = self.store.path_for("<a@example.com>")
+        relative = os.path.relpath(path, self.test_dir).split(os.sep)
+        self.assertEqual(len(relative), 3)
+        self.assertTrue(all(len(part) == 2 for part in relative[:2]))
+        self.assertEqual(relative[2], "a_at_example.com.eml")
+        self.assertEqual(path, self.store.path_for("<a@example.com>"))
+        # 带不带尖括号都定位到同一个文件
+        self.assertEqual(path, self.store.path_for(" a@example.com "))
+
+    def test_base_class_is_abstract(self):
+        """测试存储后端基类不能直接实例化"""
+        with self.assertRaises(TypeError):
+            MessageStore(self.test_dir)
+
+    def test_atomic_write(self):
+        """测试写入替换整个文件且不留下临时文件"""
+        path = self.store.write("<a@example.com>", b"first")
+        self.store.write("<a@example.com>", "second")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"second")
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["a_at_example.com.eml"])
+
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.store.write("<a@example.com>", b"third")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"second")
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["a_at_example.com.eml"])
+
+    def test_email_service_storage_dir(self):
+        """测试邮件服务把内容文件写入指定的存储根目录"""
+        storage_dir = os.path.join(self.test_dir, "emails")
+        service = EmailService(
+            os.path.join(self.test_dir, "dir.db"), storage_dir=storage_dir
+        )
+        try:
+            self.assertEqual(service.content_manager.store.root, storage_dir)
+            self.assertTrue(
+                service.save_email(
+                    message_id="<dir@example.com>",
+                    from_addr="alice@example.com",
+                    to_addrs=["bob@example.com"],
+                    subject="store",
+                    full_content_for_storage=RAW,
+                    store_as_is=True,
+                )
+            )
+            path = service.content_manager.resolve_path("<dir@example.com>")
+            self.assertTrue(path.startswith(storage_dir))
+        finally:
+            service.close()
+
+    def test_resolve_without_listing(self):
+        """测试定位新旧布局中的文件都不需要列目录"""
+        manager = EmailContentManager(self.store)
+        legacy_path = FlatMessageStore(self.test_dir).write("<old@example.com>", RAW)
+        new_path = manager.save_content("<new@example.com>", RAW, normalize=False)
+
+        with mock.patch("os.listdir", side_effect=AssertionError("不应列目录")):
+            self.assertEqual(manager.resolve_path("<old@example.com>"), legacy_path)
+            self.assertEqual(manager.resolve_path("<new@example.com>"), new_path)
+            self.assertIsNone(manager.resolve_path("<none@example.com>"))
+            self.assertIn("body", manager.get_content("<old@example.com>"))
+
+
+def build_with_attachment(message_id, attachment):
+    """构造带附件的测试邮件（附件以base64编码，每行76个字符）"""
+    encoded = base64.encodebytes(attachment).replace(b"\n", b"\r\n")
+    return (
+        b"From: alice@example.com\r\n"
+        b"To: list@example.com\r\n"
+        b"Message-ID: " + message_id.encode() + b"\r\n"
+        b'Content-Type: multipart/mixed; boundary="XX"\r\n'
+        b"\r\n"
+        b"preamble\r\n"
+        b"--XX\r\n"
+        b"Content-Type: text/plain\r\n"
+        b"\r\n"
+        b"see attachment\r\n"
+        b"--XX\r\n"
+        b"Content-Type: application/octet-stream\r\n"
+        b"Content-Transfer-Encoding: base64\r\n"
+        b"\r\n" + encoded + b"--XX--\r\n"
+    )
+
+
+class TestPackedMessageStore(unittest.TestCase):
+    """压缩和附件去重测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.attachment = os.urandom(20000)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def blob_files(self, store):
+        """列出数据块文件"""
+        blob_root = os.path.join(store.root, store.BLOB_DIR)
+        return [f for _, _, files in os.walk(blob_root) for f in files]
+
+    def test_compression_round_trip(self):
+        """测试压缩写入后读取内容逐字节一致，未打包的旧文件照常读取"""
+        store = ShardedMessageStore(self.test_dir, compression="zlib")
+        raw = RAW + b"repeated line\r\n" * 1000
+        path = store.write("<zip@example.com>", raw)
+
+        self.assertTrue(store.is_packed_file(path))
+        self.assertLess(os.path.getsize(path), len(raw) // 10)
+        self.assertEqual(store.read_file(path), raw)
+        with store.open_file(path) as f:
+            self.assertEqual(f.read(), raw)
+
+        legacy_path = FlatMessageStore(self.test_dir).write("<old@example.com>", RAW)
+        self.assertEqual(store.read_file(legacy_path), RAW)
+        with store.open_file(legacy_path) as f:
+            self.assertEqual(f.read(), RAW)
+
+    def test_attachment_stored_once(self):
+        """测试相同附件只保存一份，重组后的邮件与原始内容逐字节一致"""
+        store = ShardedMessageStore(
+            self.test_dir, compression="zlib", dedup_attachments=True
+        )
+        messages = {
+            f"<list{i}@example.com>": build_with_attachment(
+                f"<list{i}@example.com>", self.attachment
+            )
+            for i in range(5)
+        }
+        paths = {mid: store.write(mid, raw) for mid, raw in messages.items()}
+
+        self.assertEqual(len(self.blob_files(store)), 1)
+        for message_id, raw in messages.items():
+            self.assertEqual(store.read_file(paths[message_id]), raw)
+            # 邮件文件中只保留头部、边界等少量内联内容
+            self.assertLess(os.path.getsize(paths[message_id]), 1024)
+
+        # 附件不同的邮件使用新的数据块
+        other = build_with_attachment("<other@example.com>", os.urandom(20000))
+        other_path = store.write("<other@example.com>", other)
+        self.assertEqual(store.read_file(other_path), other)
+        self.assertEqual(len(self.blob_files(store)), 2)
+
+    def test_blob_removed_with_last_reference(self):
+        """测试数据块在最后一封引用它的邮件删除或覆盖后才被删除"""
+        store = ShardedMessageStore(
+            self.test_dir, compression="zlib", dedup_attachments=True
+        )
+        store.write(
+            "<a@example.com>", build_with_attachment("<a@example.com>", self.attachment)
+        )
+        path_b = store.write(
+            "<b@example.com>", build_with_attachment("<b@example.com>", self.attachment)
+        )
+        self.assertEqual(len(self.blob_files(store)), 1)
+
+        # 覆盖为不同附件：旧数据块仍被a引用
+        other = build_with_attachment("<b@example.com>", os.urandom(20000))
+        store.write("<b@example.com>", other)
+        self.assertEqual(len(self.blob_files(store)), 2)
+
+        self.assertTrue(store.delete("<a@example.com>"))
+        self.assertEqual(len(self.blob_files(store)), 1)
+        self.assertEqual(store.read_file(path_b), other)
+
+        # 重复写入同一封邮件不会释放仍在使用的数据块
+        store.write("<b@example.com>", other)
+        self.assertEqual(store.read_file(path_b), other)
+
+        self.assertTrue(store.delete("<b@example.com>"))
+        self.assertEqual(self.blob_files(store), [])
+
+    def test_sweep_blobs(self):
+        """测试计数表建立之前的数据块不会被自动删除，由标记-清除回收"""
+        store = ShardedMessageStore(
+            self.test_dir, compression="zlib", dedup_attachments=True
+        )
+        for name in ("a", "b"):
+            mid = f"<{name}@example.com>"
+            store.write(mid, build_with_attachment(mid, self.attachment))
+        store.write(
+            "<c@example.com>",
+            build_with_attachment("<c@example.com>", os.urandom(20000)),
+        )
+        # 模拟引用计数出现之前写入的存储
+        os.unlink(os.path.join(self.test_dir, store.BLOB_REFS_DB))
+
+        self.assertTrue(store.delete("<a@example.com>"))
+        self.assertTrue(store.delete("<c@example.com>"))
+        self.assertEqual(len(self.blob_files(store)), 2)
+
+        stats = store.sweep_blobs(dry_run=True)
+        self.assertEqual(stats, {"messages": 1, "referenced": 1, "removed": 1})
+        self.assertEqual(len(self.blob_files(store)), 2)
+
+        store.sweep_blobs()
+        self.assertEqual(len(self.blob_files(store)), 1)
+        # 回收后计数准确，删除最后一封邮件时数据块随之删除
+        self.assertTrue(store.delete("<b@example.com>"))
+        self.assertEqual(self.blob_files(store), [])
+
+    def test_split_keeps_exact_bytes(self):
+        """测试不完整或嵌套的MIME结构拆分后仍能逐字节还原"""
+        attachment = build_with_attachment("<x@example.com>", self.attachment)
+        cases = [
+            attachment,
+            attachment[: len(attachment) // 2],
+            attachment.replace(b"\r\n", b"\n"),
+            RAW,
+            b"",
+        ]
+        blobs = {}
+        for raw in cases:
+            segments = message_codec.split_message(raw, 1024)
+            for segment in segments:
+                if not isinstance(segment, bytes):
+                    blobs[segment[0]] = segment[1]
+            stream = message_codec.encode_segments(segments)
+            self.assertEqual(message_codec.decode_segments(stream, blobs.get), raw)
+
+        segments = message_codec.split_message(attachment, 1024)
+        self.assertEqual(sum(not isinstance(s, bytes) for s in segments), 1)
+
+    def test_email_service_reads_packed_content(self):
+        """测试邮件服务通过存储后端读取压缩和去重后的邮件"""
+        service = EmailService(os.path.join(self.test_dir, "packed.db"))
+        try:
+            service.content_manager = EmailContentManager(
+                ShardedMessageStore(
+                    os.path.join(self.test_dir, "emails"),
+                    compression="zlib",
+                    dedup_attachments=True,
+                )
+            )
+            raw = build_with_attachment("<svc@example.com>", self.attachment)
+            service.save_email(
+                message_id="<svc@example.com>",
+                from_addr="alice@example.com",
+                to_addrs=["list@example.com"],
+                subject="packed",
+                full_content_for_storage=raw,
+                date=datetime.datetime(2024, 1, 1),
+                store_as_is=True,
+            )
+
+            with service.open_email_content("<svc@example.com>") as f:
+                self.assertEqual(f.read(), raw)
+            content = service.get_email_content("<svc@example.com>")
+            self.assertEqual(content, raw.decode().replace("\r\n", "\n"))
+        finally:
+            service.close()
+
+
+class TestMessageStoreMigration(unittest.TestCase):
+    """旧布局迁移测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.storage_dir = os.path.join(self.test_dir, "emails")
+        self.service = EmailService(os.path.join(self.test_dir, "store.db"))
+        # 先以旧的单目录布局保存邮件
+        self.service.content_manager = EmailContentManager(
+            FlatMessageStore(self.storage_dir)
+        )
+        for i in range(3):
+            self.service.save_email(
+                message_id=f"<m{i}@example.com>",
+                from_addr="alice@example.com",
+                to_addrs=["bob@example.com"],
+                subject=f"m{i}",
+                full_content_for_storage=RAW.replace(b"body", f"body {i}".encode()),
+                date=datetime.datetime(2024, 1, 1 + i),
+                store_as_is=True,
+            )
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.service.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_migrate_legacy_files(self):
+        """测试迁移移动文件、更新content_path，重复执行无副作用"""
+        self.service.content_manager = EmailContentManager(
+            ShardedMessageStore(self.storage_dir)
+        )
+        # 删除一个文件模拟缺失
+        os.unlink(os.path.join(self.storage_dir, "m2_at_example.com.eml"))
+
+        dry_run = migrate_messages(self.service, dry_run=True)
+        self.assertEqual(dry_run["moved"], 2)
+        legacy_path = os.path.join(self.storage_dir, "m0_at_example.com.eml")
+        self.assertTrue(os.path.exists(legacy_path))
+
+        stats = migrate_messages(self.service, batch_size=1)
+        self.assertEqual((stats["moved"], stats["missing"]), (2, 1))
+        self.assertEqual(
+            [f for f in os.listdir(self.storage_dir) if f.endswith(".eml")], []
+        )
+
+        record = self.service.get_email("<m1@example.com>")
+        store = self.service.content_manager.store
+        self.assertEqual(record["content_path"], store.path_for("<m1@example.com>"))
+        self.assertIn("body 1", self.service.get_email_content("<m1@example.com>"))
+
+        again = migrate_messages(self.service)
+        self.assertEqual((again["moved"], again["in_place"]), (0, 2))
+
+    def test_migrate_repacks_plain_files(self):
+        """测试启用压缩后，迁移把未打包的文件按新格式重写"""
+        store = ShardedMessageStore(self.storage_dir, compression="zlib")
+        self.service.content_manager = EmailContentManager(store)
+
+        stats = migrate_messages(self.service)
+        self.assertEqual((stats["repacked"], stats["moved"]), (3, 0))
+
+        path = self.service.get_email("<m0@example.com>")["content_path"]
+        self.assertTrue(store.is_packed_file(path))
+        self.assertIn("body 0", self.service.get_email_content("<m0@example.com>"))
+        self.assertEqual(migrate_messages(self.service)["in_place"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
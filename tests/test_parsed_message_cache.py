@@ -0,0 +1,130 @@
+"""
+解析结果缓存测试 - 测试查看邮件时复用解析结果、文件变化和删除后失效以及容量限制
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.email_format_handler import EmailFormatHandler
+from server.new_db_handler import EmailService
+from server.parsed_message_cache import ParsedMessageCache, file_stamp
+
+MESSAGE = (
+    "From: alice@example.com\r\n"
+    "To: bob@example.com\r\n"
+    "Subject: cached\r\n"
+    "Date: Mon, 01 Jan 2024 00:00:00 +0000\r\n"
+    "Message-ID: <cached@example.com>\r\n"
+    "MIME-Version: 1.0\r\n"
+    'Content-Type: multipart/mixed; boundary="b"\r\n'
+    "\r\n"
+    "--b\r\n"
+    "Content-Type: text/plain; charset=utf-8\r\n"
+    "\r\n"
+    "hello body\r\n"
+    "--b\r\n"
+    "Content-Type: application/octet-stream\r\n"
+    'Content-Disposition: attachment; filename="data.bin"\r\n'
+    "Content-Transfer-Encoding: base64\r\n"
+    "\r\n"
+    "AAECAwQF\r\n"
+    "--b--\r\n"
+)
+
+
+class TestParsedMessageCache(unittest.TestCase):
+    """解析结果缓存测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.service = EmailService(
+            os.path.join(self.test_dir, "cache.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+        self.service.parsed_cache = ParsedMessageCache(max_entries=8)
+        self.service.save_email(
+            message_id="<cached@example.com>",
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject="cached",
+            content="hello body",
+            full_content_for_storage=MESSAGE.encode(),
+            date=datetime.datetime(2024, 1, 1),
+            store_as_is=True,
+        )
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.service.delete_email("<cached@example.com>", permanent=True)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_repeated_view_uses_cache(self):
+        """测试第二次查看不再解析邮件"""
+        first = self.service.get_email("<cached@example.com>", include_content=True)
+        self.assertIn("hello body", first["content"])
+        self.assertEqual(first["attachments"][0]["filename"], "data.bin")
+        self.assertEqual(first["attachments"][0]["size"], 6)
+
+        with mock.patch.object(
+            EmailFormatHandler, "parse_mime_message", side_effect=AssertionError
+        ):
+            second = self.service.get_email(
+                "<cached@example.com>", include_content=True
+            )
+        self.assertEqual(second["content"], first["content"])
+        self.assertEqual(second["attachments"], first["attachments"])
+
+        stats = self.service.parsed_cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_file_change_and_delete_invalidate(self):
+        """测试文件内容变化后重新解析，删除后清除缓存"""
+        self.service.get_email("<cached@example.com>", include_content=True)
+        path = self.service.get_email_content_path("<cached@example.com>")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\r\n")
+        stamp = file_stamp(path)
+        os.utime(path, ns=(stamp[0] + 10**9, stamp[0] + 10**9))
+
+        self.service.get_email("<cached@example.com>", include_content=True)
+        stats = self.service.parsed_cache.get_stats()
+        self.assertEqual((stats["stale"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["entries"], 1)
+
+        self.service.delete_email("<cached@example.com>", user_email="bob@example.com")
+        self.assertEqual(self.service.parsed_cache.get_stats()["entries"], 0)
+
+    def test_entry_and_byte_limits(self):
+        """测试按条目数和总字节数淘汰最久未使用的结果"""
+        cache = ParsedMessageCache(max_entries=2, max_bytes=100)
+        path = os.path.join(self.test_dir, "f")
+        stamp = (1, 1)
+        summary = {"content": "x" * 40, "attachments": []}
+        cache.put("a", path, stamp, summary)
+        cache.put("b", path, stamp, summary)
+        cache.get("a", path, stamp)
+        cache.put("c", path, stamp, summary)
+        self.assertIsNone(cache.get("b", path, stamp))
+        self.assertIsNotNone(cache.get("a", path, stamp))
+
+        cache.put("d", path, stamp, {"content": "x" * 90, "attachments": []})
+        stats = cache.get_stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertLessEqual(stats["bytes"], 100)
+        # 超过总字节上限的结果不缓存
+        cache.put("e", path, stamp, {"content": "x" * 200, "attachments": []})
+        self.assertIsNone(cache.get("e", path, stamp))
+
+
+if __name__ == "__main__":
+    unittest.main()
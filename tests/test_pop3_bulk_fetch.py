@@ -0,0 +1,118 @@
+"""
+POP3批量获取测试 - 测试客户端流水线RETR、并行解析和多连接回退
+"""
+
+import sys
+import os
+import socket
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from client.pop3_client_refactored import POP3ClientRefactored
+from server.async_pop3_server import AsyncPOP3Server
+from server.new_db_handler import EmailService
+from server.pop3_auth import POP3Authenticator
+from server.user_auth import UserAuth
+
+
+class TestPOP3BulkFetch(unittest.TestCase):
+    """POP3批量获取测试类"""
+
+    COUNT = 30
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        db_path = os.path.join(self.test_dir, "pop3.db")
+        email_service = EmailService(
+            db_path, storage_dir=os.path.join(self.test_dir, "emails")
+        )
+        user_auth = UserAuth(db_path)
+        user_auth.create_user("bob", "bob@example.com", "secret123")
+
+        base = datetime.datetime(2024, 1, 1)
+        for i in range(self.COUNT):
+            email_service.save_email(
+                message_id=f"<bulk{i}@example.com>",
+                from_addr="alice@example.com",
+                to_addrs=["bob@example.com"],
+                subject=f"bulk {i}",
+                content="",
+                full_content_for_storage=(
+                    f"From: alice@example.com\r\n"
+                    f"To: bob@example.com\r\n"
+                    f"Subject: bulk {i}\r\n"
+                    f"Message-ID: <bulk{i}@example.com>\r\n"
+                    f"\r\n"
+                    f".line {i}\r\n"
+                ).encode(),
+                date=base + datetime.timedelta(minutes=i),
+                store_as_is=True,
+            )
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            self.port = s.getsockname()[1]
+
+        self.server = AsyncPOP3Server(
+            host="localhost", port=self.port, use_ssl=False, executor_workers=4
+        )
+        self.server.email_service = email_service
+        self.server.user_auth = user_auth
+        self.server.authenticator = POP3Authenticator(user_auth)
+        self.server.start()
+
+        self.client = POP3ClientRefactored(
+            host="localhost",
+            port=self.port,
+            use_ssl=False,
+            username="bob",
+            password="secret123",
+            auth_method="BASIC",
+            timeout=10,
+        )
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.client.disconnect()
+        self.server.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_pipelined_fetch_in_order(self):
+        """测试流水线获取的邮件按编号顺序返回"""
+        results = list(self.client.iter_emails())
+        self.assertEqual([n for n, _ in results], list(range(1, self.COUNT + 1)))
+        # 邮箱快照按时间倒序，编号1是最新的邮件
+        self.assertEqual(results[0][1].subject, f"bulk {self.COUNT - 1}")
+        self.assertEqual(len({email.message_id for _, email in results}), self.COUNT)
+
+    def test_early_stop_keeps_connection_usable(self):
+        """测试调用方提前停止后连接仍可继续使用"""
+        for i, _ in enumerate(self.client.iter_emails(), 1):
+            if i == 3:
+                break
+        self.assertEqual(self.client.get_mailbox_status()[0], self.COUNT)
+
+    def test_extra_connections_fall_back(self):
+        """测试服务器锁定邮箱时多连接获取退回单连接"""
+        results = list(self.client.iter_emails(connections=3))
+        self.assertEqual(len(results), self.COUNT)
+
+    def test_retrieve_all_emails_with_delete(self):
+        """测试retrieve_all_emails在流水线结束后再标记删除"""
+        emails = self.client.retrieve_all_emails(delete=True, limit=5)
+        self.assertEqual(len(emails), 5)
+        self.client.disconnect()
+
+        self.client.connect()
+        self.assertEqual(self.client.get_mailbox_status()[0], self.COUNT - 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+POP3邮箱快照测试 - 测试稳定的消息编号、延迟删除和邮箱独占锁
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.new_db_handler import EmailService
+from server.pop3_auth import POP3Authenticator
+from server.pop3_commands import POP3CommandHandler
+from server.pop3_maildrop import MaildropSnapshot, MaildropLocks, make_uid
+from server.user_auth import UserAuth
+
+
+class TestMaildropSnapshot(unittest.TestCase):
+    """邮箱快照测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.snapshot = MaildropSnapshot(
+            [("<a@example.com>", 10, None), ("<b@example.com>", 20, None)]
+        )
+
+    def test_deleted_messages_keep_numbers(self):
+        """测试标记删除后其他消息编号不变"""
+        self.snapshot.mark_deleted(0)
+
+        self.assertIsNone(self.snapshot.index_of(1))
+        self.assertEqual(self.snapshot.index_of(2), 1)
+        self.assertEqual(self.snapshot.stat(), (1, 20))
+        self.assertEqual(self.snapshot.deleted_message_ids(), ["<a@example.com>"])
+
+        self.snapshot.reset()
+        self.assertEqual(self.snapshot.stat(), (2, 30))
+
+    def test_uid(self):
+        """测试UID与之前的UIDL输出一致，不合规时使用摘要"""
+        self.assertEqual(self.snapshot.uids[0], "a@example.com")
+        uid = make_uid("<has space@example.com>")
+        self.assertEqual(len(uid), 40)
+        self.assertEqual(uid, make_uid("<has space@example.com>"))
+
+    def test_locks(self):
+        """测试邮箱锁只允许一个持有者"""
+        locks = MaildropLocks()
+        first, second = object(), object()
+
+        self.assertTrue(locks.acquire("Bob@example.com", first))
+        self.assertFalse(locks.acquire("bob@example.com", second))
+        locks.release("bob@example.com", second)
+        self.assertTrue(locks.is_locked("bob@example.com"))
+        locks.release("bob@example.com", first)
+        self.assertTrue(locks.acquire("bob@example.com", second))
+
+
+class TestPOP3MaildropSession(unittest.TestCase):
+    """POP3会话快照和延迟删除测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        db_path = os.path.join(self.test_dir, "pop3.db")
+        self.service = EmailService(
+            db_path, storage_dir=os.path.join(self.test_dir, "emails")
+        )
+        user_auth = UserAuth(db_path)
+        user_auth.create_user("bob", "bob@example.com", "secret123")
+        self.authenticator = POP3Authenticator(user_auth)
+
+        for i in range(3):
+            self.service.save_email(
+                message_id=f"<m{i}@example.com>",
+                from_addr="alice@example.com",
+                to_addrs=["bob@example.com"],
+                subject=f"m{i}",
+                content="",
+                full_content_for_storage=f"Subject: m{i}\r\n\r\nbody\r\n".encode(),
+                date=datetime.datetime(2024, 1, 1 + i),
+                store_as_is=True,
+            )
+
+        self.handlers = []
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        for handler in self.handlers:
+            handler.release_maildrop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def login(self):
+        """创建处理器并登录，返回(处理器, 响应列表)"""
+        responses = []
+        handler = POP3CommandHandler(
+            self.service, self.authenticator, responses.append, None
+        )
+        self.handlers.append(handler)
+        handler.handle_command("USER bob")
+        handler.handle_command("PASS secret123")
+        return handler, responses
+
+    def bob_email(self, message_id):
+        """获取bob邮箱中的邮件状态"""
+        return self.service.get_email(message_id, user_email="bob@example.com")
+
+    def test_snapshot_and_deferred_delete(self):
+        """测试会话期间不再查询邮件列表，DELE在QUIT时批量提交"""
+        handler, responses = self.login()
+        self.assertTrue(responses[-1].startswith("+OK bob logged in, 3 messages"))
+
+        size = self.service.get_email("<m1@example.com>")["size"]
+        with mock.patch.object(
+            self.service, "list_emails", side_effect=AssertionError("不应查询")
+        ), mock.patch.object(
+            self.service, "mark_email_as_deleted", side_effect=AssertionError("不应逐封删除")
+        ):
+            handler.handle_command("DELE 1")
+            handler.handle_command("STAT")
+            self.assertEqual(responses[-1], f"+OK 2 {size * 2}")
+            handler.handle_command("UIDL 2")
+            self.assertEqual(responses[-1], "+OK 2 m1@example.com")
+            handler.handle_command("RETR 1")
+            self.assertEqual(responses[-1], "-ERR Message 1 already deleted")
+
+            # QUIT之前数据库中的邮件仍未删除
+            self.assertFalse(self.bob_email("<m2@example.com>")["is_deleted"])
+            self.assertFalse(handler.handle_command("QUIT"))
+
+        self.assertTrue(self.bob_email("<m2@example.com>")["is_deleted"])
+        self.assertFalse(self.bob_email("<m1@example.com>")["is_deleted"])
+        # 删除只作用于bob的邮箱，邮件本身的全局状态不变
+        self.assertFalse(self.service.get_email("<m2@example.com>")["is_deleted"])
+
+    def test_rset_and_disconnect_discard_deletions(self):
+        """测试RSET和未QUIT断开都不会删除邮件"""
+        handler, responses = self.login()
+        handler.handle_command("DELE 1")
+        handler.handle_command("RSET")
+        self.assertTrue(responses[-1].startswith("+OK maildrop has 3 messages"))
+        handler.handle_command("DELE 2")
+        handler.release_maildrop()
+
+        self.assertFalse(self.service.get_email("<m1@example.com>")["is_deleted"])
+
+    def test_concurrent_session_is_rejected(self):
+        """测试同一邮箱的第二个会话被拒绝"""
+        first, _ = self.login()
+        second, responses = self.login()
+        self.assertEqual(responses[-1], "-ERR [IN-USE] Maildrop already locked")
+        self.assertEqual(second.state, "AUTHORIZATION")
+
+        first.handle_command("QUIT")
+        third, responses = self.login()
+        self.assertEqual(third.state, "TRANSACTION")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+POP3流式发送测试 - 测试按缓冲区点填充以及RETR/TOP的流式响应
+"""
+
+import sys
+import os
+import io
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.pop3_utils import dot_stuff_chunks, iter_top_lines, write_multiline_response
+from server.pop3_commands import POP3CommandHandler
+from server.pop3_maildrop import MaildropSnapshot
+from server.new_db_handler import EmailService
+
+
+class TestDotStuffing(unittest.TestCase):
+    """点填充和多行响应测试类"""
+
+    def test_chunk_boundaries(self):
+        """测试跨块边界的CRLF和行首点都能正确处理"""
+        chunks = [b"a\r", b"\n.b\n", b".c\r\nd"]
+        self.assertEqual(
+            b"".join(dot_stuff_chunks(chunks)), b"a\r\n..b\r\n..c\r\nd\r\n.\r\n"
+        )
+
+    def test_same_result_for_any_chunk_size(self):
+        """测试分块大小不影响输出结果"""
+        raw = b"Subject: x\n\n.first\r\nline\r.\r\n..two\n\n.\n"
+        expected = b"".join(dot_stuff_chunks([raw]))
+        for size in range(1, 8):
+            chunks = [raw[i : i + size] for i in range(0, len(raw), size)]
+            self.assertEqual(b"".join(dot_stuff_chunks(chunks)), expected)
+        self.assertTrue(expected.endswith(b"\r\n\r\n..\r\n.\r\n"))
+
+    def test_top_lines(self):
+        """测试TOP只返回头部、空行和正文的前n行"""
+        raw = io.BytesIO(b"From: a\r\nSubject: b\r\n\r\n1\r\n2\r\n3\r\n")
+        self.assertEqual(
+            b"".join(iter_top_lines(raw, 2)), b"From: a\r\nSubject: b\r\n\r\n1\r\n2\r\n"
+        )
+
+    def test_small_pieces_are_coalesced(self):
+        """测试小块内容合并后写出"""
+        writes = []
+        sent = write_multiline_response(writes.append, "+OK", [b"x\r\n"] * 100, 64)
+        self.assertEqual(sent, sum(len(w) for w in writes))
+        self.assertLess(len(writes), 10)
+        self.assertEqual(b"".join(writes), b"+OK\r\n" + b"x\r\n" * 100 + b".\r\n")
+
+
+class TestPOP3StreamingCommands(unittest.TestCase):
+    """RETR/TOP流式发送测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.service = EmailService(
+            os.path.join(self.test_dir, "pop3.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+        self.raw = (
+            b"From: alice@example.com\r\n"
+            b"To: bob@example.com\r\n"
+            b"Subject: stream\r\n"
+            b"Message-ID: <stream@example.com>\r\n"
+            b"\r\n"
+            b".leading dot\r\n"
+            + b"body line\r\n" * 5000
+        )
+        self.service.save_email(
+            message_id="<stream@example.com>",
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject="stream",
+            content="body",
+            full_content_for_storage=self.raw,
+            date=datetime.datetime.now(),
+            store_as_is=True,
+        )
+
+        self.lines = []
+        self.writes = []
+        self.handler = POP3CommandHandler(
+            self.service, None, self.lines.append, self.writes.append
+        )
+        self.handler.state = "TRANSACTION"
+        self.handler.user_email = "bob@example.com"
+        self.handler.maildrop = MaildropSnapshot.load(self.service, "bob@example.com")
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_retr_streams_in_chunks(self):
+        """测试RETR使用数据库大小并分块发送完整内容"""
+        self.handler.process_retr("1")
+
+        data = b"".join(self.writes)
+        self.assertEqual(self.lines, [])
+        self.assertTrue(data.startswith(f"+OK {len(self.raw)} octets\r\n".encode()))
+        self.assertTrue(data.endswith(b"body line\r\n.\r\n"))
+        self.assertIn(b"\r\n..leading dot\r\n", data)
+        self.assertLess(len(self.writes), 5)
+
+    def test_normalized_message_size_matches_stored_bytes(self):
+        """测试保存时被规范化的邮件，LIST和RETR报告的大小与实际发送的内容一致"""
+        self.service.save_email(
+            message_id="<normalized@example.com>",
+            from_addr="carol@example.com",
+            to_addrs=["bob@example.com"],
+            subject="normalized",
+            content="short body",
+            full_content_for_storage="Subject: normalized\n\nshort body\n",
+            date=datetime.datetime.now(),
+        )
+        self.handler.maildrop = MaildropSnapshot.load(self.service, "bob@example.com")
+        index = self.handler.maildrop.message_ids.index("<normalized@example.com>")
+        stored = self.service.get_email("<normalized@example.com>")
+        with open(stored["content_path"], "rb") as f:
+            content = f.read()
+        self.assertEqual(self.handler.maildrop.sizes[index], len(content))
+
+        self.handler.process_retr(str(index + 1))
+        data = b"".join(self.writes)
+        self.assertTrue(data.startswith(f"+OK {len(content)} octets\r\n".encode()))
+
+    def test_top(self):
+        """测试TOP只发送头部和指定行数的正文"""
+        self.handler.process_top("1 1")
+
+        data = b"".join(self.writes)
+        self.assertTrue(data.startswith(b"+OK\r\nFrom: alice@example.com\r\n"))
+        self.assertTrue(data.endswith(b"\r\n\r\n..leading dot\r\n.\r\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+POP3增量同步测试 - 测试按UIDL只下载新邮件、本地读取和已删除邮件过滤
+"""
+
+import sys
+import os
+import socket
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from client.pop3_client_refactored import POP3ClientRefactored
+from client.pop3_sync import POP3MailboxSync
+from server.async_pop3_server import AsyncPOP3Server
+from server.new_db_handler import EmailService
+from server.pop3_auth import POP3Authenticator
+from server.user_auth import UserAuth
+
+
+class TestPOP3MailboxSync(unittest.TestCase):
+    """POP3增量同步测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        server_db = os.path.join(self.test_dir, "server.db")
+        self.server_service = EmailService(
+            server_db, storage_dir=os.path.join(self.test_dir, "server_emails")
+        )
+        user_auth = UserAuth(server_db)
+        user_auth.create_user("bob", "bob@example.com", "secret123")
+        for i in range(5):
+            self._deliver(i)
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            port = s.getsockname()[1]
+
+        self.server = AsyncPOP3Server(
+            host="localhost", port=port, use_ssl=False, executor_workers=4
+        )
+        self.server.email_service = self.server_service
+        self.server.user_auth = user_auth
+        self.server.authenticator = POP3Authenticator(user_auth)
+        self.server.start()
+
+        self.client = POP3ClientRefactored(
+            host="localhost",
+            port=port,
+            use_ssl=False,
+            username="bob",
+            password="secret123",
+            auth_method="BASIC",
+            timeout=10,
+        )
+        # 客户端的本地存储与服务器使用不同的数据库
+        self.local = EmailService(
+            os.path.join(self.test_dir, "local.db"),
+            storage_dir=os.path.join(self.test_dir, "local_emails"),
+        )
+        self.sync = POP3MailboxSync(self.client, self.local, "bob@example.com")
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.client.disconnect()
+        self.server.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _deliver(self, i):
+        self.server_service.save_email(
+            message_id=f"<sync{i}@example.com>",
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject=f"sync {i}",
+            content="",
+            full_content_for_storage=(
+                f"From: alice@example.com\r\n"
+                f"To: bob@example.com\r\n"
+                f"Subject: sync {i}\r\n"
+                f"Message-ID: <sync{i}@example.com>\r\n"
+                f"\r\n"
+                f"body {i}\r\n"
+            ).encode(),
+            date=datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i),
+            store_as_is=True,
+        )
+
+    def _sync_session(self, **kwargs):
+        self.client.connect()
+        try:
+            return self.sync.sync(**kwargs)
+        finally:
+            self.client.disconnect()
+
+    def test_only_new_messages_are_retrieved(self):
+        """测试第二次同步不再RETR，新到达的邮件只下载一封"""
+        first = self._sync_session()
+        self.assertEqual(first.new_count, 5)
+        self.assertEqual(len(first.message_ids), 5)
+
+        with mock.patch.object(
+            self.client, "iter_emails", side_effect=AssertionError
+        ):
+            second = self._sync_session()
+        self.assertEqual(second.new_count, 0)
+        self.assertEqual(second.message_ids, first.message_ids)
+
+        self._deliver(5)
+        third = self._sync_session()
+        self.assertEqual(third.new_count, 1)
+        self.assertEqual(len(third.message_ids), 6)
+
+    def test_load_from_local_store_skips_deleted(self):
+        """测试从本地存储读取邮件，并按本地索引过滤已删除邮件"""
+        result = self._sync_session()
+        deleted_id = result.message_ids[0]
+        self.local.update_email(deleted_id, is_deleted=True)
+        self.assertIn(deleted_id, self.local.get_deleted_message_ids("bob@example.com"))
+
+        emails = self.sync.load_emails(result.message_ids)
+        self.assertEqual(len(emails), 4)
+        self.assertNotIn(deleted_id, [email.message_id for email in emails])
+        self.assertTrue(all(email.subject.startswith("sync") for email in emails))
+
+    def test_limit_and_server_side_removal(self):
+        """测试limit只同步最新的邮件，服务器上删除的邮件移出同步状态"""
+        result = self._sync_session(limit=2)
+        self.assertEqual(result.new_count, 2)
+        self.assertEqual(result.total, 5)
+
+        account = "bob@example.com"
+        self.local.sync_state.record_synced(account, [("gone", "<gone@x>")])
+        self._sync_session(limit=2)
+        self.assertNotIn("gone", self.local.sync_state.get_synced(account))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+撤回索引测试 - 测试布隆过滤器、撤回记录匹配和收件时跳过已撤回邮件
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.new_db_handler import EmailService
+from server.recall_index import BloomFilter, RecallIndex
+
+
+class TestRecallIndex(unittest.TestCase):
+    """撤回索引测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.service = EmailService(
+            os.path.join(self.test_dir, "recall.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+        self.now = datetime.datetime.now()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _send_and_recall(self, message_id, subject="hello"):
+        self.service.save_sent_email(
+            message_id=message_id,
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject=subject,
+            content="body",
+            date=self.now,
+        )
+        self.assertTrue(self.service.email_repo.recall_email(message_id, "alice"))
+
+    def _receive(self, message_id, subject="hello"):
+        return self.service.save_email(
+            message_id=message_id,
+            from_addr="alice@example.com",
+            to_addrs=["bob@example.com"],
+            subject=subject,
+            content="body",
+            date=self.now,
+        )
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """测试布隆过滤器对已加入的元素全部命中，误判率在预期范围内"""
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"key{i}")
+        self.assertTrue(all(f"key{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_not_recalled_does_not_query_database(self):
+        """测试未撤回的邮件只探测布隆过滤器"""
+        self._send_and_recall("<recalled@example.com>")
+        index = self.service.email_repo.recall_index
+        with mock.patch.object(
+            index.db, "execute_query", side_effect=AssertionError
+        ):
+            self.assertFalse(
+                index.is_recalled("<other@example.com>", "carol@example.com", "hi")
+            )
+
+    def test_recalled_email_is_not_saved(self):
+        """测试已撤回的邮件按Message ID和主题+发件人匹配时不保存到收件箱"""
+        self._send_and_recall("<recalled@example.com>")
+
+        self.assertTrue(self._receive("<recalled@example.com>"))
+        # 服务器重新生成的Message ID按主题+发件人匹配
+        self.assertTrue(self._receive("<regenerated@example.com>"))
+        self.assertTrue(self._receive("<kept@example.com>", subject="other"))
+
+        self.assertIsNone(self.service.get_email("<recalled@example.com>"))
+        self.assertIsNone(self.service.get_email("<regenerated@example.com>"))
+        self.assertIsNotNone(self.service.get_email("<kept@example.com>"))
+
+    def test_subject_match_window(self):
+        """测试主题+发件人匹配只针对24小时内发送的邮件"""
+        self._send_and_recall("<recalled@example.com>")
+        index = self.service.email_repo.recall_index
+        later = self.now + datetime.timedelta(hours=25)
+        self.assertFalse(
+            index.is_recalled("<x@example.com>", "alice@example.com", "hello", later)
+        )
+        # Message ID匹配不受时间窗口限制
+        self.assertTrue(
+            index.is_recalled("<recalled@example.com>", "", "", later)
+        )
+
+    def test_index_loads_existing_records(self):
+        """测试新建的索引从撤回记录表加载，容量不足时扩容"""
+        for i in range(3):
+            self._send_and_recall(f"<r{i}@example.com>", subject=f"s{i}")
+        index = RecallIndex(self.service.db_connection, capacity=2)
+        self.assertGreaterEqual(index.capacity, 6)
+        for i in range(3):
+            self.assertTrue(
+                index.is_recalled(f"<r{i}@example.com>", "alice@example.com", "")
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
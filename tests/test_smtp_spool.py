@@ -0,0 +1,214 @@
+"""
+SMTP DATA暂存测试 - 测试点填充去除、转存临时文件、大小和行长度限制
+"""
+
+import sys
+import os
+import socket
+import smtplib
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiosmtpd.controller import Controller
+
+from server.smtp_spool import MessageSpool, SpoolingSMTP
+
+
+class RecordingHandler:
+    """记录handle_DATA收到的内容和暂存区状态"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        spool = envelope.spool
+        with spool.open() as f:
+            data = f.read()
+        self.messages.append(
+            {
+                "data": data,
+                "in_memory": spool.in_memory,
+                "path": spool.path,
+                "content": envelope.content,
+            }
+        )
+        return "250 OK"
+
+
+class SpoolingController(Controller):
+    """使用SpoolingSMTP的测试控制器"""
+
+    def __init__(self, handler, port, memory_limit, spool_dir, **kwargs):
+        self.memory_limit = memory_limit
+        self.spool_dir = spool_dir
+        super().__init__(handler, hostname="localhost", port=port, **kwargs)
+
+    def factory(self):
+        return SpoolingSMTP(
+            self.handler,
+            spool_memory_limit=self.memory_limit,
+            spool_dir=self.spool_dir,
+            **self.SMTP_kwargs,
+        )
+
+
+class TestMessageSpool(unittest.TestCase):
+    """MessageSpool测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir)
+
+    def test_rollover_above_memory_limit(self):
+        """测试超过内存阈值后转存到临时文件，关闭后删除"""
+        spool = MessageSpool(memory_limit=10, spool_dir=self.test_dir)
+        spool.write(b"12345")
+        self.assertTrue(spool.in_memory)
+        self.assertEqual(spool.getvalue(), b"12345")
+
+        spool.write(b"678901")
+        self.assertFalse(spool.in_memory)
+        self.assertTrue(os.path.exists(spool.path))
+        with self.assertRaises(ValueError):
+            spool.getvalue()
+        with spool.open() as f:
+            self.assertEqual(f.read(), b"12345678901")
+
+        path = spool.path
+        spool.close()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+
+class TestSpoolingSMTP(unittest.TestCase):
+    """SpoolingSMTP测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.handler = RecordingHandler()
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            port = s.getsockname()[1]
+
+        self.controller = SpoolingController(
+            self.handler,
+            port,
+            memory_limit=64,
+            spool_dir=self.test_dir,
+            data_size_limit=4096,
+        )
+        self.controller.start()
+        self.client = smtplib.SMTP("localhost", port, timeout=10)
+        self.client.ehlo()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        try:
+            self.client.quit()
+        except smtplib.SMTPException:
+            pass
+        self.controller.stop()
+        shutil.rmtree(self.test_dir)
+
+    def _send_without_size(self, body: bytes):
+        """不带SIZE参数发送邮件，让大小检查发生在DATA阶段"""
+        self.client.mail("alice@example.com")
+        self.client.rcpt("bob@example.com")
+        return self.client.data(body)
+
+    def test_help_lists_data(self):
+        """测试HELP能显示DATA的语法"""
+        self.assertIn(b"DATA", self.client.help("DATA"))
+
+    def test_dot_unstuffing(self):
+        """测试去除行首的点填充（smtplib发送时会进行点填充）"""
+        body = b"Subject: dots\r\n\r\n.leading dot\r\n..\r\nend\r\n"
+        self.client.sendmail("alice@example.com", ["bob@example.com"], body)
+
+        message = self.handler.messages[0]
+        self.assertTrue(message["in_memory"])
+        self.assertEqual(message["data"], body)
+        self.assertEqual(message["content"], body)
+
+    def test_large_message_rolls_over_and_temp_file_removed(self):
+        """测试超过内存阈值的邮件转存到临时文件，handle_DATA返回后删除"""
+        body = b"Subject: big\r\n\r\n" + b"line of text\r\n" * 50
+        self.client.sendmail("alice@example.com", ["bob@example.com"], body)
+
+        message = self.handler.messages[0]
+        self.assertFalse(message["in_memory"])
+        self.assertEqual(message["data"], body)
+        self.assertIsNone(message["content"])
+        self.assertTrue(message["path"].startswith(self.test_dir))
+        self.assertFalse(os.path.exists(message["path"]))
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_oversize_data_rejected(self):
+        """测试DATA超过大小限制时返回552并丢弃内容"""
+        body = b"Subject: huge\r\n\r\n" + b"line of text\r\n" * 400
+        code, _ = self._send_without_size(body)
+
+        self.assertEqual(code, 552)
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_oversize_mail_from_size_rejected(self):
+        """测试MAIL FROM声明的SIZE超过限制时返回552"""
+        code, _ = self.client.mail("alice@example.com", ["SIZE=10000"])
+        self.assertEqual(code, 552)
+
+    def test_line_too_long_rejected(self):
+        """测试超过行长度限制时返回500"""
+        body = b"Subject: long\r\n\r\n" + b"y" * 2000 + b"\r\n"
+        code, _ = self._send_without_size(body)
+
+        self.assertEqual(code, 500)
+        self.assertEqual(self.handler.messages, [])
+
+        # 会话恢复正常，后续邮件可以继续发送
+        self.client.sendmail(
+            "alice@example.com", ["bob@example.com"], b"Subject: ok\r\n\r\nok\r\n"
+        )
+        self.assertEqual(len(self.handler.messages), 1)
+
+    def test_non_ascii_rejected_in_strict_ascii_mode(self):
+        """测试decode_data且未启用SMTPUTF8时，与aiosmtpd一致拒绝非ASCII内容"""
+        self.client.quit()
+        self.controller.stop()
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            port = s.getsockname()[1]
+        self.controller = SpoolingController(
+            self.handler,
+            port,
+            memory_limit=64,
+            spool_dir=self.test_dir,
+            decode_data=True,
+            enable_SMTPUTF8=False,
+        )
+        self.controller.start()
+        self.client = smtplib.SMTP("localhost", port, timeout=10)
+        self.client.ehlo()
+
+        body = "Subject: ascii\r\n\r\n中文内容\r\n".encode("utf-8") * 10
+        code, message = self._send_without_size(body)
+        self.assertEqual(code, 500)
+        self.assertIn(b"strict ASCII", message)
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+SMTP处理工作池测试 - 测试任务分发、队列满时的背压和指标统计
+"""
+
+import sys
+import os
+import time
+import socket
+import asyncio
+import smtplib
+import unittest
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.smtp_worker_pool import SMTPWorkerPool, WorkerPoolFull
+from server.smtp_server import StableSMTPServer
+from server.new_db_handler import EmailService
+
+
+class TestSMTPWorkerPool(unittest.TestCase):
+    """SMTP处理工作池测试类"""
+
+    def test_run_returns_result_and_records_metrics(self):
+        """测试任务在工作线程中执行并记录指标"""
+        pool = SMTPWorkerPool(max_workers=2, queue_size=2, mode="thread")
+        try:
+            main_thread = threading.get_ident()
+            result = asyncio.run(pool.run(lambda x: (x * 2, threading.get_ident()), 21))
+
+            self.assertEqual(result[0], 42)
+            self.assertNotEqual(result[1], main_thread)
+
+            metrics = pool.get_metrics()
+            self.assertEqual(metrics["completed"], 1)
+            self.assertEqual(metrics["in_flight"], 0)
+            self.assertGreaterEqual(metrics["avg_wait_time"], 0.0)
+        finally:
+            pool.shutdown()
+
+    def test_rejects_when_full(self):
+        """测试正在处理和排队的任务达到上限时拒绝新任务"""
+        pool = SMTPWorkerPool(max_workers=1, queue_size=1, mode="thread")
+        release = threading.Event()
+
+        async def scenario():
+            first = asyncio.ensure_future(pool.run(release.wait, 5))
+            second = asyncio.ensure_future(pool.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+
+            with self.assertRaises(WorkerPoolFull):
+                await pool.run(release.wait, 5)
+
+            self.assertEqual(pool.get_metrics()["queue_depth"], 1)
+            release.set()
+            await asyncio.gather(first, second)
+
+        try:
+            asyncio.run(scenario())
+            metrics = pool.get_metrics()
+            self.assertEqual(metrics["rejected"], 1)
+            self.assertEqual(metrics["completed"], 2)
+            self.assertEqual(metrics["max_queue_depth"], 1)
+            self.assertGreater(metrics["max_wait_time"], 0.0)
+        finally:
+            pool.shutdown()
+
+
+class TestSMTPServerWorkerPool(unittest.TestCase):
+    """SMTP服务器通过工作池处理邮件的集成测试"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_handler = EmailService(
+            os.path.join(self.test_dir, "smtp.db"),
+            storage_dir=os.path.join(self.test_dir, "emails"),
+        )
+
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            self.port = s.getsockname()[1]
+
+        self.server = StableSMTPServer(
+            host="localhost",
+            port=self.port,
+            db_handler=self.db_handler,
+            require_auth=False,
+            use_ssl=False,
+            processing_workers=2,
+        )
+        self.server.start()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.server.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_message_processed_in_worker_pool(self):
+        """测试邮件经工作池保存后才返回250"""
+        message = (
+            "From: sender@example.com\r\n"
+            "To: bob@example.com\r\n"
+            "Subject: worker pool\r\n"
+            "Message-ID: <pool.test@example.com>\r\n"
+            "\r\n"
+            "hello\r\n"
+        )
+        with smtplib.SMTP("localhost", self.port, timeout=10) as client:
+            client.sendmail("sender@example.com", ["bob@example.com"], message)
+
+        # 250返回时邮件已经保存
+        self.assertIsNotNone(self.db_handler.get_email("<pool.test@example.com>"))
+        metrics = self.server.get_processing_metrics()
+        self.assertEqual(metrics["completed"], 1)
+        self.assertEqual(metrics["mode"], "thread")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+垃圾邮件关键词匹配引擎测试 - 验证合并匹配与逐个正则匹配的结果一致
+"""
+
+import re
+import sys
+import json
+import random
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spam_filter.matcher import (
+    AUTOMATON_MIN_LITERALS,
+    AhoCorasick,
+    KeywordMatcher,
+    literal_of,
+)
+from spam_filter.spam_filter import KeywordSpamFilter
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "spam_keywords.json"
+
+
+def naive_match(keywords, text):
+    """逐个编译并匹配关键词（原实现）"""
+    return [
+        i for i, k in enumerate(keywords) if re.compile(k, re.IGNORECASE).search(text)
+    ]
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    """关键词匹配引擎测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        rng = random.Random(42)
+        alphabet = "abcdefg促销免费"
+        self.words = sorted(
+            {
+                "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 6)))
+                for _ in range(AUTOMATON_MIN_LITERALS * 2)
+            }
+        )
+        self.texts = [
+            "".join(rng.choice(alphabet + " ABCDEFG.") for _ in range(300))
+            for _ in range(20)
+        ]
+
+    def test_literal_detection(self):
+        """测试字面量关键词识别"""
+        self.assertEqual(literal_of("免费"), "免费")
+        self.assertEqual(literal_of(r"100\% off"), "100% off")
+        self.assertEqual(literal_of(r"click\.here"), "click.here")
+        self.assertIsNone(literal_of(r"\bwin\b"))
+        self.assertIsNone(literal_of("a.b"))
+        self.assertIsNone(literal_of("(a|b)"))
+
+    def test_aho_corasick_overlapping(self):
+        """测试重叠和相互包含的模式都能找到"""
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        self.assertEqual(automaton.find_all("ushers"), {0, 1, 3})
+        self.assertEqual(automaton.find_all("xyz"), set())
+
+    def test_config_keywords_match_naive(self):
+        """测试配置文件中的关键词结果与逐个匹配一致"""
+        for field, keywords in self.config.items():
+            matcher = KeywordMatcher(keywords)
+            for text in self.texts + [" ".join(keywords), "", "normal text"]:
+                self.assertEqual(matcher.match(text), naive_match(keywords, text))
+
+    def test_automaton_path_matches_naive(self):
+        """测试大量字面量走自动机时结果一致（包括大小写和混合正则）"""
+        keywords = self.words + [r"\bABC\b", "d[ef]+g", "(?:促销|免费){2}"]
+        matcher = KeywordMatcher(keywords)
+        self.assertIsNotNone(matcher.automaton)
+        for text in self.texts:
+            self.assertEqual(matcher.match(text), naive_match(keywords, text))
+
+    def test_automaton_unicode_ignorecase(self):
+        """测试re.IGNORECASE额外视为等价的字符不会被自动机漏掉"""
+        keywords = self.words + ["ı", "ſtraße", "ΣΟΦΊΑ", "K", "İstanbul", "ss"]
+        matcher = KeywordMatcher(keywords)
+        self.assertIsNotNone(matcher.automaton)
+        for text in [
+            "I",
+            "STRASSE",
+            "straße",
+            "σοφία",
+            "ΣΟΦΊΑΣ σοφίας",
+            "k",
+            "istanbul",
+            "ISTANBUL",
+            "ß",
+        ]:
+            self.assertEqual(matcher.match(text), naive_match(keywords, text))
+        self.assertIn(keywords.index("ı"), matcher.match("I"))
+
+    def test_backreference_patterns(self):
+        """测试含反向引用的正则与逐个匹配一致"""
+        keywords = [r"(a)\1", "(?P<x>b)(?P=x)", "spam"]
+        matcher = KeywordMatcher(keywords)
+        for text in ["aa", "bb", "SPAM", "ab"]:
+            self.assertEqual(matcher.match(text), naive_match(keywords, text))
+
+    def test_filter_output_order(self):
+        """测试过滤器输出的匹配关键词顺序与配置顺序一致"""
+        spam_filter = KeywordSpamFilter(str(CONFIG_PATH))
+        email = {
+            "from_addr": "promo@example.com",
+            "subject": " ".join(self.config["subject"]),
+            "content": " ".join(self.config["body"]),
+        }
+        result = spam_filter.analyze_email(email)
+        subject_hits = [
+            k.split(":", 1)[1]
+            for k in result["matched_keywords"]
+            if k.startswith("subject:")
+        ]
+        expected = [
+            self.config["subject"][i]
+            for i in naive_match(self.config["subject"], email["subject"])
+        ]
+        self.assertEqual(subject_hits, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
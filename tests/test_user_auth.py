@@ -0,0 +1,119 @@
+"""
+用户认证测试 - 测试可插拔密码哈希、旧哈希升级和认证缓存
+"""
+
+import sys
+import os
+import sqlite3
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common import password_hashing
+from server.new_db_handler import EmailService
+from server.user_auth import UserAuth
+
+
+class TestPasswordHashing(unittest.TestCase):
+    """密码哈希测试类"""
+
+    def test_schemes_round_trip(self):
+        """测试各算法哈希后可以验证"""
+        for scheme in ("scrypt", "pbkdf2_sha256", "sha256"):
+            hashed, salt = password_hashing.hash_password("secret", scheme=scheme)
+            self.assertTrue(password_hashing.verify_password("secret", hashed, salt))
+            self.assertFalse(password_hashing.verify_password("wrong", hashed, salt))
+
+    def test_legacy_hash_needs_rehash(self):
+        """测试旧的sha256哈希可以验证并被标记为需要升级"""
+        hashed, salt = password_hashing.hash_password("secret", scheme="sha256")
+        self.assertEqual(len(hashed), 64)
+        self.assertTrue(password_hashing.needs_rehash(hashed, "scrypt"))
+
+        current, _ = password_hashing.hash_password("secret", scheme="scrypt")
+        self.assertTrue(current.startswith("$scrypt$"))
+        self.assertFalse(password_hashing.needs_rehash(current, "scrypt"))
+
+    def test_unknown_format_rejected(self):
+        """测试无法识别的哈希格式验证失败"""
+        self.assertFalse(password_hashing.verify_password("x", "$md5$x$y", "salt"))
+
+
+class TestUserAuth(unittest.TestCase):
+    """用户认证测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "auth.db")
+        # EmailService负责创建users表
+        EmailService(self.db_path)
+        self.auth = UserAuth(self.db_path)
+        self.auth.create_user("alice", "alice@example.com", "secret")
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _stored_hash(self, username):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            "SELECT password_hash, salt FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        conn.close()
+        return row
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """测试使用旧哈希的用户登录成功后哈希被升级"""
+        legacy, salt = password_hashing.hash_password("old-pass", scheme="sha256")
+        self.auth._store_password_hash("alice", legacy, salt)
+        self.auth.invalidate_user("alice")
+
+        self.assertIsNotNone(self.auth.authenticate("alice", "old-pass"))
+        upgraded, _ = self._stored_hash("alice")
+        self.assertNotEqual(upgraded, legacy)
+        self.assertFalse(password_hashing.needs_rehash(upgraded))
+        self.assertIsNotNone(UserAuth(self.db_path).authenticate("alice", "old-pass"))
+
+    def test_repeated_login_uses_cache(self):
+        """测试重复登录命中缓存，不再执行KDF"""
+        self.assertIsNotNone(self.auth.authenticate("alice", "secret"))
+        with mock.patch(
+            "server.user_auth.verify_password", side_effect=AssertionError
+        ), mock.patch.object(
+            self.auth, "get_user_by_username", side_effect=AssertionError
+        ):
+            self.assertIsNotNone(self.auth.authenticate("alice", "secret"))
+
+        # 错误密码不会命中缓存
+        self.assertIsNone(self.auth.authenticate("alice", "wrong"))
+
+    def test_cache_invalidated_by_password_change_and_deactivation(self):
+        """测试修改密码和停用用户后缓存失效"""
+        self.assertIsNotNone(self.auth.authenticate("alice", "secret"))
+
+        self.assertTrue(self.auth.change_password("alice", "new-secret"))
+        self.assertIsNone(self.auth.authenticate("alice", "secret"))
+        self.assertIsNotNone(self.auth.authenticate("alice", "new-secret"))
+
+        self.assertTrue(self.auth.deactivate_user("alice"))
+        self.assertIsNone(self.auth.authenticate("alice", "new-secret"))
+
+    def test_cache_disabled(self):
+        """测试cache_ttl为0时每次都完整验证"""
+        auth = UserAuth(self.db_path, cache_ttl=0)
+        self.assertIsNotNone(auth.authenticate("alice", "secret"))
+        with mock.patch(
+            "server.user_auth.verify_password", return_value=False
+        ) as verify:
+            self.assertIsNone(auth.authenticate("alice", "secret"))
+            self.assertEqual(verify.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
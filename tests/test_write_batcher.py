@@ -0,0 +1,137 @@
+"""
+写入批处理器测试 - 测试组提交的合并、持久化和失败回退
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+import datetime
+import concurrent.futures
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.db_connection import DatabaseConnection
+from server.db_connection_pool import DatabaseConnectionPool
+from server.db_models import EmailRecord
+from server.email_repository import EmailRepository
+from server.write_batcher import WriteBatcher
+
+
+class TestWriteBatcher(unittest.TestCase):
+    """写入批处理器测试类"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "test_batch.db")
+        self.pool = DatabaseConnectionPool(self.db_path, pool_size=4)
+        self.db = DatabaseConnection(self.db_path, pool=self.pool)
+        self.db.init_database()
+        self.batcher = WriteBatcher(self.db, max_batch_size=16, max_delay_ms=50)
+        self.repo = EmailRepository(self.db, self.batcher)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.batcher.stop()
+        self.pool.close_all()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _record(self, index):
+        return EmailRecord(
+            message_id=f"<{index}@batch.test>",
+            from_addr="sender@example.com",
+            to_addrs=["bob@example.com"],
+            subject=f"批量测试 {index}",
+            date=datetime.datetime.now(),
+            size=100,
+        )
+
+    def test_concurrent_writes_are_coalesced(self):
+        """测试并发写入被合并为较少的批次，且返回时数据已可见"""
+
+        def create(index):
+            self.assertTrue(self.repo.create_email(self._record(index)))
+            # 返回即已提交，立即可以读到
+            return self.repo.get_email_by_id(f"<{index}@batch.test>") is not None
+
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(create, range(64)))
+
+        self.assertTrue(all(results))
+        self.assertEqual(self.repo.count_emails(user_email="bob@example.com"), 64)
+
+        stats = self.batcher.get_stats()
+        self.assertEqual(stats["items"], 64)
+        self.assertLess(stats["batches"], 64)
+
+    def test_failed_item_does_not_fail_batch(self):
+        """测试批次中的错误语句只影响所属提交"""
+        good = self.batcher.submit(
+            [
+                (
+                    "INSERT INTO email_recipients (message_id, address, role) "
+                    "VALUES (?, ?, ?)",
+                    ("<good@test>", "a@example.com", "to"),
+                )
+            ]
+        )
+        bad = self.batcher.submit([("INSERT INTO no_such_table VALUES (1)", ())])
+
+        self.assertTrue(good.result(timeout=5))
+        with self.assertRaises(Exception):
+            bad.result(timeout=5)
+
+        rows = self.db.execute_query(
+            "SELECT * FROM email_recipients WHERE message_id = ?",
+            ("<good@test>",),
+            fetch_all=True,
+        )
+        self.assertEqual(len(rows), 1)
+
+    def test_stop_flushes_pending_writes(self):
+        """测试停止时提交所有待写入数据"""
+        futures = [
+            self.batcher.submit(
+                [
+                    (
+                        "INSERT INTO email_recipients (message_id, address, role) "
+                        "VALUES (?, ?, ?)",
+                        (f"<{i}@test>", "a@example.com", "to"),
+                    )
+                ]
+            )
+            for i in range(10)
+        ]
+        self.batcher.stop()
+
+        self.assertTrue(all(f.result(timeout=5) for f in futures))
+        self.assertFalse(self.batcher.submit([]).exception() is None)
+
+    def test_submit_racing_stop_always_completes(self):
+        """测试与stop()并发的提交要么被执行要么立即失败，不会永远挂起"""
+        statement = [
+            (
+                "INSERT INTO email_recipients (message_id, address, role) "
+                "VALUES (?, ?, ?)",
+                ("<race@test>", "a@example.com", "to"),
+            )
+        ]
+
+        def submit_many():
+            return [self.batcher.submit(statement) for _ in range(200)]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            tasks = [executor.submit(submit_many) for _ in range(8)]
+            self.batcher.stop()
+            futures = [f for task in tasks for f in task.result()]
+
+        _, pending = concurrent.futures.wait(futures, timeout=5)
+        self.assertEqual(pending, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
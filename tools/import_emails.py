@@ -71,8 +71,8 @@ def import_received_emails(directory, db_handler, force=False, verbose=False):
             with open(file_path, "r", encoding="utf-8") as f:
                 eml_content = f.read()
 
-            # 使用EmailFormatHandler解析邮件
-            email_obj = EmailFormatHandler.parse_mime_message(eml_content)
+            # 导入只需要头部字段，只解析头部块
+            email_obj = EmailFormatHandler.parse_headers_fast(eml_content)
 
             # 检查数据库中是否已存在
             if not force and db_handler.get_email(email_obj.message_id):
@@ -175,8 +175,8 @@ def import_sent_emails(directory, db_handler, force=False, verbose=False):
             with open(file_path, "r", encoding="utf-8") as f:
                 eml_content = f.read()
 
-            # 使用EmailFormatHandler解析邮件
-            email_obj = EmailFormatHandler.parse_mime_message(eml_content)
+            # 导入只需要头部字段，只解析头部块
+            email_obj = EmailFormatHandler.parse_headers_fast(eml_content)
 
             # 检查数据库中是否已存在
             if not force and db_handler.get_sent_email(email_obj.message_id):
@@ -0,0 +1,193 @@
+"""
+邮件存储迁移工具 - 将旧的单目录布局中的.eml文件移动到当前存储后端（默认按哈希分片），
+并把新路径写回数据库的content_path列
+
+存储后端启用了压缩或附件去重时，尚未打包的文件会按新格式重新写入。
+--sweep-blobs在迁移后标记-清除没有被任何邮件引用的附件数据块，并重建引用计数。
+"""
+
+import os
+import sys
+import errno
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.utils import setup_logging
+from common.config import DB_PATH
+from server.message_store import MessageStore
+from server.new_db_handler import EmailService
+
+# 设置日志
+logger = setup_logging("migrate_message_store")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="邮件存储迁移工具")
+    parser.add_argument(
+        "--db", type=str, default=DB_PATH, help="数据库文件路径，默认为配置中的DB_PATH"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="每次从数据库读取的邮件数"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只统计需要移动的文件，不做任何修改"
+    )
+    parser.add_argument(
+        "--sweep-blobs",
+        action="store_true",
+        help="迁移后回收没有被引用的附件数据块（需在服务停止时运行）",
+    )
+    return parser.parse_args()
+
+
+def move_file(store: MessageStore, source: str, target: str) -> None:
+    """
+    移动邮件文件；同一文件系统内使用rename，跨设备时复制后删除源文件
+
+    Args:
+        store: 目标存储后端
+        source: 源文件路径
+        target: 目标文件路径
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        with open(source, "rb") as f:
+            store.write_file(target, f.read())
+        os.unlink(source)
+
+
+def repack_file(
+    store: MessageStore, message_id: str, source: str, same_path: bool
+) -> None:
+    """
+    按存储后端的压缩/去重设置重新写入未打包的邮件文件
+
+    Args:
+        store: 目标存储后端
+        message_id: 邮件ID
+        source: 源文件路径
+        same_path: 源文件是否就是目标路径
+    """
+    with open(source, "rb") as f:
+        store.write(message_id, f.read())
+    if not same_path:
+        os.unlink(source)
+
+
+def migrate_messages(
+    email_service: EmailService,
+    store: Optional[MessageStore] = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    将接收和已发送邮件的内容文件迁移到存储后端计算出的路径
+
+    Args:
+        email_service: 邮件服务
+        store: 目标存储后端，默认使用邮件服务当前的存储后端
+        batch_size: 每次从数据库读取的邮件数
+        dry_run: 只统计，不移动文件也不更新数据库
+
+    Returns:
+        统计信息: moved（已移动）, repacked（已按压缩/去重格式重写）,
+        in_place（已在目标位置）, missing（找不到文件）, failed（移动失败）
+    """
+    content_manager = email_service.content_manager
+    store = store or content_manager.store
+    stats = {"moved": 0, "repacked": 0, "in_place": 0, "missing": 0, "failed": 0}
+
+    for table, sent in (("emails", False), ("sent_emails", True)):
+        last_rowid = 0
+        while True:
+            rows = email_service.db_connection.execute_query(
+                f"SELECT rowid, message_id, content_path FROM {table} "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
+                fetch_all=True,
+            )
+            if not rows:
+                break
+            last_rowid = rows[-1]["rowid"]
+
+            updates: List[Tuple[str, str]] = []
+            for row in rows:
+                message_id = row["message_id"]
+                target = store.path_for(message_id)
+                source = content_manager.resolve_path(message_id, row["content_path"])
+
+                if not source:
+                    stats["missing"] += 1
+                    logger.warning(f"找不到邮件内容文件: {message_id}")
+                    continue
+
+                same_path = os.path.abspath(source) == os.path.abspath(target)
+                try:
+                    if store.packing and not store.is_packed_file(source):
+                        if not dry_run:
+                            repack_file(store, message_id, source, same_path)
+                        stats["repacked"] += 1
+                    elif same_path:
+                        stats["in_place"] += 1
+                    else:
+                        if not dry_run:
+                            move_file(store, source, target)
+                        stats["moved"] += 1
+                except OSError as e:
+                    stats["failed"] += 1
+                    logger.error(f"迁移邮件文件失败: {source} -> {target}: {e}")
+                    continue
+
+                if row["content_path"] != target:
+                    updates.append((message_id, target))
+
+            if updates and not dry_run:
+                email_service.email_repo.update_content_paths(updates, sent=sent)
+
+    logger.info(f"邮件存储迁移完成: {stats}")
+    return stats
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    email_service = EmailService(args.db)
+    stats = migrate_messages(
+        email_service, batch_size=args.batch_size, dry_run=args.dry_run
+    )
+    sweep_stats = None
+    if args.sweep_blobs:
+        sweep_stats = email_service.content_manager.store.sweep_blobs(
+            dry_run=args.dry_run
+        )
+    email_service.close()
+
+    prefix = "[DRY RUN] " if args.dry_run else ""
+    print(
+        f"{prefix}迁移完成: 移动 {stats['moved']} 个文件, "
+        f"重新打包 {stats['repacked']} 个, "
+        f"已在目标位置 {stats['in_place']} 个, 缺失 {stats['missing']} 个, "
+        f"失败 {stats['failed']} 个"
+    )
+    if sweep_stats:
+        print(
+            f"{prefix}数据块回收完成: 扫描邮件 {sweep_stats['messages']} 个, "
+            f"仍被引用 {sweep_stats['referenced']} 个, "
+            f"删除 {sweep_stats['removed']} 个"
+        )
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
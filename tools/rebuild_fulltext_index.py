@@ -0,0 +1,59 @@
+"""
+全文索引重建工具 - 从已存储的.eml内容重建email_fts全文索引
+
+用于升级前已经存在的邮件库，或索引与邮件内容不一致时重新生成。
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.utils import setup_logging
+from common.config import DB_PATH
+from server.new_db_handler import EmailService
+
+# 设置日志
+logger = setup_logging("rebuild_fulltext_index")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="全文索引重建工具")
+    parser.add_argument(
+        "--db", type=str, default=DB_PATH, help="数据库文件路径，默认为配置中的DB_PATH"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="每次从数据库读取的邮件数"
+    )
+    parser.add_argument("--verbose", action="store_true", help="显示进度")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    email_service = EmailService(args.db)
+    if not email_service.fulltext_index.available:
+        print("全文索引不可用：当前SQLite不支持FTS5 trigram分词器")
+        sys.exit(1)
+
+    def progress(count):
+        if count % 1000 == 0:
+            print(f"已索引 {count} 封邮件...")
+
+    start = time.time()
+    count = email_service.rebuild_fulltext_index(
+        batch_size=args.batch_size, progress=progress if args.verbose else None
+    )
+    email_service.close()
+
+    print(f"全文索引重建完成: {count} 封邮件, 耗时 {time.time() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -177,15 +177,16 @@ def main():
 
     try:
         # 解析.eml文件
-        with open(content_path, "rb") as f:
+        # 通过内容管理器读取，压缩或去重存储的邮件会被透明还原
+        content_manager = db_handler.content_manager
+        with content_manager.open_raw(content_path) as f:
             parser = BytesParser(policy=policy.default)
             msg = parser.parse(f)
 
         # 根据参数显示不同内容
         if args.raw:
             # 显示原始内容
-            with open(content_path, "r", encoding="utf-8", errors="replace") as f:
-                print(f.read())
+            print(content_manager.read_text(content_path))
         elif args.headers:
             # 只显示邮件头
             print_headers(msg)
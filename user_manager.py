@@ -5,14 +5,13 @@
 """
 
 import sqlite3
-import hashlib
-import uuid
 from pathlib import Path
 import os
 import getpass
 
 # 导入统一配置
 from common.config import DB_PATH as MAIN_DB_PATH
+from common.utils import hash_password
 
 # 添加项目根目录到Python路径
 import sys
@@ -51,12 +50,8 @@ class UserManager:
         Returns:
             (hashed_password, salt)元组
         """
-        if salt is None:
-            salt = uuid.uuid4().hex
-
-        # 使用与common.utils.hash_password相同的方法
-        hashed = hashlib.sha256((password + salt).encode()).hexdigest()
-        return hashed, salt
+        # 使用与common.utils.hash_password相同的方法（PASSWORD_HASH_SCHEME）
+        return hash_password(password, salt)
 
     def list_users(self):
         """列出所有用户"""